@@ -1,14 +1,26 @@
 import argparse
+import asyncio
 import os
 import re
 import sys
 from time import sleep
-from influxdb import InfluxDBClient
 from datetime import datetime, timedelta, timezone
 import numpy as np
 import time
-import paramiko
 import ipaddress
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from sketch_queries import latency_sketch_query, merge_result_sketches
+from influx_query import get_influx_query
+from load_feed import DEFAULT_LOAD_FEED, LoadWindows, open_load_feed
+from onos_cli import OnosCliClient, OnosCliPool, OnosCliError
+from srv6_registry import SRv6Registry, SRv6Journal, OPERATION_DETOUR_LATENCY, replay_journal
+from topology import HOST_SWITCHES, weighted_links
+from flow_table import DEFAULT_FLOW_TABLE, FlowTableClient
+import mcda_engine
+from path_planner import PathPlanner, segment_list
 
 ORANGE = '\033[38;5;214m'
 RED = '\033[31m'
@@ -23,12 +35,11 @@ END = "\033[0m"
 host='localhost'
 dbname='int'
 
-file_name_sufix = "-SRv6_rules.log"
+file_name_sufix = "-SRv6_rules.jsonl"                       #journal of the SRv6 rules (see srv6_registry.py)
 
 args = None
 minutes_ago_str = None                                      #string with the time of the last minute to analyze
 current_iteration = None
-doNotLog = False
 
 sleep_time_seconds = 15
 analisy_window_minutes = 0.25
@@ -61,9 +72,13 @@ qos_class_priority = {
 
 ef_dscp_value = 46  # Expedited Forwarding DSCP value
 
-# To store the currenty in usage SRv6 rules, key(switch that was overloaded) values: list dictionaries with the SRv6 args (strings)
-active_SRv6_rules = {}
-lows_alrady_demanded_detour_on_this_call = []             #to avoid overlaps ona single call (srcIP, dstIP, flow_label)
+# To store the currenty in usage SRv6 rules, by flow and by switch that was overloaded, each rule is a dictionary with the SRv6 args
+active_SRv6_rules = SRv6Registry()
+flows_alrady_demanded_detour_on_this_call = set()          #to avoid overlaps ona single call (srcIP, dstIP, flow_label)
+
+path_planner = None                                         #candidate paths on the local topology (--path_source local, see path_planner.py)
+flow_table_client = None                                    #latest path of the flows from the collector (--flow_table, see flow_table.py)
+link_pattern = re.compile(r"src=device:r(\d+)/\d+, dst=device:r(\d+)/\d+, .*state=ACTIVE")      #line of the ONOS links command
 
 current_directory = os.path.dirname(os.path.realpath(__file__))
 
@@ -108,6 +123,22 @@ def parse_args():
                         type=int, action="store", required=True, default=None)
     parser.add_argument('--iterations_timer', help='Time in seconds for each iteration, 0 mens infinite',
                         type=float, action="store", required=True, default=None)
+    parser.add_argument('--mode', help='poll: analyze every sleep_time_seconds, alternating detour and revert passes. event: re-evaluate the switches when the load pushed by the collector (--load_feed) crosses the thresholds',
+                        type=str, action="store", required=False, default="poll", choices=["poll", "event"])
+    parser.add_argument('--load_feed', help='Event mode: unix datagram socket where the collector pushes the per switch load of every window (collector --load_feed)',
+                        type=str, action="store", required=False, default=DEFAULT_LOAD_FEED)
+    parser.add_argument('--min_dwell', help='Event mode: seconds a switch must stay above (below) the threshold before being detoured (reverted)',
+                        type=float, action="store", required=False, default=3.0)
+    parser.add_argument('--stats_source', help='Where the per switch/flow stats come from: rollup (pre-aggregated by the collector, one point per key and window) or raw (switch_stats/flow_stats points)',
+                        type=str, action="store", required=False, default="rollup", choices=["rollup", "raw"])
+    parser.add_argument('--detour_workers', help='ONOS CLI sessions, the detours of different overloaded switches are requested in parallel over them (1: one switch after the other)',
+                        type=int, action="store", required=False, default=1)
+    parser.add_argument('--path_source', help='local: the detour path is chosen by the analyzer on the topology (cached candidate paths) and ONOS installs its segment list (srv6-insert). onos: ONOS computes it (Path-Detour-SRv6)',
+                        type=str, action="store", required=False, default="local", choices=["local", "onos"])
+    parser.add_argument('--k_paths', help='Local path source: candidate paths kept between each pair of switches',
+                        type=int, action="store", required=False, default=8)
+    parser.add_argument('--flow_table', help='Unix socket of the flow table of the collector (collector --flow_table), the current path of the flows comes from it instead of the DB, empty to always query the DB',
+                        type=str, action="store", required=False, default=DEFAULT_FLOW_TABLE)
 
 
     args = parser.parse_args()
@@ -116,6 +147,12 @@ def parse_args():
     if args.num_iterations <= 0:
         print("Invalid number of iterations, must be a positive integer")
         sys.exit(1)
+    if args.detour_workers < 1:
+        print("Invalid number of detour workers, must be a positive integer")
+        sys.exit(1)
+    if args.k_paths < 1:
+        print("Invalid number of candidate paths, must be a positive integer")
+        sys.exit(1)
     if args.iterations_timer < 0:
         print("Invalid timer for iterations, must be a zero or positive integer")
         sys.exit(1)
@@ -123,113 +160,73 @@ def parse_args():
         print("Impossible to have more than one iteration without a timer")
         sys.exit(1)
 
-def delete_old_log():
-    if args.routing is None:
-        return
-
-    log_file = args.routing + file_name_sufix
+def open_journal(session):
+    # The journal of the last run is replayed first: the rules it left active (it did not stop cleanly) are removed from ONOS
+    # Without --routing the journal is only used for that, under the name "analyzer"
+    journal_file = os.path.join(current_directory, (args.routing or "analyzer") + file_name_sufix)
 
-    # Delete the log file if it already exists
-    if os.path.exists(os.path.join(current_directory, log_file)):
-        os.remove(os.path.join(current_directory, log_file))
-    
-    # Create the empty log file
-    with open(os.path.join(current_directory, log_file), 'w') as file:
-        pass
+    leaked = replay_journal(journal_file)
+    if len(leaked) > 0:
+        print(PINK + f"Removing {len(leaked)} SRv6 rules left active by the previous run: {leaked}" + END)
+        send_commands(session, [srv6_remove_command(SRv6_rule) for SRv6_rule in leaked.all_rules()])
 
-def write_log(message):
-    if args.routing is None or doNotLog is True:
-        return
-    
-    log_file = args.routing + file_name_sufix
+    active_SRv6_rules.journal = SRv6Journal(journal_file)
+    active_SRv6_rules.journal.truncate()
 
-    #Open file and append the message to the log file at the same directory of the script is on
-    with open(os.path.join(current_directory, log_file), 'a') as file:
-        file.write(f"{current_iteration} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+def write_log(operation, switch_id, **fields):
+    if active_SRv6_rules.journal is not None:
+        active_SRv6_rules.journal.record(operation, switch_id, current_iteration, **fields)
 
 def remove_all_active_SRv6_rules(session):
-    global active_SRv6_rules, doNotLog
-    switch_marked_to_remove = []
-    doNotLog = True
     print(PINK + "Removing all active SRv6 rules" + END)
 
-    for switch_id, SRv6_rules in active_SRv6_rules.items():
-        #Remove all rules from the current switch
-        remove_switch_SRv6_rules(session, switch_id, SRv6_rules, switch_marked_to_remove)
-        print(PINK + "Removed active SRv6 rules from switch:" + str(switch_id) + END)
-
-    #iterate the list of switches that had all of their rules removed and remove them from active_SRv6_rules
-    for switch_id in switch_marked_to_remove:
-        del active_SRv6_rules[switch_id]
-    
-    doNotLog = False
-
-# Function to strip ANSI escape sequences from a string
-def strip_ansi_escape_sequences(string):    
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    string = ansi_escape.sub('', string)
+    #all the srv6-remove commands of every switch are sent back to back on the session
+    commands = [srv6_remove_command(SRv6_rule) for SRv6_rule in active_SRv6_rules.all_rules()]
+    outputs = send_commands(session, commands)
 
-    #If \x1b> is still present, remove it
-    string = string.replace('\x1b>', '')
+    for output in outputs:
+        if output:
+            print(output)
+    for switch_id in active_SRv6_rules.switches():
+        print(PINK + "Removed active SRv6 rules from switch:" + str(switch_id) + END)
 
-    return string
+    #end of the test, marked as cleanup in the journal (not part of the results)
+    active_SRv6_rules.clear(current_iteration, cleanup=True)
 
 def connect_to_onos():
-    # Define connection parameters
-    hostname = 'localhost'
-    port = 8101
-    username = 'onos'
-    password = 'rocks' 
-
-    # Create an SSH client
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Persistent session with the ONOS CLI, commands end when the prompt comes back (see onos_cli.py)
+    # with detour_workers > 1 a pool of sessions, with the same interface
+    if args.detour_workers > 1:
+        session = OnosCliPool(args.detour_workers, hostname='localhost', port=8101, username='onos', password='rocks')
+    else:
+        session = OnosCliClient(hostname='localhost', port=8101, username='onos', password='rocks')
 
     try:
-        # Connect to the ONOS CLI
-        client.connect(
-            hostname=hostname,
-            port=port,
-            username=username,
-            password=password,
-            look_for_keys=False,
-            allow_agent=False
-        )
-        
-        # Open a session
-        session = client.invoke_shell()
-        
-        # Allow some time for the session to be ready
-        time.sleep(1)
-        
-        # Check if the channel is active
-        if session.recv_ready():
-            print(session.recv(1024).decode('utf-8'))
-        
+        banner = session.connect()
+        print(banner)
         return session
 
-    except Exception as e:
+    except OnosCliError as e:
         print(f"Failed to connect: {e}")
-        client.close()
         return None
 
 def send_command(session, command):
-    if session:
-        session.send(command + '\n')
-        time.sleep(1)  # Wait for the command to be executed
+    return send_commands(session, [command])[0]
 
-        output = ""
-        while True:
-            if session.recv_ready():
-                output_chunk = session.recv(1024).decode('utf-8')
-                output += output_chunk
-            else:
-                break
-        
-        return output
-    else:
-        return "Session not established"
+def send_commands(session, commands):
+    # Returns the output of each command, an error message for all of them if the session fails
+    if not session:
+        return ["Session not established"] * len(commands)
+    if not commands:
+        return []
+
+    try:
+        return session.execute_many(commands)
+    except OnosCliError as e:
+        print(RED + f"ONOS command failed: {e}" + END)
+        return [f"ONOS command failed: {e}"] * len(commands)
 
+@functools.lru_cache(maxsize=65536)
 def compare_ipv6_segment(ipv6_address, segment_index, comparison_value):
     # Receive an IPv6 address in its compressed form, compares a specific segment to a given value,
     # the segment is converted to an integer before the comparison, the comparation is done in decimal
@@ -250,11 +247,20 @@ def compare_ipv6_segment(ipv6_address, segment_index, comparison_value):
     # Compare the extracted segment to the given value
     return segment_to_compare == comparison_value
 
-def get_current_path(flow):
+def get_current_path(flow, snapshot=None):
     # Get the current path of the flow, arguments: (src_ip, dst_ip, flow_label)
     # Returns a string with the current path of the flow, separated by -
     # Example: "1-2-3-4"
 
+    # Latest path already fetched in the analysis snapshot
+    if snapshot is not None and flow in snapshot.flow_paths:
+        return snapshot.flow_paths[flow]
+
+    # Latest path kept by the collector
+    paths = flow_table_paths([flow])
+    if paths and flow in paths:
+        return paths[flow]
+
     # Get the flow arguments
     src_ip = flow[0]
     dst_ip = flow[1]
@@ -263,15 +269,15 @@ def get_current_path(flow):
     # Query the DB to get the current path of the flow
     query = f"""
         SELECT "path" 
-        FROM flow_stats
-        WHERE "src_ip" = '{src_ip}' 
-        AND "dst_ip" = '{dst_ip}' 
-        AND "flow_label" = '{flow_label}'
+        FROM {"flow_rollup" if args.stats_source == "rollup" else "flow_stats"}
+        WHERE "src_ip" = $src_ip 
+        AND "dst_ip" = $dst_ip 
+        AND "flow_label" = $flow_label
         ORDER BY time DESC
         LIMIT 1
         """
     
-    result = apply_query(query)
+    result = apply_query(query, {'src_ip': src_ip, 'dst_ip': dst_ip, 'flow_label': str(flow_label)})
 
     # Many checks done already, so I can assume that there is data to analyze
     #print(result)
@@ -280,54 +286,96 @@ def get_current_path(flow):
     return path
 
 def store_SRv6_rule(switch_id, values):
-    #check if there is already a SRv6 rule for the same flow and delete it before adding new on the new key
-    stop = False
-    for key, SRv6_rules in active_SRv6_rules.items():
-        for SRv6_rule in SRv6_rules:
-            #if the flow is the same, remove it
-            if SRv6_rule['srcIP'] == values['srcIP'] and SRv6_rule['dstIP'] == values['dstIP'] and SRv6_rule['flow_label'] == values['flow_label']:
-                SRv6_rules.remove(SRv6_rule)
-                stop = True
-                break
-        if stop:
-            break
-    
-    #add the new rule to switch_id
-    if switch_id not in active_SRv6_rules:
-        active_SRv6_rules[switch_id] = [values]
-    else:
-        active_SRv6_rules[switch_id].append(values)
-    
-    write_log(f"Created SRv6 rule => {switch_id}: {values}")
-
-def remove_switch_SRv6_rules(session, switch_id, SRv6_rules, switch_marked_to_remove):
-    
-    #--------Iterate trough all of it's SRv6_args and remove each rule from ONOS
+    #a rule already active for the same flow is replaced, the new one is stored under switch_id (and in the journal)
+    detours = active_SRv6_rules.add(switch_id, values, current_iteration)
+    if detours > 1:
+        print(ORANGE + f"Flow {values['srcIP']} -> {values['dstIP']} (Flow label: {values['flow_label']}) detoured {detours} times" + END)
+
+def store_detour(switch_id, current_flow, srcSwitchID):
+    #prepare info to store in active_SRv6_rules
+    devideID = srcSwitchID                 #device that injects the SRv6 in the packet
+    srcIP = current_flow[0]                #source IP of the flow
+    dstIP = current_flow[1]                #destination IP of the flow
+    flow_label = current_flow[2]           #flow label of the flow
+    src_mask = 128                         #source mask of the flow
+    dst_mask = 128                         #destination mask of the flow
+    flow_label_mask = 255                  #flow label mask of the flow
+
+    values = {'deviceID': devideID, 'srcIP': srcIP, 'dstIP': dstIP, 'flow_label': flow_label, 'src_mask': src_mask, 'dst_mask': dst_mask, 'flow_label_mask': flow_label_mask}
+
+    #store the SRv6 rule in the dictionary active_SRv6_rules, switch_id is the switch that was overloaded
+    store_SRv6_rule(switch_id, values)
+
+    print(CYAN + "created SRv6 rule:" + str(values) + END)
+    return values
+
+def srv6_remove_command(SRv6_rule):
+    devideID = SRv6_rule['deviceID']                  #device that injects the SRv6 in the packet
+    srcIP = SRv6_rule['srcIP']                        #source IP of the flow
+    dstIP = SRv6_rule['dstIP']                        #destination IP of the flow
+    flow_label = SRv6_rule['flow_label']              #flow label of the flow
+    src_mask = SRv6_rule['src_mask']                  #source mask of the flow
+    dst_mask = SRv6_rule['dst_mask']                  #destination mask of the flow
+    flow_label_mask = SRv6_rule['flow_label_mask']    #flow label mask of the flow
+
+    #This command does not return anything if successful (or if there is no rule with said args)
+    args = (devideID, srcIP, dstIP, flow_label, src_mask, dst_mask, flow_label_mask)
+    return 'srv6-remove device:r%s %s %s %s %s %s %s' % args
+
+def srv6_insert_command(srcSwitchID, flow, segments):
+    #same masks as the rules created by ONOS for Path-Detour-SRv6 (and stored by store_detour)
+    args = (srcSwitchID, flow[0], flow[1], flow[2], ' '.join(segments))
+    return 'srv6-insert device:r%s %s %s %s 128 128 255 %s' % args
+
+def remove_switch_SRv6_rules(session, switch_id):
+
+    #--------Remove all of it's SRv6 rules from ONOS, the commands are sent back to back
+    SRv6_rules = active_SRv6_rules.rules_of_switch(switch_id)
+    now = time.time()
     for SRv6_rule in SRv6_rules:
-        print(f"Trying to remove rule: {SRv6_rule}")
-        devideID = SRv6_rule['deviceID']                  #device that injects the SRv6 in the packet
-        srcIP = SRv6_rule['srcIP']                        #source IP of the flow
-        dstIP = SRv6_rule['dstIP']                        #destination IP of the flow
-        flow_label = SRv6_rule['flow_label']              #flow label of the flow
-        src_mask = SRv6_rule['src_mask']                  #source mask of the flow
-        dst_mask = SRv6_rule['dst_mask']                  #destination mask of the flow
-        flow_label_mask = SRv6_rule['flow_label_mask']    #flow label mask of the flow
-
-        #This command does not return anything if successful (or if there is no rule with said args)
-        args = (devideID, srcIP, dstIP, flow_label, src_mask, dst_mask, flow_label_mask)
-        command = 'srv6-remove device:r%s %s %s %s %s %s %s' % args
-
-        #remove rule from ONOS
-        output = send_command(session, command)
+        age = active_SRv6_rules.age((SRv6_rule['srcIP'], SRv6_rule['dstIP'], int(SRv6_rule['flow_label'])), now)
+        print(f"Trying to remove rule: {SRv6_rule} (active for {age:.1f} s)")
+    outputs = send_commands(session, [srv6_remove_command(SRv6_rule) for SRv6_rule in SRv6_rules])
+
+    for output in outputs:
         print(output)
-        write_log(f"Removed SRv6 rule => {switch_id}: {SRv6_rule}")
 
-    #all rules created by this switch removed from ONOS, mark to remove after iterating active_SRv6_rules
-    switch_marked_to_remove.append(switch_id)
+    #all rules created by this switch removed from ONOS
+    active_SRv6_rules.remove_switch(switch_id, current_iteration)
+
+def refresh_link_state(session):
+    # One links command before the detours, the cached candidate paths are only computed again if a link changed
+    output = send_command(session, "links")
+    active_links = {frozenset((int(src), int(dst))) for src, dst in link_pattern.findall(output)}
+    if not active_links:                #no answer from ONOS, keep the last known state
+        return
+
+    if path_planner.update_link_states(active_links):
+        down_links = sorted(tuple(sorted(link)) for link in path_planner.down_links)
+        print(ORANGE + f"Link state changed, candidate paths computed again, links down: {down_links}" + END)
+
+def request_local_detour(session, wrost, current_path, bad_switch_loads, switch_loads):
+    # The detour path is chosen here (path_planner.py), ONOS only installs its segment list on the source switch
+    srcID = current_path.split('-')[0]
+    parsed_current_path = [int(switch_id) for switch_id in current_path.split('-')]
 
-    return switch_marked_to_remove
+    detour = path_planner.best_detour(parsed_current_path, dict(switch_loads), dict(bad_switch_loads))
+    if detour is None:
+        return 1, "No path alternatives, no SRv6 rule created", srcID
+
+    result = send_command(session, srv6_insert_command(srcID, wrost, segment_list(detour)))
+
+    # srv6-insert prints "Installing path on device ..." before installing it, anything else is an error
+    lines = [line.strip() for line in result.strip().split('\n') if line.strip()]
+    if not lines or not lines[0].startswith("Installing path on device"):
+        return 1, lines[-1] if lines else "No answer from ONOS", srcID
+
+    return 0, "Success, detour path: " + '-'.join(str(switch_id) for switch_id in detour), srcID
+
+def request_SRv6_detour(session, wrost, current_path, bad_switch_loads, switch_loads):
+    if args.path_source == "local":
+        return request_local_detour(session, wrost, current_path, bad_switch_loads, switch_loads)
 
-def request_SRv6_detour(session, wrost, current_path, bad_switch_loads):
     parsed_current_path = current_path.split('-')
     code = 0
     srcID = parsed_current_path[0]
@@ -356,10 +404,9 @@ def request_SRv6_detour(session, wrost, current_path, bad_switch_loads):
 
     result = send_command(session, command)
 
-    # Clean the message from ANSI escape sequences
-    lines = result.strip().split('\n')
-    msg = lines[3].strip()         # Strip trailing whitespace and newlines
-    msg = strip_ansi_escape_sequences(msg)
+    # The result is the last line of the output (after "Creating path detour using SRv6 policy")
+    lines = [line.strip() for line in result.strip().split('\n') if line.strip()]
+    msg = lines[-1] if lines else ""
 
 
     cmp = "Success"
@@ -386,206 +433,141 @@ def print_tags_fields(result):
             print(f"Fields: {fields}")
         print("-----------------------")
 
-def apply_query(query):
-    # Connect to the InfluxDB client
-    client = InfluxDBClient(host=host, database=dbname)
-    
-    # Execute the query
-    result = client.query(query)
-    
-    # Close the connection
-    client.close()
-
-    return result
-
-def normalize_value(value, min_value, max_value):
-    normalized = (value - min_value) / (max_value - min_value)
-    return round(normalized, 3)
-
-def calculate_MCDA_loads(non_infra_switch, normalized_num_packets, normalized_avg_packet_size, normalized_avg_packet_procesing_time):
-    # Create a numpy array for normalized values and weights
-    normalized_values = np.array([
-        non_infra_switch,
-        normalized_num_packets,
-        normalized_avg_packet_size,
-        normalized_avg_packet_procesing_time
-    ])
-    
-    weight_values = np.array([
-        weights['no_infra_switch'],
-        weights['num_packets'],
-        weights['avg_packet_size'],
-        weights['avg_packet_procesing_time']
-    ])
-
-    #print("Normalized values:", normalized_values)
-    #print("Weight values:", weight_values)
-    # Calculate the weighted sum (MCDA score)
-    score = np.dot(normalized_values, weight_values)
-    return round(score, 3)
-
-def calculate_switches_load(stats_by_switch):
-    switch_loads = []
-
-    for series in stats_by_switch.raw['series']:
-        tags = series.get('tags')
-        values = series.get('values')       #[0][time, num_packets', 'average_latency', 'average_size]
-
-        switch_id = int(tags['switch_id'])
-        num_packets = values[0][1]                  #no decimals
-        avg_packet_size = values[0][3]              #bytes
-        avg_packet_procesing_time = values[0][2]    #nanoseconds
-
-        non_infra_switch = 1
-        if switch_id in static_infra_switches: non_infra_switch = 0   
-
-        
-        #print("-----------------------")
-        #print(f"Switch ID: {switch_id}")
-        #print(f"Number of packets: {num_packets}")
-        #print(f"Average packet size: {avg_packet_size}")
-        #print(f"Average packet processing time: {avg_packet_procesing_time}")
-        
-        
-
-        # See if there is a need to update the max num_packets possible in the current time window
-        #if num_packets > normalization_limits['num_packets'][1]:
-        #    normalization_limits['num_packets'][1] = num_packets
-        #    print("Updated max num_packets to:", num_packets)
-
-
-
-        #--------------------Normalize the values and calculate the MCDA loads--------------------
+def apply_query(query, params=None):
+    # Execute the query on the shared InfluxDB client (HTTP connections kept alive between queries and cycles)
+    # the values are passed as bound parameters, referenced as $name in the query
+    return get_influx_query(host=host, database=dbname).query(query, params)
 
-        # Normalize the values
-        normalized_num_packets               = normalize_value(num_packets,               normalization_limits['num_packets'][0],               normalization_limits['num_packets'][1])
-        normalized_avg_packet_size           = normalize_value(avg_packet_size,           normalization_limits['packet_size'][0],           normalization_limits['packet_size'][1])
-        normalized_avg_packet_procesing_time = normalize_value(avg_packet_procesing_time, normalization_limits['packet_procesing_time'][0], normalization_limits['packet_procesing_time'][1])
-        
-
-        #print("-----------------------")
-        #print(f"Switch ID: {switch_id}")
-        #print(f"Normalized Number of packets: {normalized_num_packets}")
-        #print(f"Normalized Average packet size: {normalized_avg_packet_size}")
-        #print(f"Normalized Average packet processing time: {normalized_avg_packet_procesing_time}")
+def apply_query_batch(queries, params=None):
+    # Several queries on a single request, returns a result per query
+    return get_influx_query(host=host, database=dbname).query_batch(queries, params)
 
-        loads = calculate_MCDA_loads(non_infra_switch, normalized_num_packets, normalized_avg_packet_size, normalized_avg_packet_procesing_time)
+def calculate_switches_load(stats_by_switch, verbose=True):
+    if not stats_by_switch:
+        return []
 
-        print(f'The MCDA loads for: {switch_id} \tis: {loads}')
+    #--------------------Normalize the values and calculate the MCDA loads of all the switches at once--------------------
+    switch_ids, num_packets, avg_packet_procesing_time, avg_packet_size = (np.array(column) for column in zip(*stats_by_switch))
+    loads = mcda_engine.switch_loads(switch_ids, num_packets, avg_packet_procesing_time, avg_packet_size,
+                                     static_infra_switches, normalization_limits, weights)
 
-        #add the switch_id and the load to the list
-        switch_loads.append((switch_id, loads))
+    #list of (switch_id, load)
+    switch_loads = list(zip(switch_ids.tolist(), loads.tolist()))
 
-    #print the list of switch_id and loads
-    #for switch in switch_loads:
-    #    print(f"Switch ID: {switch[0]} \tLoad: {switch[1]}")
+    if verbose:
+        for switch_id, load in switch_loads:
+            print(f'The MCDA loads for: {switch_id} \tis: {load}')
 
     return switch_loads
 
-def get_wrost_flows_on_switch(switch_id):
-    global flows_alrady_demanded_detour_on_this_call
-    
-    #--------Get the worst flow in the current switch
-    flow_list = []      #to store the flows from the current switch from worst to best
+def get_wrost_flows_on_switch(switch_id, snapshot=None):
+    #--------Get the flows in the current switch, from worst to best
 
-    #similar to global one, but this only considers the current switch
-    #switch_normalization_limits = update_max_values_on_switch(switch_id) 
-    #print("Switch normalization limits:", normalization_limits)
+    #Get flow stats for the current switch (from the analysis snapshot if there is one)
+    if snapshot is not None:
+        flow_stats = snapshot.flow_stats_by_switch.get(switch_id, [])
+    else:
+        flow_stats = get_flow_stats_on_switch(switch_id)
 
-    #Get flow stats for the current switch
-    query = f"""
-        SELECT 
-            COUNT("latency") AS num_packets_on_switch, 
-            MEAN("size") AS avg_size,
-            MEAN("latency") AS avg_latency
-        FROM switch_stats 
-        WHERE 
-            time >= '{minutes_ago_str}' AND
-            "switch_id" = '{switch_id}'
-        GROUP BY "src_ip", "dst_ip", "flow_label"
-    """
+    #See if the current switch is src or dst of the flow, if so skip it
+    flow_stats = [stats for stats in flow_stats
+                  if not (compare_ipv6_segment(stats[0][0], 2, switch_id) or compare_ipv6_segment(stats[0][1], 2, switch_id))]
+    if flow_stats == []:
+        return []
 
-    result = apply_query(query)
-    #print tags and fields
-    #print_tags_fields(result)
+    # Normalize the values, using the global normalization limits (not switch specific), and calculate the MCDA loads
+    flows, num_packets, avg_packet_size, avg_packet_procesing_time = zip(*flow_stats)
+    loads = mcda_engine.flow_loads(np.array(num_packets), np.array(avg_packet_size), np.array(avg_packet_procesing_time),
+                                   normalization_limits, weights)
 
+    #flows by descending order of load, the flows with the same load in the order they came
+    order = mcda_engine.rank_descending(loads)
+    loads = loads.tolist()
+    return [(flows[i], loads[i]) for i in order]
 
-    #There is already 2 checks done before this function call, so I can assume that there is data to analyze
-    #print(result)
 
-    #Get data from the tags and fields
-    for series in result.raw['series']:
-        tags = series.get('tags')
-        values = series.get('values')       #[0][time, num_packets', 'average_latency', 'average_size]
 
-        src_ip = tags['src_ip']
-        dst_ip = tags['dst_ip']
-        flow_label = tags['flow_label']
-        new_flow = (src_ip, dst_ip, flow_label)
+def flow_stats_query(group_by_switch=False):
+    # Per flow stats of one switch ($switch_id), or of all the switches if group_by_switch (GROUP BY switch_id too)
+    if group_by_switch:
+        switch_condition = ""
+        group_by = '"switch_id", "src_ip", "dst_ip", "flow_label"'
+    else:
+        switch_condition = 'AND "switch_id" = $switch_id'
+        group_by = '"src_ip", "dst_ip", "flow_label"'
+
+    if args.stats_source == "rollup":
+        return f"""
+            SELECT 
+                SUM("count") AS num_packets_on_switch, 
+                SUM("size_sum") AS size_sum,
+                SUM("latency_sum") AS latency_sum
+            FROM switch_flow_rollup 
+            WHERE 
+                time >= $start
+                {switch_condition}
+            GROUP BY {group_by}
+        """
+    else:
+        return f"""
+            SELECT 
+                COUNT("latency") AS num_packets_on_switch, 
+                MEAN("size") AS avg_size,
+                MEAN("latency") AS avg_latency
+            FROM switch_stats 
+            WHERE 
+                time >= $start
+                {switch_condition}
+            GROUP BY {group_by}
+        """
+
+def parse_flow_stats(series):
+    # ((src_ip, dst_ip, flow_label), num_packets, avg_size, avg_latency) of one series of flow_stats_query()
+    tags = series.get('tags')
+    values = series.get('values')       #[0][time, num_packets, average_size or size_sum, average_latency or latency_sum]
 
-        num_packets = values[0][1]                  #no decimals
+    num_packets = values[0][1]                  #no decimals
+    if args.stats_source == "rollup":           #the means of the whole window come from the sums of every rollup window
+        avg_packet_size = values[0][2] / num_packets
+        avg_packet_procesing_time = values[0][3] / num_packets
+    else:
         avg_packet_size = values[0][2]              #bytes
         avg_packet_procesing_time = values[0][3]    #nanoseconds
 
-        #See if the current switch is src or dst of the flow, if so skip it
-        if compare_ipv6_segment(src_ip, 2, switch_id) or compare_ipv6_segment(dst_ip, 2, switch_id):
-            #print("Switch is src or dst of the flow, skipping")
-            continue
-
-
-        # Normalize the values, using the global normalization limits (not switch specific)
-        normalized_num_packets               = normalize_value(num_packets,               normalization_limits['num_packets'][0],           normalization_limits['num_packets'][1])
-        normalized_avg_packet_size           = normalize_value(avg_packet_size,           normalization_limits['packet_size'][0],           normalization_limits['packet_size'][1])
-        normalized_avg_packet_procesing_time = normalize_value(avg_packet_procesing_time, normalization_limits['packet_procesing_time'][0], normalization_limits['packet_procesing_time'][1])
-
-        # Calculate the MCDA load
-        new_load = calculate_MCDA_loads(1, normalized_num_packets, normalized_avg_packet_size, normalized_avg_packet_procesing_time)
-
-        #store the flow in the list of flows by descending order of load
-        new = (new_flow, new_load)
-        if flow_list == []:
-            flow_list.append(new)
-        else:
-            for i, (flow, load) in enumerate(flow_list):
-                if new_load > load:
-                    flow_list.insert(i, new)
-                    break
-            else:
-                flow_list.append(new)
-
-    return flow_list
+    return ((tags['src_ip'], tags['dst_ip'], tags['flow_label']), num_packets, avg_packet_size, avg_packet_procesing_time)
 
+def get_flow_stats_on_switch(switch_id):
+    # Returns a list of ((src_ip, dst_ip, flow_label), num_packets, avg_size, avg_latency) of the flows that crossed the switch
+    result = apply_query(flow_stats_query(), {'start': minutes_ago_str, 'switch_id': str(switch_id)})
+    #print tags and fields
+    #print_tags_fields(result)
 
+    return [parse_flow_stats(series) for series in result.raw.get('series', [])]
 
-def search_no_longer_overloaded_switches(session, switch_loads):
+def search_no_longer_overloaded_switches(session, switch_loads, only_switches=None):
     #--------Iterate through active_SRv6_rules and see if the switchs (keys) have their loads below the thresholds_no_overloaded
     #if so remove said rule via ONOS if all good remove from our list
-    load = 0            #It will remain 0 if the switch is not in the list of switch_loads (there is no flow passing through it) 
-    switch_marked_to_remove = []
-    for switch_id, SRv6_rules in active_SRv6_rules.items():
-        
+    #only_switches: only these switches are checked (event mode), None checks all of them
+    loads = dict(switch_loads)
+    for switch_id in active_SRv6_rules.switches():
+        if only_switches is not None and switch_id not in only_switches:
+            continue
+
         # Get the load value for the current switch responsible for the current SRv6 rules
-        #List of tuples
-        for load_id, load_value in switch_loads:
-            if load_id == switch_id:
-                load = load_value
-                print(f"Switch ID: {switch_id}, Load: {load}")
-                break
+        # It will be 0 if the switch is not in switch_loads (there is no flow passing through it)
+        load = loads.get(switch_id, 0)
+        print(f"Switch ID: {switch_id}, Load: {load}")
 
         if load > thresholds_no_overloaded:
             continue
 
         print(BLUE + "Switch" + str(switch_id) + " is no longer overloaded, removing SRv6 rule" + END)
 
-        switch_marked_to_remove = remove_switch_SRv6_rules(session, switch_id, SRv6_rules, switch_marked_to_remove)
-
-    #iterate the list of switches that had all of their rules removed and remove them from active_SRv6_rules
-    for switch_id in switch_marked_to_remove:
-        del active_SRv6_rules[switch_id]
+        remove_switch_SRv6_rules(session, switch_id)
 
-def search_overloaded_switches(session, switch_loads):
+def search_overloaded_switches(session, switch_loads, snapshot=None, only_switches=None):
     global flows_alrady_demanded_detour_on_this_call
-    flows_alrady_demanded_detour_on_this_call = []             #to avoid overlaps ona single call (srcIP, dstIP, flow_label)
+    flows_alrady_demanded_detour_on_this_call = set()          #to avoid overlaps ona single call (srcIP, dstIP, flow_label)
     switch_detour_done = False
     #print("Searching for overloaded switches")
 
@@ -603,13 +585,23 @@ def search_overloaded_switches(session, switch_loads):
         if load_value >= thresholds_overloaded:                             
             bad_switch_loads.append((switch_id, load_value))
 
-    #Got through the list of bad switches
+    #With several ONOS sessions, the overloaded switches are detoured at the same time
+    switches = [switch_id for switch_id, _ in bad_switch_loads if only_switches is None or switch_id in only_switches]
+    if args.path_source == "local" and switches:
+        refresh_link_state(session)
+    if args.detour_workers > 1 and len(switches) > 1:
+        detour_switches_concurrently(session, switches, bad_switch_loads, switch_loads, snapshot)
+        return
+
+    #Got through the list of bad switches (only the ones in only_switches on event mode, the detours still avoid all the bad ones)
     for switch_id, load_value in bad_switch_loads:
+        if only_switches is not None and switch_id not in only_switches:
+            continue
         switch_detour_done = False
         print(f"Switch {switch_id} is overloaded, checking flows")
 
         #--------Get the heaviest flow in the current switch
-        flow_list = get_wrost_flows_on_switch(switch_id)
+        flow_list = get_wrost_flows_on_switch(switch_id, snapshot)
 
         if flow_list == []:
             print(RED + "No flows in the switch have it as a non-src/dst, skipping" + END)
@@ -625,125 +617,281 @@ def search_overloaded_switches(session, switch_loads):
 
             #print("For switch", switch_id, "the flow tring to be detoured is:", current_flow)
 
-            current_path = get_current_path(current_flow)
-            code, result, srcSwitchID = request_SRv6_detour(session, current_flow, current_path, bad_switch_loads)
+            current_path = get_current_path(current_flow, snapshot)
+            code, result, srcSwitchID = request_SRv6_detour(session, current_flow, current_path, bad_switch_loads, switch_loads)
 
             #store the flow that was requested to detoured
-            flows_alrady_demanded_detour_on_this_call.append(current_flow)
+            flows_alrady_demanded_detour_on_this_call.add(current_flow)
 
             print(result)
             if code != 0:           #if the detour was not successful, try the next flow
                 continue
             else:
-                #prepare info to store in active_SRv6_rules 
                 print("Storing Detour info")
                 switch_detour_done = True
-
-                devideID = srcSwitchID          #device that injects the SRv6 in the packet
-                srcIP = current_flow[0]                #source IP of the flow
-                dstIP = current_flow[1]                #destination IP of the flow
-                flow_label = current_flow[2]           #flow label of the flow
-                src_mask = 128                  #source mask of the flow
-                dst_mask = 128                  #destination mask of the flow
-                flow_label_mask = 255           #flow label mask of the flow
-                
-                values = {'deviceID': devideID, 'srcIP': srcIP, 'dstIP': dstIP, 'flow_label': flow_label, 'src_mask': src_mask, 'dst_mask': dst_mask, 'flow_label_mask': flow_label_mask}
-
-                #store the SRv6 rule in the dictionary active_SRv6_rules, switch_id is the switch that was overloaded
-                store_SRv6_rule(switch_id, values)      
-
-                print(CYAN + "created SRv6 rule:" + str(values) + END)
-                break           #break the loop on current switch's flows, 1 the detour was successful 
+                store_detour(switch_id, current_flow, srcSwitchID)
+                break           #break the loop on current switch's flows, 1 the detour was successful
         
         if switch_detour_done == False:
             print(ORANGE + "No flow was able to be detoured on this switch" + END)
 
 
 
-def get_stats_by_switch():
-    global minutes_ago_str
-    query = f"""
+def plan_detours(switch_candidates):
+    #One round of detours: each switch takes its worst flow not demanded yet on this call, in the order of the switches,
+    #so a flow crossing several overloaded switches is only requested by the first one (as in the sequential search)
+    #switch_candidates: switch_id -> flows not tried yet, from worst to best (consumed)
+    plan = []
+    for switch_id, candidates in switch_candidates.items():
+        while candidates:
+            current_flow = candidates.pop(0)
+            if current_flow in flows_alrady_demanded_detour_on_this_call:
+                print(f"Flow {current_flow} already demanded a detour on this call, skipping it for switch {switch_id}")
+                continue
+            flows_alrady_demanded_detour_on_this_call.add(current_flow)
+            plan.append((switch_id, current_flow))
+            break
+    return plan
+
+def detour_switches_concurrently(session, switches, bad_switch_loads, switch_loads, snapshot=None):
+    #Plans one detour per overloaded switch, requests them in parallel (one ONOS session each) and stores the successful ones
+    #The switches whose detour failed go to the next round with their next worst flow, until all are detoured or out of flows
+    switch_candidates = {}
+    for switch_id in switches:
+        print(f"Switch {switch_id} is overloaded, checking flows")
+        flow_list = get_wrost_flows_on_switch(switch_id, snapshot)
+        if flow_list == []:
+            print(RED + "No flows in the switch have it as a non-src/dst, skipping" + END)
+            continue
+        switch_candidates[switch_id] = [flow for flow, load in flow_list]
+
+    with ThreadPoolExecutor(max_workers=args.detour_workers) as executor:
+        while switch_candidates:
+            plan = plan_detours(switch_candidates)
+
+            #paths from the snapshot (or the DB) on this thread, only the ONOS commands go to the pool
+            paths = [get_current_path(current_flow, snapshot) for _, current_flow in plan]
+            futures = [executor.submit(request_SRv6_detour, session, current_flow, current_path, bad_switch_loads, switch_loads)
+                       for (_, current_flow), current_path in zip(plan, paths)]
+
+            #results stored in the order of the plan, once all of the round arrived
+            for (switch_id, current_flow), future in zip(plan, futures):
+                code, result, srcSwitchID = future.result()
+                print(f"Switch {switch_id}, flow {current_flow}: {result}")
+                if code == 0:
+                    print("Storing Detour info")
+                    store_detour(switch_id, current_flow, srcSwitchID)
+                    del switch_candidates[switch_id]
+
+            for switch_id in [switch_id for switch_id, candidates in switch_candidates.items() if not candidates]:
+                print(ORANGE + "No flow was able to be detoured on switch " + str(switch_id) + END)
+                del switch_candidates[switch_id]
+
+def stats_by_switch_query():
+    if args.stats_source == "rollup":
+        return """
+                SELECT 
+                    SUM("count") AS num_packets, 
+                    SUM("latency_sum") AS latency_sum, 
+                    SUM("size_sum") AS size_sum
+                FROM switch_rollup 
+                WHERE time >= $start 
+                GROUP BY "switch_id"
+                """
+    else:
+        return """
                 SELECT 
                     COUNT("latency") AS num_packets, 
                     MEAN("latency") AS average_latency, 
                     MEAN("size") AS average_size
                 FROM switch_stats 
-                WHERE time >= '{minutes_ago_str}' 
+                WHERE time >= $start 
                 GROUP BY "switch_id"
                 """
 
-    result = apply_query(query)
+def parse_stats_by_switch(result):
+    # Returns a list of (switch_id, num_packets, average_latency, average_size), empty if there is no data
+    stats_by_switch = []
+    for series in result.raw.get('series', []):
+        tags = series.get('tags')
+        values = series.get('values')       #[0][time, num_packets, average_latency or latency_sum, average_size or size_sum]
 
-    return result
+        num_packets = values[0][1]
+        if args.stats_source == "rollup":
+            stats_by_switch.append((int(tags['switch_id']), num_packets, values[0][2] / num_packets, values[0][3] / num_packets))
+        else:
+            stats_by_switch.append((int(tags['switch_id']), num_packets, values[0][2], values[0][3]))
 
-def update_max_values_globaly():
-    global minutes_ago_str
-    global normalization_limits
+    return stats_by_switch
 
-    # Define normalization limits for each data type
-    normalization_limits = {
-        'num_packets': [0, -1],                                    # Min and max values for number of packets (no decimals)
-        'packet_size': [0, network_MTU],                           # Min and max values for average packet size (bytes)
-        'packet_procesing_time': [0, -1]                           # Min and max values for average packet processing time (nanoseconds), 
-    }
+def total_packets_query():
+    # Total number of packets in the current time window
+    if args.stats_source == "rollup":
+        return """
+                SELECT SUM("count") AS total_num_packets
+                FROM flow_rollup 
+                WHERE time >= $start 
+                """
+    else:
+        return """
+                SELECT COUNT("latency") AS total_num_packets
+                FROM flow_stats 
+                WHERE time >= $start 
+                """
+
+def flow_paths_query():
+    # Latest path of every flow seen in the current time window
+    return f"""
+        SELECT LAST("path") AS path
+        FROM {"flow_rollup" if args.stats_source == "rollup" else "flow_stats"}
+        WHERE time >= $start
+        GROUP BY "src_ip", "dst_ip", "flow_label"
+        """
 
-    # Send query to DB so I can get the current max for packet_procesing_time and count how many packets, remove the -1
-    # Query to get the 85th percentile latency value
-    percentile_query = f"""
+# Raw stats only, the 85th percentile latency, to exclude outliers
+percentile_query = """
         SELECT PERCENTILE("latency", 85) AS p_latency
         FROM switch_stats
-        WHERE time >= '{minutes_ago_str}'
+        WHERE time >= $start
     """
 
-    # Execute the first query to get the 85th percentile value, to exclude outliers
-    percentile_result = apply_query(percentile_query)
-    p_latency = list(percentile_result.get_points())[0]['p_latency']   #nanoseconds
-
-    #if empty return False
-    if not percentile_result: return False
-    #print("percentile latency:", p_latency)
-
-    # Use the 85th percentile value to filter and get the maximum latency below this value
-    max_latency_query = f"""
+# Raw stats only, the maximum latency below the 85th percentile ($p_latency)
+max_latency_query = """
         SELECT MAX("latency") AS MAX_latency
         FROM switch_stats
-        WHERE time >= '{minutes_ago_str}' AND "latency" <= {p_latency}
+        WHERE time >= $start AND "latency" <= $p_latency
     """
 
-    # Execute the second query to get the maximum latency below the 85th percentile
-    max_latency_result = apply_query(max_latency_query)
-    max_latency = list(max_latency_result.get_points())[0]['MAX_latency']
-
-    #print("Max latency:", max_latency)
-
-    #---------------------------------Get the total number of packets in the current time window
-    query = f"""
-                SELECT COUNT("latency") AS total_num_packets
-                FROM flow_stats 
-                WHERE time >= '{minutes_ago_str}' 
-                """
-    result = apply_query(query)
-    #if empty return False
-    if not result: return False
+def parse_flow_paths(result):
+    # (src_ip, dst_ip, flow_label) -> latest path, from the result of flow_paths_query
+    flow_paths = {}
+    for series in result.raw.get('series', []):
+        tags = series['tags']
+        flow_paths[(tags['src_ip'], tags['dst_ip'], tags['flow_label'])] = series['values'][0][1]
+    return flow_paths
+
+def flow_table_paths(flows):
+    # Latest path of the flows from the flow table of the collector, {flow: path} without the flows it never saw
+    # None if there is no flow table (the paths come from the DB)
+    if flow_table_client is None:
+        return None
+    try:
+        entries = flow_table_client.get_many(flows)
+    except OSError as e:
+        print(RED + f"Flow table not available, paths from the DB: {e}" + END)
+        return None
+    return {flow: entry['path'] for flow, entry in entries.items()}
 
-    #extract the values from the query
-    for series in result.raw['series']:
-        values = series.get('values')       #[0][time, total_num_packets]
-        num_packets = values[0][1]          #no decimals
+def first_value(result):
+    # First value of the first series of a result, None if there is no data
+    series = result.raw.get('series', [])
+    if not series:
+        return None
+    return series[0]['values'][0][1]
+
+class AnalysisSnapshot():
+    #Stats of one analysis cycle, all fetched in one batched request and indexed so the decision logic
+    #(search_overloaded_switches, get_wrost_flows_on_switch, get_current_path) does not query the DB again
+    def __init__(self) -> None:
+        self.stats_by_switch = []          #[(switch_id, num_packets, average_latency, average_size)]
+        self.flow_stats_by_switch = {}     #switch_id -> [((src_ip, dst_ip, flow_label), num_packets, avg_size, avg_latency)]
+        self.flow_paths = {}               #(src_ip, dst_ip, flow_label) -> latest path of the flow, "1-2-3-4"
+        self.num_packets = None            #total number of packets (normalization limit)
+        self.max_latency = None            #max latency below the 85th percentile (normalization limit)
+        self.requests = 0                  #DB requests sent to build it
+        self.phase_times = {}              #phase -> seconds
+
+def get_analysis_snapshot():
+    snapshot = AnalysisSnapshot()
+    params = {'start': minutes_ago_str}
+
+    queries = [stats_by_switch_query(), flow_stats_query(group_by_switch=True), total_packets_query()]
+    if args.stats_source == "rollup":
+        queries.append(latency_sketch_query("switch_stats", minutes_ago_str)[0])
+    else:
+        queries.append(percentile_query)
+    if flow_table_client is None:                   #with the flow table of the collector the paths do not come from the DB
+        queries.append(flow_paths_query())
+
+    #---------------One request with all the queries
+    start = time.perf_counter()
+    results = apply_query_batch(queries, params)
+    stats_result, flows_result, total_result, latency_result = results[:4]
+    paths_result = results[4] if len(results) > 4 else None
+    snapshot.requests += 1
+
+    if args.stats_source == "rollup":
+        # 85th percentile latency from the merged sketches of the switches (no scan of the raw points)
+        latency_sketch = merge_result_sketches(latency_result)
+        if latency_sketch.count > 0:
+            # PERCENTILE() returns one of the stored values, so the max latency below the 85th percentile was the percentile itself
+            snapshot.max_latency = latency_sketch.quantile(0.85)   #nanoseconds
+    else:
+        # the max below the percentile depends on the percentile value, second request
+        p_latency = first_value(latency_result)
+        if p_latency is not None:
+            snapshot.max_latency = first_value(apply_query(max_latency_query, {'start': minutes_ago_str, 'p_latency': p_latency}))
+            snapshot.requests += 1
+    snapshot.phase_times['query'] = time.perf_counter() - start
+
+    #---------------Index the results
+    start = time.perf_counter()
+    snapshot.stats_by_switch = parse_stats_by_switch(stats_result)
+    snapshot.num_packets = first_value(total_result)
+
+    # series are sorted by their tags, so each switch keeps the same order of flows as a query for that switch alone
+    for series in flows_result.raw.get('series', []):
+        switch_id = int(series['tags']['switch_id'])
+        snapshot.flow_stats_by_switch.setdefault(switch_id, []).append(parse_flow_stats(series))
+
+    if paths_result is not None:
+        snapshot.flow_paths = parse_flow_paths(paths_result)
+    snapshot.phase_times['index'] = time.perf_counter() - start
+
+    if paths_result is None:
+        # paths of the flows of the window from the flow table of the collector, from the DB if it is not available
+        start = time.perf_counter()
+        flows = {stats[0] for flow_stats in snapshot.flow_stats_by_switch.values() for stats in flow_stats}
+        flow_paths = flow_table_paths(sorted(flows))
+        if flow_paths is None:
+            flow_paths = parse_flow_paths(apply_query(flow_paths_query(), params))
+            snapshot.requests += 1
+        snapshot.flow_paths = flow_paths
+        snapshot.phase_times['paths'] = time.perf_counter() - start
+
+    return snapshot
+
+def update_max_values_globaly(num_packets, max_latency, verbose=True):
+    global normalization_limits
 
+    # Define normalization limits for each data type
+    normalization_limits = {
+        'num_packets': [0, -1],                                    # Min and max values for number of packets (no decimals)
+        'packet_size': [0, network_MTU],                           # Min and max values for average packet size (bytes)
+        'packet_procesing_time': [0, -1]                           # Min and max values for average packet processing time (nanoseconds), 
+    }
 
+    # Current max for packet_procesing_time and how many packets, remove the -1
+    if max_latency is None or num_packets is None:
+        return False
 
     #--------------Store 2 values in the normalization_limits
     normalization_limits['num_packets'][1] = num_packets
     normalization_limits['packet_procesing_time'][1] = max_latency
 
-    print("Updated global normalization limits:", normalization_limits)
+    if verbose:
+        print("Updated global normalization limits:", normalization_limits)
 
 
     return True
 
+def print_phase_times(phase_times, requests):
+    phases = ", ".join(f"{phase} {seconds * 1000:.1f}" for phase, seconds in phase_times.items())
+    print(f"Analysis cycle times (ms): {phases} ({requests} DB requests)")
+
 def analyze(session, alternation_flag):
     global minutes_ago_str 
+    cycle_start = time.perf_counter()
 
     # Get the current time and the time some minutes ago
     now = datetime.now(timezone.utc)
@@ -752,28 +900,35 @@ def analyze(session, alternation_flag):
     # Format the timestamps, to the same in the DB
     minutes_ago_str = minutes_ago.strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    #---------------Get the stats by switch
-    result = get_stats_by_switch()
-    if not result:
+    #---------------Get the stats by switch, by flow and the limits in one batch
+    snapshot = get_analysis_snapshot()
+    phase_times = snapshot.phase_times
+    if not snapshot.stats_by_switch:
         print("No data to analyze, sleeping for", sleep_time_seconds, "seconds")
         sleep(sleep_time_seconds)
         return alternation_flag
 
     #---------------Get current windows limit values for normalization
-    with_data = update_max_values_globaly()
+    with_data = update_max_values_globaly(snapshot.num_packets, snapshot.max_latency)
     if not with_data:
         print(GREEN+"No data to analyze, sleeping for", sleep_time_seconds, "seconds" + END)
         sleep(sleep_time_seconds)
         return alternation_flag
 
-    switch_loads = calculate_switches_load(result)
+    start = time.perf_counter()
+    switch_loads = calculate_switches_load(snapshot.stats_by_switch)
+    phase_times['loads'] = time.perf_counter() - start
 
+    start = time.perf_counter()
     if alternation_flag:                                                #Search NO-LONGER overloaded switches
         search_no_longer_overloaded_switches(session, switch_loads)
         print(MAGENTA+'Active_SRv6_rules after search_no_longer_overloaded_switches:', active_SRv6_rules , END)
     else:                                                               #Search FOR overloaded switches
-        search_overloaded_switches(session, switch_loads)
+        search_overloaded_switches(session, switch_loads, snapshot)
         print(MAGENTA+'Active_SRv6_rules after search_overloaded_switches:', active_SRv6_rules , END)
+    phase_times['decision'] = time.perf_counter() - start
+    phase_times['total'] = time.perf_counter() - cycle_start
+    print_phase_times(phase_times, snapshot.requests)
 
     alternation_flag = not alternation_flag
     print(GREEN+"Sleeping for", sleep_time_seconds, "seconds"+ END)
@@ -781,8 +936,149 @@ def analyze(session, alternation_flag):
 
     return alternation_flag
 
+#------------------------Event mode: switch loads pushed by the collector, instead of polling the DB every sleep_time_seconds
+
+detour_latencies = []               #seconds from the detection of an overloaded switch to its detour installed (event mode)
+
+class SwitchLoadState():
+    #Hysteresis/dwell state of one switch
+    def __init__(self) -> None:
+        self.load = 0
+        self.above_since = None         #time the load crossed thresholds_overloaded (detection), None if not above it
+        self.below_since = None         #time the load went down to thresholds_no_overloaded, None if not below it
+        self.next_attempt = 0           #no detour/revert before this time
+
+def update_switch_states(switch_states, switch_loads, now):
+    # Returns the switches to detour (above thresholds_overloaded for min_dwell) and to revert (detoured and below
+    # thresholds_no_overloaded for min_dwell), between both thresholds nothing changes and the dwell times restart
+    loads = dict(switch_loads)
+    to_detour = []
+    to_revert = []
+    for switch_id in set(loads) | set(switch_states) | set(active_SRv6_rules.switches()):
+        state = switch_states.setdefault(switch_id, SwitchLoadState())
+        state.load = loads.get(switch_id, 0)          #0 if no flow is passing through it
+
+        if state.load >= thresholds_overloaded:
+            state.below_since = None
+            if state.above_since is None:
+                state.above_since = now
+                print(ORANGE + f"Switch {switch_id} crossed the overloaded threshold (load {state.load})" + END)
+            if now - state.above_since >= args.min_dwell and now >= state.next_attempt:
+                to_detour.append(switch_id)
+        elif state.load <= thresholds_no_overloaded:
+            state.above_since = None
+            if not active_SRv6_rules.has_switch(switch_id):
+                state.below_since = None
+                continue
+            if state.below_since is None:
+                state.below_since = now
+            if now - state.below_since >= args.min_dwell and now >= state.next_attempt:
+                to_revert.append(switch_id)
+        else:
+            state.above_since = None
+            state.below_since = None
+
+    return to_detour, to_revert
+
+def store_detour_latency(switch_id, latency):
+    detour_latencies.append(latency)
+    print(CYAN + f"Switch {switch_id}: detection to detour {latency * 1000:.0f} ms" + END)
+    write_log(OPERATION_DETOUR_LATENCY, switch_id, latency_ms=round(latency * 1000))
+
+    point = {'measurement': 'detour_latency', 'tags': {'switch_id': switch_id}, 'fields': {'latency': latency * 1000}}
+    try:
+        get_influx_query(host=host, database=dbname).write_points([point])
+    except Exception as e:
+        print("Could not write the detour latency:", e)
+
+def apply_event_decisions(session, switch_states, switch_loads, to_detour, to_revert):
+    # Runs on an executor thread, the ONOS session and the DB client are blocking
+    global minutes_ago_str
+
+    if to_revert:
+        search_no_longer_overloaded_switches(session, switch_loads, to_revert)
+        for switch_id in to_revert:
+            switch_states[switch_id].below_since = None
+        print(MAGENTA+'Active_SRv6_rules after search_no_longer_overloaded_switches:', active_SRv6_rules , END)
+
+    if to_detour:
+        # flows of the overloaded switches and their paths, from the DB
+        minutes_ago = datetime.now(timezone.utc) - timedelta(minutes=analisy_window_minutes)
+        minutes_ago_str = minutes_ago.strftime('%Y-%m-%dT%H:%M:%SZ')
+        snapshot = get_analysis_snapshot()
+
+        rules_before = {switch_id: active_SRv6_rules.count(switch_id) for switch_id in to_detour}
+        search_overloaded_switches(session, switch_loads, snapshot, to_detour)
+        print(MAGENTA+'Active_SRv6_rules after search_overloaded_switches:', active_SRv6_rules , END)
+
+        now = time.time()
+        for switch_id in to_detour:
+            state = switch_states[switch_id]
+            if active_SRv6_rules.count(switch_id) > rules_before[switch_id]:
+                store_detour_latency(switch_id, now - state.above_since)
+                state.above_since = now             #if it stays overloaded, the next detour is measured from this one
+                # the loads keep the windows from before the detour during the whole analysis window
+                state.next_attempt = now + analisy_window_minutes * 60
+            else:
+                state.next_attempt = now + args.min_dwell
+
+def print_detour_latencies():
+    if not detour_latencies:
+        print("No detours created")
+        return
+    latencies = np.array(detour_latencies) * 1000
+    print(f"Detection to detour latency (ms): {len(latencies)} detours, avg {latencies.mean():.0f}, "
+          f"p95 {np.percentile(latencies, 95):.0f}, max {latencies.max():.0f}")
+
+async def analyze_events(session, duration=None):
+    # Event mode analysis during duration seconds (None forever)
+    loop = asyncio.get_running_loop()
+    updates = asyncio.Queue()
+    windows = LoadWindows(analisy_window_minutes * 60)
+    switch_states = {}
+
+    transport, protocol = await open_load_feed(updates.put_nowait, args.load_feed)
+    print(f"Waiting for the switch loads on {args.load_feed}")
+    end_time = None if duration is None else loop.time() + duration
+
+    try:
+        while True:
+            timeout = None if end_time is None else end_time - loop.time()
+            if timeout is not None and timeout <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(updates.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+            windows.add(message)
+            while not updates.empty():                  #windows received while deciding
+                windows.add(updates.get_nowait())
+
+            stats_by_switch = windows.stats_by_switch()
+            latency_sketch = windows.latency_sketch()
+            if not stats_by_switch or latency_sketch.count == 0:
+                continue
+
+            # same limits as the poll mode, from the pushed windows instead of the DB
+            update_max_values_globaly(windows.num_packets(), latency_sketch.quantile(0.85), verbose=False)
+            switch_loads = calculate_switches_load(stats_by_switch, verbose=False)
+
+            to_detour, to_revert = update_switch_states(switch_states, switch_loads, time.time())
+            if to_detour or to_revert:
+                await loop.run_in_executor(None, apply_event_decisions, session, switch_states, switch_loads, to_detour, to_revert)
+    finally:
+        transport.close()
+
+    print_detour_latencies()
+
+def print_session_stats(session):
+    print(f"ONOS CLI: {session.stats()}")
+    if path_planner is not None:
+        print(f"Path planner: {path_planner.stats()}")
+
 def main():
-    global current_iteration, active_SRv6_rules
+    global current_iteration, path_planner, flow_table_client
 
     current_iteration = 1
     alternation_flag = False
@@ -792,7 +1088,29 @@ def main():
         print("ONOS Session not established")
         exit()
 
-    delete_old_log()
+    open_journal(session)
+
+    if args.flow_table:
+        flow_table_client = FlowTableClient(args.flow_table)
+
+    if args.path_source == "local":
+        # candidate paths between the switches with hosts computed once, the other pairs on their first detour
+        path_planner = PathPlanner(weighted_links(), args.k_paths)
+        path_planner.precompute(HOST_SWITCHES)
+
+    if args.mode == "event":
+        # each iteration listens to the load feed during iterations_timer seconds (0, a single iteration until interrupted)
+        while current_iteration <= args.num_iterations:
+            print(f"Starting iteration {current_iteration} of {args.num_iterations} at {datetime.now()}")
+            asyncio.run(analyze_events(session, args.iterations_timer or None))
+            current_iteration += 1
+            remove_all_active_SRv6_rules(session)
+
+        get_influx_query(host=host, database=dbname).print_stats()
+        print_session_stats(session)
+        active_SRv6_rules.journal.close()
+        session.close()
+        return
 
     if args.iterations_timer == 0:    # Infinite loop to analyze the data
         while True:
@@ -819,6 +1137,9 @@ def main():
         current_iteration += 1
         remove_all_active_SRv6_rules(session)
 
+    get_influx_query(host=host, database=dbname).print_stats()
+    print_session_stats(session)
+    active_SRv6_rules.journal.close()
     session.close()
 
 
@@ -9,6 +9,109 @@ import json
 from datetime import datetime
 from influxdb import InfluxDBClient
 
+# ----------------------------------------------------------------------------
+# Array TOPSIS core
+# A decision matrix is an array (..., alternatives, criteria): the leading axes
+# are independent problems (e.g. every flow, with its candidate paths as the
+# alternatives), all of them evaluated at once by broadcasting.
+# benefit[c] is True for the 'max' criteria, mask (..., alternatives) marks the
+# real alternatives when problems with fewer alternatives are padded.
+# ----------------------------------------------------------------------------
+
+def _masked(matrix, mask, fill):
+    """Matrix with the padded alternatives replaced by fill (ignored by max/min)"""
+    if mask is None:
+        return matrix
+    return np.where(mask[..., None], matrix, fill)
+
+def topsis_normalize(matrix, benefit, mask=None):
+    """Normalize criteria values to 0-1 range ('max': value/max, 'min': (max-value)/(max-min), 0 if constant)"""
+    max_val = _masked(matrix, mask, -np.inf).max(axis=-2, keepdims=True)
+    min_val = _masked(matrix, mask, np.inf).min(axis=-2, keepdims=True)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        higher_better = np.where(max_val == 0, 0.0, matrix / max_val)
+        lower_better = np.where(max_val == min_val, 0.0, (max_val - matrix) / (max_val - min_val))
+    return np.where(benefit, higher_better, lower_better)
+
+def topsis_weight(normalized, weights):
+    """Apply weights to normalized matrix"""
+    return normalized * weights
+
+def topsis_ideal_solutions(weighted, benefit, mask=None):
+    """Ideal (+) and worst (-) solutions, (..., 1, criteria)"""
+    # As the dict implementation did, the 'min' criteria (already inverted by the
+    # normalization) take their lowest weighted value as the ideal
+    max_val = _masked(weighted, mask, -np.inf).max(axis=-2, keepdims=True)
+    min_val = _masked(weighted, mask, np.inf).min(axis=-2, keepdims=True)
+    return np.where(benefit, max_val, min_val), np.where(benefit, min_val, max_val)
+
+def _sum_criteria(values):
+    """Sum over the criteria axis, added one criterion after the other (same rounding as the dict implementation)"""
+    total = values[..., 0]
+    for j in range(1, values.shape[-1]):
+        total = total + values[..., j]
+    return total
+
+def topsis_separations(weighted, ideal_pos, ideal_neg):
+    """Euclidean distance of every alternative to the ideal positive and negative solutions"""
+    return np.sqrt(_sum_criteria((weighted - ideal_pos) ** 2)), np.sqrt(_sum_criteria((weighted - ideal_neg) ** 2))
+
+def topsis_scores(sep_pos, sep_neg, mask=None):
+    """TOPSIS scores (0-1, higher is better), 0.5 when both separations are 0, NaN for padded alternatives"""
+    total = sep_pos + sep_neg
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(total == 0, 0.5, sep_neg / total)
+    if mask is not None:
+        scores = np.where(mask, scores, np.nan)
+    return scores
+
+def topsis(matrix, weights, benefit, mask=None, steps=False):
+    """
+    Run the whole TOPSIS pipeline on one or many decision matrices.
+
+    :param matrix: Array (..., alternatives, criteria).
+    :param weights: Array (criteria,) with the weight of each criterion.
+    :param benefit: Array (criteria,), True for higher is better criteria.
+    :param mask: Optional bool array (..., alternatives), False for padding.
+    :param steps: Also return the intermediate arrays.
+    :return: Scores (..., alternatives), or a dict with every step if steps.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    benefit = np.asarray(benefit, dtype=bool)
+
+    normalized = topsis_normalize(matrix, benefit, mask)
+    weighted = topsis_weight(normalized, weights)
+    ideal_pos, ideal_neg = topsis_ideal_solutions(weighted, benefit, mask)
+    sep_pos, sep_neg = topsis_separations(weighted, ideal_pos, ideal_neg)
+    scores = topsis_scores(sep_pos, sep_neg, mask)
+
+    if not steps:
+        return scores
+    return {'normalized': normalized, 'weighted': weighted, 'ideal_positive': ideal_pos, 'ideal_negative': ideal_neg,
+            'separation_positive': sep_pos, 'separation_negative': sep_neg, 'scores': scores}
+
+def topsis_many(matrices, weights, benefit):
+    """Score a list of 2D decision matrices with different numbers of alternatives in a single call (padded)"""
+    if not matrices:
+        return []
+    num_criteria = len(weights)
+    size = max(len(matrix) for matrix in matrices)
+    padded = np.zeros((len(matrices), size, num_criteria))
+    mask = np.zeros((len(matrices), size), dtype=bool)
+    for i, matrix in enumerate(matrices):
+        padded[i, :len(matrix)] = matrix
+        mask[i, :len(matrix)] = True
+
+    scores = topsis(padded, weights, benefit, mask)
+    return [scores[i, :len(matrix)] for i, matrix in enumerate(matrices)]
+
+def rank_scores(scores):
+    """Indexes of the alternatives by descending score along the last axis, ties keep their order"""
+    return np.argsort(-np.asarray(scores), axis=-1, kind='stable')
+
+
 class MCDAAnalyzer:
     """Multi-Criteria Decision Analysis for network optimization"""
     
@@ -68,101 +171,71 @@ class MCDAAnalyzer:
         
         return metrics
     
+    def criteria_arrays(self, criteria_names):
+        """Weights and benefit flags of the given criteria, in that order"""
+        weights = np.array([self.criteria[criterion]['weight'] for criterion in criteria_names], dtype=np.float64)
+        benefit = np.array([self.criteria[criterion]['type'] == 'max' for criterion in criteria_names])
+        return weights, benefit
+
+    def to_matrix(self, table):
+        """{criterion: {alternative: value}} -> (criteria, alternatives, matrix), only the known criteria"""
+        criteria_names = [criterion for criterion in table if criterion in self.criteria]
+        if not criteria_names:
+            return [], [], np.zeros((0, 0))
+        alt_names = list(table[criteria_names[0]].keys())
+        matrix = np.array([[table[criterion][alt] for criterion in criteria_names] for alt in alt_names], dtype=np.float64)
+        return criteria_names, alt_names, matrix
+
+    @staticmethod
+    def to_table(matrix, criteria_names, alt_names):
+        """(alternatives, criteria) matrix -> {criterion: {alternative: value}}"""
+        return {criterion: {alt: float(matrix[i, j]) for i, alt in enumerate(alt_names)}
+                for j, criterion in enumerate(criteria_names)}
+
     def normalize_decision_matrix(self, alternatives):
         """Normalize criteria values to 0-1 range"""
-        normalized = {}
-        
-        for criterion, values in alternatives.items():
-            if criterion not in self.criteria:
-                continue
-            
-            crit_type = self.criteria[criterion]['type']
-            max_val = max(values.values())
-            min_val = min(values.values())
-            
-            normalized[criterion] = {}
-            
-            if crit_type == 'max':
-                # Higher is better: normalize to max
-                for alt, val in values.items():
-                    if max_val == 0:
-                        normalized[criterion][alt] = 0
-                    else:
-                        normalized[criterion][alt] = val / max_val
-            else:
-                # Lower is better: invert normalization
-                for alt, val in values.items():
-                    if max_val == min_val:
-                        normalized[criterion][alt] = 0
-                    else:
-                        normalized[criterion][alt] = (max_val - val) / (max_val - min_val)
-        
-        return normalized
+        criteria_names, alt_names, matrix = self.to_matrix(alternatives)
+        _, benefit = self.criteria_arrays(criteria_names)
+        return self.to_table(topsis_normalize(matrix, benefit), criteria_names, alt_names)
     
     def calculate_weighted_matrix(self, normalized_matrix):
         """Apply weights to normalized matrix"""
-        weighted = {}
-        
-        for criterion, values in normalized_matrix.items():
-            weight = self.criteria[criterion]['weight']
-            weighted[criterion] = {}
-            for alt, score in values.items():
-                weighted[criterion][alt] = score * weight
-        
-        return weighted
+        criteria_names, alt_names, matrix = self.to_matrix(normalized_matrix)
+        weights, _ = self.criteria_arrays(criteria_names)
+        return self.to_table(topsis_weight(matrix, weights), criteria_names, alt_names)
     
     def calculate_ideal_worst_solutions(self, weighted_matrix):
         """Calculate ideal (+) and worst (-) solutions"""
-        ideal_positive = {}
-        ideal_negative = {}
-        
-        for criterion, values in weighted_matrix.items():
-            crit_type = self.criteria[criterion]['type']
-            
-            if crit_type == 'max':
-                ideal_positive[criterion] = max(values.values())
-                ideal_negative[criterion] = min(values.values())
-            else:
-                ideal_positive[criterion] = min(values.values())  # For min criteria, best is lowest
-                ideal_negative[criterion] = max(values.values())
-        
-        return ideal_positive, ideal_negative
+        criteria_names, alt_names, matrix = self.to_matrix(weighted_matrix)
+        _, benefit = self.criteria_arrays(criteria_names)
+        ideal_pos, ideal_neg = topsis_ideal_solutions(matrix, benefit)
+        return ({criterion: float(ideal_pos[0, j]) for j, criterion in enumerate(criteria_names)},
+                {criterion: float(ideal_neg[0, j]) for j, criterion in enumerate(criteria_names)})
     
     def calculate_separations(self, weighted_matrix, ideal_pos, ideal_neg):
         """Calculate distance from ideal positive and negative solutions"""
-        separations = {'positive': {}, 'negative': {}}
-        
-        # Get all alternatives
-        alt_names = list(list(weighted_matrix.values())[0].keys())
-        
-        for alt in alt_names:
-            dist_pos = 0
-            dist_neg = 0
-            
-            for criterion, values in weighted_matrix.items():
-                alt_value = values[alt]
-                dist_pos += (alt_value - ideal_pos[criterion]) ** 2
-                dist_neg += (alt_value - ideal_neg[criterion]) ** 2
-            
-            separations['positive'][alt] = np.sqrt(dist_pos)
-            separations['negative'][alt] = np.sqrt(dist_neg)
-        
-        return separations
+        criteria_names, alt_names, matrix = self.to_matrix(weighted_matrix)
+        sep_pos, sep_neg = topsis_separations(matrix, np.array([ideal_pos[criterion] for criterion in criteria_names]),
+                                       np.array([ideal_neg[criterion] for criterion in criteria_names]))
+        return {'positive': dict(zip(alt_names, sep_pos.tolist())), 'negative': dict(zip(alt_names, sep_neg.tolist()))}
     
     def calculate_topsis_scores(self, separations):
         """Calculate TOPSIS scores (0-1, higher is better)"""
-        scores = {}
-        
-        for alt in separations['positive'].keys():
-            sep_pos = separations['positive'][alt]
-            sep_neg = separations['negative'][alt]
-            
-            if sep_pos + sep_neg == 0:
-                scores[alt] = 0.5
-            else:
-                scores[alt] = sep_neg / (sep_pos + sep_neg)
-        
-        return scores
+        alt_names = list(separations['positive'].keys())
+        scores = topsis_scores(np.array([separations['positive'][alt] for alt in alt_names], dtype=np.float64),
+                               np.array([separations['negative'][alt] for alt in alt_names], dtype=np.float64))
+        return dict(zip(alt_names, scores.tolist()))
+
+    def score_many(self, matrices, criteria_names):
+        """
+        TOPSIS scores of many decision matrices in a single call (e.g. the
+        candidate paths of every flow), each one (alternatives, criteria) with
+        the columns in the order of criteria_names. Returns a list of arrays.
+        """
+        weights, benefit = self.criteria_arrays(criteria_names)
+        if len({len(matrix) for matrix in matrices}) == 1:
+            return list(topsis(np.asarray(matrices, dtype=np.float64), weights, benefit))
+        return topsis_many(matrices, weights, benefit)
     
     def rank_alternatives(self, scores):
         """Rank alternatives by TOPSIS score"""
@@ -187,15 +260,20 @@ class MCDAAnalyzer:
             print("MCDA ANALYSIS (TOPSIS METHOD)")
             print("="*80)
         
+        # Whole pipeline on the array (criteria, alternatives), the steps as dicts
+        criteria_names, alt_names, matrix = self.to_matrix(alternatives)
+        weight_values, benefit = self.criteria_arrays(criteria_names)
+        steps = topsis(matrix, weight_values, benefit, steps=True)
+
         # Step 1: Normalize decision matrix
-        normalized = self.normalize_decision_matrix(alternatives)
+        normalized = self.to_table(steps['normalized'], criteria_names, alt_names)
         if debug:
             print("\n1. NORMALIZED MATRIX:")
             print(json.dumps({k: {ak: round(av, 4) for ak, av in v.items()} 
                             for k, v in normalized.items()}, indent=2))
         
         # Step 2: Calculate weighted matrix
-        weighted = self.calculate_weighted_matrix(normalized)
+        weighted = self.to_table(steps['weighted'], criteria_names, alt_names)
         if debug:
             print("\n2. WEIGHTED MATRIX (after applying criteria weights):")
             weights = {k: v['weight'] for k, v in self.criteria.items()}
@@ -204,14 +282,16 @@ class MCDAAnalyzer:
                             for k, v in weighted.items()}, indent=2))
         
         # Step 3: Calculate ideal solutions
-        ideal_pos, ideal_neg = self.calculate_ideal_worst_solutions(weighted)
+        ideal_pos = dict(zip(criteria_names, steps['ideal_positive'][0].tolist()))
+        ideal_neg = dict(zip(criteria_names, steps['ideal_negative'][0].tolist()))
         if debug:
             print("\n3. IDEAL SOLUTIONS:")
             print(f"Ideal Positive (Best): {ideal_pos}")
             print(f"Ideal Negative (Worst): {ideal_neg}")
         
         # Step 4: Calculate separations
-        separations = self.calculate_separations(weighted, ideal_pos, ideal_neg)
+        separations = {'positive': dict(zip(alt_names, steps['separation_positive'].tolist())),
+                       'negative': dict(zip(alt_names, steps['separation_negative'].tolist()))}
         if debug:
             print("\n4. SEPARATIONS FROM IDEAL:")
             print("Distance to Ideal Positive (lower is better):")
@@ -222,7 +302,7 @@ class MCDAAnalyzer:
                 print(f"  {alt}: {dist:.6f}")
         
         # Step 5: Calculate TOPSIS scores
-        scores = self.calculate_topsis_scores(separations)
+        scores = dict(zip(alt_names, steps['scores'].tolist()))
         if debug:
             print("\n5. TOPSIS SCORES (0-1, higher is better):")
             for alt, score in sorted(scores.items(), key=lambda x: x[1], reverse=True):
@@ -0,0 +1,79 @@
+import numpy as np
+
+#Vectorized MCDA load of the analyzer: all the switches (or all the flows of a switch) are scored at once, from
+#columnar arrays, with a single matrix-weights product, and ranked with argsort/argpartition
+#The scores are the same as the per row code it replaces (normalize_value + calculate_MCDA_loads):
+#   - normalized values rounded to 3 decimals as round() on Python floats (correctly rounded)
+#   - score rounded to 3 decimals as round() on the np.float64 of np.dot (np.round)
+#The matrix product may add the 4 terms in another order than np.dot on a single row, only visible on the scores that
+#are at a rounding tie, those rows are computed again with np.dot
+
+CRITERIA = ('no_infra_switch', 'num_packets', 'avg_packet_size', 'avg_packet_procesing_time')      #columns of the decision matrix
+DECIMALS = 3
+TIE_TOLERANCE = 1e-6            #distance (in units of the last decimal) to a .5 to check the rounding of a value again
+
+def weight_vector(weights):
+    return np.array([weights[criterion] for criterion in CRITERIA], dtype=np.float64)
+
+def near_ties(values, decimals=DECIMALS):
+    # Mask of the values whose rounding depends on the last bits (at ~.5 of the last decimal)
+    scaled = values * 10**decimals
+    return np.abs(scaled - np.floor(scaled) - 0.5) < TIE_TOLERANCE
+
+def normalize(values, min_value, max_value, decimals=DECIMALS):
+    normalized = (np.asarray(values, dtype=np.float64) - min_value) / (max_value - min_value)
+    rounded = np.round(normalized, decimals)
+    for i in np.flatnonzero(near_ties(normalized, decimals)):
+        rounded[i] = round(float(normalized[i]), decimals)
+    return rounded
+
+def decision_matrix(non_infra, num_packets, avg_packet_size, avg_packet_procesing_time, normalization_limits):
+    # One row per switch/flow, the columns in the order of CRITERIA, normalized with the global limits
+    return np.column_stack((
+        np.asarray(non_infra, dtype=np.float64),
+        normalize(num_packets,               *normalization_limits['num_packets']),
+        normalize(avg_packet_size,           *normalization_limits['packet_size']),
+        normalize(avg_packet_procesing_time, *normalization_limits['packet_procesing_time'])
+    ))
+
+def mcda_scores(matrix, weights, decimals=DECIMALS):
+    weight_values = weight_vector(weights)
+    scores = matrix @ weight_values
+    rounded = np.round(scores, decimals)
+    for i in np.flatnonzero(near_ties(scores, decimals)):
+        rounded[i] = np.round(np.dot(matrix[i], weight_values), decimals)
+    return rounded
+
+def switch_loads(switch_ids, num_packets, avg_packet_procesing_time, avg_packet_size, infra_switches, normalization_limits, weights):
+    """
+    MCDA load of every switch.
+
+    :param switch_ids: Array with the id of each switch, the other arrays in the same order.
+    :param infra_switches: Ids of the static infrastructure switches (no_infra_switch criterion 0).
+    :return: Array with the loads.
+    """
+    non_infra = ~np.isin(switch_ids, list(infra_switches))
+    matrix = decision_matrix(non_infra, num_packets, avg_packet_size, avg_packet_procesing_time, normalization_limits)
+    return mcda_scores(matrix, weights)
+
+def flow_loads(num_packets, avg_packet_size, avg_packet_procesing_time, normalization_limits, weights):
+    # MCDA load of every flow of a switch, the flows are always scored as on a non infrastructure switch
+    matrix = decision_matrix(np.ones(len(num_packets)), num_packets, avg_packet_size, avg_packet_procesing_time, normalization_limits)
+    return mcda_scores(matrix, weights)
+
+def rank_descending(scores, k=None):
+    """
+    Indexes of the scores from highest to lowest, the equal scores keep their order.
+
+    :param k: Only the k highest (argpartition first), None for all of them.
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    #every score equal to the k-th highest is a candidate, so the ties are broken by position as in the full sort
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    candidates = np.flatnonzero(scores >= kth)
+    return candidates[np.argsort(-scores[candidates], kind='stable')][:k]
@@ -0,0 +1,232 @@
+import queue
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import paramiko
+
+#Client of the ONOS CLI (Karaf shell over SSH) used by the analyzer to create/remove the SRv6 detours
+#A command is finished when the shell prints the prompt again, instead of waiting a fixed time, so a command costs
+#its real execution time. Several commands can be sent back to back (execute_many), each response is the text
+#between two prompts and is matched to its command by the echo the shell prints of it
+#If the channel is lost the client reconnects and sends the command again, a command that times out also
+#reconnects, so its late output is never read as the response of the next one
+#OnosCliPool keeps several sessions with the same interface, so independent commands can run at the same time from several threads
+
+ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+DEFAULT_PROMPT = r'[\w.-]+@[\w.-]+ > '
+
+def strip_ansi_escape_sequences(string):
+    string = ANSI_ESCAPE.sub('', string)
+
+    #If \x1b> is still present, remove it
+    string = string.replace('\x1b>', '')
+
+    return string
+
+
+class OnosCliError(Exception):
+    pass
+
+class OnosCliTimeout(OnosCliError):
+    pass
+
+class OnosCliConnectionError(OnosCliError):
+    pass
+
+
+class OnosCliClient():
+    """
+    Persistent ONOS CLI session.
+
+    :param timeout: Default seconds to wait for the prompt after a command.
+    :param retries: Times a command is sent again (after reconnecting) if the channel is lost.
+    :param prompt: Regex of the shell prompt.
+    """
+    def __init__(self, hostname='localhost', port=8101, username='onos', password='rocks', timeout=10.0, connect_timeout=10.0,
+                 retries=1, prompt=DEFAULT_PROMPT) -> None:
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.prompt = re.compile(prompt)
+
+        self.client = None
+        self.channel = None
+        self.buffer = ""                #output received and not consumed yet (ANSI sequences and \r removed)
+
+        #counters
+        self.commands = 0
+        self.connections = 0
+        self.timeouts = 0
+        self.command_time = 0.0         #seconds, sum of all the commands
+
+    def connect(self):
+        self.close()
+        self.connections += 1
+        self.client = paramiko.SSHClient()
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            self.client.connect(hostname=self.hostname, port=self.port, username=self.username, password=self.password,
+                                look_for_keys=False, allow_agent=False, timeout=self.connect_timeout)
+            #small commands and responses, do not wait to coalesce them (Nagle + delayed ACKs add ~40 ms per command)
+            self.client.get_transport().sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            #wide terminal, so the shell never wraps the echo of long commands
+            self.channel = self.client.invoke_shell(width=4096, height=1000)
+            self.buffer = ""
+            banner = self.read_until_prompt(self.connect_timeout)
+        except (paramiko.SSHException, OSError, EOFError, OnosCliError) as e:
+            self.close()
+            raise OnosCliConnectionError("Failed to connect to %s:%s: %s" % (self.hostname, self.port, e)) from e
+        return banner
+
+    def is_active(self):
+        return self.channel is not None and not self.channel.closed and self.client.get_transport().is_active()
+
+    def read_until_prompt(self, timeout):
+        #returns the output up to the next prompt (not included)
+        deadline = time.monotonic() + timeout
+        while True:
+            match = self.prompt.search(self.buffer)
+            if match:
+                output = self.buffer[:match.start()]
+                self.buffer = self.buffer[match.end():]
+                return output
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise OnosCliTimeout("No prompt after %.1f s, received: %r" % (timeout, self.buffer[-200:]))
+            self.channel.settimeout(remaining)
+            try:
+                data = self.channel.recv(65536)
+            except socket.timeout:
+                continue
+            if not data:
+                raise OnosCliConnectionError("Channel closed by ONOS")
+            self.buffer += strip_ansi_escape_sequences(data.decode('utf-8', errors='replace')).replace('\r', '')
+
+    def parse_response(self, command, output):
+        #drops the echo of the command (first lines, up to the one ending with the command) and the blank lines around
+        lines = output.split('\n')
+        for i, line in enumerate(lines):
+            if line.strip().endswith(command.strip()):
+                return '\n'.join(lines[i + 1:]).strip('\n')
+        raise OnosCliError("Response does not match the command %r: %r" % (command, output[:200]))
+
+    def execute(self, command, timeout=None):
+        """
+        Runs one command and returns its output (without the echo and the prompt).
+
+        :raises OnosCliTimeout: The prompt did not come back in time (the session is reconnected).
+        :raises OnosCliConnectionError: Could not (re)connect.
+        """
+        return self.execute_many([command], timeout)[0]
+
+    def execute_many(self, commands, timeout=None):
+        """
+        Sends all the commands back to back and returns their outputs, in the same order.
+
+        :param timeout: Seconds to wait for each response, by default the client timeout.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        outputs = []
+        attempts = 0
+        while len(outputs) < len(commands):
+            pending = commands[len(outputs):]
+            try:
+                if not self.is_active():
+                    self.connect()
+
+                start = time.monotonic()
+                self.channel.sendall(''.join(command + '\n' for command in pending))
+                for command in pending:
+                    outputs.append(self.parse_response(command, self.read_until_prompt(timeout)))
+                    self.commands += 1
+                self.command_time += time.monotonic() - start
+            except OnosCliTimeout:
+                #the output of the command may still arrive, start from a clean session
+                self.timeouts += 1
+                self.close()
+                raise
+            except (OnosCliConnectionError, paramiko.SSHException, OSError, EOFError) as e:
+                #the commands with a response are done, the rest is sent again on a new session
+                self.close()
+                attempts += 1
+                if attempts > self.retries:
+                    raise OnosCliConnectionError("ONOS channel lost: %s" % e) from e
+        return outputs
+
+    def stats(self):
+        return {'commands': self.commands, 'reconnects': max(self.connections - 1, 0), 'timeouts': self.timeouts,
+                'avg_command_ms': round(self.command_time / self.commands * 1000, 3) if self.commands else 0}
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.channel = None
+        self.buffer = ""
+
+
+class OnosCliPool():
+    """
+    Pool of ONOS CLI sessions, same interface as OnosCliClient. Each command (or execute_many batch) takes a free
+    session, so up to size commands run in parallel from different threads.
+
+    :param size: Number of sessions.
+    :param kwargs: OnosCliClient arguments.
+    """
+    def __init__(self, size, **kwargs) -> None:
+        self.clients = [OnosCliClient(**kwargs) for _ in range(size)]
+        self.free = queue.Queue()
+        for client in self.clients:
+            self.free.put(client)
+        self.lock = threading.Lock()
+        self.waits = 0                  #commands that found all the sessions busy
+
+    def __len__(self):
+        return len(self.clients)
+
+    def connect(self):
+        #opens all the sessions in parallel, returns the banner of the first one
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as executor:
+            banners = list(executor.map(lambda client: client.connect(), self.clients))
+        return banners[0]
+
+    @contextmanager
+    def session(self):
+        try:
+            client = self.free.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                self.waits += 1
+            client = self.free.get()
+        try:
+            yield client
+        finally:
+            self.free.put(client)
+
+    def execute(self, command, timeout=None):
+        with self.session() as client:
+            return client.execute(command, timeout)
+
+    def execute_many(self, commands, timeout=None):
+        with self.session() as client:
+            return client.execute_many(commands, timeout)
+
+    def stats(self):
+        stats = [client.stats() for client in self.clients]
+        commands = sum(stat['commands'] for stat in stats)
+        return {'sessions': len(self.clients), 'commands': commands, 'reconnects': sum(stat['reconnects'] for stat in stats),
+                'timeouts': sum(stat['timeouts'] for stat in stats), 'waits': self.waits,
+                'avg_command_ms': round(sum(client.command_time for client in self.clients) / commands * 1000, 3) if commands else 0}
+
+    def close(self):
+        for client in self.clients:
+            client.close()
@@ -0,0 +1,187 @@
+import heapq
+import threading
+
+#Detour paths computed by the analyzer on its own copy of the topology (INT/common/topology.py), instead of asking ONOS
+#to compute one per flow (Path-Detour-SRv6): only the resulting segment list is sent to ONOS (srv6-insert)
+#   - the k shortest paths (link delay) between two switches that fit in a uSID are computed once (Yen) and cached
+#   - the cache is only dropped when the topology or the state of a link changes
+#   - the detour is the candidate with the least load on the overloaded switches, then the least of them,
+#     then the least MCDA load on all of its switches, then the least delay (same order as the ONOS app, plus the last 2)
+
+SID_PREFIX = "fcbb:bb00"             #uSID block of the switches (netcfg.json uN)
+SID_END = "fd00"                     #uDX of the destination switch, closes the SID
+MAX_SID_NODES = 4                    #nodes of the SID after the source: at the most 3 transit nodes and the destination
+
+def segment_list(path):
+    """
+    uSID of a path, as the ONOS app builds it (Srv6Component.pushSRv6RuleForPath).
+
+    :param path: Switch ids of the path, the source (that injects the SRv6 header) included.
+    :return: List with the SID, fcbb:bb00:<node>:...:<destination>:fd00::
+    """
+    nodes = list(path[1:])
+    if len(nodes) > MAX_SID_NODES:
+        nodes = nodes[:MAX_SID_NODES - 1] + nodes[-1:]
+    return [":".join([SID_PREFIX] + [format(node, 'x') for node in nodes] + [SID_END]) + "::"]
+
+
+class PathPlanner():
+    """
+    :param links: Links of the topology, [(switch, switch, weight)], both directions.
+    :param k: Number of candidate paths kept for each pair of switches.
+    :param max_hops: Longest candidate path (hops), the longer ones would not fit in the SID and ONOS would route the rest.
+    """
+    def __init__(self, links, k=8, max_hops=MAX_SID_NODES) -> None:
+        self.links = {}                  #frozenset({a, b}) -> weight
+        for a, b, weight in links:
+            self.links[frozenset((a, b))] = weight
+        self.k = k
+        self.max_hops = max_hops
+        self.down_links = set()          #links of the topology that are not active
+        self.version = 0                 #topology/link state version, changes with every change of either
+        self.lock = threading.Lock()
+
+        self.adjacency = {}
+        self.candidates = {}             #(src, dst) -> [(cost, path)], cost ascending
+        self.rebuild()
+
+        #counters
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def rebuild(self):
+        # Adjacency of the active links, the cached paths are dropped
+        self.adjacency = {}
+        for link, weight in self.links.items():
+            if link in self.down_links:
+                continue
+            a, b = tuple(link)
+            self.adjacency.setdefault(a, {})[b] = weight
+            self.adjacency.setdefault(b, {})[a] = weight
+        self.candidates = {}
+        self.version += 1
+
+    def set_link_state(self, a, b, up):
+        # Returns True if the state changed (and the cache was dropped)
+        link = frozenset((a, b))
+        return self.update_link_states({link} if up else set(), only=[link])
+
+    def update_link_states(self, active_links, only=None):
+        """
+        Sets the state of the links of the topology, the cache is only dropped if some state changed.
+
+        :param active_links: Set of frozenset({a, b}) of the active links.
+        :param only: Links to update, None all of them (a link of the topology not in active_links is down).
+        :return: True if something changed.
+        """
+        with self.lock:
+            links = self.links if only is None else [link for link in only if link in self.links]
+            down_links = set(self.down_links)
+            for link in links:
+                if link in active_links:
+                    down_links.discard(link)
+                else:
+                    down_links.add(link)
+            if down_links == self.down_links:
+                return False
+            self.down_links = down_links
+            self.invalidations += 1
+            self.rebuild()
+            return True
+
+    def precompute(self, switches):
+        # Candidate paths between every pair of the switches
+        for src in switches:
+            for dst in switches:
+                if src != dst:
+                    self.candidate_paths(src, dst)
+
+    def candidate_paths(self, src, dst):
+        # The k shortest loopless paths from src to dst (at the most max_hops), [(cost, path)], from the cache if the topology did not change
+        with self.lock:
+            key = (src, dst)
+            if key in self.candidates:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.candidates[key] = self.k_shortest_paths(src, dst)
+            return self.candidates[key]
+
+    def shortest_path(self, src, dst, max_hops, removed_nodes=(), removed_edges=()):
+        # Dijkstra on (switch, hops), so the shortest path of at the most max_hops is found
+        # the ties broken by the path (same result every run), None if there is no path
+        if src not in self.adjacency or src in removed_nodes:
+            return None
+        queue = [(0.0, (src,))]
+        done = set()
+        while queue:
+            cost, path = heapq.heappop(queue)
+            node = path[-1]
+            if node == dst:
+                return cost, path
+            hops = len(path) - 1
+            if (node, hops) in done or hops >= max_hops:
+                continue
+            done.add((node, hops))
+            for neighbor, weight in self.adjacency[node].items():
+                if neighbor in path or neighbor in removed_nodes or (node, neighbor) in removed_edges:
+                    continue
+                heapq.heappush(queue, (cost + weight, path + (neighbor,)))
+        return None
+
+    def k_shortest_paths(self, src, dst):
+        # Yen's algorithm, the spur paths limited to the hops left after their root
+        first = self.shortest_path(src, dst, self.max_hops)
+        if first is None:
+            return []
+        paths = [first]
+        potential = []
+        seen = {first[1]}
+        while len(paths) < self.k:
+            last_cost, last_path = paths[-1]
+            for i in range(len(last_path) - 1):
+                spur_node = last_path[i]
+                root = last_path[:i + 1]
+                root_cost = sum(self.adjacency[a][b] for a, b in zip(root, root[1:]))
+
+                #the next hop of every known path with the same root is removed, and the root nodes (loopless)
+                removed_edges = {(path[i], path[i + 1]) for _, path in paths if path[:i + 1] == root}
+                spur = self.shortest_path(spur_node, dst, self.max_hops - i, removed_nodes=set(root[:-1]), removed_edges=removed_edges)
+                if spur is None:
+                    continue
+                path = root[:-1] + spur[1]
+                if path not in seen:
+                    seen.add(path)
+                    heapq.heappush(potential, (root_cost + spur[0], path))
+            if not potential:
+                break
+            paths.append(heapq.heappop(potential))
+        return paths
+
+    def best_detour(self, current_path, loads, avoid):
+        """
+        Best path to detour a flow from current_path.
+
+        :param current_path: Switch ids of the current path of the flow, source and destination included.
+        :param loads: switch_id -> MCDA load, of all the switches.
+        :param avoid: switch_id -> load, of the overloaded switches.
+        :return: Switch ids of the detour, None if no candidate differs from the current path.
+        """
+        current_path = tuple(current_path)
+        best = None
+        best_key = None
+        for cost, path in self.candidate_paths(current_path[0], current_path[-1]):
+            if path == current_path:
+                continue
+            nodes = path[1:]
+            avoid_load = sum(avoid[node] for node in nodes if node in avoid)
+            avoid_count = sum(1 for node in nodes if node in avoid)
+            key = (avoid_load, avoid_count, sum(loads.get(node, 0) for node in nodes), cost)
+            if best_key is None or key < best_key:
+                best, best_key = path, key
+        return best
+
+    def stats(self):
+        return {'candidate_hits': self.hits, 'candidate_misses': self.misses, 'invalidations': self.invalidations,
+                'down_links': len(self.down_links), 'version': self.version}
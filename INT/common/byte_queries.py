@@ -0,0 +1,122 @@
+from quantile_sketch import merge_sketches
+from sketch_queries import SKETCH_MEASUREMENTS, time_condition
+
+#Reads the per switch byte counts written by the collector (receive/rollup.py, or receive/backfill_switch_bytes.py for the
+#data recorded before it), instead of one SUM("size") per switch with a regex on the path of flow_stats:
+#   switch_bytes:  per switch_id, dscp and size, the flow reports whose path has the switch (once, as the regex) and their bytes
+#   flow_bytes:    per dscp and size, the flow reports (the sizes of flow_stats, for their percentile)
+#The size is a tag, the tests only have a handful of packet sizes, so the percentile of the sizes and the sums below it are exact
+#
+#process_results gets all of a scenario (every switch and DSCP, and the latency sketches) in one request, and then the values
+#of each DSCP out of it (ScenarioSwitchData)
+
+BYTE_MEASUREMENTS = ["switch_bytes", "flow_bytes"]
+
+def size_percentile(size_packets, p):
+    # PERCENTILE("size", p) of flow_stats out of {size: packets}: value at position int(count*p/100 + 0.5) of the sorted sizes
+    total = sum(size_packets.values())
+    index = int(total * p / 100 + 0.5) - 1
+    if total == 0 or index < 0:
+        return None
+    for size in sorted(size_packets):
+        index -= size_packets[size]
+        if index < 0:
+            return size
+    return None
+
+def scenario_switch_queries(start_time, end_time=None):
+    # Queries (and their bound parameters) of ScenarioSwitchData, all the DSCPs and switches, to send them in a batch
+    condition, params = time_condition(start_time, end_time)
+    queries = [
+        f"""SELECT SUM("packets") AS packets, SUM("bytes") AS bytes FROM switch_bytes WHERE {condition} GROUP BY "switch_id", "dscp", "size" """,
+        f"""SELECT SUM("packets") AS packets FROM flow_bytes WHERE {condition} GROUP BY "dscp", "size" """,
+        f"""SELECT "sketch" FROM {SKETCH_MEASUREMENTS["switch_stats"]} WHERE {condition} GROUP BY "switch_id", "dscp" """,
+        f"""SELECT "sketch" FROM {SKETCH_MEASUREMENTS["flow_stats"]} WHERE {condition} GROUP BY "dscp" """
+    ]
+    return queries, params
+
+def get_scenario_switch_data(query_batch, start_time, end_time=None):
+    """
+    Byte counts and latency sketches of all the switches and DSCPs of a time range, in one request.
+
+    :param query_batch: Function that runs several InfluxQL queries with the same bound parameters on one request,
+                        query_batch(queries, params), and returns a ResultSet per query (InfluxQuery.query_batch).
+    :return: ScenarioSwitchData.
+    """
+    queries, params = scenario_switch_queries(start_time, end_time)
+    return ScenarioSwitchData(*query_batch(queries, params))
+
+
+class ScenarioSwitchData():
+    """
+    Per switch values of a scenario, for each DSCP (-1 is all of them, as in process_results).
+
+    :param switch_bytes: ResultSet of switch_bytes GROUP BY switch_id, dscp, size.
+    :param flow_bytes: ResultSet of flow_bytes GROUP BY dscp, size.
+    :param switch_sketches: ResultSet of switch_latency_sketch GROUP BY switch_id, dscp.
+    :param flow_sketches: ResultSet of flow_latency_sketch GROUP BY dscp.
+    """
+    def __init__(self, switch_bytes, flow_bytes, switch_sketches, flow_sketches) -> None:
+        self.switch_bytes = {}          #(switch_id, dscp, size) -> bytes
+        for series in switch_bytes.raw.get('series', []):
+            tags = series['tags']
+            self.switch_bytes[(int(tags['switch_id']), int(tags['dscp']), int(tags['size']))] = series['values'][0][2]
+
+        self.flow_packets = {}          #(dscp, size) -> packets
+        for series in flow_bytes.raw.get('series', []):
+            tags = series['tags']
+            self.flow_packets[(int(tags['dscp']), int(tags['size']))] = series['values'][0][1]
+
+        self.switch_sketches = {}       #(switch_id, dscp) -> QuantileSketch, merged over the time range
+        for series in switch_sketches.raw.get('series', []):
+            tags = series['tags']
+            self.switch_sketches[(int(tags['switch_id']), int(tags['dscp']))] = merge_sketches(value[1] for value in series['values'])
+
+        self.flow_sketches = {}         #dscp -> QuantileSketch, merged over the time range
+        for series in flow_sketches.raw.get('series', []):
+            self.flow_sketches[int(series['tags']['dscp'])] = merge_sketches(value[1] for value in series['values'])
+
+    def has_bytes(self):
+        return len(self.flow_packets) > 0
+
+    def byte_sums(self, p, dscp=-1):
+        """
+        Same as SUM("size") of flow_stats per switch (path =~ switch), of the packets with size <= PERCENTILE("size", p).
+        The percentile is of all the DSCPs, the sums only of the given one.
+
+        :return: Dictionary switch_id -> bytes, the switches without packets are left out.
+        """
+        size_packets = {}
+        for (_, size), packets in self.flow_packets.items():
+            size_packets[size] = size_packets.get(size, 0) + packets
+        p_size = size_percentile(size_packets, p)
+
+        sums = {}
+        for (switch_id, switch_dscp, size), total in self.switch_bytes.items():
+            if (dscp == -1 or switch_dscp == dscp) and p_size is not None and size <= p_size:
+                sums[switch_id] = sums.get(switch_id, 0) + total
+        return sums
+
+    def switch_counts(self, p, dscp=-1):
+        """
+        Packets of each switch and of all the flows with latency <= their p percentile (of all the DSCPs), only of the given DSCP.
+
+        :return: (total_count, {switch_id: count}), None if there are no sketches in the time range.
+        """
+        flow_sketch = merge_sketches(self.flow_sketches.values())
+        switch_sketch = merge_sketches(self.switch_sketches.values())
+        if flow_sketch.count == 0 or switch_sketch.count == 0:
+            return None
+        flow_percentile_value = flow_sketch.percentile(p)
+        switch_percentile_value = switch_sketch.percentile(p)
+
+        total_count = merge_sketches(sketch for sketch_dscp, sketch in self.flow_sketches.items()
+                                     if dscp == -1 or sketch_dscp == dscp).rank(flow_percentile_value)
+
+        sketches_by_switch = {}
+        for (switch_id, sketch_dscp), sketch in self.switch_sketches.items():
+            if dscp == -1 or sketch_dscp == dscp:
+                sketches_by_switch.setdefault(switch_id, []).append(sketch)
+        counts_by_switch = {switch_id: merge_sketches(sketches).rank(switch_percentile_value) for switch_id, sketches in sketches_by_switch.items()}
+
+        return total_count, counts_by_switch
@@ -0,0 +1,262 @@
+import glob
+import json
+import os
+import socket
+import socketserver
+import threading
+
+#Table of the flows seen by the collector, kept up to date with every INT report that has the flow latency (the same
+#reports that are written as flow_stats points), so the consumers get the latest value of a flow without scanning the
+#time series (ORDER BY time DESC LIMIT 1):
+#   (src_ip, dst_ip, flow_label) -> {"path": "1-4-5-8", "dscp": 46, "size": 512, "first_seen": <ns>, "last_seen": <ns>, "packets": n}
+#
+#The collector serves it on a unix stream socket, one JSON request per line and one JSON answer per line:
+#   {"op": "get", "flows": [[src_ip, dst_ip, flow_label], ...]}   ->  {"flows": [entry or null, ...]}  (same order)
+#   {"op": "all"}                                                   ->  {"flows": [entry, ...]}
+#   {"op": "stats"}                                                 ->  {"flows": n, "updates": n, "requests": n, "checkpoints": n}
+#and checkpoints it periodically to a JSON file (written to a temporary file and renamed, never half written), that
+#process_results reads after the tests, when the collector is no longer running
+#In supervisor mode each worker has its own table, on <socket>.<worker> and <checkpoint root>.<worker>.json, the
+#client and read_checkpoints merge them (the most recent entry of a flow wins)
+
+DEFAULT_FLOW_TABLE = "/tmp/int_flow_table.sock"
+
+ENTRY_FIELDS = ["src_ip", "dst_ip", "flow_label", "path", "dscp", "size", "first_seen", "last_seen", "packets"]
+
+def flow_key(src_ip, dst_ip, flow_label):
+    # The flow label is a tag (string) in the DB and an integer in the reports
+    return (src_ip, dst_ip, int(flow_label))
+
+def worker_path(path, worker_id):
+    # Socket/checkpoint of one worker in supervisor mode, None for a single collector
+    if worker_id is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{worker_id}{ext}"
+
+def matching_paths(path):
+    # The path and the ones of every worker
+    root, ext = os.path.splitext(path)
+    return [path] + sorted(glob.glob(glob.escape(root) + ".*" + glob.escape(ext)))
+
+def newest(entries):
+    # Most recent entry of each flow, of several tables
+    flows = {}
+    for entry in entries:
+        if entry is None:
+            continue
+        key = flow_key(entry['src_ip'], entry['dst_ip'], entry['flow_label'])
+        if key not in flows or entry['last_seen'] > flows[key]['last_seen']:
+            flows[key] = entry
+    return flows
+
+
+class FlowTable():
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.flows = {}                 #(src_ip, dst_ip, flow_label) -> [path, dscp, size, first_seen, last_seen, packets]
+        self.updates = 0                #reports added, also tells the checkpoint thread if something changed
+
+    def update(self, flow_info, timestamp):
+        # flow_info with the flow latency (the report of the sink), timestamp in ns
+        key = flow_key(flow_info.src_ip, flow_info.dst_ip, flow_info.flow_label)
+        path = '-'.join(map(str, flow_info.switch_ids[::-1]))          #leftmost is the first hop, as in flow_stats
+
+        with self.lock:
+            self.updates += 1
+            flow = self.flows.get(key)
+            if flow is None:
+                self.flows[key] = [path, flow_info.dscp, flow_info.size, timestamp, timestamp, 1]
+                return
+            flow[0] = path
+            flow[1] = flow_info.dscp
+            flow[2] = flow_info.size
+            flow[4] = timestamp
+            flow[5] += 1
+
+    def entry(self, key):
+        flow = self.flows.get(key)
+        if flow is None:
+            return None
+        return dict(zip(ENTRY_FIELDS, key + tuple(flow)))
+
+    def get(self, src_ip, dst_ip, flow_label):
+        with self.lock:
+            return self.entry(flow_key(src_ip, dst_ip, flow_label))
+
+    def get_many(self, flows):
+        with self.lock:
+            return [self.entry(flow_key(*flow)) for flow in flows]
+
+    def entries(self):
+        with self.lock:
+            return [self.entry(key) for key in self.flows]
+
+    def save(self, path):
+        entries = self.entries()
+        temporary = path + ".tmp"
+        with open(temporary, 'w') as file:
+            json.dump({'flows': entries}, file, separators=(',', ':'))
+        os.replace(temporary, path)
+
+    def __len__(self):
+        return len(self.flows)
+
+
+def read_checkpoints(path):
+    """
+    Flows of the checkpoint of the collector (and of its workers in supervisor mode).
+
+    :param path: Checkpoint file of the collector (collector_influxdb.py --flow_table_checkpoint).
+    :return: Dictionary (src_ip, dst_ip, flow_label) -> entry, empty if there is no checkpoint.
+    """
+    entries = []
+    for checkpoint in matching_paths(path):
+        if checkpoint.endswith(".tmp") or not os.path.isfile(checkpoint):
+            continue
+        with open(checkpoint, 'r') as file:
+            entries += json.load(file)['flows']
+    return newest(entries)
+
+
+class FlowTableService():
+    """
+    Serves a FlowTable on a unix socket and checkpoints it.
+
+    :param table: FlowTable.
+    :param socket_path: Unix stream socket of the queries, None to not serve it.
+    :param checkpoint_path: JSON file of the checkpoints, None to not checkpoint it.
+    :param checkpoint_interval: Seconds between checkpoints (only written if the table changed).
+    """
+    def __init__(self, table, socket_path=DEFAULT_FLOW_TABLE, checkpoint_path=None, checkpoint_interval=5.0) -> None:
+        self.table = table
+        self.socket_path = socket_path
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.server = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="flow-table-checkpoint", daemon=True)
+
+        #counters
+        self.requests = 0
+        self.checkpoints = 0
+        self.checkpointed_updates = 0
+
+    def start(self):
+        if self.socket_path:
+            if os.path.exists(self.socket_path):            #left by a previous run
+                os.unlink(self.socket_path)
+            service = self
+
+            class FlowTableHandler(socketserver.StreamRequestHandler):
+                def handle(self):
+                    for line in self.rfile:
+                        try:
+                            answer = service.answer(json.loads(line))
+                        except (ValueError, KeyError, TypeError) as e:
+                            answer = {'error': str(e)}
+                        self.wfile.write(json.dumps(answer, separators=(',', ':')).encode() + b"\n")
+
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, FlowTableHandler)
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name="flow-table-server", daemon=True).start()
+        if self.checkpoint_path:
+            self.thread.start()
+        return self
+
+    def answer(self, request):
+        self.requests += 1
+        op = request.get('op', 'get')
+        if op == 'get':
+            return {'flows': self.table.get_many(request['flows'])}
+        if op == 'all':
+            return {'flows': self.table.entries()}
+        if op == 'stats':
+            return self.stats()
+        raise ValueError("unknown op: %s" % op)
+
+    def checkpoint(self):
+        updates = self.table.updates
+        if updates == self.checkpointed_updates:
+            return
+        self.table.save(self.checkpoint_path)
+        self.checkpointed_updates = updates
+        self.checkpoints += 1
+
+    def run(self):
+        while not self.stop_event.wait(self.checkpoint_interval):
+            self.checkpoint()
+
+    def stats(self):
+        return {'flows': len(self.table), 'updates': self.table.updates, 'requests': self.requests, 'checkpoints': self.checkpoints}
+
+    def close(self):
+        #stops serving and writes the last checkpoint
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        if self.checkpoint_path:
+            self.checkpoint()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+class FlowTableClient():
+    """
+    Queries the flow table of the collector (and of its workers in supervisor mode).
+
+    :param path: Unix socket of the collector (collector_influxdb.py --flow_table).
+    :param timeout: Seconds to wait for an answer.
+    """
+    def __init__(self, path=DEFAULT_FLOW_TABLE, timeout=1.0) -> None:
+        self.path = path
+        self.timeout = timeout
+
+    def request(self, socket_path, request):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(request, separators=(',', ':')).encode() + b"\n")
+            answer = b""
+            while not answer.endswith(b"\n"):
+                data = sock.recv(1 << 20)
+                if not data:
+                    break
+                answer += data
+        return json.loads(answer)
+
+    def query(self, request):
+        # Entries of every table that answers, raises OSError if none does
+        entries = []
+        answered = False
+        error = None
+        for socket_path in matching_paths(self.path):
+            if not os.path.exists(socket_path):
+                continue
+            try:
+                entries += self.request(socket_path, request)['flows']
+                answered = True
+            except (OSError, ValueError, KeyError) as e:
+                error = e
+        if not answered:
+            raise OSError("No flow table on %s: %s" % (self.path, error or "not found"))
+        return newest(entries)
+
+    def get_many(self, flows):
+        """
+        Latest entry of each flow.
+
+        :param flows: List of (src_ip, dst_ip, flow_label).
+        :return: Dictionary (src_ip, dst_ip, flow_label) -> entry (as given in flows), the flows never seen are left out.
+        """
+        found = self.query({'op': 'get', 'flows': [list(flow_key(*flow)) for flow in flows]})
+        return {flow: found[flow_key(*flow)] for flow in flows if flow_key(*flow) in found}
+
+    def get(self, src_ip, dst_ip, flow_label):
+        return self.get_many([(src_ip, dst_ip, flow_label)]).get((src_ip, dst_ip, flow_label))
+
+    def all(self):
+        return self.query({'op': 'all'})
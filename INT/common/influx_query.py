@@ -0,0 +1,177 @@
+import re
+import threading
+import time
+
+from influxdb import InfluxDBClient
+from influxdb.resultset import ResultSet
+
+#Query layer shared by the analyzer, process_results and the evaluation scripts
+#A single long-lived InfluxDBClient per (host, port, database): its requests session keeps the HTTP connections alive and pooled,
+#instead of one TCP connect/teardown per query. Values go as bound parameters ($name in the query, InfluxDB >= 1.6), several
+#SELECTs can be sent on one request (query_batch) and every query is timed, grouped by name (by default the measurement)
+#
+#usage:
+#   influx = get_influx_query(host='localhost', database='int')
+#   result = influx.query('SELECT "path" FROM flow_rollup WHERE "src_ip" = $src_ip', params={'src_ip': src_ip})
+#   stats_by_switch, total = influx.query_batch([query1, query2], params={'start': minutes_ago_str})
+
+DEFAULT_POOL_SIZE = 4
+
+FROM_REGEX = re.compile(r'\bFROM\s+"?([\w.]+)"?', re.IGNORECASE)
+
+def query_name(query):
+    #default timing key of a query: the statement and its measurement (e.g. "SELECT switch_rollup")
+    words = query.split(None, 1)
+    statement = words[0].upper() if words else ""
+    match = FROM_REGEX.search(query)
+    return statement + " " + match.group(1) if match else statement
+
+
+class QueryTimer():
+    #Timing of the queries with the same name
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0                #seconds
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, elapsed, error=False):
+        self.count += 1
+        self.errors += error
+        self.total += elapsed
+        self.last = elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def merge(self, timer):
+        #adds the to_dict() of the same queries timed on another process
+        self.count += timer['count']
+        self.errors += timer['errors']
+        self.total += timer['total_ms'] / 1000
+        self.last = timer['last_ms'] / 1000
+        self.max = max(self.max, timer['max_ms'] / 1000)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'max_ms': round(self.max * 1000, 3),
+            'last_ms': round(self.last * 1000, 3),
+            'total_ms': round(self.total * 1000, 3)
+        }
+
+
+class InfluxQuery():
+    """
+    Long-lived InfluxDB client with parameterized, batched and timed queries.
+
+    :param host: InfluxDB host.
+    :param port: InfluxDB HTTP port.
+    :param database: Database of the queries.
+    :param pool_size: Number of HTTP connections kept alive (threads querying at the same time).
+    :param timeout: Timeout in seconds of each request, None to wait forever.
+    """
+    def __init__(self, host='localhost', port=8086, database='int', pool_size=DEFAULT_POOL_SIZE, timeout=None) -> None:
+        self.client = InfluxDBClient(host=host, port=port, database=database, pool_size=pool_size, timeout=timeout)
+        self.lock = threading.Lock()
+        self.timers = {}                #query name -> QueryTimer
+        self.requests = 0               #HTTP requests sent (a batch is a single one)
+
+    def timed(self, name, function, *args, **kwargs):
+        start = time.perf_counter()
+        error = True
+        try:
+            result = function(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.requests += 1
+                timer = self.timers.get(name)
+                if timer is None:
+                    timer = self.timers[name] = QueryTimer()
+                timer.add(elapsed, error)
+
+    def query(self, query, params=None, name=None, epoch=None):
+        """
+        Runs one InfluxQL statement.
+
+        :param query: Query, the values are referenced as $name.
+        :param params: Dict with the values of the bound parameters.
+        :param name: Timing key, by default the statement and its measurement.
+        :param epoch: Time precision of the results (e.g. 'ns'), None for RFC3339 strings.
+        :return: ResultSet.
+        """
+        return self.timed(name or query_name(query), self.client.query, query, bind_params=params, epoch=epoch)
+
+    def query_batch(self, queries, params=None, name=None, epoch=None):
+        """
+        Runs several statements on a single request (joined with ';'), InfluxDB answers them in order.
+
+        :param queries: List of queries, all of them share the same bound parameters.
+        :param params: Dict with the values of the bound parameters.
+        :param name: Timing key, by default "batch:" and the names of the queries.
+        :return: List of ResultSet, one per query.
+        """
+        if not queries:
+            return []
+        name = name or "batch:" + ",".join(query_name(query) for query in queries)
+        #POST, a batch easily goes over the URL length limits of a GET
+        result = self.timed(name, self.client.query, ";\n".join(query.strip().rstrip(';') for query in queries),
+                            bind_params=params, epoch=epoch, method='POST')
+        results = result if isinstance(result, list) else [result]
+
+        #InfluxDB omits the statements without series at the end of the response, return an empty result for them
+        while len(results) < len(queries):
+            results.append(ResultSet({}))
+        return results
+
+    def write_points(self, points, **kwargs):
+        #writes go through the same pooled connections (not timed)
+        return self.client.write_points(points, **kwargs)
+
+    def stats(self):
+        with self.lock:
+            queries = {name: timer.to_dict() for name, timer in sorted(self.timers.items())}
+            requests = self.requests
+        return {'requests': requests, 'queries': queries}
+
+    def merge_stats(self, stats):
+        #adds the stats() of another InfluxQuery (e.g. of a worker process) to the ones of this client
+        with self.lock:
+            self.requests += stats['requests']
+            for name, timer in stats['queries'].items():
+                if name not in self.timers:
+                    self.timers[name] = QueryTimer()
+                self.timers[name].merge(timer)
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"InfluxDB queries: {stats['requests']} requests")
+        for name, timer in stats['queries'].items():
+            print(f"\t{name}: {timer['count']} queries ({timer['errors']} errors), avg {timer['avg_ms']} ms, max {timer['max_ms']} ms")
+
+    def close(self):
+        self.client.close()
+
+
+shared_clients = {}
+shared_clients_lock = threading.Lock()
+
+def get_influx_query(host='localhost', port=8086, database='int', **kwargs):
+    #Shared InfluxQuery of the process for (host, port, database), created on the first call
+    key = (host, port, database)
+    with shared_clients_lock:
+        influx = shared_clients.get(key)
+        if influx is None:
+            influx = shared_clients[key] = InfluxQuery(host, port, database, **kwargs)
+    return influx
+
+def close_influx_queries():
+    with shared_clients_lock:
+        for influx in shared_clients.values():
+            influx.close()
+        shared_clients.clear()
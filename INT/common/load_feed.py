@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+import socket
+import time
+
+from quantile_sketch import merge_sketches
+
+#Push feed of the per switch load of every rollup window, from the collector (receive/rollup.py) to the analyzer event mode
+#One JSON datagram per closed window and collector, over a unix datagram socket bound by the analyzer:
+#   {"collector": 0, "window": <start ns>, "window_length": 1.0, "sent": <unix time>,
+#    "switches": {"<switch_id>": [num_packets, latency_sum, size_sum], ...},
+#    "flow_packets": <reports with flow latency>, "latency_sketch": "<merged hop latency sketch of all the switches>"}
+#The publisher never blocks: without an analyzer listening (or with its buffer full) the window is dropped and counted
+
+DEFAULT_LOAD_FEED = "/tmp/int_load_feed.sock"
+
+
+class LoadFeedPublisher():
+    def __init__(self, path=DEFAULT_LOAD_FEED) -> None:
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+        #counters
+        self.sent = 0
+        self.dropped = 0
+
+    def publish(self, message):
+        try:
+            self.sock.sendto(json.dumps(message, separators=(',', ':')).encode(), self.path)
+            self.sent += 1
+            return True
+        except (FileNotFoundError, ConnectionRefusedError, BlockingIOError):      #no analyzer listening, or not reading fast enough
+            self.dropped += 1
+            return False
+
+    def stats(self):
+        return {'load_feed_sent': self.sent, 'load_feed_dropped': self.dropped}
+
+    def close(self):
+        self.sock.close()
+
+
+class LoadWindows():
+    """
+    Per switch stats over a sliding time range, from the windows pushed by the collectors.
+
+    :param horizon: Length (seconds) of the time range, the windows older than the newest one minus horizon are discarded.
+    """
+    def __init__(self, horizon) -> None:
+        self.horizon_ns = int(horizon * 1000000000)
+        self.windows = {}               #(collector, window start) -> message
+        self.latest = None              #start (ns) of the newest window received
+
+    def add(self, message):
+        self.windows[(message['collector'], message['window'])] = message
+        if self.latest is None or message['window'] > self.latest:
+            self.latest = message['window']
+        self.prune()
+
+    def prune(self):
+        oldest = self.latest - self.horizon_ns
+        for key in [key for key in self.windows if key[1] < oldest]:
+            del self.windows[key]
+
+    def stats_by_switch(self):
+        # [(switch_id, num_packets, average_latency, average_size)], same as the analyzer's stats from the rollups
+        totals = {}
+        for message in self.windows.values():
+            for switch_id, (count, latency_sum, size_sum) in message['switches'].items():
+                total = totals.setdefault(int(switch_id), [0, 0, 0])
+                total[0] += count
+                total[1] += latency_sum
+                total[2] += size_sum
+        return [(switch_id, count, latency_sum / count, size_sum / count)
+                for switch_id, (count, latency_sum, size_sum) in sorted(totals.items()) if count > 0]
+
+    def num_packets(self):
+        return sum(message['flow_packets'] for message in self.windows.values())
+
+    def latency_sketch(self):
+        return merge_sketches(message['latency_sketch'] for message in self.windows.values())
+
+
+class LoadFeedProtocol(asyncio.DatagramProtocol):
+    def __init__(self, callback) -> None:
+        self.callback = callback
+        self.invalid = 0
+
+    def datagram_received(self, data, addr):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            self.invalid += 1
+            return
+        message['received'] = time.time()
+        self.callback(message)
+
+
+async def open_load_feed(callback, path=DEFAULT_LOAD_FEED):
+    """
+    Binds the feed socket and calls callback(message) from the event loop for every window pushed.
+
+    :return: (transport, protocol), close the transport to stop receiving.
+    """
+    if os.path.exists(path):            #left by a previous run
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    sock.bind(path)
+    loop = asyncio.get_running_loop()
+    return await loop.create_datagram_endpoint(lambda: LoadFeedProtocol(callback), sock=sock)
@@ -0,0 +1,151 @@
+import math
+
+#DDSketch (Masson et al., VLDB 2019): streaming quantile sketch with relative error guarantees
+#Values are counted in logarithmic buckets, bucket i holds the values in (gamma^(i-1), gamma^i] with gamma = (1+alpha)/(1-alpha),
+#so any quantile is returned with a relative error <= alpha. Sketches with the same alpha are merged by adding the bucket counts,
+#which allows keeping one sketch per (switch, window) in the collector and merging them later on any time range
+#Values <= 0 are counted apart (zero_count), latencies and sizes are never negative
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+MIN_INDEXABLE_VALUE = 1e-9
+
+def parse_number(string):
+    #keeps ints as ints (latencies in ns), so the min/max of a deserialized sketch are the exact values
+    if string == "":
+        return None
+    try:
+        return int(string)
+    except ValueError:
+        return float(string)
+
+class QuantileSketch():
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}                  #bucket index -> count
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def key(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def value(self, key):
+        #representative value of the bucket (the relative error to any value in the bucket is <= alpha)
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        if value <= MIN_INDEXABLE_VALUE:
+            self.zero_count += count
+        else:
+            key = self.key(value)
+            self.bins[key] = self.bins.get(key, 0) + count
+
+        self.count += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can not merge sketches with different relative accuracy (%s != %s)" % (self.relative_accuracy, other.relative_accuracy))
+
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """
+        Estimates the q quantile, with the same nearest rank definition of InfluxDB PERCENTILE()
+        (the value at position int(count*q + 0.5) of the sorted values).
+
+        :param q: Quantile between 0 and 1 (e.g. 0.85 for the 85th percentile).
+        :return: Estimated value (relative error <= relative_accuracy), None if the sketch is empty.
+        """
+        if self.count == 0:
+            return None
+
+        rank = int(self.count * q + 0.5) - 1
+        rank = min(max(rank, 0), self.count - 1)
+
+        if rank < self.zero_count:
+            return max(self.min, 0)
+        cumulative = self.zero_count
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if cumulative > rank:
+                #the extremes are known exactly, never return a value outside them
+                return min(max(self.value(key), self.min), self.max)
+        return self.max
+
+    def rank(self, value):
+        #Estimated number of values <= value (e.g. COUNT(x) WHERE x <= value), exact for the values in other buckets
+        if self.count == 0 or value < self.min:
+            return 0
+        if value >= self.max:
+            return self.count
+        if value <= MIN_INDEXABLE_VALUE:
+            return self.zero_count
+
+        max_key = self.key(value)
+        return self.zero_count + sum(count for key, count in self.bins.items() if key <= max_key)
+
+    def percentile(self, p):
+        return self.quantile(p / 100)
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    #------------------------Serialization (compact string, stored as an InfluxDB string field)
+    #alpha;count;sum;min;max;zero_count;key:count,key:count,...
+
+    def to_string(self):
+        if self.count == 0:
+            return "%r;0;0;;;0;" % self.relative_accuracy
+        bins = ",".join("%d:%d" % (key, self.bins[key]) for key in sorted(self.bins))
+        return "%r;%d;%r;%r;%r;%d;%s" % (self.relative_accuracy, self.count, self.sum, self.min, self.max, self.zero_count, bins)
+
+    @classmethod
+    def from_string(cls, string):
+        alpha, count, total, minimum, maximum, zero_count, bins = string.split(";")
+        sketch = cls(float(alpha))
+        sketch.count = int(count)
+        sketch.sum = parse_number(total)
+        sketch.min = parse_number(minimum)
+        sketch.max = parse_number(maximum)
+        sketch.zero_count = int(zero_count)
+        if bins:
+            for item in bins.split(","):
+                key, bin_count = item.split(":")
+                sketch.bins[int(key)] = int(bin_count)
+        return sketch
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self) -> str:
+        return "QuantileSketch(count=%d, buckets=%d, min=%s, max=%s)" % (self.count, len(self.bins), self.min, self.max)
+
+
+def merge_sketches(sketches, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    #Merges an iterable of sketches (or their serialized strings) into a new one
+    merged = QuantileSketch(relative_accuracy)
+    for sketch in sketches:
+        if sketch is None:
+            continue
+        if isinstance(sketch, str):
+            sketch = QuantileSketch.from_string(sketch)
+        merged.merge(sketch)
+    return merged
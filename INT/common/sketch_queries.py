@@ -0,0 +1,73 @@
+from quantile_sketch import merge_sketches
+
+#Reads the latency sketches written by the collector (receive/rollup.py) and merges them over a time range
+#The queries only read one point per (switch_id, dscp) and window, no matter how many packets were received
+
+# raw measurement -> measurement with the sketches of its "latency" field
+SKETCH_MEASUREMENTS = {
+    "switch_stats": "switch_latency_sketch",
+    "flow_stats": "flow_latency_sketch"
+}
+
+def time_condition(start_time, end_time=None):
+    # Condition on the time range and its bound parameters ($start, $end)
+    condition = "time >= $start"
+    params = {'start': start_time}
+    if end_time is not None:
+        condition += " AND time <= $end"
+        params['end'] = end_time
+    return condition, params
+
+def latency_sketch_query(table, start_time, end_time=None, dscp_condition="", switch_id=None):
+    # Query (and its bound parameters) of the latency sketches of get_latency_sketch(), to send it in a batch
+    condition, params = time_condition(start_time, end_time)
+    switch_condition = ""
+    if switch_id is not None:
+        switch_condition = "AND \"switch_id\" = $switch_id"
+        params['switch_id'] = str(switch_id)
+    query = f"""
+        SELECT "sketch"
+        FROM {SKETCH_MEASUREMENTS[table]}
+        WHERE {condition}
+        {dscp_condition}
+        {switch_condition}
+    """
+    return query, params
+
+def merge_result_sketches(result):
+    # Merges all the sketches of the result of latency_sketch_query()
+    sketches = []
+    for series in result.raw.get('series', []):
+        sketches.extend(value[1] for value in series['values'])
+    return merge_sketches(sketches)
+
+def get_latency_sketch(apply_query, table, start_time, end_time=None, dscp_condition="", switch_id=None):
+    """
+    Merges all the latency sketches of a raw table (switch_stats or flow_stats) in the time range.
+
+    :param apply_query: Function that runs an InfluxQL query with bound parameters, apply_query(query, params), and returns the ResultSet.
+    :param table: Raw measurement (key of SKETCH_MEASUREMENTS).
+    :param dscp_condition: Extra condition, same format used by process_results (e.g. "AND dscp = '46'").
+    :param switch_id: Only the sketches of this switch (switch_stats only).
+    :return: Merged QuantileSketch, empty (count 0) if there are no sketches in the range.
+    """
+    query, params = latency_sketch_query(table, start_time, end_time, dscp_condition, switch_id)
+    return merge_result_sketches(apply_query(query, params))
+
+def get_latency_sketches_by_switch(apply_query, start_time, end_time=None, dscp_condition=""):
+    # Same as get_latency_sketch() for switch_stats, but returns a merged sketch per switch: {switch_id: QuantileSketch}
+    condition, params = time_condition(start_time, end_time)
+    query = f"""
+        SELECT "sketch"
+        FROM {SKETCH_MEASUREMENTS["switch_stats"]}
+        WHERE {condition}
+        {dscp_condition}
+        GROUP BY "switch_id"
+    """
+    result = apply_query(query, params)
+
+    sketches = {}
+    for series in result.raw.get('series', []):
+        switch_id = int(series['tags']['switch_id'])
+        sketches[switch_id] = merge_sketches(value[1] for value in series['values'])
+    return sketches
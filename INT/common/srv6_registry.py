@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+#Registry of the SRv6 rules the analyzer has active in ONOS, indexed by flow (srcIP, dstIP, flow_label) and by the
+#switch whose load caused the detour (responsible switch), with the creation time and the number of detours of each flow
+#Every change is appended to a journal, one JSON object per line:
+#   {"iteration": 1, "timestamp": "2025-04-23 10:15:02", "time": 1745403302.123, "operation": "Created SRv6 rule",
+#    "switch": 5, "rule": {"deviceID": "1", "srcIP": ..., "dstIP": ..., "flow_label": 3, "src_mask": 128, ...}, "detours": 1}
+#The rules still active can be rebuilt from the journal (replay_journal), so an analyzer that did not stop cleanly can
+#remove them from ONOS when it starts again, and process_results reads the operations of each iteration from it
+#
+#usage:
+#   registry = SRv6Registry(SRv6Journal("Medium-ECMP-SRv6_rules.jsonl"))
+#   registry.add(switch_id, rule, iteration=1)
+#   rules = registry.remove_switch(switch_id, iteration=1)
+
+OPERATION_CREATED = "Created SRv6 rule"
+OPERATION_REMOVED = "Removed SRv6 rule"
+OPERATION_DETOUR_LATENCY = "Detection to detour"
+
+def flow_key(rule):
+    return (rule['srcIP'], rule['dstIP'], int(rule['flow_label']))
+
+
+class SRv6Journal():
+    def __init__(self, path) -> None:
+        self.path = path
+        self.file = open(path, 'a', buffering=1)          #line buffered, every entry reaches the file when written
+
+    def record(self, operation, switch_id, iteration=None, rule=None, **fields):
+        entry = {'iteration': iteration, 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'time': round(time.time(), 3),
+                 'operation': operation, 'switch': switch_id}
+        if rule is not None:
+            entry['rule'] = rule
+        entry.update(fields)
+        self.file.write(json.dumps(entry, separators=(',', ':')) + "\n")
+
+    def truncate(self):
+        self.file.truncate(0)
+
+    def close(self):
+        self.file.close()
+
+
+def read_journal(path):
+    #entries of a journal, a last line cut by a crash is skipped
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def replay_journal(path):
+    #registry (without journal) with the rules that were still active at the end of the journal
+    registry = SRv6Registry()
+    if not os.path.exists(path):
+        return registry
+    for entry in read_journal(path):
+        if entry['operation'] == OPERATION_CREATED:
+            registry.add(entry['switch'], entry['rule'])
+        elif entry['operation'] == OPERATION_REMOVED:
+            registry.remove_rule(entry['rule'])
+    return registry
+
+
+class SRv6RuleEntry():
+    __slots__ = ('switch_id', 'rule', 'created')
+
+    def __init__(self, switch_id, rule, created) -> None:
+        self.switch_id = switch_id                  #switch whose load caused the detour
+        self.rule = rule                            #SRv6 args (deviceID, srcIP, dstIP, flow_label, masks)
+        self.created = created                      #unix time
+
+
+class SRv6Registry():
+    """
+    Active SRv6 rules, at most one per flow.
+
+    :param journal: SRv6Journal where every change is recorded, None to keep them only in memory.
+    """
+    def __init__(self, journal=None) -> None:
+        self.journal = journal
+        self.lock = threading.RLock()               #the detour results may arrive on several threads
+        self.rules = {}                             #flow key -> SRv6RuleEntry
+        self.by_switch = {}                         #switch_id -> {flow key: None}, in creation order
+        self.detour_counts = {}                     #flow key -> detours created for the flow (never reset)
+
+    def add(self, switch_id, rule, iteration=None):
+        #a new rule for a flow with one already active replaces it (the detour of the flow moves to this switch)
+        key = flow_key(rule)
+        with self.lock:
+            self.discard(key)
+            self.rules[key] = SRv6RuleEntry(switch_id, rule, time.time())
+            self.by_switch.setdefault(switch_id, {})[key] = None
+            self.detour_counts[key] = self.detour_counts.get(key, 0) + 1
+            if self.journal is not None:
+                self.journal.record(OPERATION_CREATED, switch_id, iteration, rule, detours=self.detour_counts[key])
+        return self.detour_counts[key]
+
+    def discard(self, key):
+        entry = self.rules.pop(key, None)
+        if entry is None:
+            return None
+        flows = self.by_switch[entry.switch_id]
+        del flows[key]
+        if not flows:
+            del self.by_switch[entry.switch_id]
+        return entry
+
+    def remove_rule(self, rule, iteration=None, cleanup=False):
+        with self.lock:
+            entry = self.discard(flow_key(rule))
+            if entry is not None and self.journal is not None:
+                self.journal.record(OPERATION_REMOVED, entry.switch_id, iteration, entry.rule,
+                                    age=round(time.time() - entry.created, 3), cleanup=cleanup)
+        return entry
+
+    def remove_switch(self, switch_id, iteration=None, cleanup=False):
+        """
+        Removes all the rules of a switch.
+
+        :param cleanup: The rules are removed at the end of a test (not because of the load), marked in the journal.
+        :return: List with the removed rules.
+        """
+        with self.lock:
+            return [self.remove_rule(self.rules[key].rule, iteration, cleanup).rule for key in list(self.by_switch.get(switch_id, ()))]
+
+    def clear(self, iteration=None, cleanup=True):
+        with self.lock:
+            return [rule for switch_id in self.switches() for rule in self.remove_switch(switch_id, iteration, cleanup)]
+
+    def get(self, flow):
+        return self.rules.get(flow)
+
+    def age(self, flow, now=None):
+        #seconds since the rule of the flow was created, None without rule
+        entry = self.rules.get(flow)
+        return None if entry is None else (now or time.time()) - entry.created
+
+    def detour_count(self, flow):
+        return self.detour_counts.get(flow, 0)
+
+    def switches(self):
+        with self.lock:
+            return list(self.by_switch)
+
+    def has_switch(self, switch_id):
+        return switch_id in self.by_switch
+
+    def count(self, switch_id):
+        return len(self.by_switch.get(switch_id, ()))
+
+    def rules_of_switch(self, switch_id):
+        with self.lock:
+            return [self.rules[key].rule for key in self.by_switch.get(switch_id, ())]
+
+    def all_rules(self):
+        with self.lock:
+            return [entry.rule for entry in self.rules.values()]
+
+    def to_dict(self):
+        #same layout as the old active_SRv6_rules: switch_id -> list of rules
+        with self.lock:
+            return {switch_id: [self.rules[key].rule for key in flows] for switch_id, flows in self.by_switch.items()}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __repr__(self):
+        return repr(self.to_dict())
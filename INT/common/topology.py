@@ -0,0 +1,41 @@
+#Static topology of the emulated network (mininet/topo.py), switch ids as in device:r<id>
+#Each link once, as (switch, switch, link type), the link types of mininet/constants.py network_config
+
+INFRA_INFRA = "INFRA_INFRA"
+INFRA_VEHICULE = "INFRA_VEHICULE"
+VEHICULE_VEHICULE = "VEHICULE_VEHICULE"
+
+#delay (ms) of each link type, from mininet/constants.py network_config
+LINK_DELAYS = {
+    INFRA_INFRA: 30.6,
+    INFRA_VEHICULE: 13.0,
+    VEHICULE_VEHICULE: 10.0,
+}
+
+SWITCHES = list(range(1, 15))
+INFRA_SWITCHES = [9, 10, 11, 12, 13, 14]         #static infrastructure
+HOST_SWITCHES = [1, 2, 3, 5, 7, 8]               #switches with hosts, where the flows start and end
+
+LINKS = [
+    (1, 4, VEHICULE_VEHICULE),  (1, 9, INFRA_VEHICULE),
+    (2, 3, VEHICULE_VEHICULE),  (2, 14, INFRA_VEHICULE),
+    (9, 4, INFRA_VEHICULE),     (9, 10, INFRA_INFRA),       (9, 13, INFRA_INFRA),       (9, 14, INFRA_INFRA),
+    (14, 10, INFRA_INFRA),      (14, 3, INFRA_VEHICULE),    (14, 13, INFRA_INFRA),
+    (4, 5, VEHICULE_VEHICULE),  (4, 10, INFRA_VEHICULE),
+    (3, 13, INFRA_VEHICULE),    (3, 6, VEHICULE_VEHICULE),
+    (10, 5, INFRA_VEHICULE),    (10, 11, INFRA_INFRA),      (10, 12, INFRA_INFRA),      (10, 13, INFRA_INFRA),
+    (13, 11, INFRA_INFRA),      (13, 12, INFRA_INFRA),      (13, 6, INFRA_VEHICULE),
+    (5, 8, VEHICULE_VEHICULE),  (5, 11, INFRA_VEHICULE),
+    (6, 7, VEHICULE_VEHICULE),  (6, 12, INFRA_VEHICULE),
+    (11, 8, INFRA_VEHICULE),    (11, 12, INFRA_INFRA),
+    (12, 7, INFRA_VEHICULE),
+    (8, 7, VEHICULE_VEHICULE),
+]
+
+def directed_links():
+    # Both directions of every link, [(src, dst)]
+    return [(a, b) for a, b, _ in LINKS] + [(b, a) for a, b, _ in LINKS]
+
+def weighted_links():
+    # [(switch, switch, delay in ms)]
+    return [(a, b, LINK_DELAYS[link_type]) for a, b, link_type in LINKS]
@@ -8,14 +8,17 @@ import subprocess
 import time
 import json
 import os
+import sys
 from datetime import datetime
-from influxdb import InfluxDBClient
 from statistics import mean, stdev, quantiles
 
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from influx_query import get_influx_query
+
 class QuickEvaluation:
     def __init__(self):
         try:
-            self.client = InfluxDBClient(host='localhost', port=8086, database='int')
+            self.client = get_influx_query(host='localhost', port=8086, database='int')
             print("Connected to InfluxDB")
         except Exception as e:
             print(f"InfluxDB connection failed: {e}")
@@ -167,12 +170,12 @@ class QuickEvaluation:
                     break
                 
                 # Query current queue depth from InfluxDB
-                query = f"""
+                query = """
                 SELECT last(q_occupancy) FROM queue_stats
-                WHERE time > '{burst_start_datetime.isoformat()}'
+                WHERE time > $start
                 LIMIT 1
                 """
-                result = list(self.client.query(query))
+                result = list(self.client.query(query, {'start': burst_start_datetime.isoformat()}))
                 
                 if result and len(result[0]) > 0:
                     point = result[0][0]
@@ -7,10 +7,14 @@ Tests 7 packet sizes with 30+ runs for statistical significance
 import subprocess
 import time
 import json
+import os
+import sys
 import numpy as np
 from datetime import datetime
 from pathlib import Path
-from influxdb import InfluxDBClient
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from influx_query import get_influx_query
 
 class RFC2544StatisticalBenchmark:
     """RFC 2544 benchmarking with 30+ statistical runs"""
@@ -20,7 +24,7 @@ class RFC2544StatisticalBenchmark:
     
     def __init__(self, num_runs=30):
         self.num_runs = num_runs
-        self.client = InfluxDBClient(host='localhost', port=8086, database='int')
+        self.client = get_influx_query(host='localhost', port=8086, database='int')
         self.results = {size: [] for size in self.RFC2544_SIZES}
     
     def run_single_evaluation(self, run_num):
@@ -7,8 +7,12 @@ Generates marked traffic and measures per-class QoS metrics
 import subprocess
 import time
 import json
+import os
+import sys
 from datetime import datetime
-from influxdb import InfluxDBClient
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from influx_query import get_influx_query
 
 class DSCPTrafficGenerator:
     """Generate and measure DSCP-marked traffic flows"""
@@ -24,7 +28,7 @@ class DSCPTrafficGenerator:
         self.host = host
         self.dest = dest
         self.dest_ip = dest_ip
-        self.client = InfluxDBClient(host='localhost', port=8086, database='int')
+        self.client = get_influx_query(host='localhost', port=8086, database='int')
     
     def run_ef_traffic(self, duration=30, rate='100k'):
         """Generate EF (VoIP) traffic - high priority"""
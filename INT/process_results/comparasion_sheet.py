@@ -6,11 +6,11 @@ from openpyxl.styles import Font
 
 
 
-def get_line_column_to_copy_from(sheet_to_copy_from_name, variable_number, dscp):
+def get_line_column_to_copy_from(workbook, sheet_to_copy_from_name, variable_number, dscp):
     line =None
     col = None
 
-    workbook = load_workbook(constants.final_file_path)
+    # the workbook being configured, instead of loading it again for every value
     sheet_to_copy_from = workbook[sheet_to_copy_from_name]
 
     variable_name = constants.headers_lines[variable_number]
@@ -110,7 +110,7 @@ def set_comparasion_formulas(sheet, start_line):
         sheet[f'F{start_line + i}'] = f'=IFERROR(ROUND((D{start_line + i} - B{start_line + i}) / ABS(B{start_line + i}) * 100, 2), 0)'
         sheet[f'G{start_line + i}'] = f'=IFERROR(ROUND((D{start_line + i} - C{start_line + i}) / ABS(C{start_line + i}) * 100, 2), 0)'
 
-def set_copied_values(sheet, current_test_scenario, start_line, dscp):    
+def set_copied_values(workbook, sheet, current_test_scenario, start_line, dscp):    
     print("Seting values to copy from other sheets")
     
     # Cycle through the variables to compare (lines)
@@ -124,7 +124,7 @@ def set_copied_values(sheet, current_test_scenario, start_line, dscp):
             sheet_to_copy_from_name = current_test_scenario + "-" + curent_algorithm
             print(f"For {current_test_scenario} DSCP:{dscp} copying variable nº {variable_number} from sheet: {sheet_to_copy_from_name}")
 
-            line, column = get_line_column_to_copy_from(sheet_to_copy_from_name, variable_number, dscp)
+            line, column = get_line_column_to_copy_from(workbook, sheet_to_copy_from_name, variable_number, dscp)
 
             if line is None or column is None:
                 print(f"Error getting line and column to copy from, sheet_to_copy_from: {sheet_to_copy_from_name}, variable number: {variable_number}")
@@ -156,7 +156,7 @@ def set_scenario_headers(sheet, test_case, start_line):
         sheet[f'F{start_line}'].font = Font(bold=True)
         sheet[f'G{start_line}'].font = Font(bold=True)
 
-def comparasion_area(sheet, current_test_scenario, start_line, dscp):
+def comparasion_area(workbook, sheet, current_test_scenario, start_line, dscp):
     #as bold text
     if dscp == -1:
         sheet[f'A{start_line}'] = "All DSCP: All Data Flows"
@@ -168,10 +168,10 @@ def comparasion_area(sheet, current_test_scenario, start_line, dscp):
 
     set_algorithm_headers(sheet, start_line)
     set_comparasion_formulas(sheet, start_line)
-    set_copied_values(sheet, current_test_scenario, start_line, dscp)
+    set_copied_values(workbook, sheet, current_test_scenario, start_line, dscp)
     sheet.append([""])
 
-def set_Non_to_Emergency_Data_Flows_Comparasion(sheet, current_test_scenario, start_line):
+def set_Non_to_Emergency_Data_Flows_Comparasion(workbook, sheet, current_test_scenario, start_line):
     sheet[f'A{start_line}'] = "For All Data Flows"
     sheet[f'A{start_line + 1}'] = constants.headers_lines[-2]
     sheet[f'A{start_line + 2}'] = constants.headers_lines[-1]
@@ -183,8 +183,8 @@ def set_Non_to_Emergency_Data_Flows_Comparasion(sheet, current_test_scenario, st
     for i in range(len(constants.algorithms)):
         sheet_to_copy_from_name = f"{current_test_scenario}-{constants.algorithms[i]}"
 
-        line1, column1 = get_line_column_to_copy_from(sheet_to_copy_from_name, 14, -1)
-        line2, column2 = get_line_column_to_copy_from(sheet_to_copy_from_name, 15, -1)
+        line1, column1 = get_line_column_to_copy_from(workbook, sheet_to_copy_from_name, 14, -1)
+        line2, column2 = get_line_column_to_copy_from(workbook, sheet_to_copy_from_name, 15, -1)
 
         if line1 is None or column1 is None:
             print(f"Error getting line and column to copy from, sheet_to_copy_from: {sheet_to_copy_from_name}, variable number: {14}")
@@ -267,7 +267,7 @@ def set_Comparison_sheet():
                 has_emergency_dscp = True
             
             max_line = sheet.max_row + 1
-            comparasion_area(sheet, current_test_scenario, max_line, dscp)
+            comparasion_area(workbook, sheet, current_test_scenario, max_line, dscp)
 
         # Set SRv6 area
         if constants.args.SRv6_index is not None:
@@ -276,7 +276,7 @@ def set_Comparison_sheet():
         # If contains DSCP >= 40, set comparasion for Non to Emergency Data Flows
         if has_emergency_dscp:
             sheet.append([""])
-            set_Non_to_Emergency_Data_Flows_Comparasion(sheet, current_test_scenario, sheet.max_row + 1)
+            set_Non_to_Emergency_Data_Flows_Comparasion(workbook, sheet, current_test_scenario, sheet.max_row + 1)
 
         # Insert 2 empty lines
         sheet.append([""])
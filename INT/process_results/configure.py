@@ -2,108 +2,135 @@ from cmath import sqrt
 import os
 import sys
 import constants, comparasion_sheet, graphs
+from byte_queries import get_scenario_switch_data
 from openpyxl import load_workbook
 from openpyxl.styles import Font
 
+def get_scenario_data(start, end):
+    # Byte counts and latency sketches of all the switches and DSCPs of a scenario, one request per scenario (cached for the other DSCPs)
+    if (start, end) not in constants.scenario_switch_data:
+        constants.scenario_switch_data[(start, end)] = get_scenario_switch_data(constants.client.query_batch, start, end)
+    return constants.scenario_switch_data[(start, end)]
+
 def get_byte_sum(start, end, dscp, dscp_condition):
     # Initialize the result dictionary to store total byte counts per switch ID
-    sum = {}
-    switch_ids = list(range(1, constants.num_switches + 1))
+    sum = {dscp: {}}
 
-    # Loop through each unique switch ID
-    for switch_id in switch_ids:
-        # Formulate the query to get the sum of bytes for the given switch ID and time range
-        percentile_query = f"""
-            SELECT PERCENTILE("size", {constants.percentile}) AS p_size
-            FROM "flow_stats"
-            WHERE time >= '{start}'
-            AND time <= '{end}'
-        """
-        percentile_value = constants.apply_query(percentile_query)
-        percentile_value = list(percentile_value.get_points())[0]['p_size']
+    byte_sums = None
+    if constants.use_switch_bytes:
+        scenario_data = get_scenario_data(start, end)
+        if scenario_data.has_bytes():
+            byte_sums = scenario_data.byte_sums(constants.percentile, dscp)
+    if byte_sums is None:               #no switch_bytes in the time range (recorded before them, and not backfilled)
+        byte_sums = get_byte_sums_from_db(start, end, dscp_condition)
+
+    for switch_id in range(1, constants.num_switches + 1):
+        sum[dscp][switch_id] = {"Byte Sums": byte_sums.get(switch_id, 0)}           #if there is no data, set to 0
+
+    return sum
 
+def get_byte_sums_from_db(start, end, dscp_condition):
+    # Same sums as ScenarioSwitchData.byte_sums(), with a regex on the path of flow_stats per switch
+    sums = {}
 
+    # the percentile is of all DSCPs and the same for every switch
+    percentile_query = f"""
+        SELECT PERCENTILE("size", {constants.percentile}) AS p_size
+        FROM "flow_stats"
+        WHERE time >= $start
+        AND time <= $end
+    """
+    percentile_value = constants.apply_query(percentile_query, {'start': start, 'end': end})
+    percentile_value = list(percentile_value.get_points())[0]['p_size']
+
+    # Loop through each unique switch ID
+    for switch_id in range(1, constants.num_switches + 1):
         query = f"""                                    
             SELECT SUM("size") AS total_count
             FROM flow_stats 
-            WHERE time >= '{start}' AND time <= '{end}' 
+            WHERE time >= $start AND time <= $end 
             AND path =~ /(^|-)({switch_id})(-|$|\b)/
             {dscp_condition}
-            AND "size" <= {percentile_value}
+            AND "size" <= $p_size
         """
 
-        result = constants.apply_query(query)  # Assume this returns a dictionary with 'total_count'
-        
-        # Add the result to the sum dictionary under the switch_id key and dscp key
-        if dscp not in sum:
-            sum[dscp] = {}
-        if switch_id not in sum[dscp]:
-            sum[dscp][switch_id] = {}
-        
-        if not result.raw["series"]:            #if there is no data, set to 0
-            sum[dscp][switch_id]["Byte Sums"] = 0
-        else:
-            sum[dscp][switch_id]["Byte Sums"] = result.raw["series"][0]["values"][0][1]
+        result = constants.apply_query(query, {'start': start, 'end': end, 'p_size': percentile_value})
+        if result.raw["series"]:
+            sums[switch_id] = result.raw["series"][0]["values"][0][1]
 
-    return sum
+    return sums
 
 def calculate_percentages(start, end, switch_data, dscp, dscp_condition):
+    # initialize to all switches as 0, so unused switches are taken into account too
+    for switch_id in range(1, constants.num_switches + 1):
+        switch_data[dscp][switch_id]["Percentage Pkt"] = 0
+
+    if constants.use_sketches:
+        switch_counts = get_scenario_data(start, end).switch_counts(constants.percentile, dscp)
+    else:
+        switch_counts = None
+    if switch_counts is None:
+        switch_counts = get_switch_counts_from_db(start, end, dscp_condition)
+
+    # Calculate the percentage of packets that went to each switch
+    total_count, counts_by_switch = switch_counts
+    for switch_id, switch_count in counts_by_switch.items():
+        switch_data[dscp][switch_id]["Percentage Pkt"] = round((switch_count / total_count) * 100, 2)
+
+    return switch_data
+
+def get_switch_counts_from_db(start, end, dscp_condition):
     percentile_query = f"""
         SELECT PERCENTILE("latency", {constants.percentile}) AS p_latency
         FROM "flow_stats"
-        WHERE time >= '{start}'
-        AND time <= '{end}'
+        WHERE time >= $start
+        AND time <= $end
     """
 
-    flow_percentile_value = constants.apply_query(percentile_query)
+    flow_percentile_value = constants.apply_query(percentile_query, {'start': start, 'end': end})
     flow_percentile_value = list(flow_percentile_value.get_points())[0]['p_latency']
 
     # Get the total count of packets
     query = f"""
         SELECT COUNT("latency") AS total_count
         FROM flow_stats
-        WHERE time >= '{start}' 
-        AND time <= '{end}'
+        WHERE time >= $start 
+        AND time <= $end
         {dscp_condition}
-        AND "latency" <= {flow_percentile_value}
+        AND "latency" <= $p_latency
     """
-    result = constants.apply_query(query)
+    result = constants.apply_query(query, {'start': start, 'end': end, 'p_latency': flow_percentile_value})
     total_count = result.raw["series"][0]["values"][0][1]  # Extract total_count from the result
 
     ############ Get the count of packets that went to each switch
     percentile_query = f"""
         SELECT PERCENTILE("latency", {constants.percentile}) AS p_latency
         FROM "switch_stats"
-        WHERE time >= '{start}'
-        AND time <= '{end}'
+        WHERE time >= $start
+        AND time <= $end
     """
 
-    switch_percentile_value = constants.apply_query(percentile_query)
+    switch_percentile_value = constants.apply_query(percentile_query, {'start': start, 'end': end})
     switch_percentile_value = list(switch_percentile_value.get_points())[0]['p_latency']
 
     query = f"""
         SELECT COUNT("latency") AS switch_count
         FROM switch_stats
-        WHERE time >= '{start}'
-        AND time <= '{end}'
+        WHERE time >= $start
+        AND time <= $end
         {dscp_condition}
-        AND "latency" <= {switch_percentile_value}
+        AND "latency" <= $p_latency
         GROUP BY switch_id
     """
-    result = constants.apply_query(query)
-    
-    # Calculate the percentage of packets that went to each switch
-    # initialize to all switches as 0, so unused switches are taken into account too
-    for switch_id in range(1, constants.num_switches + 1):
-        switch_data[dscp][switch_id]["Percentage Pkt"] = 0
+    result = constants.apply_query(query, {'start': start, 'end': end, 'p_latency': switch_percentile_value})
 
+    counts_by_switch = {}
     for row in result.raw["series"]:
         #tuple pair: id, count
         switch_id = int(row["tags"]["switch_id"])
-        switch_count = int(row["values"][0][1])
-        switch_data[dscp][switch_id]["Percentage Pkt"] = round((switch_count / total_count) * 100, 2)
+        counts_by_switch[switch_id] = int(row["values"][0][1])
 
-    return switch_data
+    return total_count, counts_by_switch
 
 def get_mean_standard_deviation(switch_data, dscp):
     sum_percentage = 0
@@ -215,109 +242,6 @@ def write_INT_results(sheet, AVG_flows_latency, STD_flows_latency, AVG_hop_laten
     sheet[f'E{last_line + 2}'] = dscp
     sheet[f'E{last_line + 3}'] = dscp
 
-def set_pkt_loss():
-    # To all sheets set pkt loss in the raw data area for all iterations
-
-    # Configure each sheet  
-    workbook = load_workbook(constants.final_file_path)
-
-    # Set formula for each sheet
-    for sheet in workbook.sheetnames:
-        sheet = workbook[sheet]
-
-        #Set new headers
-        sheet['M1'] = "Packet Loss"
-        sheet['N1'] = "Packet Loss (%)"
-
-        sheet['M1'].font = Font(bold=True)
-        sheet['N1'].font = Font(bold=True)
-
-        no_formula_section = False
-
-        for row in sheet.iter_rows(min_row=2, max_row=constants.last_line_raw_data[sheet.title], min_col=1, max_col=3):
-            if row[0].value == "Calculations":
-                break
-
-            if row[0].value and row[0].value.startswith("Iteration -"):
-                no_formula_section = False
-            if no_formula_section:
-                continue
-
-            #if cell from collumn A does not contain an IPv6 address, skip
-            if row[0].value is None or ":" not in row[0].value:
-                skip = True
-                continue
-            if skip:            #not in the right line of the pair
-                skip = False
-                continue
-            
-            # get value from collumn G, line row[0].row-1
-            pkts_received = sheet[f'G{row[0].row-1}'].value
-            pkts_sent = sheet[f'G{row[0].row}'].value
-            
-            if pkts_received is None or pkts_sent is None:      #Skip the SRv6 area
-                continue
-
-            # Set the formula, pkt loss, -1 is sender, 0 is receiver
-            pkt_loss = pkts_received - pkts_sent
-            sheet[f'M{row[0].row}'] = pkt_loss   
-            sheet[f'N{row[0].row}'] = round((pkt_loss/pkts_sent)*100, 2)
-
-            skip = True
-
-    # Save the workbook
-    workbook.save(constants.final_file_path)
-
-def set_fist_pkt_delay():
-    # Configure each sheet
-    workbook = load_workbook(constants.final_file_path)
-    
-    # Set formula for each sheet
-    for sheet in workbook.sheetnames:
-        sheet = workbook[sheet]
-
-        #Set new headers as bold text
-        sheet['O1'] = "1º Packet Delay (nanoseconds)"
-        sheet['O1'].font = Font(bold=True)
-
-        no_formula_section = False
-        
-        # Set collumn L to contain a formula to be the subtraction of values of collum F of the current pair of lines
-        for row in sheet.iter_rows(min_row=2, max_row=constants.last_line_raw_data[sheet.title], min_col=1, max_col=3):
-            if row[0].value == "Calculations":
-                break
-
-            if row[0].value and row[0].value.startswith("Iteration -"):
-                no_formula_section = False
-            if no_formula_section:
-                continue
-
-            #if cell from collumn A does not contain an IPv4 address, skip
-            if row[0].value is None or ":" not in row[0].value:
-                skip = True
-                continue
-            if skip:            #not in the right line of the pair
-                skip = False
-                continue
-            #print(row)
-            
-            # Set the formula, pkt loss, -1 is sender, 0 is receiver
-            # The values are 2 Timestamp (seconds-Unix Epoch)
-            # subtraction give seconds, we convert to nanoseconds
-            first_pkt_sent = sheet[f'H{row[0].row-1}'].value
-            first_pkt_received = sheet[f'H{row[0].row}'].value
-
-            if first_pkt_received is None or first_pkt_sent is None:      #Skip the SRv6 area
-                continue
-
-            first_pkt_delay = first_pkt_received - first_pkt_sent
-            sheet[f'O{row[0].row}'] = round(first_pkt_delay*1000000000, 2)  
-
-            skip = True
-
-    # Save the workbook
-    workbook.save(constants.final_file_path)
-
 def set_caculation_formulas(workbook, sheet_name, dscp, scenario_DSCPs):
 
     if dscp == -1:
@@ -326,7 +250,6 @@ def set_caculation_formulas(workbook, sheet_name, dscp, scenario_DSCPs):
         title = f"Calculations For Flows with DSCP = {dscp}"
 
     sheet = workbook[sheet_name]
-    last_line_raw_data_sheet = constants.last_line_raw_data[sheet_name]
 
     #Pass the last line with data, and leave 2 empty lines
     last_line = sheet.max_row + 4
@@ -361,102 +284,88 @@ def set_caculation_formulas(workbook, sheet_name, dscp, scenario_DSCPs):
 
 
     #-----------------------------------------------------------------------------------------------------Calculations
-    avg_collunm_I = constants.get_collumn_average_per_dscp(sheet, last_line_raw_data_sheet, "D", dscp, "I", scenario_DSCPs)
-    avg_collunm_M = constants.get_collumn_average_per_dscp(sheet, last_line_raw_data_sheet, "D", dscp, "M", scenario_DSCPs)
-    avg_collunm_N = constants.get_collumn_average_per_dscp(sheet, last_line_raw_data_sheet, "D", dscp, "N", scenario_DSCPs)
-    avg_collunm_O = constants.get_collumn_average_per_dscp(sheet, last_line_raw_data_sheet, "D", dscp, "O", scenario_DSCPs)
-    avg_collunm_K = constants.get_collumn_average_per_dscp(sheet, last_line_raw_data_sheet, "D", dscp, "K", scenario_DSCPs)
-
-    sheet[f'B{last_line + 1}'] = avg_collunm_I
-    sheet[f'B{last_line + 2}'] = avg_collunm_M
-    sheet[f'B{last_line + 3}'] = avg_collunm_N
-    sheet[f'B{last_line + 4}'] = avg_collunm_O
-    sheet[f'B{last_line + 5}'] = avg_collunm_K
-    sheet[f'B{last_line + 6}'] = constants.aux_calculated_results[sheet_name][dscp]["std_jitter"]       #array formuals are not working, so we calculated and set the value here
+    # calculated on the flows of the sheet (constants.calculate_statistics), the workbook only shows them
+    sheet[f'B{last_line + 1}'] = constants.get_collumn_average_per_dscp(sheet_name, "num_out_of_order_pkt", dscp)
+    sheet[f'B{last_line + 2}'] = constants.get_collumn_average_per_dscp(sheet_name, "packet_loss", dscp)
+    sheet[f'B{last_line + 3}'] = constants.get_collumn_average_per_dscp(sheet_name, "packet_loss_pct", dscp)
+    sheet[f'B{last_line + 4}'] = constants.get_collumn_average_per_dscp(sheet_name, "first_pkt_delay", dscp)
+    sheet[f'B{last_line + 5}'] = constants.get_collumn_average_per_dscp(sheet_name, "avg_jitter", dscp)
+    sheet[f'B{last_line + 6}'] = constants.get_collumn_average_per_dscp(sheet_name, "std_jitter", dscp)
 
 
 def get_avg_stdev_flow_hop_latency(start, end, dscp_condition):
     ############################################ Get the results from the DB
     # We need AVG Latency of ALL flows combined (NOT distinguishing between flows)
-    # Query to get the 95th percentile latency value, to exclude outliers
-    percentile_query = f"""
-        SELECT PERCENTILE("latency", {constants.percentile}) AS p_latency
-        FROM flow_stats
-        WHERE time >= '{start}'
-        AND time <= '{end}'
-        {dscp_condition}
-    """
-    percentile_result = constants.apply_query(percentile_query)
-    p_latency = list(percentile_result.get_points())[0]['p_latency']                #nanoseconds
+    # Get the 95th percentile latency value, to exclude outliers
+    p_latency = constants.get_percentile("latency", constants.percentile, "flow_stats", start, end, dscp_condition)   #nanoseconds
 
     query = f"""
                 SELECT MEAN("latency"), STDDEV("latency")
                 FROM  flow_stats
-                WHERE time >= '{start}'
-                AND time <= '{end}'
-                AND "latency" <= {p_latency}
+                WHERE time >= $start
+                AND time <= $end
+                AND "latency" <= $p_latency
                 {dscp_condition}
             """
-    result = constants.apply_query(query)
+    result = constants.apply_query(query, {'start': start, 'end': end, 'p_latency': p_latency})
     AVG_flows_latency = round(result.raw["series"][0]["values"][0][1], 2)           #nanoseconds
     STD_flows_latency = round(result.raw["series"][0]["values"][0][2], 2)
 
     ###########################################
     # We need AVG Latency for processing of ALL packets (NOT distinguishing between switches/flows) 
-    # Query to get the 95th percentile latency value, to exclude outliers
-    percentile_query = f"""
-        SELECT PERCENTILE("latency", {constants.percentile}) AS p_latency
-        FROM switch_stats
-        WHERE time >= '{start}'
-        AND time <= '{end}'
-        {dscp_condition}
-    """
-    percentile_result = constants.apply_query(percentile_query)
-    p_latency = list(percentile_result.get_points())[0]['p_latency']                #nanoseconds
+    # Get the 95th percentile latency value, to exclude outliers
+    p_latency = constants.get_percentile("latency", constants.percentile, "switch_stats", start, end, dscp_condition)  #nanoseconds
     
     query = f"""
                 SELECT MEAN("latency"), STDDEV("latency")
                 FROM  switch_stats
-                WHERE time >= '{start}'
-                AND time <= '{end}'
-                AND "latency" <= {p_latency}
+                WHERE time >= $start
+                AND time <= $end
+                AND "latency" <= $p_latency
                 {dscp_condition}
             """
-    result = constants.apply_query(query)
+    result = constants.apply_query(query, {'start': start, 'end': end, 'p_latency': p_latency})
     AVG_hop_latency = round(result.raw["series"][0]["values"][0][1], 2)             #nanoseconds
     STD_hop_latency = round(result.raw["series"][0]["values"][0][2], 2)         
 
     return AVG_flows_latency, STD_flows_latency, AVG_hop_latency, STD_hop_latency
 
-def set_INT_results(workbook, sheet_name, dscp, i):
-
-    #can i can not exceed the number of args.f (last one is comparasions)
-    if i >= len(constants.args.f):
-        return
+def get_INT_results(start, end, dscp):
+    # Values of the DB of the INT results of a DSCP: latencies of the flows and hops, and the per switch data
 
     if dscp == -1:
         dscp_condition = ""
     else:
         dscp_condition = f"AND dscp = \'{dscp}\'"
-    
-    print(f"Processing sheet {sheet_name},\t index {i},\t for dscp {dscp}")
-    sheet = workbook[sheet_name]
-
-    # Get the start and end times
-    start = constants.args.start[i]
-    end = constants.args.end[i]
-
-    # Add pair to the dictionary
-    constants.start_end_times[sheet_name] = (start, end)
 
     #get the flow and hop latency, for the given dscp, that includes all flows and switches
-    AVG_flows_latency, STD_flows_latency, AVG_hop_latency, STD_hop_latency = get_avg_stdev_flow_hop_latency(start, end, dscp_condition)
+    latencies = get_avg_stdev_flow_hop_latency(start, end, dscp_condition)
 
     # % of packets that went to each individual switch (switch_id)
     switch_data = get_byte_sum(start, end, dscp, dscp_condition)
     switch_data = calculate_percentages(start, end, switch_data, dscp, dscp_condition)
     switch_data = get_mean_standard_deviation(switch_data, dscp)
 
+    return latencies, switch_data
+
+def calculate_INT_results(sheet_name, start, end):
+    # INT results of every DSCP of the scenario of the sheet, before the workbook is written (on a worker with --jobs)
+    scenario = sheet_name.split("-")[0]
+    print(f"Querying INT results of sheet {sheet_name}")
+    constants.INT_results[sheet_name] = {dscp: get_INT_results(start, end, dscp) for dscp in constants.DSCP_per_scenario[scenario]}
+
+def set_INT_results(workbook, sheet_name, dscp, i):
+
+    #can i can not exceed the number of args.f (last one is comparasions)
+    if i >= len(constants.args.f):
+        return
+
+    print(f"Processing sheet {sheet_name},\t index {i},\t for dscp {dscp}")
+    sheet = workbook[sheet_name]
+
+    # Already queried by calculate_INT_results()
+    (AVG_flows_latency, STD_flows_latency, AVG_hop_latency, STD_hop_latency), switch_data = constants.INT_results[sheet_name][dscp]
+
     write_INT_results(sheet, AVG_flows_latency, STD_flows_latency, AVG_hop_latency, STD_hop_latency, dscp)
     write_INT_results_switchID(sheet, switch_data, dscp)
 
@@ -539,10 +448,6 @@ def set_compare_non_Emergency_to_Emergency_variation():
 
 def configure_final_file():
 
-    # Raw data area
-    set_pkt_loss()
-    set_fist_pkt_delay()
-    
     # Calculations area for each dscp 
     set_caculation_section()
 
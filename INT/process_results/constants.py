@@ -3,9 +3,13 @@
 import os
 import pprint
 import sys
-from influxdb import InfluxDBClient
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from sketch_queries import SKETCH_MEASUREMENTS, get_latency_sketch
+from influx_query import get_influx_query
+from results_frame import dscp_statistics
+
 
 headers_lines = ["AVG Out of Order Packets (Nº)", "AVG Packet Loss (Nº)", "AVG Packet Loss (%)", 
                 "AVG 1º Packet Delay (nanoseconds)", 
@@ -57,21 +61,26 @@ parent_path = os.path.abspath(os.path.join(current_directory, ".."))
 results_path = os.path.join(parent_path, result_directory) 
 final_file_path = os.path.join(results_path, final_file) 
 images_path = os.path.join(results_path, directory_images)
+parquet_path = os.path.join(results_path, "parquet")          #flows and SRv6 operations of each sheet (results_frame.py)
 
 # Create the directory if it doesn't exist
 os.makedirs(images_path, exist_ok=True)
 os.makedirs(results_path, exist_ok=True)
 
 args = None
-results = {}
+results_frames = {}         #sheet name -> DataFrame of its flows, one line per flow and iteration (results_frame.aggregate_flows)
+SRv6_frames = {}            #sheet name -> DataFrame of its SRv6 operations
+SRv6_operations = []        #SRv6 operations of the file being read
 percentile = 95             #percentile % to  filter out values, NOT USED EVERYWHERE YET
+use_sketches = True         #latency percentiles from the sketches written by the collector (falls back to PERCENTILE() if there are none)
+use_switch_bytes = True     #per switch byte sums from switch_bytes/flow_bytes written by the collector (falls back to the regex on flow_stats.path if there are none)
 num_switches = 14           #switches ids go from 1 to 14
 
 # Define DB connection parameters
 host='localhost'
 dbname='int'
-# Connect to the InfluxDB client
-client = InfluxDBClient(host=host, database=dbname)
+# Shared InfluxDB client, its connections are kept alive for all the queries of the run
+client = get_influx_query(host=host, database=dbname)
 
 algorithms = None
 test_scenarios = None
@@ -82,6 +91,8 @@ script_dir = os.path.dirname(os.path.realpath(__file__))
 filename_with_sizes = os.path.join(script_dir, "multicast_DSCP.json")
 DSCP_IPs = None
 
+flow_table = {}                     #flows of the checkpoint of the collector's flow table (--flow_table), (src_ip, dst_ip, flow_label) -> entry
+
 DSCP_per_scenario = {               # Dictionary with DSCP values used on each scenario
     "MEDIUM":[-1, 0, 34, 35],
     "HIGH":[-1, 0, 34, 35],
@@ -91,108 +102,71 @@ DSCP_per_scenario = {               # Dictionary with DSCP values used on each s
 
 start_end_times = {} # Dictionary with start and end times for each scenariọ-algorithm pair
 
-aux_calculated_results = {}         #auxiliar dictionary to store calculated results before writing in the final file
+scenario_switch_data = {}           #(start, end) -> ScenarioSwitchData, byte counts and latency sketches of all the switches and DSCPs of a scenario
+
+statistics = {}                     #sheet name -> DataFrame with the values of its calculations area, indexed by DSCP (results_frame.dscp_statistics)
+
+INT_results = {}                    #sheet name -> {dscp: ((AVG/STD flows latency, AVG/STD hop latency), switch data)} (configure.calculate_INT_results)
+
+CDF_images = {}                     #scenario -> paths of its CDF images, None for the ones without data (graphs.render_CDFs)
 
-def apply_query(query):
+stage_times = {}                    #stage of the pipeline (load, join, aggregate, ...) -> seconds, of all the files
+
+def apply_query(query, params=None, epoch=None):
     global client
     try:
-        # Execute the query
-        result = client.query(query)
+        # Execute the query, the values in params are bound to the $name references of the query
+        result = client.query(query, params, epoch=epoch)
     except Exception as error:
         # handle the exception
         print("An exception occurred:", error)
     return result
 
-def get_full_variable_data_from_db(variable, percentile, table, start_time, end_time):
-    
+def get_percentile(variable, percentile, table, start_time, end_time, dscp_condition=""):
+    # Percentile of a variable in the time range, from the merged sketches if available (latency only), else with PERCENTILE()
+    if use_sketches and variable == "latency" and table in SKETCH_MEASUREMENTS:
+        sketch = get_latency_sketch(apply_query, table, start_time, end_time, dscp_condition)
+        if sketch.count > 0:
+            return sketch.percentile(percentile)
+
     percentile_query = f"""
         SELECT PERCENTILE("{variable}", {percentile}) AS p_latency
         FROM {table}
-        WHERE time >= '{start_time}'
-        AND time <= '{end_time}'
+        WHERE time >= $start
+        AND time <= $end
+        {dscp_condition}
     """
-    percentile_result = apply_query(percentile_query)
-    p_latency = list(percentile_result.get_points())[0]['p_latency']
+    percentile_result = apply_query(percentile_query, {'start': start_time, 'end': end_time})
+    return list(percentile_result.get_points())[0]['p_latency']
+
+def get_full_variable_data_from_db(variable, percentile, table, start_time, end_time):
+    
+    p_latency = get_percentile(variable, percentile, table, start_time, end_time)
 
     query = f"""
                 SELECT "{variable}"
                 FROM {table}
-                WHERE time >= '{start_time}'
-                AND time <= '{end_time}'
-                AND "{variable}" <= {p_latency}
+                WHERE time >= $start
+                AND time <= $end
+                AND "{variable}" <= $p_latency
             """
-    result = apply_query(query)
+    result = apply_query(query, {'start': start_time, 'end': end_time, 'p_latency': p_latency})
 
     # Extracting just the values, ignoring the timestamps
     full_data = [entry[1] for entry in result.raw["series"][0]["values"]]
 
     return full_data
 
-def get_collumn_average_per_dscp(sheet, last_line_raw_data_sheet, dscp_collumn_letter, dscp_target, data_collumn_letter, scenario_DSCPs):
-    # Get lines from 2 to last_line_raw_data_sheet
-    
-    values = []
-    for i in range(2, last_line_raw_data_sheet + 1):
-        # Get the value of the cell
-        dscp_value = sheet[f'{dscp_collumn_letter}{i}'].value
-        data_value = sheet[f'{data_collumn_letter}{i}'].value
-
-        # Check if the dscp_cell is not empty, and we are not at wrong variable are
-        if dscp_value not in scenario_DSCPs or data_value is None:  
-            continue
-
-        if dscp_target == dscp_value or dscp_target == -1:                    # -1 means all DSCP
-            values.append(data_value)   
-
-    if len(values) == 0:
-        print(f"Warning: No values found for DSCP {dscp_target} in column {data_collumn_letter}, sheet.title: {sheet.title}")
+def get_collumn_average_per_dscp(sheet_name, column, dscp_target):
+    # Value of a column of the calculations area (results_frame.AVERAGED_COLUMNS or std_jitter), for a DSCP (-1 means all DSCP)
+    sheet_statistics = statistics[sheet_name]
+    if dscp_target not in sheet_statistics.index or np.isnan(sheet_statistics.at[dscp_target, column]):
+        print(f"Warning: No values found for DSCP {dscp_target} in column {column}, sheet.title: {sheet_name}")
         sys.exit(1)
-        
-    # Apply percentile
-    percentile_values = np.percentile(values, percentile)
 
-    # Filter the values with the percentile value
-    values = np.array(values)
-    values = values[values <= percentile_values]
-    
-    # Calculate the average
-    return round(np.mean(values), 2)
-
-def calulate_std_jitter_per_dscp(current_filename):
-    global aux_calculated_results, results, percentile
-    scenario_algorithms = current_filename.split("_")[0]
-
-    aux_calculated_results[scenario_algorithms] = {}
-    aux_calculated_results[scenario_algorithms][-1] = {}                 #initialize the dictionary entry to store the avg_jitters for all DSCP
-    aux_calculated_results[scenario_algorithms][-1]["avg_jitters"] = []
-
-    # Group all the avg_jitters by DSCP
-    for iteration, iteration_values in results.items():
-        for flow, flow_values in iteration_values.items():
-            if flow == "SRv6_Operations":                                #skip the SRv6_Operations data for the current iteration
-                continue
-            dscp = flow_values["DSCP"]
-            current_avg_jitter = flow_values["receiver"]["extra"]["avg_jitter"]      #get avg_jitter of current jitter
-
-            if dscp not in aux_calculated_results[scenario_algorithms]:
-                aux_calculated_results[scenario_algorithms][dscp] = {}
-                aux_calculated_results[scenario_algorithms][dscp]["avg_jitters"] = []
-            
-            aux_calculated_results[scenario_algorithms][-1]["avg_jitters"].append(current_avg_jitter)
-            aux_calculated_results[scenario_algorithms][dscp]["avg_jitters"].append(current_avg_jitter)
-
-    # Calculate the std of the avg_jitters
-    for dscp, dscp_values in aux_calculated_results[scenario_algorithms].items():
-        avg_jitters = dscp_values["avg_jitters"]
-        
-        # Calculate the std of the avg_jitters, 2 decimal places, and applying a percentile
-        avg_jitters = np.array(avg_jitters)
-        avg_jitters_percentile_value = np.percentile(avg_jitters, percentile)
-        
-        # Filter the avg_jitters with the percentile value
-        avg_jitters_filtered = avg_jitters[avg_jitters <= avg_jitters_percentile_value]
-        if len(avg_jitters_filtered) > 2:              #Only apply percentile if we have more than 2 values
-            avg_jitters = avg_jitters_filtered
-
-        std_jitter = round(np.std(avg_jitters), 2)
-        aux_calculated_results[scenario_algorithms][dscp]["std_jitter"] = std_jitter
+    return float(sheet_statistics.at[dscp_target, column])
+
+def calculate_statistics(sheet_name):
+    # Averages and STD of the jitter of the flows of the sheet, for each DSCP of its scenario, all at once
+    scenario = sheet_name.split("-")[0]
+    statistics[sheet_name] = dscp_statistics(results_frames[sheet_name], DSCP_per_scenario[scenario], percentile)
@@ -1,26 +1,47 @@
 import os
+import numpy as np
 from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font
 
 import constants
+from results_frame import RAW_DATA_COLUMNS
+
+COUNT_COLUMNS = ["sender_num_pkt", "receiver_num_pkt", "num_out_of_order_pkt", "max_reorder_extent", "packet_loss"]      #written without decimals when they have none
+
+def cell_value(flow, column):
+    # Value of a column of the flows frame as a cell, None if missing
+    value = getattr(flow, column)
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return None
+        if column in COUNT_COLUMNS and float(value).is_integer():
+            return int(value)
+        return float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+def flow_lines(flow):
+    # Sender and receiver lines of a flow, () if it has no sender/receiver
+    OG_line = [flow.src_ip, flow.dst_ip, cell_value(flow, "flow_label"), cell_value(flow, "dscp"), cell_value(flow, "size")]
+
+    if cell_value(flow, "sender_num_pkt") is not None:
+        line_s = OG_line + ["sender", cell_value(flow, "sender_num_pkt"), cell_value(flow, "sender_time")]
+    else:
+        print(f"Sender not found in iteration {flow.iteration} flow {(flow.src_ip, flow.dst_ip, flow.flow_label)}")
+        line_s = ()
 
+    if cell_value(flow, "num_hosts") is not None:
+        line_r = OG_line + ["receiver"] + [cell_value(flow, column) for _, column in RAW_DATA_COLUMNS[6:11]]
+        if cell_value(flow, "packet_loss") is not None:                    #packet loss and 1º packet delay, with a sender only
+            line_r += [None] + [cell_value(flow, column) for _, column in RAW_DATA_COLUMNS[12:]]
+    else:
+        print(f"Receiver not found in iteration {flow.iteration} flow {(flow.src_ip, flow.dst_ip, flow.flow_label)}")
+        line_r = ()
 
+    return line_s, line_r
 
-def extract_Is_values(line, iteration, flow, Is):
-    line = line + [Is]
-    # Is values, all in the current line
-    for key, Is_value in constants.results[iteration][flow][Is].items():
-        if key == "extra":
-            for key, value in Is_value.items():
-                line = line + [value]
-        else:
-            if key == "num_hosts":          #skip the num_hosts for final file
-                continue
-            line = line + [Is_value]
-
-    return line
-
-def export_SRv6_rules(sheet, iteration):
+def export_SRv6_rules(sheet, operations):
     sheet.append([""])
 
     # Add the "SRv6 Operations" header
@@ -38,12 +59,8 @@ def export_SRv6_rules(sheet, iteration):
         cell.font = Font(bold=True)
 
     # Add the SRv6 operations
-    for operation in constants.results[iteration]["SRv6_Operations"]:
-        new_next_row = sheet.max_row + 1
-        rule_src_IP = operation["rule"]["srcIP"]
-        rule_dst_IP = operation["rule"]["dstIP"]
-        rule_flow_label = operation["rule"]["flow_label"]
-        line = [operation["timestamp"], operation["operation"], operation["responsible_switch"], rule_src_IP, rule_dst_IP, rule_flow_label]
+    for operation in operations.itertuples(index=False):
+        line = [operation.timestamp, operation.operation, int(operation.responsible_switch), operation.src_ip, operation.dst_ip, int(operation.flow_label)]
         sheet.append(line)
 
     sheet.append([""])
@@ -68,13 +85,15 @@ def export_raw_results(OG_file):
         sheet.title = sheet_name
     
     # Write the header
-    header = ["Flow src", "Flow dst", "Flow Label", "DSCP", "Packet Size (Bytes)", "Is", "Nº of packets", "1º Packet Timestamp(seconds)", "Nº of out of order packets", "Out of order packets", "AVG Flow Jitter (nanoseconds)"]
-    for col_num, value in enumerate(header, 1):
-        cell = sheet.cell(row=1, column=col_num, value=value)
-        cell.font = Font(bold=True)
-
-    # Write results, iteration by iteration
-    for iteration in constants.results:
+    for col_num, (value, _) in enumerate(RAW_DATA_COLUMNS, 1):
+        if value is not None:
+            cell = sheet.cell(row=1, column=col_num, value=value)
+            cell.font = Font(bold=True)
+
+    # Write results, iteration by iteration, from the flows of the sheet (rendering only, nothing is calculated here)
+    flows = constants.results_frames[sheet_name]
+    SRv6_operations = constants.SRv6_frames[sheet_name]
+    for iteration, iteration_flows in flows.groupby("iteration", sort=False):
         
         # Write key
         sheet.append([f""])
@@ -84,39 +103,17 @@ def export_raw_results(OG_file):
         cell.font = Font(bold=True)
 
         # Flow by flow
-        for flow in constants.results[iteration]:
-            if flow == "SRv6_Operations":                                #skip the SRv6_Operations data for the current iteration
-                continue
-            
-            keys = list(constants.results[iteration][flow].keys())
-
-            DSCP = constants.results[iteration][flow]["DSCP"]
-            pkt_size =  constants.results[iteration][flow]["Packet Size"]
-
-            # Check if both types of Is are keys in the dictionary
-            if "sender" in keys:
-                OG_line = list(flow) + [DSCP, pkt_size]
-                line_s = extract_Is_values(OG_line, iteration, flow, "sender")    
-            else:
-                print(f"Sender not found in iteration {iteration} flow {flow}")
-                # empty tuple
-                line_s = ()
-
-
-            if "receiver" in keys:
-                OG_line = list(flow) + [DSCP, pkt_size]
-                line_r = extract_Is_values(OG_line, iteration, flow, "receiver")
-            else:
-                print(f"Receiver not found in iteration {iteration} flow {flow}")
-                line_r = ()
+        for flow in iteration_flows.itertuples(index=False):
+            line_s, line_r = flow_lines(flow)
 
             # Is by Is, sender must be the 1º
             sheet.append(line_s)
             sheet.append(line_r)
         
         # Write the SRv6 operations of this Iteration if they exist
-        if "SRv6_Operations" in constants.results[iteration]:
-            export_SRv6_rules(sheet, iteration)
+        iteration_operations = SRv6_operations[SRv6_operations["iteration"] == iteration]
+        if len(iteration_operations) > 0:
+            export_SRv6_rules(sheet, iteration_operations)
 
         # Store the last line of raw data for the current sheet
         constants.last_line_raw_data[sheet_name] = sheet.max_row
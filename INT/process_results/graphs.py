@@ -2,7 +2,6 @@ import os
 import pprint
 import sys
 import tempfile
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from PIL import Image as PILImage, ImageDraw, ImageFont
@@ -12,6 +11,7 @@ from openpyxl.utils import get_column_letter
 
 
 import constants
+from results_frame import RAW_DATA_COLUMNS
 
 def create_CDF(image_path, data, labels, xlabel, ylabel, x_min, x_max, title):
     # Create directory if it doesn't exist
@@ -39,7 +39,8 @@ def create_CDF(image_path, data, labels, xlabel, ylabel, x_min, x_max, title):
     plt.close()  # Close the figure to free up memory
 
 
-def create_CDF_graphs(sheet, datas, title, xlabel, ylabel, variable_name, position_image_x, position_image_y):
+def create_CDF_graphs(datas, title, xlabel, ylabel, variable_name):
+    # Renders the CDF image, returns its path (None without data), the images are added to the sheet by create_graphs()
     print(f"Creating CDF with title: {title}...")
     image_path = constants.images_path + "/" + title + ".png"
     #remove from the path any presnece of ":"
@@ -95,14 +96,16 @@ def create_CDF_graphs(sheet, datas, title, xlabel, ylabel, variable_name, positi
         image_collection.save(temp_file_path)
     '''
 
-    # Create an openpyxl Image object from the temporary file
+    return image_path
+
+def add_CDF_image(sheet, image_path, position_image_x, position_image_y):
+    # Create an openpyxl Image object from the image file
     openpyxl_image = Image(image_path)
     openpyxl_image.anchor = f'{get_column_letter(position_image_x)}{position_image_y}'  # Position the image in the sheet
     sheet.add_image(openpyxl_image)
 
-    return 0
-
-def from_excel_data(sheet, current_scenario, position_image_x, position_image_y):
+def from_excel_data(current_scenario):
+    image_paths = []
     x_label = ""
     for current_collunm_index in constants.index_of_headers_to_do_CDF_out_of_raw_values:            
         datas = []
@@ -113,15 +116,9 @@ def from_excel_data(sheet, current_scenario, position_image_x, position_image_y)
         for current_algorithm in constants.algorithms:
             current_sheet_name = current_scenario + "-" + current_algorithm
 
-            # Read the Excel file. VERY CONSUMING
-            current_data = pd.read_excel(constants.final_file_path, sheet_name=current_sheet_name, header=None)
-
-            # Get collumn by index
-            current_data = current_data.iloc[:, current_collunm_index]
-            current_data = current_data.dropna().values                       # Remove empty values
-            variable_name = current_data[0]                                   # Get the first value of the column
-
-            current_data = current_data[1:]                                   # Remove the first row (header)
+            # Same values as the collumn of the sheet, from the flows of the sheet instead of reading the Excel file back
+            variable_name, column = RAW_DATA_COLUMNS[current_collunm_index]
+            current_data = constants.results_frames[current_sheet_name][column].dropna().values      # Remove empty values
 
             # Apply percentile
             percentile_value = np.percentile(current_data, constants.percentile)
@@ -131,13 +128,12 @@ def from_excel_data(sheet, current_scenario, position_image_x, position_image_y)
 
         # Create CDF graphs
         title = f"{current_scenario}: {variable_title}"
-        res = create_CDF_graphs(sheet, datas, title, x_label, "Probability", variable_name, position_image_x, position_image_y)
-        if res is not None:
-            position_image_x += 10      # Move right for each algorithm
+        image_paths.append(create_CDF_graphs(datas, title, x_label, "Probability", variable_name))
     
-    return position_image_x
+    return image_paths
 
-def from_db_data(sheet, current_scenario, position_image_x, position_image_y):
+def from_db_data(current_scenario):
+    image_paths = []
     x_label = "Nanoseconds"
 
     for current_table, current_values in constants.variables_to_do_CDF_out_of_db_values.items():    
@@ -161,11 +157,14 @@ def from_db_data(sheet, current_scenario, position_image_x, position_image_y):
 
             # Create CDF graphs
             title = f"{current_scenario}: {title1}"
-            res = create_CDF_graphs(sheet, datas, title, x_label, "Probability", current_variable, position_image_x, position_image_y)
-            if res is not None:
-                position_image_x += 10      # Move right for each algorithm
+            image_paths.append(create_CDF_graphs(datas, title, x_label, "Probability", current_variable))
     
-    return position_image_x
+    return image_paths
+
+def render_CDFs(current_scenario):
+    # CDF images of a scenario (all its algorithms), in the order they go in the sheet (on a worker with --jobs)
+    print(f"Creating CDF plots for scenario {current_scenario}...")
+    return from_excel_data(current_scenario) + from_db_data(current_scenario)
 
 def create_graphs():
     workbook = load_workbook(constants.final_file_path)
@@ -174,10 +173,15 @@ def create_graphs():
 
     # Get data and create graph for 3 algorithms for each scenario for each variable
     for current_scenario in constants.test_scenarios:
-        print(f"Creating CDF plots for scenario {current_scenario}...")
+        # Rendered already by the workers with --jobs
+        if current_scenario not in constants.CDF_images:
+            constants.CDF_images[current_scenario] = render_CDFs(current_scenario)
+
         position_image_x = 1
-        position_image_x = from_excel_data(sheet, current_scenario, position_image_x, position_image_y)
-        position_image_x = from_db_data(sheet, current_scenario, position_image_x, position_image_y)
+        for image_path in constants.CDF_images[current_scenario]:
+            if image_path is not None:
+                add_CDF_image(sheet, image_path, position_image_x, position_image_y)
+                position_image_x += 10      # Move right for each algorithm
         position_image_y += 23          # Move down for each scenario 
 
     # Save the workbook
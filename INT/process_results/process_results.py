@@ -1,14 +1,27 @@
 import argparse
 import ast
-import csv
 import json
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 
 
-import constants, export, configure
+import constants, export, configure, graphs, results_frame
+from srv6_registry import OPERATION_CREATED, OPERATION_REMOVED, read_journal
+from flow_table import flow_key, read_checkpoints
+from influx_query import InfluxQuery
+
+#With --jobs N the files (scenario-algorithm sheets) and then the scenarios are processed on a pool of N processes:
+#   sheets:   load/join/aggregate of the CSV, SRv6 operations, statistics, Parquet store and the INT results of the DB, per file
+#   images:   CDF images of each scenario (all its algorithms), rendered while the main process writes the raw results
+#   workbook: written only by the main process, out of what the workers returned, final_results.xlsx is the same as with --jobs 1
+#Each task has its own InfluxDB client, its stage times and query stats are added to the ones of the run
+
+WORKER_CONSTANTS = ["args", "flow_table", "algorithms", "test_scenarios", "start_end_times"]
 
 def adjust_columns_width():
     print(f"Adjusting columns width for all sheets")
@@ -37,21 +50,109 @@ def read_json(file_path):
         data = json.load(file)
     return data
 
+@contextmanager
+def stage(name, times=None):
+    # Times a stage of the pipeline, added up over all the files (and workers), or in the given dictionary
+    times = constants.stage_times if times is None else times
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        times[name] = times.get(name, 0) + time.perf_counter() - start
+
+def print_stage_times(wall_times):
+    added_up = "added up over the files and workers" if constants.args.jobs > 1 else "added up over the files"
+    print(f"Stages ({added_up}): " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in constants.stage_times.items()))
+    print(f"Wall time ({constants.args.jobs} jobs): " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in wall_times.items()))
+
+def init_worker(values):
+    # Same constants of the run on each worker of the pool (it may spawn them instead of forking)
+    for name, value in values.items():
+        setattr(constants, name, value)
+
+def run_task(function, task_args):
+    # On a worker: the task with its own InfluxDB client, returned with its stage times and query stats
+    constants.stage_times = {}
+    constants.client = InfluxQuery(constants.host, database=constants.dbname)
+    try:
+        result = function(*task_args)
+    finally:
+        constants.client.close()
+    return result, constants.stage_times, constants.client.stats()
+
+def task_results(futures):
+    # Results of the tasks in order, their stage times and queries added to the ones of the run
+    results = []
+    for future in futures:
+        result, stage_times, query_stats = future.result()
+        for name, seconds in stage_times.items():
+            constants.stage_times[name] = constants.stage_times.get(name, 0) + seconds
+        constants.client.merge_stats(query_stats)
+        results.append(result)
+    return results
+
+def get_flows_size_dscp(flows, start, end):
+    """
+    DSCP and packet size of all the flows of a scenario: the checkpoint of the flow table first, then one query
+    for the rest (the last report of each flow in the time range), and get_pkt_size_dscp() for the ones still missing.
+
+    :param flows: Set of (src_ip, dst_ip, flow_label).
+    :param start: Start of the scenario (RFC3339).
+    :param end: End of the scenario (RFC3339).
+    :return: Dictionary flow -> (dscp, size), (-1, -1) for the flows not found.
+    """
+    flows_info = {}
+    for flow in flows:
+        entry = constants.flow_table.get(flow_key(*flow))
+        if entry is not None:
+            flows_info[flow] = (entry['dscp'], entry['size'])
+
+    missing = {flow_key(*flow): flow for flow in flows if flow not in flows_info}
+    if missing:
+        query = """
+            SELECT LAST("size") AS size
+            FROM flow_stats
+            WHERE time >= $start
+            AND time <= $end
+            GROUP BY "src_ip", "dst_ip", "flow_label", "dscp"
+        """
+        result = constants.apply_query(query, {'start': start, 'end': end}, epoch='ns')
+
+        last_seen = {}
+        for series in result.raw.get("series", []):
+            tags = series["tags"]
+            key = flow_key(tags["src_ip"], tags["dst_ip"], tags["flow_label"])
+            timestamp, size = series["values"][0]
+            if key in missing and (key not in last_seen or timestamp > last_seen[key]):        #the DSCP of a flow may have changed
+                last_seen[key] = timestamp
+                flows_info[missing[key]] = (int(tags["dscp"]), size)
+
+    for flow in flows:
+        if flow not in flows_info:                   #not in the time range, same lookup as before over all the DB
+            flows_info[flow] = get_pkt_size_dscp(flow)
+
+    return flows_info
+
 def get_pkt_size_dscp(flow):
     #reads the INT DB and sets the pkt size and DSCP collumns
 
-    query = f"""
+    # Latest values kept by the collector, without scanning flow_stats
+    entry = constants.flow_table.get(flow_key(*flow))
+    if entry is not None:
+        return entry['dscp'], entry['size']
+
+    query = """
         SELECT dscp, size
         FROM flow_stats
-        WHERE   "src_ip" = '{flow[0]}'
-        AND     "dst_ip" = '{flow[1]}'
-        AND     "flow_label" = '{flow[2]}'
+        WHERE   "src_ip" = $src_ip
+        AND     "dst_ip" = $dst_ip
+        AND     "flow_label" = $flow_label
         ORDER BY time DESC
         LIMIT 1
     """
     #print(f"Query: {query}")
     
-    r = constants.apply_query(query)
+    r = constants.apply_query(query, {'src_ip': flow[0], 'dst_ip': flow[1], 'flow_label': str(flow[2])})
 
     if r.raw["series"] == []:
         print(f"At get_pkt_size_dscp() Flow {flow} not found in the DB, probably multicast related")
@@ -65,77 +166,22 @@ def get_pkt_size_dscp(flow):
 
     return dscp, size
 
-def read_raw_results(row):
-    iteration = row[0]
-    ħost = row[1]
-    flow = (row[2], row[3], int(row[4]))
-    Is = row[5]
-    number_of_packets = int(row[6])
-    first_packet_time = row[7]
-    dscp = int(row[10])
-    values_end_points = {}
-    values_end_points["num_pkt"] = number_of_packets
-    values_end_points["time"] = float(first_packet_time)
-    values_end_points["num_hosts"] = 1
-
-    if Is == "receiver":
-        number_out_of_order_packets = int(row[8])
-        out_of_order_packets = row[9]
-        avg_jitter = float(row[11])
-
-        extra1 = {"num_out_of_order_pkt": number_out_of_order_packets}
-        extra2 = {"out_of_order_pkt": out_of_order_packets}
-        extra3 = {"avg_jitter": avg_jitter}
-
-        values_end_points["extra"] = {}
-        values_end_points["extra"].update(extra1)
-        values_end_points["extra"].update(extra2)
-        values_end_points["extra"].update(extra3)
-
-    not_needed_anymore, pkt_size = get_pkt_size_dscp(flow)            #Get the flows info
-    values_flow = {Is: values_end_points, "DSCP": dscp, "Packet Size": pkt_size}
-
-    # Check if the iteration is already in the results dictionary
-    if iteration not in constants.results:
-        values_iteration = {flow: values_flow}
-        constants.results[iteration] = values_iteration
-    else:
-        # Check if the flow is already in the constants.results dictionary
-        if flow not in constants.results[iteration]:
-            constants.results[iteration][flow] = values_flow
-        else:
-            # Add currect Is to the flow
-            #Just add if sender or receiver no receiver there yet
-            if Is == "sender" or (Is == "receiver" and "receiver" not in constants.results[iteration][flow]):      
-                constants.results[iteration][flow][Is] = values_end_points
-
-            else:                           #If multiple receivers, acommudate for that with averages amd concatenations
-                old_number_hosts = constants.results[iteration][flow][Is]["num_hosts"]
-                constants.results[iteration][flow][Is]["time"]    = (constants.results[iteration][flow][Is]["time"]    * old_number_hosts + values_end_points["time"]   ) / (old_number_hosts + 1)
-                constants.results[iteration][flow][Is]["num_pkt"] = (constants.results[iteration][flow][Is]["num_pkt"] * old_number_hosts + values_end_points["num_pkt"]) / (old_number_hosts + 1)
-
-                constants.results[iteration][flow][Is]["extra"]["num_out_of_order_pkt"] = (constants.results[iteration][flow][Is]["extra"]["num_out_of_order_pkt"] * old_number_hosts + number_out_of_order_packets) / (old_number_hosts + 1)
-                constants.results[iteration][flow][Is]["extra"]["out_of_order_pkt"]    += out_of_order_packets
-                constants.results[iteration][flow][Is]["extra"]["avg_jitter"]           = (constants.results[iteration][flow][Is]["extra"]["avg_jitter"] * old_number_hosts + avg_jitter) / (old_number_hosts + 1)
-
-                constants.results[iteration][flow][Is]["num_hosts"] = old_number_hosts + 1
-
-def read_csv_files(filename):
-    first_row = True
-
+def read_csv_files(filename, start, end):
+    # load the rows, join them with the DSCP/size of their flows (fetched all at once) and aggregate them, one line per flow and iteration
     file_path = os.path.join(constants.results_path, filename)
     
     print(f"Reading files: {filename}")
-    with open(file_path, 'r', newline='') as csvfile:
-        reader = csv.reader(csvfile)
-        for row in reader:
-            #Skip the header, first row
-            if first_row:
-                first_row = False
-                continue
-            read_raw_results(row)
+    with stage("load"):
+        rows = results_frame.read_csv_rows(file_path)
+
+    with stage("join"):
+        flows_info = get_flows_size_dscp(results_frame.row_flows(rows), start, end)
+
+    with stage("aggregate"):
+        flows = results_frame.aggregate_flows(rows, flows_info)
 
     #print("Done reading file")
+    return flows
 
 def check_files_exist():
     # Check if the directory/files exist
@@ -171,9 +217,9 @@ def check_files_exist():
                 sys.exit(1)
 
 def read_SRv6_line(line):
+    # Legacy free text logs (*-SRv6_rules.log), the analyzer now writes a journal (read_SRv6_journal)
     #print(f"Reading SRv6 line: {line}")
 
-    new_content = {}
     part1 = line.split(" - ")
     part2 = part1[2].split(" => ")
     operation = part2[0]
@@ -185,6 +231,17 @@ def read_SRv6_line(line):
     rule_elemets_str = line.split("{")[1]
     rule_elemets = ast.literal_eval("{"+rule_elemets_str)
 
+    add_SRv6_operation(iteration, timestamp, operation, responsible_switch, rule_elemets)
+
+def read_SRv6_journal(log_file_path):
+    # Journal of the analyzer (srv6_registry.py), one JSON object per operation
+    # The rules removed at the end of each test (cleanup) and the other entries (detour latencies) are not SRv6 operations
+    for entry in read_journal(log_file_path):
+        if entry['operation'] not in (OPERATION_CREATED, OPERATION_REMOVED) or entry.get('cleanup'):
+            continue
+        add_SRv6_operation(str(entry['iteration']), entry['timestamp'], entry['operation'], int(entry['switch']), dict(entry['rule']))
+
+def add_SRv6_operation(iteration, timestamp, operation, responsible_switch, rule_elemets):
     # Convert numebrs in the dictionary to integers
     rule_elemets["deviceID"] = int(rule_elemets["deviceID"])
     rule_elemets["flow_label"] = int(rule_elemets["flow_label"])
@@ -202,22 +259,9 @@ def read_SRv6_line(line):
         sys.exit(1)
 
 
-    #---------------Create the new operation for the dictionary
-    new_content["responsible_switch"] = responsible_switch    # Which switch the load induced the operation
-    new_content["operation"] = operation
-    new_content["timestamp"] = timestamp
-    new_content["rule"] = rule_elemets
-
-    # Add the results to the dictionary
-    # At this point the iteration is already in the dictionary
-    results_ite = constants.results[iteration]
-    
-    # Check if the operation if "SRv6_Operations" is already in the current iteration
-    if "SRv6_Operations" not in results_ite:
-        results_ite["SRv6_Operations"] = [new_content]   # as a list since there can be multiple operations
-    else:
-        # Add the operation to the dictionary
-        results_ite["SRv6_Operations"].append(new_content)
+    #---------------Add the operation, responsible_switch is the switch which load induced it
+    constants.SRv6_operations.append([iteration, timestamp, operation, responsible_switch,
+                                      rule_elemets["srcIP"], rule_elemets["dstIP"], rule_elemets["flow_label"]])
 
 
 def read_SRv6_log(file_index):
@@ -232,11 +276,51 @@ def read_SRv6_log(file_index):
 
     print(f"Reading SRv6 logs from file: {log_file}")
 
-    # Read the SRv6 logs
+    # Read the SRv6 logs, journal (.jsonl) or legacy text log
+    if log_file.endswith(".jsonl"):
+        read_SRv6_journal(log_file_path)
+        return
+
     with open(log_file_path, 'r') as file:
         for line in file:
             read_SRv6_line(line)
 
+def process_file(file_index, filename):
+    # Everything of a file that does not go through the workbook, on a worker with --jobs
+    sheet_name = filename.split("_")[0]
+    start, end = constants.args.start[file_index], constants.args.end[file_index]
+    constants.SRv6_operations = []                                      #reset the SRv6 operations between files
+
+    constants.results_frames[sheet_name] = read_csv_files(filename, start, end)
+    with stage("aggregate"):
+        if constants.args.SRv6_index is not None and file_index in constants.args.SRv6_index:
+            #Retrive the SRv6 logs data for the current file
+            read_SRv6_log(file_index)
+        constants.SRv6_frames[sheet_name] = results_frame.SRv6_frame(constants.SRv6_operations)
+
+        constants.calculate_statistics(sheet_name)                      #averages and std of the jitter per DSCP
+    with stage("store"):
+        results_frame.save_parquet(constants.results_frames[sheet_name], constants.parquet_path, sheet_name)
+        results_frame.save_parquet(constants.SRv6_frames[sheet_name], constants.parquet_path, sheet_name + "-SRv6")
+    with stage("query"):
+        configure.calculate_INT_results(sheet_name, start, end)          #latencies and per switch data of each DSCP
+
+    return (sheet_name, constants.results_frames[sheet_name], constants.SRv6_frames[sheet_name],
+            constants.statistics[sheet_name], constants.INT_results[sheet_name])
+
+def store_sheet(sheet_name, flows, SRv6_operations, statistics, INT_results):
+    # What process_file() returned from a worker
+    constants.results_frames[sheet_name] = flows
+    constants.SRv6_frames[sheet_name] = SRv6_operations
+    constants.statistics[sheet_name] = statistics
+    constants.INT_results[sheet_name] = INT_results
+
+def render_scenario(scenario, frames):
+    # CDF images of a scenario on a worker, with the flows of its sheets
+    constants.results_frames.update(frames)
+    with stage("images"):
+        return graphs.render_CDFs(scenario)
+
 def parse_args():
 
     parser = argparse.ArgumentParser(description='process parser')
@@ -252,12 +336,19 @@ def parse_args():
     # 3 Optional argument, that must be used simultaneously
     parser.add_argument('--SRv6_index', help='Indexs of the files that have SRv6 logs associated to them (starting from 0)',
                         type=int, action="store", required=False, nargs='+')
-    parser.add_argument('--SRv6_logs', help='Names of the log files with the SRv6 rules from previous argument (must match the order)',
+    parser.add_argument('--SRv6_logs', help='Names of the SRv6 rules journals (*-SRv6_rules.jsonl, or legacy *-SRv6_rules.log) of the files from previous argument (must match the order)',
                         type=str, action="store", required=False, nargs='+')
     parser.add_argument('--num_iterations', help='Nº of iterations on every test, help SRv6 AVG calculations)',
                         type=int, action="store", required=False)
+    parser.add_argument('--flow_table', help='Checkpoint of the flow table of the collector (collector --flow_table_checkpoint), the DSCP and size of the flows come from it instead of the DB',
+                        type=str, action="store", required=False, default=None)
+    parser.add_argument('--jobs', help='Processes processing the files and rendering the CDF images of the scenarios in parallel (1: one after the other)',
+                        type=int, action="store", required=False, default=1)
 
     constants.args = parser.parse_args()
+
+    if constants.args.jobs < 1:
+        parser.error("--jobs must be a positive integer")
     
     # Check if the number of elements start/end is the same
     if len(constants.args.start) != len(constants.args.end):
@@ -308,25 +399,65 @@ def main():
 
     check_files_exist()
 
+    if constants.args.flow_table:
+        constants.flow_table = read_checkpoints(constants.args.flow_table)
+        print(f"Flow table checkpoint read: {len(constants.flow_table)} flows")
+
     # Delete the final file if it exists
     if os.path.isfile(constants.final_file_path):
         os.remove(constants.final_file_path)
 
-    # Read the CSV files
     for file_index, filename in enumerate(constants.args.f):
-        constants.results = {}                                              #reset the results dictionary between files
-
-        read_csv_files(filename)
-        if constants.args.SRv6_index is not None and file_index in constants.args.SRv6_index:
-            #Retrive the SRv6 logs data for the current file
-            read_SRv6_log(file_index)
-
-        constants.calulate_std_jitter_per_dscp(filename)                    #calculate the std from jitter per DSCP
-        export.export_raw_results(filename)                                 #export the results to the final file
-    
-    configure.configure_final_file()
-    adjust_columns_width()
-    
+        constants.start_end_times[filename.split("_")[0]] = (constants.args.start[file_index], constants.args.end[file_index])
+
+    wall_times = {}
+    started = time.perf_counter()
+    executor = None
+    if constants.args.jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=constants.args.jobs, initializer=init_worker,
+                                       initargs=({name: getattr(constants, name) for name in WORKER_CONSTANTS},))
+    try:
+        # Read the CSV files, and query the DB for each of them
+        with stage("sheets", wall_times):
+            files = list(enumerate(constants.args.f))
+            if executor is None:
+                for file_index, filename in files:
+                    process_file(file_index, filename)
+            else:
+                for sheet in task_results([executor.submit(run_task, process_file, file) for file in files]):
+                    store_sheet(*sheet)
+
+        # CDF images of each scenario, on the workers while the raw results are written
+        images = []
+        if executor is None:
+            with stage("images", wall_times):
+                for scenario in constants.test_scenarios:
+                    constants.CDF_images[scenario] = render_scenario(scenario, {})
+        else:
+            for scenario in constants.test_scenarios:
+                frames = {sheet_name: flows for sheet_name, flows in constants.results_frames.items() if sheet_name.split("-")[0] == scenario}
+                images.append(executor.submit(run_task, render_scenario, (scenario, frames)))
+
+        with stage("workbook", wall_times):
+            for filename in constants.args.f:
+                with stage("export"):
+                    export.export_raw_results(filename)                 #export the results to the final file
+
+            if executor is not None:
+                with stage("waiting for images", wall_times):
+                    for scenario, image_paths in zip(constants.test_scenarios, task_results(images)):
+                        constants.CDF_images[scenario] = image_paths
+
+            with stage("configure"):
+                configure.configure_final_file()
+                adjust_columns_width()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    wall_times["total"] = time.perf_counter() - started
+
+    print_stage_times(wall_times)
+    constants.client.print_stats()
     constants.client.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+import os
+import numpy as np
+import pandas as pd
+
+#Columnar store of the results of each scenario-algorithm (sheet), instead of nested dicts and reading the workbook back:
+#   load:       the CSV rows (one per sender/receiver host of a flow and iteration), read_csv_rows()
+#   aggregate:  one row per flow and iteration, the receivers of a flow averaged as before, plus the packet loss and
+#               1º packet delay that were set cell by cell in the workbook, aggregate_flows()
+#   statistics: the averages (below the percentile) of the calculations area and the STD of the jitter, per DSCP and -1 (all),
+#               as group-bys on the flows, dscp_statistics()
+#The flows and the SRv6 operations of each sheet are also written to Parquet (results/parquet/<sheet>.parquet and
+#<sheet>-SRv6.parquet), the workbook is only rendered from them
+
+FLOW_KEYS = ["iteration", "src_ip", "dst_ip", "flow_label"]
+
+CSV_COLUMNS = ["iteration", "host", "src_ip", "dst_ip", "flow_label", "Is", "num_pkt", "time", "num_out_of_order_pkt",
+               "max_reorder_extent", "dscp", "avg_jitter"]
+
+# Counters and reorder histograms of the receivers (mininet/tools/sequence_tracker.py), CSV header -> column, NaN in the
+# files of before them (where the 10º column was the list of the out of order packets)
+HISTOGRAM_BINS = ["1", "2", "3-4", "5-8", "9-16", "17-32", "33-64", "65+"]
+SEQUENCE_COLUMNS = {"Nº pkt duplicated": "num_duplicated_pkt", "Nº pkt late": "num_late_pkt", "Nº pkt lost": "num_lost_pkt",
+                    **{f"Reorder Extent {bin}": f"reorder_extent_{bin}" for bin in HISTOGRAM_BINS},
+                    **{f"Reorder Distance {bin}": f"reorder_distance_{bin}" for bin in HISTOGRAM_BINS}}
+
+# Raw data area of the sheets, column by column (A, B, C, ...): header and column of the flows of the receiver line
+# (the sender line only has the flow, DSCP, size, Is, Nº of packets and timestamp)
+RAW_DATA_COLUMNS = [("Flow src", "src_ip"), ("Flow dst", "dst_ip"), ("Flow Label", "flow_label"), ("DSCP", "dscp"),
+                    ("Packet Size (Bytes)", "size"), ("Is", None), ("Nº of packets", "receiver_num_pkt"),
+                    ("1º Packet Timestamp(seconds)", "receiver_time"), ("Nº of out of order packets", "num_out_of_order_pkt"),
+                    ("Max Reorder Extent", "max_reorder_extent"), ("AVG Flow Jitter (nanoseconds)", "avg_jitter"), (None, None),
+                    ("Packet Loss", "packet_loss"), ("Packet Loss (%)", "packet_loss_pct"), ("1º Packet Delay (nanoseconds)", "first_pkt_delay")]
+
+# Columns averaged in the calculations area of each DSCP
+AVERAGED_COLUMNS = ["num_out_of_order_pkt", "packet_loss", "packet_loss_pct", "first_pkt_delay", "avg_jitter"]
+
+SRV6_COLUMNS = ["iteration", "timestamp", "operation", "responsible_switch", "src_ip", "dst_ip", "flow_label"]
+
+def read_csv_rows(file_path):
+    # Rows of a results CSV, the sender rows without the receiver columns (NaN), the sender pacing columns left out
+    rows = pd.read_csv(file_path, header=0, dtype=str, keep_default_na=False)
+    sequence_columns = {header: column for header, column in SEQUENCE_COLUMNS.items() if header in rows.columns}
+    rows = rows.iloc[:, :len(CSV_COLUMNS)].set_axis(CSV_COLUMNS, axis=1).join(rows[list(sequence_columns)].rename(columns=sequence_columns))
+    for column in ["flow_label", "dscp"]:
+        rows[column] = rows[column].astype(int)
+    for column in ["num_pkt", "time", "num_out_of_order_pkt", "avg_jitter"] + list(sequence_columns.values()):
+        rows[column] = rows[column].replace("", np.nan).astype(float)          #exact as float(), the timestamps are subtracted
+    rows["max_reorder_extent"] = pd.to_numeric(rows["max_reorder_extent"], errors="coerce")
+    for column in SEQUENCE_COLUMNS.values():
+        if column not in rows:
+            rows[column] = np.nan
+    return rows
+
+def row_flows(rows):
+    # Set of the (src_ip, dst_ip, flow_label) of the rows
+    return set(rows[["src_ip", "dst_ip", "flow_label"]].drop_duplicates().itertuples(index=False, name=None))
+
+def aggregate_flows(rows, flows_info):
+    """
+    One line per flow and iteration, in the order they first appear.
+
+    :param rows: Rows of read_csv_rows().
+    :param flows_info: Dictionary (src_ip, dst_ip, flow_label) -> (dscp, size), of all the flows of the rows.
+    :return: DataFrame with FLOW_KEYS, dscp and size (of the 1º row of the flow), sender_* (last sender), receiver_* and
+             the extras (mean of the receivers, the max of the reorder extent), num_hosts (receivers), packet_loss,
+             packet_loss_pct and first_pkt_delay (only with both sender and receiver).
+    """
+    flows = rows.groupby(FLOW_KEYS, sort=False).agg(dscp=("dscp", "first")).reset_index()
+    flows["size"] = [flows_info[flow][1] for flow in flows[["src_ip", "dst_ip", "flow_label"]].itertuples(index=False, name=None)]
+
+    senders = rows[rows["Is"] == "sender"].groupby(FLOW_KEYS, sort=False).agg(
+        sender_num_pkt=("num_pkt", "last"),
+        sender_time=("time", "last"))
+    receivers = rows[rows["Is"] == "receiver"].groupby(FLOW_KEYS, sort=False).agg(
+        receiver_num_pkt=("num_pkt", "mean"),
+        receiver_time=("time", "mean"),
+        num_out_of_order_pkt=("num_out_of_order_pkt", "mean"),
+        max_reorder_extent=("max_reorder_extent", "max"),
+        avg_jitter=("avg_jitter", "mean"),
+        num_hosts=("Is", "size"),
+        **{column: (column, "mean") for column in SEQUENCE_COLUMNS.values()})
+    flows = flows.join(senders, on=FLOW_KEYS).join(receivers, on=FLOW_KEYS)
+
+    # same values the workbook had: loss = sent - received, % of the received, delay in nanoseconds
+    flows["packet_loss"] = flows["sender_num_pkt"] - flows["receiver_num_pkt"]
+    flows["packet_loss_pct"] = (flows["packet_loss"] / flows["receiver_num_pkt"] * 100).replace([np.inf, -np.inf], np.nan).round(2)
+    flows["first_pkt_delay"] = ((flows["receiver_time"] - flows["sender_time"]) * 1000000000).round(2)
+    return flows
+
+def SRv6_frame(operations):
+    # SRv6 operations (process_results.add_SRv6_operation) of a file, in order
+    return pd.DataFrame(operations, columns=SRV6_COLUMNS)
+
+def below_percentile(values, groups, percentile, min_count=0):
+    # Mask of the values <= the percentile of their group (linear, as np.percentile), all the group if it would keep min_count or less
+    limit = values.groupby(groups).transform("quantile", percentile / 100)
+    mask = values <= limit
+    if min_count:
+        mask |= mask.groupby(groups).transform("sum") <= min_count
+    return mask
+
+def with_all_dscps(flows):
+    # The flows twice, the second time with DSCP -1, so a group-by on dscp also gives the values of all the flows
+    return pd.concat([flows, flows.assign(dscp=-1)], ignore_index=True)
+
+def dscp_statistics(flows, scenario_DSCPs, percentile):
+    """
+    Values of the calculations area of a sheet, for each DSCP and -1 (all the DSCPs).
+    The averages only of the flows with a DSCP of the scenario, the values above the percentile of their DSCP left out.
+    The STD of the jitter of all the flows, the values above the percentile left out only if more than 2 are kept.
+
+    :return: DataFrame indexed by DSCP, a column per AVERAGED_COLUMNS and std_jitter (rounded to 2 decimals), NaN if there are no values.
+    """
+    statistics = {}
+    scenario_flows = with_all_dscps(flows[flows["dscp"].isin(scenario_DSCPs)])
+    for column in AVERAGED_COLUMNS:
+        values = scenario_flows[["dscp", column]].dropna()
+        values = values[below_percentile(values[column], values["dscp"], percentile)]
+        statistics[column] = values.groupby("dscp")[column].mean().round(2)
+
+    jitters = with_all_dscps(flows)[["dscp", "avg_jitter"]].dropna()
+    jitters = jitters[below_percentile(jitters["avg_jitter"], jitters["dscp"], percentile, min_count=2)]
+    statistics["std_jitter"] = jitters.groupby("dscp")["avg_jitter"].std(ddof=0).round(2)
+
+    return pd.DataFrame(statistics)
+
+def save_parquet(frame, directory, name):
+    # Parquet needs pyarrow (or fastparquet), the workbook does not depend on it
+    os.makedirs(directory, exist_ok=True)
+    try:
+        frame.to_parquet(os.path.join(directory, name + ".parquet"), index=False)
+    except ImportError:
+        print(f" pyarrow not installed - Parquet store of {name} skipped")
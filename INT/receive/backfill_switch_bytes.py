@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from influx_query import get_influx_query
+from byte_queries import BYTE_MEASUREMENTS
+from rollup import count_bytes, byte_lines
+
+#Writes the switch_bytes/flow_bytes rollups (rollup.py) of a time range out of the flow_stats points already in the DB,
+#for the tests recorded before the collector wrote them, so process_results gets their byte sums from the rollups too
+#The points are the same the collector would have written (windows aligned the same way), with the tag collector=backfill
+#
+#usage: python3 backfill_switch_bytes.py --start 2024-05-01T10:00:00Z --end 2024-05-01T10:05:00Z
+#       python3 backfill_switch_bytes.py --start ... --end ... --overwrite          (drops the switch_bytes/flow_bytes of the range first)
+
+INFLUX_HOST = 'localhost'
+INFLUX_DB = 'int'
+
+BACKFILL_COLLECTOR = "backfill"
+
+RFC3339_REGEX = re.compile(r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)?$')
+
+def rfc3339_ns(timestamp):
+    # RFC3339 timestamp (or nanoseconds since the epoch) to nanoseconds, without losing the nanoseconds
+    if timestamp.isdigit():
+        return int(timestamp)
+    match = RFC3339_REGEX.match(timestamp)
+    if match is None:
+        raise ValueError("Not a RFC3339 timestamp: %s" % timestamp)
+    seconds, fraction, zone = match.groups()
+    zone = "+00:00" if zone in (None, "Z") else zone
+    seconds = int(datetime.fromisoformat(seconds + zone).timestamp())
+    return seconds * 1000000000 + int((fraction or "0")[:9].ljust(9, "0"))
+
+def window_byte_lines(rows, window, collector=BACKFILL_COLLECTOR):
+    """
+    switch_bytes/flow_bytes points of flow_stats rows.
+
+    :param rows: Iterable of (time in ns, path "1-4-5-8", dscp, size).
+    :param window: Window length in seconds (same as the collector --rollup_window).
+    :return: (line protocol points, number of rows).
+    """
+    window_ns = int(window * 1000000000)
+    windows = {}                        #window start (ns) -> {measurement: {key: packets}}
+    count = 0
+    for timestamp, path, dscp, size in rows:
+        count += 1
+        window_start = timestamp - timestamp % window_ns
+        rollups = windows.get(window_start)
+        if rollups is None:
+            rollups = windows[window_start] = {measurement: {} for measurement in BYTE_MEASUREMENTS}
+        count_bytes(rollups, [int(switch_id) for switch_id in path.split('-') if switch_id], dscp, int(size))
+
+    lines = []
+    for window_start in sorted(windows):
+        lines += byte_lines(window_start, windows[window_start], collector, window)
+    return lines, count
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill of the switch_bytes/flow_bytes rollups from flow_stats')
+    parser.add_argument('--start', help='Start of the time range (RFC3339 or nanoseconds)', type=str, action="store", required=True)
+    parser.add_argument('--end', help='End of the time range (RFC3339 or nanoseconds)', type=str, action="store", required=True)
+    parser.add_argument('--window', help='Window (seconds) of the rollups, same as the collector --rollup_window',
+                        type=float, action="store", required=False, default=1.0)
+    parser.add_argument('--chunk', help='Windows read from flow_stats on each query',
+                        type=int, action="store", required=False, default=60)
+    parser.add_argument('--overwrite', help='Delete the switch_bytes/flow_bytes points of the time range before writing them',
+                        action="store_true", required=False, default=False)
+    parser.add_argument('--batch_size', help='Max number of points written to InfluxDB in one request',
+                        type=int, action="store", required=False, default=5000)
+    args = parser.parse_args()
+
+    if args.window <= 0 or args.chunk <= 0:
+        print("--window and --chunk must be positive")
+        sys.exit(1)
+
+    influx = get_influx_query(host=INFLUX_HOST, database=INFLUX_DB)
+    window_ns = int(args.window * 1000000000)
+    start = rfc3339_ns(args.start)
+    end = rfc3339_ns(args.end)
+    first_window = start - start % window_ns           #the points are on the start of their window, may be before --start
+    params = {'start': first_window, 'end': end}
+
+    #the collector may have written them already, they would be counted twice
+    existing = 0
+    for measurement in BYTE_MEASUREMENTS:
+        result = influx.query(f'SELECT COUNT("packets") FROM {measurement} WHERE time >= $start AND time <= $end', params)
+        existing += sum(point['count'] for point in result.get_points())
+    if existing and not args.overwrite:
+        print(f"There are already {existing} switch_bytes/flow_bytes points in the time range, use --overwrite to replace them")
+        sys.exit(1)
+    if existing:
+        for measurement in BYTE_MEASUREMENTS:
+            influx.client.query(f'DELETE FROM {measurement} WHERE time >= $start AND time <= $end', bind_params=params, method='POST')
+        print(f"Deleted {existing} switch_bytes/flow_bytes points")
+
+    started = time.perf_counter()
+    rows = 0
+    points = 0
+    chunk_ns = window_ns * args.chunk
+    for chunk_start in range(first_window, end + 1, chunk_ns):
+        #whole windows on each query, so no window is split between two writes
+        result = influx.query("""
+            SELECT "path", "size" FROM flow_stats
+            WHERE time >= $from AND time < $to AND time >= $start AND time <= $end
+            GROUP BY "dscp"
+        """, {'from': chunk_start, 'to': chunk_start + chunk_ns, 'start': start, 'end': end}, epoch='ns')
+
+        chunk_rows = []
+        for (_, tags), series in result.items():
+            chunk_rows.extend((point['time'], point['path'] or "", tags['dscp'], point['size']) for point in series)
+        lines, count = window_byte_lines(chunk_rows, args.window)
+        if lines:
+            influx.write_points(lines, protocol='line', batch_size=args.batch_size)
+        rows += count
+        points += len(lines)
+
+    print(f"Backfilled {rows} flow_stats points into {points} switch_bytes/flow_bytes points in {time.perf_counter() - started:.1f} s")
+
+if __name__ == "__main__":
+    main()
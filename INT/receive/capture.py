@@ -0,0 +1,194 @@
+import mmap
+import select
+import socket
+import struct
+import threading
+
+#Capture backends for the collector, they read the frames of one interface and call handler(frame) with the raw bytes
+#(bytes or memoryview, only valid during the call) of every frame received
+#An exception of the handler only loses its frame: it is counted (handler_errors) and the capture goes on
+#   scapy: scapy.sniff() over libpcap (original implementation)
+#   ring:  AF_PACKET socket with a memory-mapped TPACKET_V3 RX ring, the kernel fills blocks of frames that are
+#          processed in place (no per packet syscall or copy), reports the kernel drop counters (PACKET_STATISTICS)
+
+# Linux constants (linux/if_packet.h, linux/if_ether.h)
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+PACKET_OUTGOING = 4                 #sll_pkttype of the frames sent by this host
+
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# struct tpacket_req3
+tpacket_req3_struct = struct.Struct("IIIIIII")
+# struct tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1: block_status, num_pkts, offset_to_first_pkt
+block_desc_struct = struct.Struct("IIIII")
+BLOCK_STATUS_OFFSET = 8
+# struct tpacket3_hdr: tp_next_offset, tp_sec, tp_nsec, tp_snaplen, tp_len, tp_status, tp_mac, tp_net
+tpacket3_hdr_struct = struct.Struct("IIIIIIHH")
+TPACKET3_HDR_LEN = 48               #TPACKET_ALIGN(sizeof(struct tpacket3_hdr)), the sockaddr_ll follows it
+SLL_PKTTYPE_OFFSET = TPACKET3_HDR_LEN + 10
+# struct tpacket_stats_v3: tp_packets, tp_drops, tp_freeze_q_cnt
+tpacket_stats_v3_struct = struct.Struct("III")
+
+def report_handler_error(iface, count, error):
+    # The 1º error and then one every 1000, a broken decoder does not flood the log
+    if count == 1 or count % 1000 == 0:
+        print("Capture %s: handler failed (%d errors so far): %r" % (iface, count, error))
+
+
+class ScapyCapture():
+    def __init__(self, iface, handler, stop_event) -> None:
+        self.iface = iface
+        self.handler = handler
+        self.stop_event = stop_event
+        self.packets = 0
+        self.handler_errors = 0
+
+    def handle_pkt(self, pkt):
+        self.packets += 1
+        try:
+            self.handler(bytes(pkt))
+        except Exception as e:
+            self.handler_errors += 1
+            report_handler_error(self.iface, self.handler_errors, e)
+
+    def run(self):
+        from scapy.all import sniff
+        sniff(iface=self.iface, filter='inbound and tcp or udp', prn=self.handle_pkt, store=False,
+              stop_filter=lambda _: self.stop_event.is_set())
+
+    def stats(self):
+        #libpcap drop counters are not exposed by scapy.sniff()
+        return {'packets': self.packets, 'handler_errors': self.handler_errors}
+
+
+class RingCapture():
+    """
+    TPACKET_V3 RX ring capture.
+
+    :param iface: Interface to capture from.
+    :param handler: Function called with a memoryview of each received frame, it must not keep a reference to it.
+    :param stop_event: threading.Event that stops the capture loop.
+    :param block_size: Size of each ring block (bytes, multiple of the page size).
+    :param block_count: Number of blocks of the ring.
+    :param frame_size: Max frame size (the kernel packs the frames, only used to fill tp_frame_nr).
+    :param block_timeout: Time (ms) after which the kernel hands a block that is not full.
+    """
+    def __init__(self, iface, handler, stop_event, block_size=1 << 20, block_count=64, frame_size=2048, block_timeout=50) -> None:
+        self.iface = iface
+        self.handler = handler
+        self.stop_event = stop_event
+        self.block_size = block_size
+        self.block_count = block_count
+        self.frame_size = frame_size
+        self.block_timeout = block_timeout
+
+        self.sock = None
+        self.ring = None
+        #counters
+        self.packets = 0                #frames handed to the handler
+        self.handler_errors = 0         #frames whose handler raised an exception
+        self.blocks = 0
+        self.kernel_packets = 0         #accumulated from PACKET_STATISTICS (the kernel resets them on every read)
+        self.kernel_drops = 0
+        self.kernel_freeze_q_cnt = 0
+        self.lock = threading.Lock()
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        req = tpacket_req3_struct.pack(self.block_size, self.block_count, self.frame_size,
+                                       (self.block_size // self.frame_size) * self.block_count,
+                                       self.block_timeout, 0, 0)
+        self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+        self.sock.bind((self.iface, ETH_P_ALL))
+        self.ring = mmap.mmap(self.sock.fileno(), self.block_size * self.block_count,
+                              mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        return self
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        if self.sock is not None:
+            self.read_kernel_stats()
+            self.sock.close()
+            self.sock = None
+
+    def run(self):
+        if self.sock is None:
+            self.open()
+
+        ring = memoryview(self.ring)
+        poller = select.poll()
+        poller.register(self.sock.fileno(), select.POLLIN | select.POLLERR)
+        block = 0
+
+        try:
+            while not self.stop_event.is_set():
+                block_offset = block * self.block_size
+                _, _, status, num_pkts, offset = block_desc_struct.unpack_from(ring, block_offset)
+                if not status & TP_STATUS_USER:
+                    poller.poll(100)                #wait for the kernel, checking the stop event every 100 ms
+                    continue
+
+                frame_offset = block_offset + offset
+                for _ in range(num_pkts):
+                    next_offset, _, _, snaplen, _, _, mac, _ = tpacket3_hdr_struct.unpack_from(ring, frame_offset)
+                    if ring[frame_offset + SLL_PKTTYPE_OFFSET] != PACKET_OUTGOING:
+                        start = frame_offset + mac
+                        try:
+                            self.handler(ring[start:start + snaplen])
+                        except Exception as e:
+                            self.handler_errors += 1
+                            report_handler_error(self.iface, self.handler_errors, e)
+                        self.packets += 1
+                    frame_offset += next_offset
+
+                # give the block back to the kernel
+                struct.pack_into("I", ring, block_offset + BLOCK_STATUS_OFFSET, TP_STATUS_KERNEL)
+                self.blocks += 1
+                block = (block + 1) % self.block_count
+        finally:
+            ring.release()
+            self.close()
+
+    def read_kernel_stats(self):
+        if self.sock is None:
+            return
+        packets, drops, freeze_q_cnt = tpacket_stats_v3_struct.unpack(
+            self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, tpacket_stats_v3_struct.size))
+        with self.lock:
+            self.kernel_packets += packets
+            self.kernel_drops += drops
+            self.kernel_freeze_q_cnt += freeze_q_cnt
+
+    def stats(self):
+        try:
+            self.read_kernel_stats()
+        except OSError:                         #socket closed meanwhile
+            pass
+        return {
+            'packets': self.packets,
+            'blocks': self.blocks,
+            'handler_errors': self.handler_errors,
+            'kernel_packets': self.kernel_packets,
+            'kernel_drops': self.kernel_drops,
+            'kernel_freeze_q_cnt': self.kernel_freeze_q_cnt
+        }
+
+
+CAPTURE_BACKENDS = {
+    "scapy": ScapyCapture,
+    "ring": RingCapture
+}
+
+def create_capture(backend, iface, handler, stop_event):
+    if backend not in CAPTURE_BACKENDS:
+        raise ValueError("Unknown capture backend %s, available: %s" % (backend, list(CAPTURE_BACKENDS)))
+    return CAPTURE_BACKENDS[backend](iface, handler, stop_event)
@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
 import os
 import json
+import multiprocessing
+import queue
+import signal
 import threading
-from scapy.all import sniff
+import time
 from influxdb import InfluxDBClient
 from colllector import *
+from influx_writer import InfluxBatchWriter
+from capture import CAPTURE_BACKENDS, create_capture
+from collector_stats import StatsAggregator, start_stats_server
+from rollup import RollupAggregator
+from load_feed import LoadFeedPublisher
+from flow_table import DEFAULT_FLOW_TABLE, FlowTable, FlowTableService, worker_path
 
-stop_sniffing = False
+stop_sniffing = threading.Event()
+args = None
 
 INFLUX_HOST = 'localhost'
 INFLUX_DB = 'int'
@@ -35,20 +46,62 @@ def read_json(file_path):
         data = json.load(file)
     return data
 
-def handle_pkt(pkt,c):   #individually triggered by each sniffed packet
-    print("got a TCP/UDP packet")
-    #pkt.show2()         #for debugging
-    if INTREP in pkt :
-        print("\n\n********* Receiving Telemetry Report ********")
-        flow_info = c.parser_int_pkt(pkt, packet_sizes)
-        flow_info.show()
+def handle_pkt(frame,c):   #individually triggered by each captured frame (raw bytes)
+    flow_info = c.parser_int_raw(frame, packet_sizes)
+
+    if flow_info:
+        if args.verbose:
+            print("\n\n********* Receiving Telemetry Report ********")
+            flow_info.show()
         c.export_influxdb(flow_info)
 
-def sniff_interface(iface, c):
-    print("Sniffing on interface:", iface)
-    sniff(iface = iface,filter='inbound and tcp or udp', prn = lambda x: handle_pkt(x, c), stop_filter=lambda _: stop_sniffing)
+def sniff_interface(capture):
+    print("Sniffing on interface:", capture.iface)
+    try:
+        capture.run()
+    except Exception as e:
+        print("Capture on %s failed: %s" % (capture.iface, e))
+
+def parse_args():
+    global args
 
-def main():
+    parser = argparse.ArgumentParser(description='INT collector parser')
+    parser.add_argument('--decoder', help='How the INT reports are decoded: struct (raw bytes, default), scapy (full dissection) or verify (both, reports differences)',
+                        type=str, action="store", required=False, default="struct", choices=DECODERS)
+    parser.add_argument('--capture', help='Capture backend: ring (AF_PACKET TPACKET_V3 memory-mapped ring, default) or scapy (scapy.sniff)',
+                        type=str, action="store", required=False, default="ring", choices=list(CAPTURE_BACKENDS))
+    parser.add_argument('--verbose', help='Print every telemetry report received',
+                        action="store_true", required=False, default=False)
+    parser.add_argument('--ifaces_per_worker', help='Supervisor mode: spawn one worker process (own decoder and writer) per N interfaces, 0 runs everything in this process',
+                        type=int, action="store", required=False, default=0)
+    parser.add_argument('--stats_port', help='Supervisor mode: HTTP port serving the combined workers stats as JSON (GET /stats), 0 to disable',
+                        type=int, action="store", required=False, default=8088)
+    parser.add_argument('--stats_host', help='Supervisor mode: address the stats HTTP server binds to, 0.0.0.0 to serve it on every interface',
+                        type=str, action="store", required=False, default="127.0.0.1")
+    parser.add_argument('--rollup_window', help='Window (seconds) of the per switch/flow/queue rollups written by the collector, 0 disables them',
+                        type=float, action="store", required=False, default=1.0)
+    parser.add_argument('--load_feed', help='Unix datagram socket where the per switch load of every rollup window is pushed (analyzer --mode event), empty to disable',
+                        type=str, action="store", required=False, default="")
+    parser.add_argument('--flow_table', help='Unix socket where the table of the flows (latest path, DSCP, size, first/last seen, packets) is served to the analyzer, empty to disable',
+                        type=str, action="store", required=False, default=DEFAULT_FLOW_TABLE)
+    parser.add_argument('--flow_table_checkpoint', help='JSON file where the table of the flows is checkpointed (read by process_results --flow_table), empty to disable',
+                        type=str, action="store", required=False, default=os.path.join(script_dir, "flow_table.json"))
+    parser.add_argument('--checkpoint_interval', help='Seconds between the checkpoints of the table of the flows (only if it changed)',
+                        type=float, action="store", required=False, default=5.0)
+    parser.add_argument('--raw_sample_rate', help='Raw flow_stats/switch_stats/queue_occupancy/link_latency points are written for 1 of every N reports (1 all, 0 none, only rollups)',
+                        type=int, action="store", required=False, default=1)
+    parser.add_argument('--batch_size', help='Max number of points written to InfluxDB in one request',
+                        type=int, action="store", required=False, default=5000)
+    parser.add_argument('--flush_interval', help='Max time (ms) the points wait in the writer before being sent to InfluxDB',
+                        type=int, action="store", required=False, default=200)
+    parser.add_argument('--queue_size', help='Max number of reports (not points, a report has the flow point and the points of each hop) waiting to be written, the points of the reports beyond it are dropped (and counted as dropped points)',
+                        type=int, action="store", required=False, default=20000)
+    parser.add_argument('--stats_interval', help='Seconds between the prints of the capture and writer counters (kernel drops, dropped points, queue depth, flush latency), 0 to disable',
+                        type=int, action="store", required=False, default=10)
+
+    args = parser.parse_args()
+
+def connect_influxdb():
     try:
         influx_client = InfluxDBClient(host=INFLUX_HOST, database=INFLUX_DB)
         influx_client.ping()  # Check if connection is successful
@@ -56,36 +109,208 @@ def main():
     except Exception as e:
         print("Failed to connect to InfluxDB:", e)
         sys.exit(1)  # Terminate the script with a non-zero exit code
+    return influx_client
+
+def create_flow_table(worker_id=None):
+    #in supervisor mode each worker serves and checkpoints its own table (<path>.<worker>), the consumers merge them
+    if not args.flow_table and not args.flow_table_checkpoint:
+        return None
+    socket_path = worker_path(args.flow_table, worker_id) if args.flow_table else None
+    checkpoint_path = worker_path(args.flow_table_checkpoint, worker_id) if args.flow_table_checkpoint else None
+    return FlowTableService(FlowTable(), socket_path, checkpoint_path, args.checkpoint_interval).start()
+
+def create_collector(influx_client, collector_id=0, worker_id=None):
+    #the sniffing threads only queue the points, a dedicated thread writes them in batches
+    writer = InfluxBatchWriter(influx_client, batch_size=args.batch_size, flush_interval=args.flush_interval/1000,
+                               queue_size=args.queue_size, stats_interval=0 if args.ifaces_per_worker else args.stats_interval).start()
+
+    rollup = None
+    if args.rollup_window > 0:
+        publisher = LoadFeedPublisher(args.load_feed) if args.load_feed else None
+        rollup = RollupAggregator(writer, window=args.rollup_window, collector_id=collector_id, publisher=publisher).start()
+
+    flow_table = create_flow_table(worker_id)
+
+    c = Collector(influx_client, decoder=args.decoder, writer=writer, rollup=rollup, raw_sample_rate=args.raw_sample_rate,
+                  flow_table=flow_table.table if flow_table else None)
+    c.flow_table_service = flow_table
+    return c, writer
+
+def close_collector(c, writer):
+    #the open rollup windows are written before closing the writer
+    if c.rollup is not None:
+        c.rollup.close(timeout=5)
+        if c.rollup.publisher is not None:
+            c.rollup.publisher.close()
+    if c.flow_table_service is not None:
+        c.flow_table_service.close()            #last checkpoint
+    writer.close(timeout=5)
+
+def collector_stats(c, writer, captures):
+    #Counters of one collector (process), as sent to the supervisor
+    stats = {'time': time.time(), 'packets': 0, 'kernel_drops': 0, 'handler_errors': 0, 'reports': c.reports, 'decoder_fallbacks': c.decoder_fallbacks}
+    for capture in captures:
+        capture_stats = capture.stats()
+        stats['packets'] += capture_stats.get('packets', 0)
+        stats['kernel_drops'] += capture_stats.get('kernel_drops', 0)
+        stats['handler_errors'] += capture_stats.get('handler_errors', 0)
+    stats.update(writer.stats())
+    if c.rollup is not None:
+        stats.update(c.rollup.stats())
+    if c.flow_table_service is not None:
+        stats.update({'flow_table_' + name: value for name, value in c.flow_table_service.stats().items()})
+    return stats
+
+def run_captures(ifaces, c, stop_event, report_stats):
+    #Captures on each interface from its own thread until stop_event is set, report_stats() is called every stats_interval
+    captures = [create_capture(args.capture, iface, lambda frame: handle_pkt(frame, c), stop_event) for iface in ifaces]
+    threads = []
+    for capture in captures:
+        sys.stdout.flush()
+        t = threading.Thread(target=sniff_interface, args=(capture,), daemon=True)
+        threads.append(t)
+        t.start()
+
+    # Wait for all threads to finish (or the stop event), reporting the counters
+    next_stats = time.monotonic() + args.stats_interval
+    while any(t.is_alive() for t in threads) and not stop_event.is_set():
+        stop_event.wait(0.5)
+        if args.stats_interval and time.monotonic() >= next_stats:
+            report_stats(captures)
+            next_stats = time.monotonic() + args.stats_interval
+
+    stop_event.set()
+    for t in threads:
+        t.join(1)
+    return captures
+
+def worker_main(worker_id, ifaces, worker_args, sizes, stop_event, stats_queue):
+    #Collector worker process (supervisor mode): own capture threads, decoder and batched writer for its interfaces
+    global args, packet_sizes
+    args = worker_args
+    packet_sizes = sizes
+    signal.signal(signal.SIGINT, signal.SIG_IGN)        #the supervisor handles Ctrl+C and sets stop_event
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    influx_client = connect_influxdb()
+    c, writer = create_collector(influx_client, collector_id=worker_id, worker_id=worker_id)
+    print("Worker %d sniffing on interfaces: %s" % (worker_id, ifaces))
+
+    def report_stats(captures):
+        stats = collector_stats(c, writer, captures)
+        stats['worker'] = worker_id
+        stats['ifaces'] = ifaces
+        stats_queue.put(stats)
+
+    captures = run_captures(ifaces, c, stop_event, report_stats)
+    close_collector(c, writer)
+    report_stats(captures)
+    print("Worker %d finished: %s" % (worker_id, collector_stats(c, writer, captures)))
+
+def supervisor(ifaces):
+    #Spawns one worker process per ifaces_per_worker interfaces and aggregates their counters
+    stop_event = multiprocessing.Event()
+    stats_queue = multiprocessing.Queue()
+    aggregator = StatsAggregator()
+
+    def stop(signum, frame):
+        print("\nSignal %d received. Terminating workers..." % signum)
+        stop_event.set()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    #the stats server is started before the workers, a port in use does not leave them running without a supervisor
+    server = None
+    if args.stats_port:
+        try:
+            server = start_stats_server(aggregator, args.stats_port, args.stats_host)
+            print("Stats available at http://%s:%d/stats" % (args.stats_host, args.stats_port))
+        except OSError as e:
+            print("Stats server on %s:%d not started: %s" % (args.stats_host, args.stats_port, e))
+
+    workers = []
+    for worker_id, first in enumerate(range(0, len(ifaces), args.ifaces_per_worker)):
+        worker_ifaces = ifaces[first:first + args.ifaces_per_worker]
+        p = multiprocessing.Process(target=worker_main, name="collector-worker-%d" % worker_id,
+                                    args=(worker_id, worker_ifaces, args, packet_sizes, stop_event, stats_queue))
+        p.start()
+        workers.append(p)
+
+    next_print = time.monotonic() + args.stats_interval
+    while any(p.is_alive() for p in workers):
+        try:
+            aggregator.update(stats_queue.get(timeout=0.5))
+        except queue.Empty:
+            pass
+        if stop_event.is_set():
+            break
+        if args.stats_interval and time.monotonic() >= next_print:
+            print("Collector stats:", aggregator.snapshot()['total'])
+            next_print = time.monotonic() + args.stats_interval
+
+    stop_event.set()
+    deadline = time.monotonic() + 10
+    for p in workers:
+        while p.is_alive() and time.monotonic() < deadline:
+            try:
+                aggregator.update(stats_queue.get(timeout=0.2))     #keep draining, a full queue blocks the worker exit
+            except queue.Empty:
+                pass
+        if p.is_alive():
+            print("Worker %s did not stop, killing it" % p.name)
+            p.terminate()
+        p.join()
+    while True:
+        try:
+            aggregator.update(stats_queue.get_nowait())
+        except queue.Empty:
+            break
+
+    if server:
+        server.shutdown()
+    print("Collector stats:", json.dumps(aggregator.snapshot()['total'], indent=2))
+
+def main():
+    parse_args()
 
     global packet_sizes
     packet_sizes = read_json(filename_with_sizes)
     print("Packet Sizes read:\n",packet_sizes)
+    print("INT report decoder:", args.decoder, "capture backend:", args.capture)
+
+    ifaces = [i for i in os.listdir('/sys/class/net/') if i.endswith('100')]
+    if not ifaces:
+        print("No interfaces ending with '100' found.")
+        return
 
-    c = Collector(influx_client)
+    if args.ifaces_per_worker > 0:
+        print("Supervisor mode, %d interfaces per worker process:" % args.ifaces_per_worker, ifaces)
+        supervisor(sorted(ifaces))
+        return
+
+    influx_client = connect_influxdb()
+    c, writer = create_collector(influx_client)
     print(influx_client)
+    print("Sniffing on interfaces:", ifaces)
 
-    global stop_sniffing
-    ifaces = [i for i in os.listdir('/sys/class/net/') if i.endswith('100')]
+    def report_stats(captures):
+        for capture in captures:
+            print("Capture %s:" % capture.iface, capture.stats())
 
-    if ifaces:
-        print("Sniffing on interfaces:", ifaces)
-        threads = []
-        try:
-            for iface in ifaces:
-                sys.stdout.flush()
-                t = threading.Thread(target=sniff_interface, args=(iface, c))
-                threads.append(t)
-                t.start()
-
-            # Wait for all threads to finish
-            for t in threads:
-                t.join()
-        except KeyboardInterrupt:
-            stop_sniffing = True
-            print("\nCtrl+C detected. Terminating...")
-            sys.exit(0)
-    else:
-        print("No interfaces ending with '100' found.")
+    def stop(signum, frame):
+        print("\nSignal %d received. Terminating..." % signum)
+        stop_sniffing.set()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    captures = run_captures(ifaces, c, stop_sniffing, report_stats)
+    report_stats(captures)
+    close_collector(c, writer)
+    print("InfluxDB writer:", writer.stats())
+    if c.rollup is not None:
+        print("Rollups:", c.rollup.stats())
+    if c.flow_table_service is not None:
+        print("Flow table:", c.flow_table_service.stats())
 
 
 
@@ -0,0 +1,75 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#Aggregation of the counters pushed by the collector workers (supervisor mode of collector_influxdb.py)
+#Each worker periodically sends {'worker': id, 'ifaces': [...], 'time': t, 'packets': n, 'reports': n, 'written_points': n, ...}
+#and the supervisor serves the per worker and combined counters and rates as JSON (GET /stats)
+
+RATE_COUNTERS = ["packets", "reports", "queued_points", "written_points", "dropped_points", "kernel_drops", "handler_errors", "rollup_points"]
+
+
+class StatsAggregator():
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.workers = {}               #worker id -> last stats received (with the rates since the previous ones)
+        self.start_time = time.time()
+
+    def update(self, stats):
+        with self.lock:
+            previous = self.workers.get(stats['worker'])
+            rates = {}
+            if previous is not None and stats['time'] > previous['time']:
+                elapsed = stats['time'] - previous['time']
+                for counter in RATE_COUNTERS:
+                    rates[counter + '_per_sec'] = round((stats.get(counter, 0) - previous.get(counter, 0)) / elapsed, 1)
+            stats['rates'] = rates
+            self.workers[stats['worker']] = stats
+
+    def snapshot(self):
+        with self.lock:
+            workers = {worker: dict(stats) for worker, stats in self.workers.items()}
+
+        total = {counter: sum(stats.get(counter, 0) for stats in workers.values()) for counter in RATE_COUNTERS}
+        total['queue_depth'] = sum(stats.get('queue_depth', 0) for stats in workers.values())
+        total['rates'] = {}
+        for counter in RATE_COUNTERS:
+            name = counter + '_per_sec'
+            total['rates'][name] = round(sum(stats['rates'].get(name, 0) for stats in workers.values()), 1)
+
+        return {
+            'uptime': round(time.time() - self.start_time, 1),
+            'num_workers': len(workers),
+            'total': total,
+            'workers': workers
+        }
+
+
+def start_stats_server(aggregator, port, host='127.0.0.1'):
+    """
+    Serves the aggregated stats as JSON from a background thread.
+
+    :param aggregator: StatsAggregator with the workers stats.
+    :param port: TCP port of the HTTP server.
+    :param host: Address the server binds to, only the local host by default.
+    :return: The ThreadingHTTPServer (call shutdown() to stop it). Raises OSError if the address can not be bound.
+    """
+    class StatsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') not in ('', '/stats'):
+                self.send_error(404)
+                return
+            body = json.dumps(aggregator.snapshot(), indent=2).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):      #no log line per request
+            pass
+
+    server = ThreadingHTTPServer((host, port), StatsHandler)
+    threading.Thread(target=server.serve_forever, name="stats-server", daemon=True).start()
+    return server
@@ -1,12 +1,16 @@
 
 import sys
 import io
+import threading
 import time
 
 from scapy.all import Packet
 from scapy.all import BitField,ShortField
 from scapy.layers.inet6 import Ether,IPv6, TCP, UDP, bind_layers
 
+from int_decoder import decode_int_report
+from influx_writer import make_point_line
+
 class INTREP(Packet):
     name = "INT Report Header v2.0"
     fields_desc =  [
@@ -153,10 +157,31 @@ class FlowInfo():
     def __str__(self) -> str:
         pass
 
+def same_flow_info(flow_info_a, flow_info_b):
+    # Compares 2 FlowInfo objects field by field (used to verify the struct decoder against Scapy)
+    if flow_info_a is None or flow_info_b is None:
+        return flow_info_a is flow_info_b
+    return vars(flow_info_a) == vars(flow_info_b)
+
+
+# Available decoders for the INT reports
+#   struct: decodes the raw frame bytes with precompiled struct layouts (int_decoder.py), falls back to Scapy if it fails
+#   scapy:  full Scapy dissection of every report (original implementation)
+#   verify: decodes with both and reports any difference (slow, for debugging the struct decoder)
+DECODERS = ["struct", "scapy", "verify"]
 
 class Collector():
-    def __init__(self,influx_client) -> None:
+    def __init__(self,influx_client, decoder="struct", writer=None, rollup=None, raw_sample_rate=1, flow_table=None) -> None:
         self.influx_client = influx_client
+        self.writer = writer                #InfluxBatchWriter, if None the points are written synchronously
+        self.rollup = rollup                #RollupAggregator, if None there are no rollups
+        self.flow_table = flow_table        #FlowTable (common/flow_table.py), latest path/DSCP/size of each flow, None to disable
+        self.raw_sample_rate = raw_sample_rate      #raw points of 1 every N reports (1 all, 0 none)
+        self.decoder = decoder
+        self.decoder_mismatches = 0
+        self.decoder_fallbacks = 0
+        self.reports = 0                    #reports exported
+        self.lock = threading.Lock()        #the counters are updated by the capture threads of all the interfaces
 
     def parse_flow_info(self,flow_info,ip_pkt,packet_sizes):
         flow_info.src_ip = ip_pkt.src
@@ -261,85 +286,105 @@ class Collector():
 
         return flow_info
 
-    #Function to export the collected data to InfluxDB
-    def export_influxdb(self,flow_info):
-        if self.influx_client is None:
-            print("collector.influx_client is Uninitialized")
-            sys.exit(0)
-        
-        if not flow_info:
-            return
-        
-        metric_timestamp = int(time.time()*1000000000)
+    def parser_int_raw(self,frame,packet_sizes):
+        #Same as parser_int_pkt() but receives the raw bytes of the frame, the decoder used depends on self.decoder
+        if self.decoder == "scapy":
+            return self.parser_int_pkt(Ether(bytes(frame)), packet_sizes)
+
+        try:
+            flow_info = decode_int_report(FlowInfo(), frame, packet_sizes)
+        except Exception as e:
+            # Unexpected encapsulation, let Scapy try to make sense of it
+            print("Struct decoder failed (%s), falling back to Scapy" % e)
+            with self.lock:
+                self.decoder_fallbacks += 1
+            return self.parser_int_pkt(Ether(bytes(frame)), packet_sizes)
+
+        if self.decoder == "verify":
+            scapy_flow_info = self.parser_int_pkt(Ether(bytes(frame)), packet_sizes)
+            if not same_flow_info(flow_info, scapy_flow_info):
+                with self.lock:
+                    self.decoder_mismatches += 1
+                print("ERROR: struct and Scapy decoders differ")
+                print("struct:", vars(flow_info) if flow_info else None)
+                print("scapy: ", vars(scapy_flow_info) if scapy_flow_info else None)
+                return scapy_flow_info
+
+        return flow_info
 
-        metrics = []
+    #Builds the InfluxDB points (line protocol) of one report
+    def influxdb_lines(self,flow_info,metric_timestamp):
+        lines = []
         if flow_info.flow_latency:
-            metrics.append({
-                    'measurement': 'flow_stats',
-                    'tags': {
-                        'src_ip': str(flow_info.src_ip),
-                        'dst_ip': str(flow_info.dst_ip),
-                        'flow_label': flow_info.flow_label,
-                        'dscp': flow_info.dscp
-                    },
-                    'time': metric_timestamp,
-                    'fields': {
-                        'src_port': flow_info.src_port,
-                        'dst_port': flow_info.dst_port,
-                        'protocol': flow_info.ip_proto,
-                        'size': flow_info.size,
-                        'latency': int(flow_info.flow_latency),
-                        'path': '-'.join(map(str, flow_info.switch_ids[::-1]))   #store as string separated by '-' and reverse the list so letfmost were the first hops
-                    }
-                })
+            lines.append(make_point_line('flow_stats',
+                    [('dscp', flow_info.dscp),
+                     ('dst_ip', flow_info.dst_ip),
+                     ('flow_label', flow_info.flow_label),
+                     ('src_ip', flow_info.src_ip)],
+                    [('dst_port', flow_info.dst_port),
+                     ('latency', int(flow_info.flow_latency)),
+                     ('path', '-'.join(map(str, flow_info.switch_ids[::-1]))),   #store as string separated by '-' and reverse the list so letfmost were the first hops
+                     ('protocol', flow_info.ip_proto),
+                     ('size', flow_info.size),
+                     ('src_port', flow_info.src_port)],
+                    metric_timestamp))
 
         if len(flow_info.switch_ids) > 0 and len(flow_info.egress_tstamps) > 0 and len(flow_info.hop_latencies) > 0:
             for i in range(flow_info.hop_cnt):
-                metrics.append({
-                    'measurement': 'switch_stats',
-                    'tags': {
-                        'switch_id': flow_info.switch_ids[i],
-                        'src_ip': str(flow_info.src_ip),
-                        'dst_ip': str(flow_info.dst_ip),
-                        'flow_label': flow_info.flow_label,
-                        'dscp': flow_info.dscp
-                    },
-                    'time': metric_timestamp,
-                    'fields': {
-                        'latency': flow_info.hop_latencies[i],
-                        'size': flow_info.size
-                    }
-                })
+                lines.append(make_point_line('switch_stats',
+                    [('dscp', flow_info.dscp),
+                     ('dst_ip', flow_info.dst_ip),
+                     ('flow_label', flow_info.flow_label),
+                     ('src_ip', flow_info.src_ip),
+                     ('switch_id', flow_info.switch_ids[i])],
+                    [('latency', flow_info.hop_latencies[i]),
+                     ('size', flow_info.size)],
+                    metric_timestamp))
 
         if len(flow_info.switch_ids) > 0 and len(flow_info.queue_ids) > 0:
             for i in range(flow_info.hop_cnt):
-                metrics.append({
-                    'measurement': 'queue_occupancy',
-                    'tags': {
-                        'switch_id': flow_info.switch_ids[i],
-                        'queue_id': flow_info.queue_ids[i]
-                    },
-
-                    'time': metric_timestamp,
-                    'fields': {
-                        'queue': flow_info.queue_occups[i]
-                    }
-                })
+                lines.append(make_point_line('queue_occupancy',
+                    [('queue_id', flow_info.queue_ids[i]),
+                     ('switch_id', flow_info.switch_ids[i])],
+                    [('queue', flow_info.queue_occups[i])],
+                    metric_timestamp))
 
         if len(flow_info.switch_ids) > 0 and len(flow_info.l1_egress_ports) > 0 and len(flow_info.l1_ingress_ports) > 0:
             for i in range(flow_info.hop_cnt - 1):
-                metrics.append({
-                    'measurement': 'link_latency',
-                    'tags': {
-                        'egress_switch_id': flow_info.switch_ids[i+1],
-                        'egress_port_id': flow_info.l1_egress_ports[i+1],
-                        'ingress_switch_id': flow_info.switch_ids[i],
-                        'ingress_port_id': flow_info.l1_ingress_ports[i]
-                    },
-                    'time': metric_timestamp,
-                    'fields': {
-                        'latency': abs(flow_info.egress_tstamps[i+1] - flow_info.ingress_tstamps[i])
-                    }
-                })
+                lines.append(make_point_line('link_latency',
+                    [('egress_port_id', flow_info.l1_egress_ports[i+1]),
+                     ('egress_switch_id', flow_info.switch_ids[i+1]),
+                     ('ingress_port_id', flow_info.l1_ingress_ports[i]),
+                     ('ingress_switch_id', flow_info.switch_ids[i])],
+                    [('latency', abs(flow_info.egress_tstamps[i+1] - flow_info.ingress_tstamps[i]))],
+                    metric_timestamp))
+
+        return lines
+
+    #Function to export the collected data to InfluxDB
+    def export_influxdb(self,flow_info):
+        if self.influx_client is None and self.writer is None:
+            print("collector.influx_client is Uninitialized")
+            sys.exit(0)
         
-        self.influx_client.write_points(points=metrics, protocol="json")
+        if not flow_info:
+            return
+        with self.lock:
+            self.reports += 1
+            reports = self.reports
+        
+        metric_timestamp = int(time.time()*1000000000)
+        if self.rollup is not None:
+            self.rollup.add(flow_info, metric_timestamp)
+        if self.flow_table is not None and flow_info.flow_latency:
+            self.flow_table.update(flow_info, metric_timestamp)
+
+        # raw per report/hop points, all of them or sampled
+        if self.raw_sample_rate <= 0 or reports % self.raw_sample_rate != 0:
+            return
+        lines = self.influxdb_lines(flow_info, metric_timestamp)
+
+        if self.writer is not None:
+            self.writer.put(lines)          #queued, the writer thread sends them in batches
+        elif lines:
+            self.influx_client.write_points(lines, protocol="line")
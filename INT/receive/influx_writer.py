@@ -0,0 +1,188 @@
+import queue
+import re
+import threading
+import time
+
+from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+from requests.exceptions import RequestException
+
+#Points are written with the InfluxDB line protocol: measurement,tag1=v1,tag2=v2 field1=v1,field2=v2 timestamp
+#Same output as influxdb.line_protocol.make_line() for the types we use (tags/fields sorted by key, ints with 'i' suffix, None fields skipped)
+
+def escape_tag(value):
+    return str(value).replace("\\", "\\\\").replace(" ", "\\ ").replace(",", "\\,").replace("=", "\\=").replace("\n", "\\n")
+
+def escape_field(value):
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return "%di" % value
+    if isinstance(value, float):
+        return repr(value)
+    return '"%s"' % str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def make_point_line(measurement, tags, fields, timestamp):
+    """
+    Builds one line protocol point.
+
+    :param measurement: Measurement name.
+    :param tags: List of (key, value) tuples, already sorted by key.
+    :param fields: List of (key, value) tuples, already sorted by key. Fields with value None are skipped.
+    :param timestamp: Timestamp in nanoseconds.
+    :return: Line protocol string.
+    """
+    line = measurement
+    for key, value in tags:
+        if value is not None and value != '':
+            line += "," + key + "=" + escape_tag(value)
+    line += " " + ",".join(key + "=" + escape_field(value) for key, value in fields if value is not None)
+    return "%s %d" % (line, timestamp)
+
+def rejected_points(error, batch_points):
+    # Points of a batch InfluxDB did not store: the dropped=N of a partial write (the valid lines are stored), else all of them
+    match = re.search(r"partial write.*dropped=(\d+)", str(error), re.DOTALL)
+    return min(int(match.group(1)), batch_points) if match else batch_points
+
+
+class InfluxBatchWriter():
+    """
+    Writes the points to InfluxDB from a dedicated thread, so the sniffing threads never wait for the HTTP round-trips.
+    Reports are queued (bounded queue of queue_size reports, if it is full the points of the report are dropped and counted) and written in batches
+    of up to batch_size points or every flush_interval seconds, whatever comes first.
+    Failed writes (connection errors, timeouts, 5xx) are retried with exponential backoff.
+    """
+    def __init__(self, influx_client, batch_size=5000, flush_interval=0.2, queue_size=20000, max_retries=5, retry_delay=0.1, stats_interval=0) -> None:
+        self.influx_client = influx_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.stats_interval = stats_interval            #seconds between stats prints, 0 to disable
+
+        self.queue = queue.Queue(maxsize=queue_size)    #each item is the list of lines of one report, the depth is in reports
+        self.lock = threading.Lock()                    #the point counters are updated by all the sniffing threads and the writer thread
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="influx-writer", daemon=True)
+
+        #counters
+        self.queued_points = 0
+        self.written_points = 0
+        self.dropped_points = 0                         #queue full or write failed after all retries
+        self.failed_flushes = 0
+        self.rejected_batches = 0                       #4xx, the valid points of a partial write are stored
+        self.retries = 0
+        self.flushes = 0
+        self.last_flush_latency = 0.0                   #seconds
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, lines):
+        #Never blocks, called from the sniffing threads
+        if not lines:
+            return True
+        try:
+            self.queue.put_nowait(lines)
+        except queue.Full:
+            with self.lock:
+                self.dropped_points += len(lines)
+            return False
+        with self.lock:
+            self.queued_points += len(lines)
+        return True
+
+    def run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        next_stats = time.monotonic() + self.stats_interval
+
+        while not self.stop_event.is_set() or not self.queue.empty():
+            try:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.extend(self.queue.get(timeout=max(timeout, 0)))
+                except queue.Empty:
+                    pass
+
+                now = time.monotonic()
+                if len(batch) >= self.batch_size or now >= deadline:
+                    if batch:
+                        self.flush(batch)
+                        batch = []
+                    deadline = time.monotonic() + self.flush_interval
+
+                if self.stats_interval and now >= next_stats:
+                    print("InfluxDB writer:", self.stats())
+                    next_stats = now + self.stats_interval
+            except Exception as e:                      #the thread must outlive any error, the points of the batch are lost
+                print("InfluxDB writer error, %d points dropped: %r" % (len(batch), e))
+                self.failed_flushes += 1
+                with self.lock:
+                    self.dropped_points += len(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+        if batch:
+            self.flush(batch)
+
+    def flush(self, batch):
+        start = time.monotonic()
+        delay = self.retry_delay
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.influx_client.write_points(batch, protocol='line')
+                break
+            except InfluxDBClientError as e:            #4xx, the batch is malformed, retrying won't help
+                self.rejected_batches += 1
+                dropped = rejected_points(e, len(batch))
+                print("InfluxDB rejected %d of %d points: %s" % (dropped, len(batch), e))
+                with self.lock:
+                    self.dropped_points += dropped
+                self.written_points += len(batch) - dropped
+                return
+            except (RequestException, InfluxDBServerError) as e:     #connection errors, timeouts, broken responses, 5xx
+                error = e
+
+            if attempt == self.max_retries or (self.stop_event.is_set() and attempt > 0):     #don't hold the shutdown for long
+                print("Failed to write %d points to InfluxDB: %s" % (len(batch), error))
+                self.failed_flushes += 1
+                with self.lock:
+                    self.dropped_points += len(batch)
+                return
+            self.retries += 1
+            time.sleep(delay)
+            delay = min(delay * 2, 5)
+
+        latency = time.monotonic() - start
+        self.flushes += 1
+        self.written_points += len(batch)
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self.total_flush_latency += latency
+
+    def stats(self):
+        with self.lock:
+            queued_points, dropped_points = self.queued_points, self.dropped_points
+        return {
+            'queued_points': queued_points,
+            'written_points': self.written_points,
+            'dropped_points': dropped_points,
+            'queue_depth': self.queue.qsize(),                  #reports
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'rejected_batches': self.rejected_batches,
+            'retries': self.retries,
+            'last_flush_latency_ms': round(self.last_flush_latency * 1000, 3),
+            'avg_flush_latency_ms': round(self.total_flush_latency / self.flushes * 1000, 3) if self.flushes else 0,
+            'max_flush_latency_ms': round(self.max_flush_latency * 1000, 3)
+        }
+
+    def close(self, timeout=None):
+        #Writes what is left in the queue and stops the writer thread
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
@@ -0,0 +1,274 @@
+import socket
+import struct
+
+#Decoder that reads the INT reports directly from the raw frame bytes, without building a Scapy packet tree
+#It fills the same FlowInfo object that Collector.parser_int_pkt() fills with the Scapy dissection
+#We work with reports that have this structure:
+#[Eth][IPv6/IPv4][UDP][INT REPORT HDR][INT INDIVIDUAL REPORT HDR][ETH][IPv6 (SRv6, Optional)][IPv6][UDP/TCP][INT SHIM][INT MD][INT DATA]
+
+INT_REPORT_UDP_PORT = 1234              #same port the Scapy layers are bound to (bind_layers(UDP,INTREP,dport=1234))
+INT_REPORT_IN_TYPE_ETHERNET = 3         #INTIndiviREP.in_type that means an Ethernet frame follows
+INT_SHIM_TYPE_MD = 1                    #INTShim.type that means an INT-MD header follows
+
+ETH_HEADER_LEN = 14
+VLAN_HEADER_LEN = 4
+IPV4_MIN_HEADER_LEN = 20
+IPV6_HEADER_LEN = 40
+UDP_HEADER_LEN = 8
+TCP_MIN_HEADER_LEN = 20
+INT_REPORT_HEADER_LEN = 8               #INTREP
+INT_INDIVIDUAL_REPORT_HEADER_LEN = 12   #INTIndiviREP
+INT_SHIM_HEADER_LEN = 4                 #INTShim
+INT_MD_HEADER_LEN = 12                  #INTMD
+
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_IPV6 = 0x86DD
+ETH_TYPE_VLAN = (0x8100, 0x88A8)
+
+IP_PROTO_TCP = 6
+IP_PROTO_UDP = 17
+IP_PROTO_IPV6 = 41                      #IPv6 encapsulated in IPv6 (SRv6 encapsulation)
+IPV6_EXT_HEADERS = (0, 43, 60)          #hop-by-hop, routing (SRv6), destination options
+IPV6_EXT_FRAGMENT = 44
+
+# Same bits as colllector.py, repeated here so the decoder can be imported without Scapy
+SWITCH_ID_BIT =             0b10000000
+L1_PORT_IDS_BIT =           0b01000000
+HOP_LATENCY_BIT =           0b00100000
+QUEUE_BIT =                 0b00010000
+INGRESS_TSTAMP_BIT =        0b00001000
+EGRESS_TSTAMP_BIT =         0b00000100
+L2_PORT_IDS_BIT =           0b00000010
+EGRESS_PORT_TX_UTIL_BIT =   0b00000001
+
+# Order and struct format of the hop metadata of each instruction bit (the order they are written by the switches)
+# The queue id (8 bits) and the queue occupancy (24 bits) are read as a single 32 bit word and split afterwards
+hop_fields_per_bit = [
+    (SWITCH_ID_BIT,           "I",  ("switch_ids",)),
+    (L1_PORT_IDS_BIT,         "HH", ("l1_ingress_ports", "l1_egress_ports")),
+    (HOP_LATENCY_BIT,         "I",  ("hop_latencies",)),
+    (QUEUE_BIT,               "I",  ("queue",)),
+    (INGRESS_TSTAMP_BIT,      "Q",  ("ingress_tstamps",)),
+    (EGRESS_TSTAMP_BIT,       "Q",  ("egress_tstamps",)),
+    (L2_PORT_IDS_BIT,         "II", ("l2_ingress_ports", "l2_egress_ports")),
+    (EGRESS_PORT_TX_UTIL_BIT, "I",  ("egress_tx_utils",)),
+]
+
+udp_ports_struct = struct.Struct("!HH")
+ipv6_first_word_struct = struct.Struct("!I")
+
+# Precompiled hop layouts, key: instruction bitmap (ins_map), value: (struct.Struct, list of FlowInfo list names)
+hop_layouts = {}
+
+def get_hop_layout(ins_map):
+    """
+    Returns the precompiled struct layout for the hop metadata selected by the instruction bitmap.
+
+    :param ins_map: 8 bit instruction bitmap (SWITCH_ID_BIT ... EGRESS_PORT_TX_UTIL_BIT).
+    :return: Tuple (struct.Struct, tuple of FlowInfo attribute names, one per unpacked value).
+    """
+    layout = hop_layouts.get(ins_map)
+    if layout is not None:
+        return layout
+
+    fmt = "!"
+    names = []
+    for bit, bit_fmt, bit_names in hop_fields_per_bit:
+        if ins_map & bit:
+            fmt += bit_fmt
+            names.extend(bit_names)
+
+    layout = (struct.Struct(fmt), tuple(names))
+    hop_layouts[ins_map] = layout
+    return layout
+
+# Build all the 256 layouts once, so the decoding path never compiles a format
+for ins_map in range(256):
+    get_hop_layout(ins_map)
+
+def skip_ethernet(buf, offset):
+    # Returns (ether_type, offset of the payload), handles 802.1Q/802.1ad tags
+    if len(buf) < offset + ETH_HEADER_LEN:
+        return None, offset
+    ether_type = (buf[offset + 12] << 8) | buf[offset + 13]
+    offset += ETH_HEADER_LEN
+    while ether_type in ETH_TYPE_VLAN:
+        if len(buf) < offset + VLAN_HEADER_LEN:
+            return None, offset
+        ether_type = (buf[offset + 2] << 8) | buf[offset + 3]
+        offset += VLAN_HEADER_LEN
+    return ether_type, offset
+
+def skip_ipv6_ext_headers(buf, next_header, offset):
+    # Skips IPv6 extension headers (SRv6 routing header included), returns (next_header, offset)
+    while next_header in IPV6_EXT_HEADERS or next_header == IPV6_EXT_FRAGMENT:
+        if len(buf) < offset + 8:
+            return None, offset
+        ext_next_header = buf[offset]
+        if next_header == IPV6_EXT_FRAGMENT:
+            offset += 8
+        else:
+            offset += (buf[offset + 1] + 1) << 3
+        next_header = ext_next_header
+    return next_header, offset
+
+def report_payload_offset(buf):
+    """
+    Finds the start of the Ethernet frame carried inside an INT report.
+
+    :param buf: Raw bytes (or memoryview) of the sniffed frame.
+    :return: Offset of the inner Ethernet header, or None if the frame is not an INT report.
+    """
+    ether_type, offset = skip_ethernet(buf, 0)
+
+    if ether_type == ETH_TYPE_IPV6:
+        if len(buf) < offset + IPV6_HEADER_LEN:
+            return None
+        next_header, offset = skip_ipv6_ext_headers(buf, buf[offset + 6], offset + IPV6_HEADER_LEN)
+    elif ether_type == ETH_TYPE_IPV4:
+        if len(buf) < offset + IPV4_MIN_HEADER_LEN:
+            return None
+        next_header = buf[offset + 9]
+        offset += (buf[offset] & 0x0F) << 2
+    else:
+        return None
+
+    if next_header != IP_PROTO_UDP or len(buf) < offset + UDP_HEADER_LEN:
+        return None
+    _, dst_port = udp_ports_struct.unpack_from(buf, offset)
+    if dst_port != INT_REPORT_UDP_PORT:
+        return None
+    offset += UDP_HEADER_LEN
+
+    # INT report header + individual report header, the in_type (4 lower bits of the 1st byte) must be Ethernet
+    if len(buf) < offset + INT_REPORT_HEADER_LEN + INT_INDIVIDUAL_REPORT_HEADER_LEN:
+        return None
+    offset += INT_REPORT_HEADER_LEN
+    if buf[offset] & 0x0F != INT_REPORT_IN_TYPE_ETHERNET:
+        return None
+    return offset + INT_INDIVIDUAL_REPORT_HEADER_LEN
+
+def decode_flow_info(flow_info, buf, offset, packet_sizes):
+    # Parses the 6 tuple from the last IPv6 header (the original packet), returns the offset of the L4 payload
+    # The report may contain the SRv6 outer IPv6 header, we always keep the last (innermost) one
+    ether_type, offset = skip_ethernet(buf, offset)
+    if ether_type != ETH_TYPE_IPV6:
+        return None
+
+    ipv6_offset = None
+    next_header = IP_PROTO_IPV6
+    while next_header == IP_PROTO_IPV6:
+        if len(buf) < offset + IPV6_HEADER_LEN:
+            return None
+        ipv6_offset = offset
+        next_header, offset = skip_ipv6_ext_headers(buf, buf[offset + 6], offset + IPV6_HEADER_LEN)
+
+    first_word = ipv6_first_word_struct.unpack_from(buf, ipv6_offset)[0]
+    traffic_class = (first_word >> 20) & 0xFF
+
+    flow_info.src_ip = socket.inet_ntop(socket.AF_INET6, bytes(buf[ipv6_offset + 8:ipv6_offset + 24]))
+    flow_info.dst_ip = socket.inet_ntop(socket.AF_INET6, bytes(buf[ipv6_offset + 24:ipv6_offset + 40]))
+    flow_info.ip_proto = buf[ipv6_offset + 6]
+    flow_info.flow_label = first_word & 0xFFFFF
+    flow_info.dscp = traffic_class >> 2         #only 6 leftmost bits are DSCP
+    flow_info.size = packet_sizes.get(str(flow_info.dscp), 0)
+
+    if next_header == IP_PROTO_UDP:
+        if len(buf) < offset + UDP_HEADER_LEN:
+            return None
+        flow_info.src_port, flow_info.dst_port = udp_ports_struct.unpack_from(buf, offset)
+        return offset + UDP_HEADER_LEN
+    elif next_header == IP_PROTO_TCP:
+        if len(buf) < offset + TCP_MIN_HEADER_LEN:
+            return None
+        flow_info.src_port, flow_info.dst_port = udp_ports_struct.unpack_from(buf, offset)
+        return offset + ((buf[offset + 12] >> 4) << 2)
+
+    return None
+
+def decode_int_metadata(flow_info, buf, offset):
+    # Same logic as Collector.parse_int_metadata(), but with precompiled struct layouts over a memoryview
+    if len(buf) < offset + INT_SHIM_HEADER_LEN + INT_MD_HEADER_LEN:
+        return
+    if buf[offset] >> 4 != INT_SHIM_TYPE_MD:
+        return
+
+    # telemetry metadata length (in 4 byte words, without the INT-MD header)
+    int_len = buf[offset + 1] - 3
+    offset += INT_SHIM_HEADER_LEN
+    # hop telemetry metadata length (in 4 byte words)
+    hop_meta_len = buf[offset + 2] & 0x1F
+    # telemetry instructions, the 8 leftmost bits of the instruction bitmap
+    ins_map = buf[offset + 4]
+    offset += INT_MD_HEADER_LEN
+
+    if hop_meta_len <= 0 or int_len <= 0:
+        print("Error: can not calculate flow_latency, hop_count = 0")
+        return
+
+    # hop count
+    hop_count = int_len // hop_meta_len
+    hop_len = hop_meta_len << 2
+    layout, names = hop_layouts[ins_map]
+
+    # Never read past the end of the frame, a truncated report only gives the complete hops
+    available_hops = (len(buf) - offset) // hop_len
+    if available_hops < hop_count:
+        hop_count = available_hops
+    flow_info.hop_cnt = hop_count
+
+    if layout.size > hop_len:           #the instructions do not fit in the announced hop length
+        return
+
+    if layout.size == hop_len:
+        hops = layout.iter_unpack(buf[offset:offset + hop_count * hop_len])
+    else:
+        hops = (layout.unpack_from(buf, offset + i * hop_len) for i in range(hop_count))
+
+    lists = [getattr(flow_info, name) if name != "queue" else None for name in names]
+    queue_index = names.index("queue") if "queue" in names else -1
+    for values in hops:
+        for i, value in enumerate(values):
+            if i == queue_index:
+                flow_info.queue_ids.append(value >> 24)
+                flow_info.queue_occups.append(value & 0xFFFFFF)
+            else:
+                lists[i].append(value)
+
+    if hop_count <= 0:
+        print("Error: can not calculate flow_latency, hop_count = %d" % hop_count)
+        return
+    if not flow_info.egress_tstamps or not flow_info.ingress_tstamps:
+        return
+    #flow latency nanosenconds (subtraction of last egress and fist ingress timestamp)
+    flow_info.flow_latency = max(flow_info.egress_tstamps) - min(flow_info.ingress_tstamps)
+    if flow_info.flow_latency < 0:
+        print("ERROR: flow_latency < 0")
+
+def decode_int_report(flow_info, frame, packet_sizes):
+    """
+    Decodes a raw INT report frame into flow_info, without any Scapy dissection.
+
+    :param flow_info: Empty FlowInfo object to be filled.
+    :param frame: Raw bytes, bytearray or memoryview of the sniffed frame (starting at the Ethernet header).
+    :param packet_sizes: Dictionary with the packet size of each DSCP value.
+    :return: flow_info if the frame is an INT report that could be decoded, None otherwise.
+    """
+    buf = frame if isinstance(frame, memoryview) else memoryview(frame)
+
+    offset = report_payload_offset(buf)
+    if offset is None:
+        return None
+
+    offset = decode_flow_info(flow_info, buf, offset, packet_sizes)
+    if offset is None:
+        # The original packet is not UDP/TCP, so it can not carry INT metadata, keep only the flow information
+        return flow_info if flow_info.src_ip is not None else None
+
+    decode_int_metadata(flow_info, buf, offset)
+    return flow_info
+
+def is_int_report(frame):
+    # Cheap check used to discard non report frames before creating any object
+    buf = frame if isinstance(frame, memoryview) else memoryview(frame)
+    return report_payload_offset(buf) is not None
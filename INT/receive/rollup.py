@@ -0,0 +1,286 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from quantile_sketch import QuantileSketch, merge_sketches
+from influx_writer import make_point_line
+
+#In-collector pre-aggregation of the INT reports into fixed time windows, one point per key and window instead of one per hop:
+#   switch_rollup:       per switch_id                                       (same stats the analyzer gets from switch_stats GROUP BY switch_id)
+#   switch_flow_rollup:  per switch_id and flow (src_ip, dst_ip, flow_label)  (same stats as switch_stats GROUP BY switch_id, flow)
+#   flow_rollup:         per flow, end to end latency and last path          (same stats as flow_stats)
+#   queue_rollup:        per switch_id and queue_id                          (same stats as queue_occupancy)
+#   switch_bytes:        per switch_id, dscp and size, flow reports through the switch and their bytes  (flow_stats WHERE path =~ switch)
+#   flow_bytes:          per dscp and size, flow reports                     (the sizes of flow_stats, for their percentile)
+#count + sums are stored so the means over several windows are SUM(x_sum)/SUM(count), the percentiles come from a sketch
+#The point timestamp is the window start, the "collector" tag keeps apart the rollups of different collector processes
+#
+#Besides the rollups, the latency sketches of every window are written serialized (quantile_sketch.py), so the analyzer and
+#process_results get the percentiles of any time range by merging them instead of scanning the raw points:
+#   switch_latency_sketch:  per switch_id and dscp, hop latency      (replaces PERCENTILE("latency", p) FROM switch_stats)
+#   flow_latency_sketch:    per dscp, end to end flow latency        (replaces PERCENTILE("latency", p) FROM flow_stats)
+#
+#With a publisher (common/load_feed.py), the per switch totals of every closed window are also pushed to the analyzer event mode
+
+ROLLUP_MEASUREMENTS = ["switch_rollup", "switch_flow_rollup", "flow_rollup", "queue_rollup", "switch_latency_sketch", "flow_latency_sketch",
+                       "switch_bytes", "flow_bytes"]
+
+def count_bytes(rollups, switch_ids, dscp, size):
+    # One flow report in switch_bytes and flow_bytes, each switch of its path only once (as the regex on flow_stats.path)
+    key = (dscp, size)
+    rollups['flow_bytes'][key] = rollups['flow_bytes'].get(key, 0) + 1
+    switch_bytes = rollups['switch_bytes']
+    for switch_id in set(switch_ids):
+        key = (switch_id, dscp, size)
+        switch_bytes[key] = switch_bytes.get(key, 0) + 1
+
+def byte_lines(window_start, rollups, collector, window):
+    lines = []
+    for (switch_id, dscp, size), packets in rollups['switch_bytes'].items():
+        lines.append(make_point_line('switch_bytes',
+            [('collector', collector), ('dscp', dscp), ('size', size), ('switch_id', switch_id)],
+            [('bytes', packets * size),
+             ('packets', packets),
+             ('window', window)],
+            window_start))
+
+    for (dscp, size), packets in rollups['flow_bytes'].items():
+        lines.append(make_point_line('flow_bytes',
+            [('collector', collector), ('dscp', dscp), ('size', size)],
+            [('bytes', packets * size),
+             ('packets', packets),
+             ('window', window)],
+            window_start))
+    return lines
+
+
+class Rollup():
+    #Aggregated values of one key on one window (the value is the latency, or the occupancy for the queues)
+    def __init__(self, sketch=True) -> None:
+        self.count = 0
+        self.value_sum = 0
+        self.size_sum = 0
+        self.sketch = QuantileSketch() if sketch else None
+        self.max = None
+        self.path = None
+
+    def add(self, value, size):
+        self.count += 1
+        self.value_sum += value
+        self.size_sum += size
+        if self.sketch is not None:
+            self.sketch.add(value)
+        if self.max is None or value > self.max:
+            self.max = value
+
+
+class RollupAggregator():
+    """
+    Keeps the rollups of the open windows and writes the closed ones through the InfluxBatchWriter.
+
+    :param writer: InfluxBatchWriter (anything with put(lines)).
+    :param window: Window length in seconds.
+    :param collector_id: Value of the "collector" tag (worker id in supervisor mode).
+    :param publisher: LoadFeedPublisher that gets the per switch totals of every closed window, None to disable.
+    """
+    def __init__(self, writer, window=1.0, collector_id=0, publisher=None) -> None:
+        self.writer = writer
+        self.publisher = publisher
+        self.window = window
+        self.window_ns = int(window * 1000000000)
+        self.collector_id = collector_id
+
+        self.lock = threading.Lock()
+        self.windows = {}               #window start (ns) -> {measurement: {key: Rollup}}
+        self.last_flushed = -1          #start of the last window written
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="rollup", daemon=True)
+
+        #counters
+        self.reports = 0
+        self.points = 0                 #rollup points written
+        self.late_reports = 0           #reports of a window already written (added to the current window)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def add(self, flow_info, metric_timestamp):
+        window_start = metric_timestamp - metric_timestamp % self.window_ns
+        flow = (flow_info.src_ip, flow_info.dst_ip, flow_info.flow_label)
+
+        with self.lock:
+            self.reports += 1
+            if window_start <= self.last_flushed:         #its window was already written, writing it again would overwrite the point
+                self.late_reports += 1
+                window_start = self.last_flushed + self.window_ns
+            if window_start not in self.windows:
+                self.windows[window_start] = {measurement: {} for measurement in ROLLUP_MEASUREMENTS}
+            rollups = self.windows[window_start]
+
+            if flow_info.flow_latency:
+                key = flow + (flow_info.dscp,)
+                rollup = rollups['flow_rollup'].get(key)
+                if rollup is None:
+                    rollup = rollups['flow_rollup'][key] = Rollup()
+                rollup.add(flow_info.flow_latency, flow_info.size)
+                rollup.path = flow_info.switch_ids[::-1]
+
+                sketch = rollups['flow_latency_sketch'].get(flow_info.dscp)
+                if sketch is None:
+                    sketch = rollups['flow_latency_sketch'][flow_info.dscp] = QuantileSketch()
+                sketch.add(flow_info.flow_latency)
+
+                count_bytes(rollups, flow_info.switch_ids, flow_info.dscp, flow_info.size)
+
+            if len(flow_info.switch_ids) > 0 and len(flow_info.egress_tstamps) > 0 and len(flow_info.hop_latencies) > 0:
+                for i in range(flow_info.hop_cnt):
+                    switch_id = flow_info.switch_ids[i]
+                    rollup = rollups['switch_rollup'].get(switch_id)
+                    if rollup is None:
+                        rollup = rollups['switch_rollup'][switch_id] = Rollup()
+                    rollup.add(flow_info.hop_latencies[i], flow_info.size)
+
+                    key = (switch_id,) + flow + (flow_info.dscp,)
+                    rollup = rollups['switch_flow_rollup'].get(key)
+                    if rollup is None:
+                        rollup = rollups['switch_flow_rollup'][key] = Rollup(sketch=False)
+                    rollup.add(flow_info.hop_latencies[i], flow_info.size)
+
+                    key = (switch_id, flow_info.dscp)
+                    sketch = rollups['switch_latency_sketch'].get(key)
+                    if sketch is None:
+                        sketch = rollups['switch_latency_sketch'][key] = QuantileSketch()
+                    sketch.add(flow_info.hop_latencies[i])
+
+            if len(flow_info.switch_ids) > 0 and len(flow_info.queue_ids) > 0:
+                for i in range(flow_info.hop_cnt):
+                    key = (flow_info.switch_ids[i], flow_info.queue_ids[i])
+                    rollup = rollups['queue_rollup'].get(key)
+                    if rollup is None:
+                        rollup = rollups['queue_rollup'][key] = Rollup()
+                    rollup.add(flow_info.queue_occups[i], 0)
+
+    def run(self):
+        #closes the windows once they are over
+        while not self.stop_event.wait(min(self.window / 2, 1)):
+            self.flush()
+        self.flush(all_windows=True)
+
+    def flush(self, all_windows=False):
+        now = time.time_ns()
+        with self.lock:
+            closed = [start for start in self.windows if all_windows or start + self.window_ns <= now]
+            closed_windows = [(start, self.windows.pop(start)) for start in sorted(closed)]
+            if closed:
+                self.last_flushed = max(self.last_flushed, max(closed))
+
+        for window_start, rollups in closed_windows:
+            lines = self.window_lines(window_start, rollups)
+            self.points += len(lines)
+            self.writer.put(lines)
+            if self.publisher is not None:
+                self.publisher.publish(self.load_message(window_start, rollups))
+
+    def load_message(self, window_start, rollups):
+        #per switch totals of the window, for the load feed
+        switch_rollups = rollups['switch_rollup']
+        return {
+            'collector': self.collector_id,
+            'window': window_start,
+            'window_length': self.window,
+            'sent': time.time(),
+            'switches': {switch_id: [rollup.count, rollup.value_sum, rollup.size_sum] for switch_id, rollup in switch_rollups.items()},
+            'flow_packets': sum(rollup.count for rollup in rollups['flow_rollup'].values()),
+            'latency_sketch': merge_sketches(rollup.sketch for rollup in switch_rollups.values()).to_string()
+        }
+
+    def window_lines(self, window_start, rollups):
+        lines = []
+        collector = self.collector_id
+        window = self.window
+
+        for switch_id, rollup in rollups['switch_rollup'].items():
+            lines.append(make_point_line('switch_rollup',
+                [('collector', collector), ('switch_id', switch_id)],
+                [('count', rollup.count),
+                 ('latency_max', rollup.max),
+                 ('latency_mean', rollup.value_sum / rollup.count),
+                 ('latency_p85', float(rollup.sketch.quantile(0.85))),
+                 ('latency_p95', float(rollup.sketch.quantile(0.95))),
+                 ('latency_sum', rollup.value_sum),
+                 ('size_mean', rollup.size_sum / rollup.count),
+                 ('size_sum', rollup.size_sum),
+                 ('window', window)],
+                window_start))
+
+        for (switch_id, src_ip, dst_ip, flow_label, dscp), rollup in rollups['switch_flow_rollup'].items():
+            lines.append(make_point_line('switch_flow_rollup',
+                [('collector', collector), ('dscp', dscp), ('dst_ip', dst_ip), ('flow_label', flow_label), ('src_ip', src_ip), ('switch_id', switch_id)],
+                [('count', rollup.count),
+                 ('latency_mean', rollup.value_sum / rollup.count),
+                 ('latency_sum', rollup.value_sum),
+                 ('size_mean', rollup.size_sum / rollup.count),
+                 ('size_sum', rollup.size_sum),
+                 ('window', window)],
+                window_start))
+
+        for (src_ip, dst_ip, flow_label, dscp), rollup in rollups['flow_rollup'].items():
+            lines.append(make_point_line('flow_rollup',
+                [('collector', collector), ('dscp', dscp), ('dst_ip', dst_ip), ('flow_label', flow_label), ('src_ip', src_ip)],
+                [('count', rollup.count),
+                 ('latency_max', rollup.max),
+                 ('latency_mean', rollup.value_sum / rollup.count),
+                 ('latency_p85', float(rollup.sketch.quantile(0.85))),
+                 ('latency_p95', float(rollup.sketch.quantile(0.95))),
+                 ('latency_sum', rollup.value_sum),
+                 ('path', '-'.join(map(str, rollup.path))),
+                 ('size_sum', rollup.size_sum),
+                 ('window', window)],
+                window_start))
+
+        for (switch_id, queue_id), rollup in rollups['queue_rollup'].items():
+            lines.append(make_point_line('queue_rollup',
+                [('collector', collector), ('queue_id', queue_id), ('switch_id', switch_id)],
+                [('count', rollup.count),
+                 ('queue_max', rollup.max),
+                 ('queue_mean', rollup.value_sum / rollup.count),
+                 ('queue_p95', float(rollup.sketch.quantile(0.95))),
+                 ('window', window)],
+                window_start))
+
+        for (switch_id, dscp), sketch in rollups['switch_latency_sketch'].items():
+            lines.append(make_point_line('switch_latency_sketch',
+                [('collector', collector), ('dscp', dscp), ('switch_id', switch_id)],
+                [('count', sketch.count),
+                 ('sketch', sketch.to_string()),
+                 ('window', window)],
+                window_start))
+
+        for dscp, sketch in rollups['flow_latency_sketch'].items():
+            lines.append(make_point_line('flow_latency_sketch',
+                [('collector', collector), ('dscp', dscp)],
+                [('count', sketch.count),
+                 ('sketch', sketch.to_string()),
+                 ('window', window)],
+                window_start))
+
+        lines += byte_lines(window_start, rollups, collector, window)
+        return lines
+
+    def stats(self):
+        stats = {'rollup_reports': self.reports, 'rollup_points': self.points, 'rollup_late_reports': self.late_reports,
+                 'rollup_open_windows': len(self.windows)}
+        if self.publisher is not None:
+            stats.update(self.publisher.stats())
+        return stats
+
+    def close(self, timeout=None):
+        #writes the open windows and stops the flush thread
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        else:
+            self.flush(all_windows=True)
@@ -5,6 +5,10 @@ from influxdb import InfluxDBClient
 import sys
 from datetime import datetime, timedelta
 import random
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common'))
+from topology import SWITCHES, directed_links
 
 # Configurações do InfluxDB
 host = 'localhost'
@@ -154,15 +158,8 @@ def visualize_graph(G, edge_colors, edge_flow_indices):
 
 # Inicialização do gráfico
 G = nx.MultiDiGraph()
-G.add_nodes_from([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14])
-G.add_edges_from([
-    (1, 4), (1, 9), (2, 3), (2, 14), (9, 4), (9, 10), (9, 13), (9, 14), (14, 10), (14, 3), (14, 13), 
-    (4, 5), (4, 10), (3, 13), (3, 6), (10, 5), (10, 11), (10, 12), (10, 13), (13, 11), (13, 12), (13, 6),
-    (5, 8), (5, 11), (6, 7), (6, 12), (11, 12), (11, 8), (12, 7), (8, 7), (4, 1), (9, 1), (3, 2), (14, 2), 
-    (4, 9), (10, 9), (13, 9), (14, 9), (10, 14), (3, 14), (13, 14), (5, 4), (10, 4), (13, 3), (6, 3), (5, 10), 
-    (11, 10), (12, 10), (13, 10), (11, 13), (12, 13), (6, 13), (8, 5), (11, 5), (7, 6), (12, 6), (12, 11), 
-    (8, 11), (7, 12), (7, 8)
-])
+G.add_nodes_from(SWITCHES)
+G.add_edges_from(directed_links())   # Ligações da topologia (INT/common/topology.py), nos dois sentidos
 
 edge_colors = {}
 edge_update_time = {edge: datetime.min for edge in G.edges()}  # Inicializa o tempo da última atualização com datetime.min
@@ -1,4 +1,5 @@
 
+import json
 import os
 import time
 import constants
@@ -30,6 +31,12 @@ iteration_sleep  = 0
 num_iterations = 10
 iteration_duration_seconds = 5 * 60  #5 minutes, the duration of each iteration of the test
 
+send_engine = "scapy"                #send.py --engine, raw: packets serialized once and sent over one AF_PACKET socket (tools/raw_send.py)
+send_pacing = "constant"             #send.py --pacing, constant|poisson|onoff intervals on absolute deadlines (tools/pacing.py)
+receive_engine = "raw"               #receive.py --engine, raw: headers parsed from the bytes, per flow counters (tools/raw_receive.py)
+traffic_engine = True                #one tools/traffic_engine.py per host with all its flows, False: one tools/send.py per flow
+host_flows = {}                      #flows of each host for the traffic engines, filled by send_packet_script(), started by start_traffic_engines()
+
 sender_receiver_gap = 5              #seconds to wait for the receiver to start before starting the sender
 export_results_gap = 5               #seconds to wait for the senders/receivers to finish before exporting the results
 
@@ -57,9 +64,15 @@ def create_lock_file(lock_filename):
             lock_file.write('') # Write an empty string to the file
 
 def send_packet_script(me, dst_ip, l4, flow_label, dport,  msg, dscp, size, count, interval, export_file, iteration):
-    global iteration_duration_seconds
+    global iteration_duration_seconds, send_engine, send_pacing, traffic_engine, host_flows
+
+    if traffic_engine:
+        #the flow is sent by the traffic engine of the host, started with the other flows by start_traffic_engines()
+        flow = {"dst_ip": dst_ip, "port": dport, "l4": l4, "flow_label": flow_label, "m": msg, "dscp": dscp, "s": size, "c": count, "i": interval}
+        host_flows.setdefault(me.name, {"host": me, "export_file": export_file, "iteration": iteration, "flows": []})["flows"].append(flow)
+        return
     
-    command = f"python3 /mininet/tools/send.py --dst_ip {dst_ip} --port {dport} --dscp {dscp} --l4 {l4} --flow_label {flow_label} --m {msg} --s {size} --c {count} --i {interval} --time_out {iteration_duration_seconds} "
+    command = f"python3 /mininet/tools/send.py --dst_ip {dst_ip} --port {dport} --dscp {dscp} --l4 {l4} --flow_label {flow_label} --m {msg} --s {size} --c {count} --i {interval} --time_out {iteration_duration_seconds} --engine {send_engine} --pacing {send_pacing} "
     
     if export_file != None:
         command = command + f" --export {export_file} --me {me.name} --iteration {iteration}"
@@ -70,8 +83,34 @@ def send_packet_script(me, dst_ip, l4, flow_label, dport,  msg, dscp, size, coun
     
     me.cmd(command)
 
+def start_traffic_engines():
+    global iteration_duration_seconds, send_engine, send_pacing, host_flows
+
+    for name, host in host_flows.items():
+        me, export_file, iteration = host["host"], host["export_file"], host["iteration"]
+
+        #flow specs of the host, read by its traffic engine
+        flows_file = f"/INT/results/logs/flows-{iteration}-{name}.json"
+        with open(flows_file, "w") as file:
+            json.dump(host["flows"], file)
+
+        command = f"python3 /mininet/tools/traffic_engine.py --flows {flows_file} --time_out {iteration_duration_seconds} --engine {send_engine} --pacing {send_pacing} "
+
+        if export_file != None:
+            command = command + f" --export {export_file} --me {name} --iteration {iteration}"
+
+        command = command + f" >> /INT/results/logs/send-{iteration}-{name}.log"
+        command = command + " &"
+        #print(f"{name} running Command: {command}")
+
+        me.cmd(command)
+
+    host_flows.clear()
+
 def receive_packet_script(me, export_file, iteration, duration):
-    command = f"python3 /mininet/tools/receive.py"
+    global receive_engine
+
+    command = f"python3 /mininet/tools/receive.py --engine {receive_engine}"
 
     if export_file != None:
         command = command + f" --export {export_file} --me {me.name} --iteration {iteration} --duration {duration}"
@@ -176,6 +215,9 @@ def low_load_test(net, routing):
         #--------------Start Message flows
         create_Messages_flow(h1_1, "2001:1:3::1", 1, 443, 0,  file_results, iteration)   #DSCP 0  
 
+        #-------------Start the flows of each host together
+        start_traffic_engines()
+
         #-------------Keep the test running for a specified duration
         print(f"Waiting for {iteration_sleep} seconds")
         time.sleep(iteration_sleep)  
@@ -270,6 +312,9 @@ def medium_load_test(net, routing):
         create_Video_flow    (h3_1, h8_3_dst_IP, 1, dport, 35,  file_results, iteration)  #DSCP 35
         create_Video_flow    (h3_1, h7_3_dst_IP, 1, dport, 35,  file_results, iteration)  #DSCP 35
 
+        #-------------Start the flows of each host together
+        start_traffic_engines()
+
         #-------------Keep the test running for a specified duration
         print(f"Waiting for {iteration_sleep} seconds")
         time.sleep(iteration_sleep)  
@@ -386,6 +431,9 @@ def high_load_test(net, routing):
         create_Video_flow    (h7_3, h8_4_dst_IP, 1, dport, 35,  file_results, iteration)  #DSCP 35
         create_Video_flow    (h5_1, h2_2_dst_IP, 1, dport, 35,  file_results, iteration)  #DSCP 35
 
+        #-------------Start the flows of each host together
+        start_traffic_engines()
+
         #-------------Keep the test running for a specified duration
         print(f"Waiting for {iteration_sleep} seconds")
         time.sleep(iteration_sleep)  
@@ -506,6 +554,9 @@ def high_emergency_load_test(net, routing):
         #--------------Start Emergency flows
         create_Emergency_flow(h8_4, h1_2_dst_IP, 1, dport, 46, file_results, iteration)   #DSCP 46
 
+        #-------------Start the flows of each host together
+        start_traffic_engines()
+
         #-------------Keep the test running for a specified duration
         print(f"Waiting for {iteration_sleep} seconds")
         time.sleep(iteration_sleep)  
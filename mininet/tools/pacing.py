@@ -0,0 +1,134 @@
+import random
+import time
+from array import array
+from collections import deque
+
+#Pacing of the packets of send.py, on absolute deadlines (time.monotonic_ns) from the start of the flow, so the time it takes
+#to send a packet and the oversleeps do not add up over the flow
+#Waits sleeping until spin before the deadline, and busy waiting the rest (time.sleep alone is late by tens of microseconds)
+#   constant: one packet every interval (constant bit rate)
+#   poisson:  exponential intervals with mean interval (Poisson arrivals)
+#   onoff:    one packet every interval during on_time, nothing during off_time
+#The achieved intervals are compared against the target ones (the differences of the deadlines), see stats()
+#
+#usage:
+#   pacer = Pacer(0.01, "constant")
+#   pacer.start()
+#   while ...:
+#       pacer.wait()
+#       count = pacer.due(batch)            #packets of the deadlines already passed, sent together
+#       ... send count packets ...
+#       pacer.record(count)
+
+PROFILES = ["constant", "poisson", "onoff"]
+
+def wait_until(deadline_ns, spin_ns):
+    # Until deadline_ns (monotonic): sleep, and busy wait the last spin_ns
+    remaining = deadline_ns - time.monotonic_ns()
+    if remaining > spin_ns:
+        time.sleep((remaining - spin_ns) / 1000000000)
+    while time.monotonic_ns() < deadline_ns:
+        pass
+
+
+class Pacer():
+    """
+    Deadlines of the packets of a flow.
+
+    :param interval: Interval between packets in seconds (mean interval with poisson).
+    :param profile: One of PROFILES.
+    :param spin: Seconds before the deadline from which wait() busy waits instead of sleeping.
+    :param on_time: Seconds sending of each on/off cycle (onoff).
+    :param off_time: Seconds without sending of each on/off cycle (onoff).
+    :param seed: Seed of the intervals of poisson.
+    """
+    def __init__(self, interval, profile="constant", spin=0.0002, on_time=1.0, off_time=1.0, seed=None) -> None:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown pacing profile {profile}, must be one of {PROFILES}")
+        self.interval_ns = int(interval * 1000000000)
+        self.profile = profile
+        self.spin_ns = int(spin * 1000000000)
+        self.on_packets = max(1, round(on_time / interval)) if interval > 0 else 1       #packets of each on period
+        self.cycle_ns = int((on_time + off_time) * 1000000000)
+        self.random = random.Random(seed)
+
+        self.start_ns = None
+        self.index = 0                  #packet of upcoming[0]
+        self.upcoming = deque()         #deadlines of the packets index, index + 1, ...
+
+        #statistics of the recorded packets
+        self.count = 0
+        self.first_send_ns = None
+        self.last_send_ns = None
+        self.first_deadline_ns = None
+        self.last_deadline_ns = None
+        self.errors = array('q')        #|achieved - target| interval of each packet after the first (ns)
+
+    def start(self, now_ns=None):
+        # The first packet is due right away
+        self.start_ns = time.monotonic_ns() if now_ns is None else now_ns
+        self.index = 0
+        self.upcoming.clear()
+        self.upcoming.append(self.start_ns)
+
+    def deadline(self, offset=0):
+        # Deadline (monotonic ns) of the packet offset places after the next one to send
+        while len(self.upcoming) <= offset:
+            n = self.index + len(self.upcoming)
+            if self.profile == "constant":
+                self.upcoming.append(self.start_ns + n * self.interval_ns)
+            elif self.profile == "onoff":
+                self.upcoming.append(self.start_ns + (n // self.on_packets) * self.cycle_ns + (n % self.on_packets) * self.interval_ns)
+            else:
+                self.upcoming.append(self.upcoming[-1] + int(self.random.expovariate(1) * self.interval_ns))
+        return self.upcoming[offset]
+
+    def wait(self):
+        # Until the deadline of the next packet
+        wait_until(self.deadline(), self.spin_ns)
+
+    def due(self, limit=1):
+        # Packets whose deadline has passed (at least the next one, at most limit), late ones are sent together to catch up
+        now = time.monotonic_ns()
+        count = 1
+        while count < limit and self.deadline(count) <= now:
+            count += 1
+        return count
+
+    def record(self, count=1, send_ns=None):
+        # The next count packets were sent at send_ns (now by default)
+        send_ns = time.monotonic_ns() if send_ns is None else send_ns
+        for _ in range(count):
+            deadline = self.deadline()
+            self.upcoming.popleft()
+            self.index += 1
+
+            if self.count == 0:
+                self.first_send_ns = send_ns
+                self.first_deadline_ns = deadline
+            else:
+                self.errors.append(abs((send_ns - self.last_send_ns) - (deadline - self.last_deadline_ns)))
+            self.last_send_ns = send_ns
+            self.last_deadline_ns = deadline
+            self.count += 1
+
+    def stats(self):
+        """
+        Achieved against target intervals of the recorded packets.
+
+        :return: Dictionary with target_interval and interval (mean, seconds), mean_error and p99_error (of each interval, ns)
+                 and drift (how much longer than the target the flow took, ns), None values with less than 2 packets.
+        """
+        if self.count < 2:
+            return {'target_interval': None, 'interval': None, 'mean_error': None, 'p99_error': None, 'drift': None}
+
+        errors = sorted(self.errors)
+        elapsed = self.last_send_ns - self.first_send_ns
+        target = self.last_deadline_ns - self.first_deadline_ns
+        return {
+            'target_interval': target / (self.count - 1) / 1000000000,
+            'interval': elapsed / (self.count - 1) / 1000000000,
+            'mean_error': round(sum(errors) / len(errors), 2),
+            'p99_error': errors[min(len(errors) - 1, int(len(errors) * 0.99 + 0.5) - 1)],      #nearest rank
+            'drift': elapsed - target
+        }
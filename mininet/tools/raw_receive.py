@@ -0,0 +1,156 @@
+import socket
+import struct
+import time
+
+from sequence_tracker import SequenceTracker
+
+#Receiver of receive.py --engine raw
+#The frames are read from one AF_PACKET socket into a preallocated buffer (recvmsg_into, kernel timestamps of SO_TIMESTAMPNS),
+#only the headers and the sequence number of the payload ("<sequence number>-<message>", send.py) are parsed from the bytes
+#One thread receives and updates the flows, no queue nor lock, each flow is a FlowRecord of a few counters and the window of
+#its SequenceTracker instead of the list of its sequence numbers, the memory does not grow with the packets
+#The frames the sniff() filter of the Scapy receiver leaves out are skipped the same way: outgoing, not IPv6, ICMPv6, port 53/5353
+#
+#usage:
+#   receiver = RawReceiver("eth0")
+#   flows = receiver.receive(duration=300)          #{(src, dst, flow label): FlowRecord}, addresses as 16 bytes
+#   receiver.close()
+
+ETH_P_IPV6 = 0x86dd
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+PACKET_OUTGOING = getattr(socket, "PACKET_OUTGOING", 4)
+
+EXTENSION_HEADERS = (0, 43, 60)         #hop-by-hop, routing (SRv6), destination options
+IGNORED_PORTS = (53, 5353)              #DNS, mDNS
+MAX_SEQ_DIGITS = 20
+
+
+def parse_frame(frame, length):
+    """
+    Flow, DSCP and sequence number of an Ethernet/IPv6 frame.
+
+    :param frame: Buffer with the frame.
+    :param length: Bytes of the frame in the buffer.
+    :return: ((src, dst, flow label), DSCP, sequence number or None if the payload has none), None if the frame is skipped.
+    """
+    if length < 54 or frame[12] != 0x86 or frame[13] != 0xdd:
+        return None
+
+    first_word = struct.unpack_from("!I", frame, 14)[0]     #version, traffic class, flow label
+    next_header = frame[20]
+    offset = 54
+    while next_header in EXTENSION_HEADERS and offset + 8 <= length:
+        next_header = frame[offset]
+        offset += (frame[offset + 1] + 1) * 8
+    if next_header == 58:
+        return None
+
+    seq = None
+    if (next_header == 17 or next_header == 6) and offset + 4 <= length:
+        sport, dport = struct.unpack_from("!HH", frame, offset)
+        if sport in IGNORED_PORTS or dport in IGNORED_PORTS:
+            return None
+
+        if next_header == 17:
+            payload = offset + 8
+        else:
+            payload = offset + (frame[offset + 12] >> 4) * 4 if offset + 13 <= length else length
+        dash = frame.find(b"-", payload, min(payload + MAX_SEQ_DIGITS + 1, length))
+        if dash > payload:
+            try:
+                seq = int(frame[payload:dash])
+            except ValueError:
+                pass
+
+    key = (bytes(frame[22:38]), bytes(frame[38:54]), first_word & 0xfffff)
+    return key, (first_word >> 22) & 0x3f, seq
+
+
+class FlowRecord():
+    """
+    Metrics of a flow at the receiver, updated per packet.
+
+    :param dscp: DSCP of the first packet.
+    :param arrival_time: Arrival time of the first packet (seconds, Unix epoch).
+    """
+    __slots__ = ("packet_count", "first_packet_time", "last_arrival_time", "DSCP", "sequences")
+
+    def __init__(self, dscp, arrival_time) -> None:
+        self.packet_count = 0
+        self.first_packet_time = arrival_time
+        self.last_arrival_time = arrival_time
+        self.DSCP = dscp
+        self.sequences = SequenceTracker()
+
+    def add(self, seq, arrival_time):
+        self.packet_count += 1
+        self.last_arrival_time = arrival_time
+        if seq is not None:
+            self.sequences.add(seq)
+
+    def avg_jitter(self):
+        # Running average of receive.py: mean inter-arrival time over the packet count
+        return (self.last_arrival_time - self.first_packet_time) / self.packet_count
+
+
+class RawReceiver():
+    """
+    Receives the IPv6 frames of an interface into FlowRecords.
+
+    :param iface: Interface the socket is bound to.
+    :param rcvbuf: Bytes of the kernel receive buffer, room for the bursts while the packets are parsed.
+    """
+    def __init__(self, iface, rcvbuf=8 * 1024 * 1024) -> None:
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_IPV6))
+        self.sock.bind((iface, ETH_P_IPV6))
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        #blocking recvmsg, woken up every 100 ms to check the duration
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, struct.pack("ll", 0, 100000))
+
+        self.buffer = bytearray(65536)
+        self.buffers = [self.buffer]
+        self.ancillary_size = socket.CMSG_SPACE(16)
+        self.flows = {}
+
+    def receive(self, duration=None):
+        """
+        Receives until duration seconds passed (until interrupted without it).
+
+        :return: Flows received, {(src, dst, flow label): FlowRecord}.
+        """
+        end = None if duration is None else time.monotonic() + duration
+        flows = self.flows
+        buffer = self.buffer
+
+        try:
+            while end is None or time.monotonic() < end:
+                try:
+                    length, ancillary, _, address = self.sock.recvmsg_into(self.buffers, self.ancillary_size)
+                except (BlockingIOError, socket.timeout):
+                    continue
+                if address[2] == PACKET_OUTGOING:
+                    continue
+
+                parsed = parse_frame(buffer, length)
+                if parsed is None:
+                    continue
+
+                if ancillary:
+                    seconds, nanoseconds = struct.unpack("ll", ancillary[0][2])
+                    arrival_time = seconds + nanoseconds / 1000000000
+                else:
+                    arrival_time = time.time()
+
+                key, dscp, seq = parsed
+                record = flows.get(key)
+                if record is None:
+                    record = flows[key] = FlowRecord(dscp, arrival_time)
+                record.add(seq, arrival_time)
+        except KeyboardInterrupt:                   #Ctrl-C ends the receive as the duration does (as sniff() of the Scapy receiver)
+            pass
+
+        return flows
+
+    def close(self):
+        self.sock.close()
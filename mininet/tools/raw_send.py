@@ -0,0 +1,161 @@
+import ctypes
+import ctypes.util
+import os
+import socket
+import struct
+
+#Pre-built packet sender of send.py --engine raw
+#The Ether/IPv6/UDP|TCP packet is serialized once (by Scapy, the same bytes sendp() sends), then per packet only the payload
+#("<sequence number>-<message>" followed by zeros) and the L4 checksum are patched on a preallocated bytearray
+#The frames go out through one AF_PACKET socket bound to the interface, with batch > 1 several of them per system call (sendmmsg)
+#
+#usage:
+#   template = PacketTemplate(bytes(Base_pkt / (b'\x00' * payload_space)), payload_offset, checksum_offset, message)
+#   sender = RawSender("eth0", template, batch=32)
+#   sent = sender.send(range(1, 33))
+
+
+def ones_complement_sum(data, total=0):
+    # 16 bit one's complement sum (not inverted) of data, with an odd length padded with a zero byte
+    if len(data) % 2:
+        data = data + b'\x00'
+    total += sum(struct.unpack(f"!{len(data) // 2}H", data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return total
+
+
+class PacketTemplate():
+    """
+    Frame of a flow with the sequence number payload of send.py, patched in place.
+
+    :param frame: Bytes of the frame with the payload all zeros (checksums already computed over it).
+    :param payload_offset: Offset of the payload in the frame, the payload starts at an even offset of the L4 header.
+    :param checksum_offset: Offset of the L4 checksum in the frame.
+    :param message: Message after the sequence number (send.py --m).
+    :param udp: UDP sends a checksum of 0 as 0xffff (0 means no checksum).
+    """
+    def __init__(self, frame, payload_offset, checksum_offset, message, udp=True) -> None:
+        self.frame = bytes(frame)
+        self.payload_offset = payload_offset
+        self.payload_space = len(frame) - payload_offset
+        self.checksum_offset = checksum_offset
+        self.suffix = f"-{message}".encode()
+        self.udp = udp
+
+        #pseudo header, L4 header and the zero payload, the patched bytes of the payload are added to it
+        self.base_sum = ~struct.unpack_from("!H", self.frame, checksum_offset)[0] & 0xffff
+
+    def payload(self, seq):
+        # Same payload as the Scapy loop of send.py, without the zero padding
+        return (str(seq).encode() + self.suffix)[:self.payload_space]
+
+    def new_buffer(self):
+        return bytearray(self.frame)
+
+    def fill(self, buffer, seq, previous_length=0):
+        """
+        Writes the payload of a sequence number and its checksum on a buffer of new_buffer().
+
+        :param previous_length: Payload bytes written on the buffer by the previous fill(), zeroed again if the new ones are fewer.
+        :return: Payload bytes written, for the next fill() of the buffer.
+        """
+        payload = self.payload(seq)
+        end = self.payload_offset + len(payload)
+        buffer[self.payload_offset:end] = payload
+        if previous_length > len(payload):
+            buffer[end:self.payload_offset + previous_length] = bytes(previous_length - len(payload))
+
+        checksum = ~ones_complement_sum(payload, self.base_sum) & 0xffff
+        if checksum == 0 and self.udp:
+            checksum = 0xffff
+        struct.pack_into("!H", buffer, self.checksum_offset, checksum)
+        return len(payload)
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(iovec)), ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", msghdr), ("msg_len", ctypes.c_uint)]
+
+def load_sendmmsg():
+    # sendmmsg() of the libc (Linux), None if it is not available, the frames are then sent one by one
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError, TypeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+class RawSender():
+    """
+    Sends the frames of a PacketTemplate through one AF_PACKET socket.
+
+    :param iface: Interface the socket is bound to.
+    :param template: PacketTemplate of the flow.
+    :param batch: Max frames per send(), each one with its own buffer, sent with a single sendmmsg() if batch > 1.
+    :param sock: AF_PACKET socket already bound to iface, shared with other senders (not closed by close()), a new one by default.
+    """
+    def __init__(self, iface, template, batch=1, sock=None) -> None:
+        self.template = template
+        self.own_sock = sock is None
+        if sock is None:
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+            sock.bind((iface, 0))
+        self.sock = sock
+
+        self.buffers = [template.new_buffer() for _ in range(batch)]
+        self.lengths = [0] * batch                  #payload bytes written on each buffer
+
+        self.sendmmsg = load_sendmmsg() if batch > 1 else None
+        if self.sendmmsg is not None:
+            #the headers point to the buffers, patched in place, so they are built only once
+            self.views = [(ctypes.c_char * len(buffer)).from_buffer(buffer) for buffer in self.buffers]      #also keep the buffers from resizing
+            self.iovecs = (iovec * batch)()
+            self.msgs = (mmsghdr * batch)()
+            for i, buffer in enumerate(self.buffers):
+                self.iovecs[i].iov_base = ctypes.addressof(self.views[i])
+                self.iovecs[i].iov_len = len(buffer)
+                self.msgs[i].msg_hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+                self.msgs[i].msg_hdr.msg_iovlen = 1
+
+    def send(self, seqs):
+        """
+        Sends the frames of the sequence numbers (at most batch of them).
+
+        :return: Number of frames sent, the first ones of seqs. Raises OSError if none was sent.
+        """
+        count = 0
+        for i, seq in enumerate(seqs):
+            self.lengths[i] = self.template.fill(self.buffers[i], seq, self.lengths[i])
+            count += 1
+
+        if self.sendmmsg is not None and count > 1:
+            sent = self.sendmmsg(self.sock.fileno(), self.msgs, count, 0)
+            if sent < 0:
+                error = ctypes.get_errno()
+                raise OSError(error, os.strerror(error))
+            return sent
+
+        for i in range(count):
+            try:
+                self.sock.send(self.buffers[i])
+            except OSError:
+                if i == 0:
+                    raise
+                return i
+        return count
+
+    def close(self):
+        if self.own_sock:
+            self.sock.close()
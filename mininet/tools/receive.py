@@ -1,24 +1,23 @@
 #!/usr/bin/env python
-import csv
-import fcntl
 import pprint
 import queue
 import sys
 import os
 import argparse
+import socket
 import threading
 from scapy.all import sniff, get_if_hwaddr, TCP, UDP, IPv6
 
+from raw_receive import RawReceiver
+from results_csv import append_lines, PACING_COLUMNS
+from sequence_tracker import SequenceTracker
+
 # Global variables to store metrics per flow
 flows_metrics = {}
 flows_lock = threading.Lock()
 
-# Define the directory path inside the container
-result_directory = "/INT/results"
-
 args = None
 packet_queue = queue.Queue()
-out_of_order_packets = []
 
 def get_if_with_zero():
     # Find all interfaces from /sys/class/net/
@@ -58,7 +57,7 @@ def process_packet(pkt):  # Process packets in queue
         if flow_key not in flows_metrics:
             flows_metrics[flow_key] = {
                 "packet_count": 0,
-                "sequence_numbers": [],
+                "sequences": SequenceTracker(),          # Reordered, duplicated, late and lost packets, as they arrive
                 "first_packet_time": pkt.time,
                 "DSCP": pkt[IPv6].tc >> 2,
                 "last_arrival_time": None,     # Track timestamp of the last packet arrival for jitter calculation
@@ -68,7 +67,7 @@ def process_packet(pkt):  # Process packets in queue
         try:
             seq_number, message = payload.split('-', 1)
             seq_number = int(seq_number)  # Ensure the sequence number is an integer
-            flows_metrics[flow_key]["sequence_numbers"].append(seq_number)
+            flows_metrics[flow_key]["sequences"].add(seq_number)
             #print(f"Flow {flow_key} - TRaffic Class:{pkt[IPv6].tc >> 2}- Packet Sequence Number: {seq_number}")
         except ValueError:
             print(f"Flow {flow_key} - Error splitting payload: {payload}")
@@ -100,6 +99,25 @@ def packet_processor():  # Thread that processes packets in queue
         process_packet(pkt)
         packet_queue.task_done()
 
+def receive_raw(iface):
+    # Receiver of raw_receive.py, its flow records as the metrics of process_packet()
+    global flows_metrics
+    receiver = RawReceiver(iface)
+    try:
+        flows = receiver.receive(args.duration)
+    finally:
+        receiver.close()
+
+    for (src, dst, flow_label), record in flows.items():
+        flow_key = (socket.inet_ntop(socket.AF_INET6, src), socket.inet_ntop(socket.AF_INET6, dst), flow_label)
+        flows_metrics[flow_key] = {
+            "packet_count": record.packet_count,
+            "first_packet_time": record.first_packet_time,
+            "DSCP": record.DSCP,
+            "avg_jitter": record.avg_jitter(),
+            "sequences": record.sequences
+        }
+
 def terminate():
     print("Starting terminate")
     print("Flow Metrics Summary:")
@@ -108,19 +126,10 @@ def terminate():
     with flows_lock:
         for flow_key, metrics in flows_metrics.items():
             packet_count = metrics["packet_count"]
-            sequence_numbers = metrics["sequence_numbers"]
-            metrics["out_of_order_count"] = 0
-            metrics["out_of_order_packets"] = []
-            expected_seq = 0
-
-            for seq in sequence_numbers:
-                if seq < expected_seq:
-                    metrics["out_of_order_count"] += 1
-                    metrics["out_of_order_packets"].append(seq)
-                else:
-                    expected_seq = seq
+            sequences = metrics["sequences"]
 
-            print(f"Flow {flow_key} - Sequence Numbers: {sequence_numbers}, Nº Received Packets: {packet_count}, Out of Order Packets Count: {metrics['out_of_order_count']}")
+            print(f"Flow {flow_key} - Nº Received Packets: {packet_count}, Out of Order Packets Count: {sequences.out_of_order()}, "
+                  f"Duplicated: {sequences.duplicated}, Late: {sequences.late}, Lost: {sequences.lost()}, Max Reorder Extent: {sequences.max_extent}")
 
     if args.export:
         print("Exporting results...")
@@ -129,52 +138,20 @@ def terminate():
 def export_results():
     print("Starting export_results()")
     global args, flows_metrics
-    os.makedirs(result_directory, exist_ok=True)
 
-    # Define the filename
-    filename_results = args.export
-    lock_filename = f"LOCK_{filename_results}"
-    
-    # Combine the directory path and filename
-    full_path_results = os.path.join(result_directory, filename_results)
-    full_path_LOCK = os.path.join(result_directory, lock_filename)
-    
-    # Open the lock file
-    with open(full_path_LOCK, 'w') as lock_file:
-        try:
-            # Acquire an exclusive lock on the lock file
-            fcntl.flock(lock_file, fcntl.LOCK_EX)
-            
-            # Check if the results file exists
-            file_exists = os.path.exists(full_path_results)
-
-            # Open the results file for appending
-            print("Exporting results to", full_path_results)
-            with open(full_path_results, mode='a', newline='') as file:
-                # Create a CSV writer object
-                writer = csv.writer(file)
-                
-                # If file does not exist, write the header row
-                if not file_exists:
-                    header = ["Iteration", "Host", "IP Source", "IP Destination", "Flow Label", "Is", "Number", "Timestamp (seconds-Unix Epoch)", "Nº pkt out of order", "Out of order packets", "DSCP", "Avg Jitter (Nanoseconds)"]
-                    writer.writerow(header)
-
-                with flows_lock:  # Ensure only one thread modifies flows_metrics at a time
-                    for flow_key, metrics in flows_metrics.items():
-                        src_ip, dst_ip, flow_label = flow_key
-                        first_packet_time = metrics["first_packet_time"]
-                        out_of_order_packets = metrics["out_of_order_packets"]
-                        out_of_order_packets_count = metrics["out_of_order_count"] 
-                        jitter = metrics["avg_jitter"] * 1000000000
-
-                        line = [args.iteration, args.me, src_ip, dst_ip, flow_label, "receiver", metrics["packet_count"], first_packet_time, out_of_order_packets_count, out_of_order_packets, metrics["DSCP"], jitter]
-                        
-                        # Write data
-                        writer.writerow(line)
-        
-        finally:
-            # Release the lock
-            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lines = []
+    with flows_lock:  # Ensure only one thread modifies flows_metrics at a time
+        for flow_key, metrics in flows_metrics.items():
+            src_ip, dst_ip, flow_label = flow_key
+            first_packet_time = metrics["first_packet_time"]
+            sequences = metrics["sequences"]
+            jitter = metrics["avg_jitter"] * 1000000000
+
+            # Counters and histograms of the sequence numbers instead of the list of the out of order ones, after the (sender) pacing columns
+            lines.append([args.iteration, args.me, src_ip, dst_ip, flow_label, "receiver", metrics["packet_count"], first_packet_time, sequences.out_of_order(), sequences.max_extent, metrics["DSCP"], jitter]
+                         + [None] * len(PACING_COLUMNS) + sequences.columns())
+
+    append_lines(args.export, lines)
     print("Results exported")
 
 def parse_args():
@@ -192,6 +169,8 @@ def parse_args():
                         type=int, action='store', required=False, default=None)
     parser.add_argument('--duration', help='Current test duration seconds', 
                         type=float, action='store', required=False, default=None)
+    parser.add_argument('--engine', help="scapy: sniff() and a processing thread, raw: headers parsed from the bytes in one thread, per flow counters (raw_receive.py)",
+                        type=str, action='store', required=False, default="raw", choices=["scapy", "raw"])
     
     args = parser.parse_args()
     if args.export is not None:
@@ -211,6 +190,11 @@ def main():
     bpf_filter = "ip6 and inbound and not ip6[6] = 58 and not port 53 and not port 5353"
     
     print(f"Starting sniffing for {args.duration} seconds...")
+    if args.engine == 'raw':
+        receive_raw(iface)
+        terminate()
+        return
+
     processor_thread = threading.Thread(target=packet_processor)
     processor_thread.start()
     sniff(
@@ -0,0 +1,58 @@
+import csv
+import fcntl
+import os
+
+from sequence_tracker import HISTOGRAM_BINS
+
+#Results CSV of the tests, one line per flow of each sender (send.py) and receiver (receive.py), all the hosts of a test append
+#to the same file, one at a time (exclusive lock on LOCK_<file>)
+#The pacing columns are only of the senders, the sequence columns (sequence_tracker.py) only of the receivers, the lines are
+#padded with empty values up to the header
+
+# Define the directory path inside the container
+result_directory = "/INT/results"
+
+PACING_COLUMNS = ["Pacing", "Target AVG Interval (seconds)", "AVG Interval (seconds)", "AVG Interval Error (nanoseconds)",
+                  "P99 Interval Error (nanoseconds)", "Drift (nanoseconds)"]
+
+SEQUENCE_COLUMNS = (["Nº pkt duplicated", "Nº pkt late", "Nº pkt lost"] +
+                    [f"Reorder Extent {bin}" for bin in HISTOGRAM_BINS] + [f"Reorder Distance {bin}" for bin in HISTOGRAM_BINS])
+
+HEADER = ["Iteration", "Host", "IP Source", "IP Destination", "Flow Label", "Is", "Number", "Timestamp (seconds-Unix Epoch)",
+          "Nº pkt out of order", "Max Reorder Extent", "DSCP", "Avg Jitter (Nanoseconds)"] + PACING_COLUMNS + SEQUENCE_COLUMNS
+
+def append_lines(filename_results, lines):
+    os.makedirs(result_directory, exist_ok=True)
+
+    lock_filename = f"LOCK_{filename_results}"
+
+    # Combine the directory path and filename
+    full_path_results = os.path.join(result_directory, filename_results)
+    full_path_LOCK = os.path.join(result_directory, lock_filename)
+
+    # Open the lock file
+    with open(full_path_LOCK, 'w') as lock_file:
+        try:
+            # Acquire an exclusive lock on the lock file
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            # Check if the results file exists
+            file_exists = os.path.exists(full_path_results)
+
+            # Open the results file for appending
+            print("Exporting results to", full_path_results)
+            with open(full_path_results, mode='a', newline='') as file:
+                # Create a CSV writer object
+                writer = csv.writer(file)
+
+                # If file does not exist, write the header row
+                if not file_exists:
+                    writer.writerow(HEADER)
+
+                # Write data
+                for line in lines:
+                    writer.writerow(list(line) + [None] * (len(HEADER) - len(line)))
+
+        finally:
+            # Release the lock on the lock file
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
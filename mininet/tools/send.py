@@ -1,8 +1,6 @@
 #!/usr/bin/env python
 import argparse
-import csv
 from datetime import datetime
-import fcntl
 import os
 import sys
 import socket
@@ -13,11 +11,12 @@ from scapy.all import sendp, get_if_list, get_if_addr, get_if_hwaddr
 from scapy.all import Ether, IPv6, UDP, TCP
 from scapy.all import srp, ICMPv6ND_NS
 
+from raw_send import PacketTemplate, RawSender
+from pacing import Pacer, PROFILES
+from results_csv import append_lines
 
-args = None
 
-# Define the directory path inside the container
-result_directory = "/INT/results"
+args = None
 
 def get_if():
     ifs = get_if_list()
@@ -82,7 +81,8 @@ def send_packet(args, pkt_ETHE, payload_space, iface, addr, src_ip):
 
     results = {
         'first_timestamp': None,
-        'failed_packets': 0
+        'failed_packets': 0,
+        'pacing': None
     }
 
     #prev_timestamp = None
@@ -97,7 +97,17 @@ def send_packet(args, pkt_ETHE, payload_space, iface, addr, src_ip):
     Base_pkt = pkt_ETHE / l3_layer / l4_layer 
     my_IP = Base_pkt[IPv6].src
 
+    # Absolute deadlines of the packets (pacing.py), the first one right away
+    pacer = Pacer(args.i, args.pacing, spin=args.spin / 1000000, on_time=args.on_time, off_time=args.off_time)
+    pacer.start()
+
+    if args.engine == 'raw':
+        return send_raw_packets(args, Base_pkt, payload_space, iface, start_time, results, pacer)
+
     for i in range(args.c):
+        # Wait for the deadline of the packet
+        pacer.wait()
+
         # Check for timeout
         if time.time() - start_time >= args.time_out:
             print(f"Timeout reached after {args.time_out} seconds. Exiting loop.")
@@ -137,7 +147,7 @@ def send_packet(args, pkt_ETHE, payload_space, iface, addr, src_ip):
 
         #pkt.show2()
 
-        pre_timestamp = datetime.now()
+        pre_timestamp = time.monotonic_ns()
         try:
             # Send the constructed packet
             sendp(pkt, iface=iface, inter=0, loop=0, verbose=False)
@@ -147,66 +157,69 @@ def send_packet(args, pkt_ETHE, payload_space, iface, addr, src_ip):
             results['failed_packets'] += 1
             print(f"({src_ip}, {args.dst_ip}, {args.flow_label}) Packet {i + 1} failed to send: {e}")
 
-        pkt_sending_time = datetime.now() - pre_timestamp
-        pkt_sending_time_seconds = pkt_sending_time.total_seconds()
-        #print(f"Packet sent in {pkt_sending_time_seconds} seconds")
+        # Achieved against target interval, the time it took to send the packet is not added to the next one
+        pacer.record(1, pre_timestamp)
         
         # Update previous timestamp
         #prev_timestamp = current_timestamp
-        
-        # Sleep for specified interval - the time it took to send the packet, must be subtracted
-        rounded_number = round(args.i - pkt_sending_time_seconds)
-        t = max(rounded_number, 0)
-        time.sleep(t)
-    
+
+    results['pacing'] = pacer.stats()
+    return results
+
+def send_raw_packets(args, Base_pkt, payload_space, iface, start_time, results, pacer):
+    # Same packets as the Scapy loop, serialized once and patched per packet, over one socket (raw_send.py)
+    frame = bytes(Base_pkt / (b'\x00' * payload_space))
+    l4_offset = len(Ether() / IPv6())
+    checksum_offset = l4_offset + (6 if args.l4 == 'udp' else 16)
+    template = PacketTemplate(frame, len(frame) - payload_space, checksum_offset, args.m, udp=args.l4 == 'udp')
+    sender = RawSender(iface, template, batch=args.batch)
+
+    try:
+        seq = 1
+        while seq <= args.c:
+            # Wait for the deadline of the next packet
+            pacer.wait()
+
+            # Check for timeout
+            if time.time() - start_time >= args.time_out:
+                print(f"Timeout reached after {args.time_out} seconds. Exiting loop.")
+                break
+
+            # Packets whose deadline already passed, sent together (at most --batch)
+            seqs = range(seq, seq + pacer.due(min(args.batch, args.c + 1 - seq)))
+
+            # Set the timestamp of the first packet sent
+            if results['first_timestamp'] is None:
+                results['first_timestamp'] = datetime.timestamp(datetime.now())
+
+            pre_timestamp = time.monotonic_ns()
+            try:
+                sent = sender.send(seqs)
+            except OSError as e:
+                sent = 0
+                print(f"({Base_pkt[IPv6].src}, {args.dst_ip}, {args.flow_label}) Packets {seqs[0]}-{seqs[-1]} failed to send: {e}")
+            results['failed_packets'] += len(seqs) - sent
+
+            pacer.record(len(seqs), pre_timestamp)
+            seq += len(seqs)
+    finally:
+        sender.close()
+
+    results['pacing'] = pacer.stats()
     return results
 
 def export_results(results):
     # Write in the CSV file a line with the following format: 
-    global args, result_directory
+    global args
     num_packets_successefuly_sent = args.c - results['failed_packets']
 
-    os.makedirs(result_directory, exist_ok=True)
+    # Prepare the data line, with the achieved against target intervals of the pacing
+    timestamp_first_sent = results['first_timestamp']
+    pacing = results['pacing'] or {}
+    line = [args.iteration, args.me, my_IP, args.dst_ip, args.flow_label, "sender", num_packets_successefuly_sent, timestamp_first_sent, None, None, args.dscp, None,
+            args.pacing, pacing.get('target_interval'), pacing.get('interval'), pacing.get('mean_error'), pacing.get('p99_error'), pacing.get('drift')]
 
-    # Define the filename
-    filename_results = args.export
-    lock_filename = f"LOCK_{filename_results}"
-    
-    # Combine the directory path and filename
-    full_path_results = os.path.join(result_directory, filename_results)
-    full_path_LOCK = os.path.join(result_directory, lock_filename)
-    
-    
-    # Open the lock file
-    with open(full_path_LOCK, 'w') as lock_file:
-        try:
-            # Acquire an exclusive lock on the lock file
-            fcntl.flock(lock_file, fcntl.LOCK_EX)
-            
-            # Check if the results file exists
-            file_exists = os.path.exists(full_path_results)
-
-            # Open the results file for appending
-            print("Exporting results to", full_path_results)
-            with open(full_path_results, mode='a', newline='') as file:
-                # Create a CSV writer object
-                writer = csv.writer(file)
-                
-                # If file does not exist, write the header row
-                if not file_exists:
-                    header = ["Iteration", "Host", "IP Source", "IP Destination", "Flow Label", "Is", "Number", "Timestamp (seconds-Unix Epoch)", "Nº pkt out of order", "Out of order packets", "DSCP", "Avg Jitter (Nanoseconds)"]
-                    writer.writerow(header)
-                
-                # Prepare the data line
-                timestamp_first_sent = results['first_timestamp']
-                line = [args.iteration, args.me, my_IP, args.dst_ip, args.flow_label, "sender", num_packets_successefuly_sent, timestamp_first_sent, None, None, args.dscp, None]
-                
-                # Write data
-                writer.writerow(line)
-                
-        finally:
-            # Release the lock on the lock file
-            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    append_lines(args.export, [line])
 
 
 def parse_args():
@@ -245,6 +258,24 @@ def parse_args():
     parser.add_argument('--time_out', help="timeout in seconds", type=int,
                         action='store', required=False, default=1)
 
+    parser.add_argument('--engine', help="scapy: sendp() of each packet, raw: packet serialized once and sent over one AF_PACKET socket (raw_send.py)",
+                        type=str, action='store', required=False, default="scapy", choices=["scapy", "raw"])
+    
+    parser.add_argument('--batch', help="max packets per system call (sendmmsg) with --engine raw, the ones whose deadline already passed are sent together", type=int,
+                        action='store', required=False, default=1)
+
+    parser.add_argument('--pacing', help="constant: one packet every --i, poisson: exponential intervals with mean --i, onoff: every --i during --on_time then nothing during --off_time",
+                        type=str, action='store', required=False, default="constant", choices=PROFILES)
+
+    parser.add_argument('--on_time', help="seconds sending of each cycle with --pacing onoff", type=float,
+                        action='store', required=False, default=1.0)
+
+    parser.add_argument('--off_time', help="seconds without sending of each cycle with --pacing onoff", type=float,
+                        action='store', required=False, default=1.0)
+
+    parser.add_argument('--spin', help="microseconds before each deadline busy waiting instead of sleeping", type=int,
+                        action='store', required=False, default=200)
+
     # Non-mandatory flag
     parser.add_argument('--export', help='File to export results', 
                         type=str, action='store', required=False, default=None)
@@ -257,6 +288,10 @@ def parse_args():
     
     
     args = parser.parse_args()
+    if args.batch < 1:
+        parser.error('--batch must be a positive integer')
+    if args.on_time <= 0 or args.off_time < 0 or args.spin < 0:
+        parser.error('--on_time must be positive, --off_time and --spin can not be negative')
     if args.export is not None:
         if not args.me:
             parser.error('--me is required when --export is used')
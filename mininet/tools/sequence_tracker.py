@@ -0,0 +1,95 @@
+from array import array
+
+#Sequence numbers of a flow at the receiver (receive.py), tracked as the packets arrive, in constant memory
+#A sliding window of the WINDOW sequence numbers up to the highest one received keeps the arrival number of each one
+#(0 = not received, the bitmap of the window), the packets are classified against it:
+#   reordered:  below the next expected one (highest + 1) and not received before (RFC 4737 Type-P-Reordered)
+#   duplicated: already received (in the window)
+#   late:       below the window, reordered or duplicated can no longer be told apart
+#   lost:       sequence numbers up to the highest one never received (the late ones counted as received)
+#Each reordered packet is added to two histograms of log2 bins (HISTOGRAM_BINS):
+#   extent:   RFC 4737 reordering extent, arrivals since the earliest packet with a higher sequence number
+#   distance: sequence numbers below the next expected one
+#
+#usage:
+#   sequences = SequenceTracker()
+#   sequences.add(seq)                  #each packet
+#   sequences.columns()                 #counters and histograms, as the columns of results_csv.SEQUENCE_COLUMNS
+
+WINDOW = 4096
+HISTOGRAM_BINS = ["1", "2", "3-4", "5-8", "9-16", "17-32", "33-64", "65+"]
+
+def histogram_bin(value):
+    # Bin of a value >= 1: 1, 2, 3-4, 5-8, ..., the last one for the rest
+    return min((value - 1).bit_length(), len(HISTOGRAM_BINS) - 1)
+
+
+class SequenceTracker():
+    """
+    Reordered, duplicated, late and lost packets of a flow.
+
+    :param window: Sequence numbers below the highest one that can still be told reordered or duplicated.
+    """
+    __slots__ = ("window", "arrivals", "arrival", "max_seq", "received", "reordered", "duplicated", "late", "max_extent",
+                 "extent_histogram", "distance_histogram")
+
+    def __init__(self, window=WINDOW) -> None:
+        self.window = window
+        self.arrivals = array('I', bytes(4 * window))       #arrival number of the sequence number of each slot (seq % window)
+        self.arrival = 0                                    #packets added
+        self.max_seq = 0
+        self.received = 0                                   #different sequence numbers in or above the window
+        self.reordered = 0
+        self.duplicated = 0
+        self.late = 0
+        self.max_extent = 0
+        self.extent_histogram = array('Q', bytes(8 * len(HISTOGRAM_BINS)))
+        self.distance_histogram = array('Q', bytes(8 * len(HISTOGRAM_BINS)))
+
+    def add(self, seq):
+        self.arrival += 1
+        arrivals = self.arrivals
+        window = self.window
+
+        if seq > self.max_seq:
+            # the window slides, the slots of the skipped sequence numbers are emptied
+            for skipped in range(max(self.max_seq + 1, seq - window + 1), seq):
+                arrivals[skipped % window] = 0
+            arrivals[seq % window] = self.arrival
+            self.max_seq = seq
+            self.received += 1
+            return
+
+        if seq <= self.max_seq - window or seq < 1:
+            self.late += 1
+            return
+
+        if arrivals[seq % window]:
+            self.duplicated += 1
+            return
+
+        arrivals[seq % window] = self.arrival
+        self.received += 1
+        self.reordered += 1
+
+        # earliest arrival of the higher sequence numbers, all in the window
+        earliest = self.arrival
+        for higher in range(seq + 1, self.max_seq + 1):
+            arrival = arrivals[higher % window]
+            if arrival and arrival < earliest:
+                earliest = arrival
+        extent = self.arrival - earliest
+        self.max_extent = max(self.max_extent, extent)
+        self.extent_histogram[histogram_bin(extent)] += 1
+        self.distance_histogram[histogram_bin(self.max_seq + 1 - seq)] += 1
+
+    def out_of_order(self):
+        # Packets that arrived after a higher sequence number, the duplicates left out
+        return self.reordered + self.late
+
+    def lost(self):
+        return max(self.max_seq - self.received - self.late, 0)
+
+    def columns(self):
+        # Duplicated, late, lost, the extent histogram and the distance histogram
+        return [self.duplicated, self.late, self.lost()] + list(self.extent_histogram) + list(self.distance_histogram)
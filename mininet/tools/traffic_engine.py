@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+import argparse
+from datetime import datetime
+import json
+import random
+import socket
+import sys
+import time
+from scapy.all import conf, get_if_hwaddr
+from scapy.all import Ether, IPv6, UDP, TCP
+
+from send import get_if, get_ipv6_addr, get_ipv6_address
+from raw_send import PacketTemplate, RawSender
+from pacing import Pacer, PROFILES, wait_until
+from results_csv import append_lines
+
+#Traffic engine of a host, all its flows in one process instead of one send.py per flow (Scapy imported and the socket opened
+#once per host), started together on one event loop
+#The flows are read from a JSON file, a list of flow specs with the flags of send.py:
+#   [{"dst_ip": "2001:1:3::1", "port": 443, "l4": "udp", "flow_label": 1, "m": "INTH1", "dscp": 0, "s": 262, "c": 3000, "i": 0.1}, ...]
+#The next deadline of each flow (pacing.py) is kept on a timer wheel of --tick slots, the loop sleeps until the next non empty
+#slot and sends its packets in deadline order, each one on its deadline
+#Exports one line per flow, the same as send.py
+#
+#usage: python3 traffic_engine.py --flows /INT/results/logs/flows-1-h1_1.json --time_out 300 --export HIGH-ECMP_raw_results.csv --me h1_1 --iteration 1
+
+args = None
+
+FLOW_KEYS = ["dst_ip", "port", "l4", "flow_label", "m", "dscp", "s", "c", "i"]
+
+
+class TimerWheel():
+    """
+    Hashed timer wheel of (deadline, item), slot of a deadline = its tick modulo the number of slots, the deadlines of later
+    rotations wait in the slot until their tick comes.
+
+    :param tick: Nanoseconds of each slot.
+    :param slots: Number of slots.
+    :param now_ns: Current time (monotonic ns), late deadlines go to its tick.
+    """
+    def __init__(self, tick, slots=1024, now_ns=0) -> None:
+        self.tick_ns = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = now_ns // tick           #tick of the last pop()
+        self.count = 0
+
+    def add(self, deadline_ns, item):
+        tick = max(deadline_ns // self.tick_ns, self.current)
+        self.slots[tick % len(self.slots)].append((deadline_ns, item))
+        self.count += 1
+
+    def next_tick(self):
+        # Tick of the earliest deadline, None if the wheel is empty
+        if self.count == 0:
+            return None
+        for tick in range(self.current, self.current + len(self.slots)):
+            for deadline_ns, _ in self.slots[tick % len(self.slots)]:
+                if deadline_ns // self.tick_ns <= tick:
+                    return tick
+        #all the deadlines are more than one rotation away (long off periods)
+        return min(deadline_ns for slot in self.slots for deadline_ns, _ in slot) // self.tick_ns
+
+    def pop(self, tick):
+        # Entries of the deadlines up to tick (their slot), in deadline order
+        slot = self.slots[tick % len(self.slots)]
+        due = [entry for entry in slot if entry[0] // self.tick_ns <= tick]
+        slot[:] = [entry for entry in slot if entry[0] // self.tick_ns > tick]
+        self.count -= len(due)
+        self.current = tick
+        due.sort(key=lambda entry: entry[0])
+        return due
+
+
+class Flow():
+    """
+    Packets of a flow spec, the same ones send.py sends for its flags.
+
+    :param spec: Flow spec, FLOW_KEYS.
+    :param pkt_ETHE: Ethernet layer of the host.
+    :param src_ip: IPv6 address of the host.
+    :param sock: Socket of the host, AF_PACKET (--engine raw) or Scapy L2 socket.
+    :param pacer: Pacer of the flow.
+    """
+    def __init__(self, spec, pkt_ETHE, src_ip, iface, sock, pacer) -> None:
+        missing = [key for key in FLOW_KEYS if key not in spec]
+        if missing:
+            raise ValueError(f"Flow spec {spec} without {missing}")
+        self.spec = spec
+        self.pacer = pacer
+        self.sock = sock
+
+        l3_layer = IPv6(src=src_ip, dst=get_ipv6_addr(spec['dst_ip']), fl=spec['flow_label'], tc=spec['dscp'] << 2)
+        if spec['l4'] == 'tcp':
+            l4_layer = TCP(dport=spec['port'], sport=random.randint(49152, 65535))
+        elif spec['l4'] == 'udp':
+            l4_layer = UDP(dport=int(spec['port']), sport=random.randint(49152, 65535))
+        else:
+            raise ValueError(f"Flow spec {spec} with l4 {spec['l4']}, must be tcp or udp")
+        self.Base_pkt = pkt_ETHE / l3_layer / l4_layer
+
+        self.payload_space = spec['s'] - len(Ether() / IPv6() / l4_layer.__class__())
+        if self.payload_space < 0:
+            raise ValueError(f"Flow spec {spec} size not enough to include all the headers")
+
+        frame = bytes(self.Base_pkt / (b'\x00' * self.payload_space))
+        checksum_offset = len(Ether() / IPv6()) + (6 if spec['l4'] == 'udp' else 16)
+        self.template = PacketTemplate(frame, len(frame) - self.payload_space, checksum_offset, spec['m'], udp=spec['l4'] == 'udp')
+        self.raw_sender = RawSender(iface, self.template, sock=sock) if isinstance(sock, socket.socket) else None
+
+        self.seq = 0
+        self.failed_packets = 0
+        self.first_timestamp = None
+
+    def send(self):
+        # Next packet of the flow
+        self.seq += 1
+        if self.first_timestamp is None:
+            self.first_timestamp = datetime.timestamp(datetime.now())
+        try:
+            if self.raw_sender is not None:
+                self.raw_sender.send([self.seq])
+            else:
+                payload = self.template.payload(self.seq)
+                self.sock.send(self.Base_pkt / (payload + b'\x00' * (self.payload_space - len(payload))))
+        except Exception as e:
+            self.failed_packets += 1
+            print(f"({self.Base_pkt[IPv6].src}, {self.spec['dst_ip']}, {self.spec['flow_label']}) Packet {self.seq} failed to send: {e}")
+
+    def done(self):
+        return self.seq >= self.spec['c']
+
+    def results_line(self):
+        # Line of send.py export_results() for the flow
+        pacing = self.pacer.stats()
+        return [args.iteration, args.me, self.Base_pkt[IPv6].src, self.spec['dst_ip'], self.spec['flow_label'], "sender",
+                self.seq - self.failed_packets, self.first_timestamp, None, None, self.spec['dscp'], None,
+                self.pacer.profile, pacing['target_interval'], pacing['interval'], pacing['mean_error'], pacing['p99_error'], pacing['drift']]
+
+
+def run(flows, tick_ns, spin_ns, time_out, start_ns):
+    # Sends every flow on its deadlines, from start_ns for all of them, until each one sent its packets or time_out
+    end_ns = start_ns + int(time_out * 1000000000)
+    wheel = TimerWheel(tick_ns, now_ns=start_ns)
+    for flow in flows:
+        flow.pacer.start(start_ns)
+        if flow.spec['c'] > 0:
+            wheel.add(flow.pacer.deadline(), flow)
+
+    while wheel.count:
+        tick = wheel.next_tick()
+        wait_until(tick * tick_ns, spin_ns)
+        for deadline_ns, flow in wheel.pop(tick):
+            wait_until(deadline_ns, spin_ns)
+            pre_timestamp = time.monotonic_ns()
+            flow.send()
+            flow.pacer.record(1, pre_timestamp)
+            #the flows with packets left after time_out stop there
+            if not flow.done() and flow.pacer.deadline() < end_ns:
+                wheel.add(flow.pacer.deadline(), flow)
+
+    unfinished = [flow for flow in flows if not flow.done()]
+    if unfinished:
+        print(f"Timeout reached after {time_out} seconds, {len(unfinished)} flows did not send all their packets.")
+
+def parse_args():
+    global args
+    parser = argparse.ArgumentParser(description='traffic engine parser')
+    parser.add_argument('--flows', help="JSON file with the list of flow specs (flags of send.py: dst_ip, port, l4, flow_label, m, dscp, s, c, i)",
+                        type=str, action='store', required=True)
+
+    parser.add_argument('--time_out', help="timeout in seconds", type=int,
+                        action='store', required=False, default=1)
+
+    parser.add_argument('--engine', help="scapy: Scapy packet of each send, raw: packets serialized once (raw_send.py), one socket for all the flows",
+                        type=str, action='store', required=False, default="scapy", choices=["scapy", "raw"])
+
+    parser.add_argument('--pacing', help="pacing of the flows without their own \"pacing\" (send.py --pacing)",
+                        type=str, action='store', required=False, default="constant", choices=PROFILES)
+
+    parser.add_argument('--on_time', help="seconds sending of each cycle with --pacing onoff", type=float,
+                        action='store', required=False, default=1.0)
+
+    parser.add_argument('--off_time', help="seconds without sending of each cycle with --pacing onoff", type=float,
+                        action='store', required=False, default=1.0)
+
+    parser.add_argument('--spin', help="microseconds before each deadline busy waiting instead of sleeping", type=int,
+                        action='store', required=False, default=200)
+
+    parser.add_argument('--tick', help="microseconds of each slot of the timer wheel", type=int,
+                        action='store', required=False, default=1000)
+
+    # Non-mandatory flag
+    parser.add_argument('--export', help='File to export results',
+                        type=str, action='store', required=False, default=None)
+    parser.add_argument('--me', help='Name of the host running the script',
+                        type=str, action='store', required=False, default=None)
+    parser.add_argument('--iteration', help='Current test iteration number',
+                        type=int, action='store', required=False, default=None)
+
+    args = parser.parse_args()
+    if args.tick < 1 or args.spin < 0 or args.on_time <= 0 or args.off_time < 0:
+        parser.error('--tick and --on_time must be positive, --off_time and --spin can not be negative')
+    if args.export is not None:
+        if not args.me:
+            parser.error('--me is required when --export is used')
+        if not args.iteration:
+            parser.error('--iteration is required when --export is used')
+
+def main():
+    global args
+    parse_args()
+
+    with open(args.flows) as file:
+        specs = json.load(file)
+
+    iface = get_if()
+    src_ip = get_ipv6_address(iface)
+    src_mac = get_if_hwaddr(iface)
+
+    dst_mac = '00:00:00:00:00:01'           #dummy value, same as send.py
+    pkt = Ether(src=src_mac, dst=dst_mac)
+
+    if args.engine == 'raw':
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+        sock.bind((iface, 0))
+    else:
+        sock = conf.L2socket(iface=iface)
+
+    try:
+        flows = []
+        for spec in specs:
+            pacer = Pacer(spec['i'], spec.get('pacing', args.pacing), spin=args.spin / 1000000, on_time=args.on_time, off_time=args.off_time)
+            flows.append(Flow(spec, pkt, src_ip, iface, sock, pacer))
+    except (ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        sock.close()
+        sys.exit(1)
+
+    print(f"Sending {len(flows)} flows on interface {iface} (IP: {src_ip}, MAC: {src_mac})")
+    try:
+        run(flows, args.tick * 1000, args.spin * 1000, args.time_out, time.monotonic_ns())
+    finally:
+        sock.close()
+
+    if args.export is not None:
+        append_lines(args.export, [flow.results_line() for flow in flows])
+
+
+if __name__ == '__main__':
+    main()
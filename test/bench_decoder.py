@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+# Micro-benchmark of the INT report decoders (struct vs Scapy)
+# Reads the INT reports from one or more pcap files (e.g. captured with "tcpdump -i r1-100 -w reports.pcap")
+# or generates synthetic ones, decodes them with both decoders, checks that the results match and prints reports/sec
+#
+# usage: python3 bench_decoder.py reports.pcap [more.pcap ...]
+#        python3 bench_decoder.py --synthetic 5000
+
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+receive_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'receive')
+sys.path.append(receive_dir)
+
+from scapy.all import Raw
+from scapy.layers.inet6 import IPv6ExtHdrSegmentRouting
+
+from colllector import *
+from int_decoder import decode_int_report, is_int_report
+
+filename_with_sizes = os.path.join(receive_dir, "packet sizes.json")
+
+pcap_header_struct = struct.Struct("IHHiIII")
+pcap_record_struct = struct.Struct("IIII")
+
+
+def read_pcap(file_path):
+    """
+    Minimal pcap reader (classic libpcap format, any endianness, us or ns timestamps).
+
+    :param file_path: Path to the pcap file.
+    :return: List with the raw bytes of each captured frame.
+    """
+    frames = []
+    with open(file_path, 'rb') as file:
+        data = file.read()
+
+    magic = data[:4]
+    if magic in (b'\xd4\xc3\xb2\xa1', b'\x4d\x3c\xb2\xa1'):
+        endian = '<'
+    elif magic in (b'\xa1\xb2\xc3\xd4', b'\xa1\xb2\x3c\x4d'):
+        endian = '>'
+    else:
+        print("%s is not a pcap file (pcapng is not supported, convert it with editcap -F pcap)" % file_path)
+        return frames
+
+    header = struct.Struct(endian + pcap_header_struct.format)
+    record = struct.Struct(endian + pcap_record_struct.format)
+
+    offset = header.size
+    while offset + record.size <= len(data):
+        _, _, incl_len, _ = record.unpack_from(data, offset)
+        offset += record.size
+        frames.append(data[offset:offset + incl_len])
+        offset += incl_len
+
+    return frames
+
+def build_synthetic_report(hop_count, srv6=True):
+    #Same structure the switches send: [Eth][IPv6][UDP][INT REPORT HDR][ETH][IPv6 (SRv6, Optional)][IPv6][UDP/TCP][INT HDR][INT DATA]
+    ins_map = SWITCH_ID_BIT | L1_PORT_IDS_BIT | HOP_LATENCY_BIT | QUEUE_BIT | INGRESS_TSTAMP_BIT | EGRESS_TSTAMP_BIT
+    hop_meta_len = 8                    #words, for the instructions above
+
+    hop_data = b''
+    tstamp = random.randint(1, 1 << 40)
+    for i in range(hop_count):          #the last hop is the first in the stack
+        switch_id = random.randint(1, 14)
+        latency = random.randint(1000, 100000)
+        hop_data = struct.pack("!IHHIIQQ", switch_id, 1, 2, latency, (random.randint(0, 7) << 24) | random.randint(0, 64),
+                               tstamp, tstamp + latency) + hop_data
+        tstamp += latency + random.randint(1000, 5000)
+
+    int_length = hop_count * hop_meta_len + 3
+    shim = struct.pack("!BBH", 1 << 4, int_length, 0)
+    int_md = struct.pack("!BBBBHHHH", 2 << 4, 0, hop_meta_len, 0, ins_map << 8, 0, 0, 0)
+
+    dscp = random.choice([0, 2, 4, 6, 34, 46])
+    inner = IPv6(src="2001:1:1::1", dst="2001:1:2::1", tc=dscp << 2, fl=random.randint(1, 0xFFFFF))
+    inner = inner / UDP(sport=random.randint(50000, 50999), dport=50000) / Raw(shim + int_md + hop_data)
+    if srv6:
+        inner = IPv6(src="2001:1:1::1", dst="fcbb:bb00:9::", nh=43) / IPv6ExtHdrSegmentRouting(addresses=["2001:1:2::1"], nh=41) / inner
+
+    report = Ether(src="00:00:00:00:00:01", dst="00:00:00:00:00:02") / IPv6(src="2001:1:1::ff", dst="2001:1:1::100") / UDP(sport=1234, dport=1234) / \
+             INTREP(version=2, node_id=1) / INTIndiviREP(in_type=3) / Ether(src="00:00:00:00:00:03", dst="00:00:00:00:00:04") / inner
+    return bytes(report)
+
+def bench(name, decode, frames, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            decode(frame)
+    elapsed = time.perf_counter() - start
+    rate = len(frames) * repeat / elapsed
+    print("%-8s %10d reports in %8.3f s -> %12.0f reports/sec" % (name, len(frames) * repeat, elapsed, rate))
+    return rate
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark of the INT report decoders')
+    parser.add_argument('pcaps', help='pcap files with captured INT reports', nargs='*')
+    parser.add_argument('--synthetic', help='Number of synthetic reports to generate (used when no pcap is given)',
+                        type=int, action="store", required=False, default=2000)
+    parser.add_argument('--repeat', help='Times each report is decoded by the struct decoder',
+                        type=int, action="store", required=False, default=10)
+    args = parser.parse_args()
+
+    packet_sizes = {}
+    if os.path.exists(filename_with_sizes):
+        with open(filename_with_sizes, 'r') as file:
+            packet_sizes = json.load(file)
+
+    frames = []
+    for pcap in args.pcaps:
+        frames.extend(f for f in read_pcap(pcap) if is_int_report(f))
+    if not args.pcaps:
+        frames = [build_synthetic_report(random.randint(1, 6), srv6=random.random() < 0.5) for _ in range(args.synthetic)]
+    if not frames:
+        print("No INT reports found")
+        sys.exit(1)
+    print("INT reports:", len(frames))
+
+    c = Collector(None)
+    #check both decoders give the same result before timing them
+    mismatches = 0
+    for frame in frames:
+        if not same_flow_info(decode_int_report(FlowInfo(), frame, packet_sizes), c.parser_int_pkt(Ether(frame), packet_sizes)):
+            mismatches += 1
+    print("Mismatches between decoders:", mismatches)
+
+    scapy_rate = bench("scapy", lambda f: c.parser_int_pkt(Ether(f), packet_sizes), frames, 1)
+    struct_rate = bench("struct", lambda f: decode_int_report(FlowInfo(), f, packet_sizes), frames, args.repeat)
+    print("Speedup: %.1fx" % (struct_rate / scapy_rate))
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'analyzer'))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'common'))
+import analyzer
+from flow_table import FlowTable, FlowTableService, FlowTableClient, read_checkpoints, worker_path
+from checks import check, exit_checks
+
+# Flow table of the collector (common/flow_table.py)
+#   update: cost per report of keeping the table
+#   lookups: latest path/DSCP/size of the flows from the unix socket, one request per flow and one for all of them
+#   checks: latest values, merge of the worker tables (supervisor mode), checkpoint, analyzer get_current_path
+#
+# usage: python3 bench_flow_table.py --flows 2000 --reports 200000
+
+def report(flow, path, dscp):
+    return SimpleNamespace(src_ip=flow[0], dst_ip=flow[1], flow_label=flow[2], switch_ids=path[::-1], dscp=dscp, size=dscp * 10 + 64)
+
+def synthetic_flows(n):
+    return [(f"2001:1:{i % 8 + 1}::{i // 8 + 1:x}", f"2001:1:{(i + 3) % 8 + 1}::1", i % 1000) for i in range(n)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Flow table benchmark')
+    parser.add_argument('--flows', help='Number of flows', type=int, action="store", required=False, default=2000)
+    parser.add_argument('--reports', help='Number of reports added to the table', type=int, action="store", required=False, default=200000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, "flow_table.sock")
+    checkpoint_path = os.path.join(directory, "flow_table.json")
+    flows = synthetic_flows(args.flows)
+    paths = [[1, 4, 5, 8], [1, 9, 10, 5, 8], [2, 3, 6, 7], [2, 14, 13, 12, 7]]
+
+    #---------------Update cost, the expected values are the last report of each flow
+    table = FlowTable()
+    expected = {}
+    reports = [(flows[random.randrange(args.flows)], random.choice(paths), random.choice([0, 34, 35, 46])) for _ in range(args.reports)]
+    start = time.perf_counter()
+    for timestamp, (flow, path, dscp) in enumerate(reports, 1):
+        table.update(report(flow, path, dscp), timestamp)
+    elapsed = time.perf_counter() - start
+    for timestamp, (flow, path, dscp) in enumerate(reports, 1):
+        expected[flow] = ('-'.join(map(str, path)), dscp, dscp * 10 + 64, timestamp)
+    print(f"update: {args.reports} reports in {elapsed * 1000:.1f} ms ({elapsed / args.reports * 1e6:.2f} us/report), {len(table)} flows")
+
+    #---------------Lookups over the socket (the flow labels as the analyzer has them, DB tags)
+    service = FlowTableService(table, socket_path, checkpoint_path, checkpoint_interval=0.1).start()
+    client = FlowTableClient(socket_path)
+    queried = [(src_ip, dst_ip, str(flow_label)) for src_ip, dst_ip, flow_label in flows]
+
+    start = time.perf_counter()
+    single = {}
+    for flow in queried[:500]:
+        single[flow] = client.get(*flow)
+    single_time = (time.perf_counter() - start) / min(500, len(queried))
+
+    start = time.perf_counter()
+    batch = client.get_many(queried)
+    batch_time = time.perf_counter() - start
+    print(f"lookups: one per request {single_time * 1000:.3f} ms/flow, {len(queried)} flows in one request {batch_time * 1000:.1f} ms")
+
+    print("\nChecks")
+    ok = True
+    different = 0
+    for flow, (src_ip, dst_ip, flow_label) in zip(queried, flows):
+        entry = batch.get(flow)
+        if (src_ip, dst_ip, flow_label) not in expected:
+            different += entry is not None
+            continue
+        different += entry is None or (entry['path'], entry['dscp'], entry['size'], entry['last_seen']) != expected[(src_ip, dst_ip, flow_label)]
+    ok &= check("latest path/DSCP/size of every flow", different == 0)
+    ok &= check("one request per flow same as one for all", all(single[flow] == batch.get(flow) for flow in single))
+    ok &= check("packets counted", sum(entry['packets'] for entry in client.all().values()) == args.reports)
+
+    time.sleep(0.3)
+    ok &= check("checkpointed", service.checkpoints >= 1 and len(read_checkpoints(checkpoint_path)) == len(table))
+
+    #---------------Supervisor mode, 2 workers, the newest entry of a flow wins
+    flow = flows[0]
+    workers_checkpoint = os.path.join(directory, "workers_flow_table.json")
+    workers = []
+    for worker_id, (path, timestamp) in enumerate([([1, 4, 5, 8], 10), ([1, 9, 10, 5, 8], 20)]):
+        worker_table = FlowTable()
+        worker_table.update(report(flow, path, 34), timestamp)
+        workers.append(FlowTableService(worker_table, None, worker_path(workers_checkpoint, worker_id)).start())
+    for worker in workers:
+        worker.close()
+    ok &= check("worker checkpoints merged", read_checkpoints(workers_checkpoint)[flow]['path'] == "1-9-10-5-8")
+
+    #---------------Analyzer, current path without snapshot nor DB
+    analyzer.args = SimpleNamespace(stats_source="rollup")
+    analyzer.flow_table_client = client
+    ok &= check("analyzer current path from the flow table", analyzer.get_current_path(queried[0]) == batch[queried[0]]['path'])
+
+    service.close()
+    ok &= check("socket removed on close", not os.path.exists(socket_path))
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
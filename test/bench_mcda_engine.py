@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'analyzer'))
+import analyzer
+import mcda_engine
+
+# Vectorized MCDA engine (mcda_engine.py) of the analyzer
+#   fixtures: switch loads and worst flows recorded with the per row code (fixtures/mcda_fixtures.json), must be identical
+#   benchmark: per row code (normalize_value/calculate_MCDA_loads + sorted insert) against the engine, on --flows flows
+#
+# usage: python3 bench_mcda_engine.py --flows 10000
+
+fixtures_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtures', 'mcda_fixtures.json')
+
+#--------------------Per row code replaced by mcda_engine.py (reference)
+def normalize_value(value, min_value, max_value):
+    normalized = (value - min_value) / (max_value - min_value)
+    return round(normalized, 3)
+
+def calculate_MCDA_loads(non_infra_switch, normalized_num_packets, normalized_avg_packet_size, normalized_avg_packet_procesing_time):
+    normalized_values = np.array([non_infra_switch, normalized_num_packets, normalized_avg_packet_size, normalized_avg_packet_procesing_time])
+    weight_values = np.array([analyzer.weights['no_infra_switch'], analyzer.weights['num_packets'],
+                              analyzer.weights['avg_packet_size'], analyzer.weights['avg_packet_procesing_time']])
+    return round(np.dot(normalized_values, weight_values), 3)
+
+def reference_worst_flows(flow_stats, limits):
+    flow_list = []
+    for flow, num_packets, avg_packet_size, avg_packet_procesing_time in flow_stats:
+        new_load = calculate_MCDA_loads(1, normalize_value(num_packets, *limits['num_packets']),
+                                        normalize_value(avg_packet_size, *limits['packet_size']),
+                                        normalize_value(avg_packet_procesing_time, *limits['packet_procesing_time']))
+        new = (flow, new_load)
+        for i, (_, load) in enumerate(flow_list):
+            if new_load > load:
+                flow_list.insert(i, new)
+                break
+        else:
+            flow_list.append(new)
+    return flow_list
+
+#--------------------Fixtures
+def check_fixtures():
+    fixtures = json.load(open(fixtures_file))
+    ok = True
+    for scenario in fixtures['scenarios']:
+        analyzer.update_max_values_globaly(scenario['num_packets'], scenario['max_latency'], verbose=False)
+
+        switch_loads = analyzer.calculate_switches_load([tuple(row) for row in scenario['stats_by_switch']], verbose=False)
+        expected = [tuple(row) for row in scenario['switch_loads']]
+        same_switches = switch_loads == expected
+
+        flow_stats_by_switch = {int(switch_id): [(tuple(row[0]), row[1], row[2], row[3]) for row in rows]
+                                for switch_id, rows in scenario['flow_stats_by_switch'].items()}
+        snapshot = SimpleNamespace(flow_stats_by_switch=flow_stats_by_switch)
+        different_flows = 0
+        num_flows = 0
+        for switch_id, expected_flows in scenario['worst_flows'].items():
+            worst_flows = analyzer.get_wrost_flows_on_switch(int(switch_id), snapshot)
+            num_flows += len(expected_flows)
+            different_flows += sum(1 for a, b in zip(worst_flows, expected_flows) if a[0] != tuple(b[0]) or a[1] != b[1])
+            different_flows += abs(len(worst_flows) - len(expected_flows))
+
+        status = "OK" if same_switches and different_flows == 0 else "FAIL"
+        ok = ok and status == "OK"
+        print(f"fixture seed {scenario['seed']}: {len(switch_loads)} switch loads {'identical' if same_switches else 'DIFFERENT'}, "
+              f"{num_flows} ranked flows, {different_flows} different\t{status}")
+    return ok
+
+#--------------------Benchmark
+def synthetic_flows(n):
+    flow_stats = []
+    for i in range(n):
+        flow = (f"2001:1:{i % 8 + 1}::{i % 4 + 1}", f"2001:1:{(i + 3) % 8 + 1}::1", str(i % 256))
+        if random.random() < 0.2:                   #same stats, same load
+            flow_stats.append((flow, 1000, 1000.0, 250000.0))
+        else:
+            flow_stats.append((flow, random.randint(1, 4000), random.uniform(64, 1500), random.uniform(1000, 900000)))
+    return flow_stats
+
+def benchmark(n, repeat):
+    flow_stats = synthetic_flows(n)
+    analyzer.update_max_values_globaly(sum(stats[1] for stats in flow_stats), max(stats[3] for stats in flow_stats), verbose=False)
+    limits = analyzer.normalization_limits
+
+    start = time.perf_counter()
+    expected = reference_worst_flows(flow_stats, limits)
+    reference_time = time.perf_counter() - start
+
+    columns = [np.array(column) for column in list(zip(*flow_stats))[1:]]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        loads = mcda_engine.flow_loads(*columns, limits, analyzer.weights)
+        order = mcda_engine.rank_descending(loads)
+    engine_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        top = mcda_engine.rank_descending(loads, 10)
+    top_time = (time.perf_counter() - start) / repeat
+
+    loads = loads.tolist()
+    ranked = [(flow_stats[i][0], loads[i]) for i in order]
+    identical = ranked == expected and list(top) == list(order[:10])
+    print(f"\n{n} flows: per row {reference_time * 1000:.1f} ms, engine {engine_time * 1000:.2f} ms "
+          f"({reference_time / engine_time:.0f}x), top 10 {top_time * 1000:.2f} ms, results {'identical' if identical else 'DIFFERENT'}")
+    return identical
+
+def main():
+    parser = argparse.ArgumentParser(description='MCDA engine fixtures and benchmark')
+    parser.add_argument('--flows', help='Number of flows of the benchmark', type=int, action="store", required=False, default=10000)
+    parser.add_argument('--repeat', help='Runs of the engine to average', type=int, action="store", required=False, default=20)
+    args = parser.parse_args()
+
+    random.seed(1)
+    ok = check_fixtures()
+    ok = benchmark(args.flows, args.repeat) and ok
+
+    print("\nAll results identical" if ok else "\nSome results are different")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
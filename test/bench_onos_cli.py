@@ -0,0 +1,113 @@
+import argparse
+import os
+import sys
+import time
+
+import paramiko
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'analyzer'))
+from onos_cli import OnosCliClient, OnosCliTimeout
+from fake_onos_server import FakeOnosServer
+from checks import check, exit_checks
+
+# ONOS CLI client against the local fake ONOS SSH server (fake_onos_server.py)
+#   legacy:     send + fixed sleep(1) per command, as the analyzer did before onos_cli.py
+#   execute:    one command at a time, waiting for the prompt
+#   pipelined:  all the commands back to back (remove_all_active_SRv6_rules)
+# and the detour response parsing, reconnect on channel loss and per command timeout
+#
+# usage: python3 bench_onos_cli.py --rules 200 --command_delay 0.002
+
+def remove_commands(n):
+    return ['srv6-remove device:r%s 2001:1:1::%x 2001:1:2::1 %s 128 128 255' % (i % 14 + 1, i + 1, i % 8) for i in range(n)]
+
+def legacy_send(channel, command):
+    channel.send(command + '\n')
+    time.sleep(1)
+    output = ""
+    while channel.recv_ready():
+        output += channel.recv(1024).decode('utf-8')
+    return output
+
+def bench_legacy(server, commands):
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(hostname='127.0.0.1', port=server.port, username='onos', password='rocks', look_for_keys=False, allow_agent=False)
+    channel = client.invoke_shell()
+    time.sleep(1)
+    start = time.perf_counter()
+    for command in commands:
+        legacy_send(channel, command)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='ONOS CLI client benchmark')
+    parser.add_argument('--rules', help='Number of srv6-remove commands', type=int, action="store", required=False, default=200)
+    parser.add_argument('--legacy_rules', help='Number of commands for the legacy sleep(1) send, 0 to skip it', type=int, action="store", required=False, default=3)
+    parser.add_argument('--command_delay', help='Seconds the fake ONOS takes per command', type=float, action="store", required=False, default=0.001)
+    args = parser.parse_args()
+
+    commands = remove_commands(args.rules)
+    server = FakeOnosServer(command_delay=args.command_delay).start()
+
+    if args.legacy_rules > 0:
+        elapsed = bench_legacy(server, commands[:args.legacy_rules])
+        print(f"legacy send+sleep(1):\t{args.legacy_rules} commands in {elapsed * 1000:.1f} ms ({elapsed / args.legacy_rules * 1000:.1f} ms/command)")
+
+    client = OnosCliClient(port=server.port, timeout=5)
+    client.connect()
+    start = time.perf_counter()
+    for command in commands:
+        client.execute(command)
+    elapsed = time.perf_counter() - start
+    print(f"execute (prompt):\t{len(commands)} commands in {elapsed * 1000:.1f} ms ({elapsed / len(commands) * 1000:.3f} ms/command)")
+
+    start = time.perf_counter()
+    outputs = client.execute_many(commands)
+    elapsed = time.perf_counter() - start
+    print(f"execute_many (pipelined):\t{len(commands)} commands in {elapsed * 1000:.1f} ms ({elapsed / len(commands) * 1000:.3f} ms/command)")
+    print(f"client stats: {client.stats()}")
+    client.close()
+    server.stop()
+
+    print("\nChecks")
+    ok = check("srv6-remove outputs are empty", outputs == [""] * len(commands))
+
+    #responses matched to their commands
+    server = FakeOnosServer().start()
+    client = OnosCliClient(port=server.port, timeout=5)
+    detour = "Path-Detour-SRv6 device:r1 device:r8 2001:1:1::1 2001:1:2::1 3 2-5-8 5 0.91"
+    outputs = client.execute_many([commands[0], detour, "unknown-command"])
+    ok &= check("detour response", outputs[1] == "Creating path detour using SRv6 policy\nSuccess")
+    ok &= check("responses in order", outputs[0] == "" and outputs[2] == "Command not found: unknown-command")
+    client.close()
+    server.stop()
+
+    #channel dropped by ONOS in the middle of a pipelined batch
+    server = FakeOnosServer(drop_after=7).start()
+    client = OnosCliClient(port=server.port, timeout=5, retries=3)
+    outputs = client.execute_many(commands[:20])
+    ok &= check("reconnect on channel loss", len(outputs) == 20 and client.stats()['reconnects'] >= 2)
+    ok &= check("every command sent once", server.commands == commands[:20])
+    client.close()
+    server.stop()
+
+    #a command slower than the timeout, the next command must not read its late output
+    server = FakeOnosServer(slow_commands="Path-Detour-SRv6", slow_delay=0.5).start()
+    client = OnosCliClient(port=server.port, timeout=0.2)
+    try:
+        client.execute(detour)
+        timed_out = False
+    except OnosCliTimeout:
+        timed_out = True
+    ok &= check("per command timeout", timed_out)
+    ok &= check("session clean after timeout", client.execute(commands[0]) == "" and client.execute("unknown-command") == "Command not found: unknown-command")
+    client.close()
+    server.stop()
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'mininet', 'tools'))
+from pacing import Pacer
+from checks import check, exit_checks
+
+# Pacing of send.py (pacing.py)
+#   checks: deadlines of each profile from a fixed start, packets due to catch up, statistics of recorded send times
+#   timing: achieved against target intervals with a busy wait standing for the sending of each packet, of the previous
+#           send.py loop (sleep of round(interval - sending time), 0 below half a second) and of the Pacer
+#
+# usage: python3 bench_pacing.py --i 0.01 --packets 300 --work_us 500
+
+def check_deadlines():
+    ok = True
+
+    pacer = Pacer(0.01, "constant")
+    pacer.start(1000)
+    ok &= check("constant: start + n * interval", [pacer.deadline(n) for n in range(5)] == [1000 + n * 10000000 for n in range(5)])
+
+    pacer = Pacer(0.01, "onoff", on_time=0.03, off_time=0.05)
+    pacer.start(0)
+    expected = [0, 10, 20, 80, 90, 100, 160]
+    ok &= check("onoff: 3 packets on, 50 ms off", [pacer.deadline(n) // 1000000 for n in range(7)] == expected)
+
+    pacer = Pacer(0.01, "poisson", seed=1)
+    pacer.start(0)
+    mean = pacer.deadline(19999) / 19999 / 1000000000
+    ok &= check(f"poisson: mean interval {mean * 1000:.3f} ms of 10 ms", abs(mean - 0.01) < 0.0003)
+    intervals = [pacer.deadline(n + 1) - pacer.deadline(n) for n in range(19999)]
+    ok &= check("poisson: deadlines the same after recording", pacer.deadline(5) == pacer.upcoming[5])
+    pacer.record(3, 0)
+    ok &= check("poisson: recorded deadlines dropped", pacer.deadline() == sum(intervals[:3]))
+
+    pacer = Pacer(0.001, "constant")
+    pacer.start(time.monotonic_ns() - 5500000)         #6 deadlines passed
+    ok &= check("due: late deadlines sent together", pacer.due(32) == 6 and pacer.due(4) == 4 and pacer.due() == 1)
+
+    pacer = Pacer(0.01, "constant")
+    pacer.start(0)
+    for send_ns in [100, 10000100, 20500100, 30000100]:
+        pacer.record(1, send_ns)
+    stats = pacer.stats()
+    ok &= check("stats: errors and drift of recorded sends", stats['mean_error'] == 333333.33 and stats['p99_error'] == 500000 and stats['drift'] == 0 and stats['target_interval'] == 0.01)
+    ok &= check("stats: None under 2 packets", Pacer(0.01).stats()['drift'] is None)
+    return ok
+
+def busy(ns):
+    end = time.monotonic_ns() + ns
+    while time.monotonic_ns() < end:
+        pass
+
+def previous_loop(interval, packets, work_ns):
+    # Loop of send.py before the Pacer, the sleeps only added up
+    sends = []
+    for _ in range(packets):
+        pre_timestamp = time.monotonic_ns()
+        sends.append(pre_timestamp)
+        busy(work_ns)
+        time.sleep(max(round(interval - (time.monotonic_ns() - pre_timestamp) / 1000000000), 0))
+    return sends
+
+def summary(name, interval, sends):
+    intervals = [b - a for a, b in zip(sends, sends[1:])]
+    errors = sorted(abs(i - interval * 1000000000) for i in intervals)
+    drift = (sends[-1] - sends[0]) - interval * 1000000000 * len(intervals)
+    print(f"{name:>8}: AVG interval {sum(intervals) / len(intervals) / 1000000:.3f} ms, AVG error {sum(errors) / len(errors) / 1000:.1f} us, "
+          f"p99 error {errors[int(len(errors) * 0.99)] / 1000:.1f} us, drift {drift / 1000000:.3f} ms")
+
+def pacer_loop(interval, packets, work_ns, spin):
+    pacer = Pacer(interval, "constant", spin=spin)
+    pacer.start()
+    sends = []
+    for _ in range(packets):
+        pacer.wait()
+        pre_timestamp = time.monotonic_ns()
+        sends.append(pre_timestamp)
+        busy(work_ns)
+        pacer.record(1, pre_timestamp)
+    return sends, pacer.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description='send.py pacing benchmark')
+    parser.add_argument('--i', help='Interval between packets in seconds', type=float, action="store", required=False, default=0.01)
+    parser.add_argument('--packets', help='Packets of each loop', type=int, action="store", required=False, default=300)
+    parser.add_argument('--work_us', help='Microseconds sending each packet', type=int, action="store", required=False, default=500)
+    parser.add_argument('--spin_us', help='Microseconds busy waiting before each deadline', type=int, action="store", required=False, default=200)
+    args = parser.parse_args()
+
+    print("Checks")
+    ok = check_deadlines()
+
+    print(f"\n{args.packets} packets every {args.i * 1000:g} ms, {args.work_us} us sending each")
+    summary("previous", args.i, previous_loop(args.i, args.packets, args.work_us * 1000))
+    sends, stats = pacer_loop(args.i, args.packets, args.work_us * 1000, args.spin_us / 1000000)
+    summary("pacer", args.i, sends)
+    print(f"{'stats':>8}: {stats}")
+
+    #the drift stays within an interval, whatever the errors of each wait on a loaded host
+    ok &= check("pacer: AVG interval within 1% of the target", abs(stats['interval'] - args.i) <= args.i * 0.01)
+    ok &= check("pacer: drift under one interval", abs(stats['drift']) < args.i * 1000000000)
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'analyzer'))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'common'))
+import analyzer
+from path_planner import PathPlanner, segment_list
+from topology import HOST_SWITCHES, weighted_links
+from fake_onos_server import FakeOnosServer
+from checks import check, exit_checks
+
+# Local detour paths of the analyzer (path_planner.py)
+#   candidates: k shortest paths (Yen) against all the loopless paths of the topology, cached lookups against computing them
+#   detours: the analyzer against the fake ONOS (fake_onos_server.py), one links command per pass and one srv6-insert per
+#            detour with the segment list of a path that avoids the overloaded switch, and link down handling
+#
+# usage: python3 bench_path_planner.py --k_paths 8
+
+def all_paths(adjacency, path, dst, max_hops):
+    # Every loopless path from path[-1] to dst of at the most max_hops
+    if path[-1] == dst:
+        yield path
+        return
+    if len(path) - 1 >= max_hops:
+        return
+    for neighbor in adjacency[path[-1]]:
+        if neighbor not in path:
+            yield from all_paths(adjacency, path + (neighbor,), dst, max_hops)
+
+def check_candidates(k, max_hops):
+    adjacency = {}
+    for a, b, weight in weighted_links():
+        adjacency.setdefault(a, {})[b] = weight
+        adjacency.setdefault(b, {})[a] = weight
+
+    planner = PathPlanner(weighted_links(), k, max_hops)
+    different = 0
+    for src in HOST_SWITCHES:
+        for dst in HOST_SWITCHES:
+            if src == dst:
+                continue
+            costs = sorted(round(sum(adjacency[a][b] for a, b in zip(path, path[1:])), 6)
+                           for path in all_paths(adjacency, (src,), dst, max_hops))[:k]
+            different += costs != [round(cost, 6) for cost, _ in planner.candidate_paths(src, dst)]
+    return check(f"k={k}, max {max_hops} hops: same costs as all the loopless paths", different == 0)
+
+def benchmark(k, repeat):
+    planner = PathPlanner(weighted_links(), k)
+    start = time.perf_counter()
+    planner.precompute(HOST_SWITCHES)
+    compute_time = time.perf_counter() - start
+
+    pairs = len(HOST_SWITCHES) * (len(HOST_SWITCHES) - 1)
+    loads = {switch_id: (switch_id % 5) / 5 for switch_id in range(1, 15)}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        planner.precompute(HOST_SWITCHES)
+        planner.best_detour((1, 4, 5, 8), loads, {4: 0.8})
+    lookup_time = (time.perf_counter() - start) / repeat
+    print(f"{pairs} pairs of switches, k={k}: computed in {compute_time * 1000:.2f} ms, "
+          f"cached (+1 detour choice) {lookup_time * 1000:.3f} ms, {planner.stats()}")
+
+def detour(server, k, flows):
+    # One detour pass of the analyzer for the overloaded switch 4 (load 0.9), the other switches loaded 0.2
+    analyzer.args = SimpleNamespace(path_source="local", detour_workers=1, stats_source="rollup", k_paths=k)
+    analyzer.path_planner = PathPlanner(weighted_links(), k)
+    analyzer.path_planner.precompute(HOST_SWITCHES)
+    analyzer.active_SRv6_rules.clear(None, cleanup=True)
+    analyzer.update_max_values_globaly(1000, 2000, verbose=False)
+
+    switch_loads = [(switch_id, 0.9 if switch_id == 4 else 0.2) for switch_id in range(1, 15)]
+    snapshot = SimpleNamespace(flow_stats_by_switch={4: [(flow, 100, 500.0, 1000.0) for flow in flows]},
+                               flow_paths={flow: "1-4-5-8" for flow in flows})
+    session = analyzer.OnosCliClient(port=server.port, timeout=5)
+    session.connect()
+    analyzer.search_overloaded_switches(session, switch_loads, snapshot)
+    session.close()
+    return analyzer.path_planner.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description='Local detour paths benchmark')
+    parser.add_argument('--k_paths', help='Candidate paths between each pair of switches', type=int, action="store", required=False, default=8)
+    parser.add_argument('--repeat', help='Runs of the cached lookups to average', type=int, action="store", required=False, default=100)
+    args = parser.parse_args()
+
+    print("Candidate paths")
+    ok = check_candidates(args.k_paths, 4)
+    ok &= check_candidates(3, 6)
+    benchmark(args.k_paths, args.repeat)
+
+    print("\nDetours")
+    flows = [("2001:1:1::1", "2001:1:8::1", "3")]
+    server = FakeOnosServer().start()
+    stats = detour(server, args.k_paths, flows)
+    inserts = [command for command in server.commands if command.startswith("srv6-insert")]
+    ok &= check("one links command and one srv6-insert, no Path-Detour-SRv6", server.commands[0] == "links" and len(inserts) == 1 and len(server.commands) == 2)
+    sid = inserts[0].split()[-1] if inserts else ""
+    ok &= check(f"detour avoids the overloaded switch ({sid})", sid == segment_list((1, 9, 10, 5, 8))[0])
+    ok &= check("detour stored", analyzer.active_SRv6_rules.count(4) == 1)
+    ok &= check("link state unchanged, cache kept", stats['invalidations'] == 0 and stats['candidate_misses'] == len(HOST_SWITCHES) * (len(HOST_SWITCHES) - 1))
+    server.stop()
+
+    server = FakeOnosServer(down_links=[(9, 10)]).start()
+    stats = detour(server, args.k_paths, flows)
+    inserts = [command for command in server.commands if command.startswith("srv6-insert")]
+    sid = inserts[0].split()[-1] if inserts else ""
+    ok &= check(f"link 9-10 down: candidates computed again, detour without it ({sid})",
+                stats['invalidations'] == 1 and sid == segment_list((1, 9, 13, 11, 8))[0])
+    server.stop()
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
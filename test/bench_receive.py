@@ -0,0 +1,211 @@
+import argparse
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'mininet', 'tools'))
+import receive
+from raw_receive import parse_frame, FlowRecord, RawReceiver
+from raw_send import RawSender
+from scapy.all import Ether, IPv6, IPv6ExtHdrSegmentRouting, UDP, TCP, ICMPv6EchoRequest
+from bench_send import create_veth, ip, template, src_mac, dst_mac, src_ip, veth, peer
+from checks import check, exit_checks
+
+# Receivers of receive.py (--engine scapy|raw)
+#   checks: metrics of the raw receiver the same as the Scapy one (process_packet() and terminate()) for flows with out of order
+#           packets, an SRv6 header, a TCP flow and the packets the sniff() filter leaves out
+#   parse: packets per second from the frame bytes to the flow metrics (Scapy dissection and process_packet() against
+#          parse_frame() and FlowRecord.add()), memory of the flow metrics after the packets
+#   live: packets of RawSender received by RawReceiver over a veth pair
+#
+# usage: sudo python3 bench_receive.py --packets 1000000 --scapy_packets 20000       (the veth pair needs root)
+
+def frame(flow_label, seq, l4='udp', dscp=34, srh=False, dport=443):
+    l3 = IPv6(src=src_ip, dst="2001:1:8::1", fl=flow_label, tc=dscp << 2)
+    if srh:
+        l3 = l3 / IPv6ExtHdrSegmentRouting(addresses=["2001:1:8::1", "2001:1:5::1"])
+    l4_layer = UDP(dport=dport, sport=50000) if l4 == 'udp' else TCP(dport=dport, sport=50000)
+    return bytes(Ether(src=src_mac, dst=dst_mac) / l3 / l4_layer / f"{seq}-INTH1".encode())
+
+def test_frames():
+    # (frame, arrival time, kept by the sniff() filter)
+    frames = []
+    now = 1700000000.0
+    for seq in [1, 2, 3, 5, 4, 6, 9, 7, 8, 10, 2]:
+        frames.append((frame(1, seq), now + seq * 0.01, True))
+    for seq in [1, 3, 2, 4]:
+        frames.append((frame(2, seq, srh=True, dscp=46), now + seq * 0.02, True))
+    for seq in [1, 2, 4, 3]:
+        frames.append((frame(3, seq, l4='tcp', dscp=0), now + seq * 0.1, True))
+    frames.append((bytes(Ether() / IPv6(src=src_ip, dst="2001:1:8::1", fl=4) / UDP(dport=443, sport=50000) / b"no sequence"), now + 1, True))
+    frames.append((frame(5, 1, dport=53), now + 1, False))
+    frames.append((bytes(Ether() / IPv6(src=src_ip, dst="2001:1:8::1") / ICMPv6EchoRequest()), now + 1, False))
+    return frames
+
+def scapy_metrics(frames):
+    receive.args = SimpleNamespace(export=None)
+    receive.flows_metrics.clear()
+    for data, arrival_time, kept in frames:
+        if kept:
+            pkt = Ether(data)
+            pkt.time = arrival_time
+            receive.process_packet(pkt)
+    receive.terminate()
+    return {key: (m["packet_count"], m["first_packet_time"], m["DSCP"], m["sequences"].out_of_order(), m["sequences"].columns(), m["avg_jitter"])
+            for key, m in receive.flows_metrics.items()}
+
+def raw_metrics(frames):
+    flows = {}
+    for data, arrival_time, _ in frames:
+        parsed = parse_frame(data, len(data))
+        if parsed is not None:
+            key, dscp, seq = parsed
+            if key not in flows:
+                flows[key] = FlowRecord(dscp, arrival_time)
+            flows[key].add(seq, arrival_time)
+    return {(socket.inet_ntop(socket.AF_INET6, src), socket.inet_ntop(socket.AF_INET6, dst), fl):
+            (r.packet_count, r.first_packet_time, r.DSCP, r.sequences.out_of_order(), r.sequences.columns(), r.avg_jitter())
+            for (src, dst, fl), r in flows.items()}
+
+def check_metrics():
+    frames = test_frames()
+    scapy, raw = scapy_metrics(frames), raw_metrics(frames)
+    same = scapy.keys() == raw.keys() and all(scapy[key][:5] == raw[key][:5] and abs(scapy[key][5] - raw[key][5]) < 1e-9 for key in scapy)
+    return check(f"{len(raw)} flows with the same metrics on both receivers (count, first time, DSCP, sequence counters, jitter)", same)
+
+def flow_templates(flows):
+    return [template(Ether(src=src_mac, dst=dst_mac) / IPv6(src=src_ip, dst="2001:1:8::1", fl=fl, tc=34 << 2) / UDP(dport=443, sport=50000),
+                     'udp', "INTH1", 420 - 62) for fl in range(1, flows + 1)]
+
+def sequence_numbers(packets, flows):
+    # Sequence numbers of flows sent round robin, 1% of them swapped with the next one
+    rng = random.Random(1)
+    count = packets // flows
+    seq = 1
+    while seq <= count:
+        if seq < count and rng.random() < 0.01:
+            yield seq + 1
+            yield seq
+            seq += 2
+        else:
+            yield seq
+            seq += 1
+
+def measured(function, *args):
+    # Seconds of function() and memory allocated by it that is still in use, measured in two runs (tracemalloc slows it down)
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, memory
+
+def bench_scapy(packets, flows=8):
+    templates = flow_templates(flows)
+    frames = []
+    for seq in sequence_numbers(packets, flows):
+        for packet_template in templates:
+            buffer = packet_template.new_buffer()
+            packet_template.fill(buffer, seq)
+            frames.append(bytes(buffer))
+
+    def run():
+        receive.flows_metrics.clear()
+        for arrival_time, data in enumerate(frames):
+            pkt = Ether(data)
+            pkt.time = arrival_time
+            receive.process_packet(pkt)
+        return receive.flows_metrics
+
+    elapsed, memory = measured(run)
+    receive.flows_metrics.clear()
+    return len(frames) / elapsed, memory
+
+def bench_raw(packets, flows=8):
+    # The frames are written on one buffer per flow as recvmsg_into() does, the time of writing them is not counted
+    templates = flow_templates(flows)
+    buffers = [packet_template.new_buffer() for packet_template in templates]
+    records = {}
+
+    def fill():
+        for seq in sequence_numbers(packets, flows):
+            for packet_template, buffer in zip(templates, buffers):
+                packet_template.fill(buffer, seq)
+
+    def run():
+        records.clear()
+        for arrival_time, seq in enumerate(sequence_numbers(packets, flows)):
+            for packet_template, buffer in zip(templates, buffers):
+                packet_template.fill(buffer, seq)
+                key, dscp, seq_number = parse_frame(buffer, len(buffer))
+                record = records.get(key)
+                if record is None:
+                    record = records[key] = FlowRecord(dscp, arrival_time)
+                record.add(seq_number, arrival_time)
+
+    fill_elapsed, _ = measured(fill)
+    elapsed, memory = measured(run)
+    return packets / (elapsed - fill_elapsed), memory
+
+def check_live(packets, batch):
+    receiver = RawReceiver(peer)
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(receiver.receive(duration=3)))
+    thread.start()
+    time.sleep(0.2)
+
+    packet_template = template(Ether(src=src_mac, dst=dst_mac) / IPv6(src=src_ip, dst="2001:1:8::1", fl=7, tc=46 << 2) / UDP(dport=443, sport=50000),
+                               'udp', "INTH1", 420 - 62)
+    sender = RawSender(veth, packet_template, batch=batch)
+    start = time.perf_counter()
+    for seq in range(1, packets + 1, batch):
+        sender.send(range(seq, min(seq + batch, packets + 1)))
+        time.sleep(0)                               #let the receiver thread drain the socket
+    sender.close()
+    elapsed = time.perf_counter() - start
+
+    thread.join()
+    receiver.close()
+    record = next(iter(results.values()), None)
+    count = record.packet_count if record else 0
+    print(f"live: {count} of {packets} packets received in {elapsed:.2f} s of sending, {count / elapsed:,.0f} pps")
+    return check("live: every packet received in order", record is not None and count == packets and record.sequences.out_of_order() == 0)
+
+def main():
+    parser = argparse.ArgumentParser(description='receive.py receivers benchmark')
+    parser.add_argument('--packets', help='Packets parsed by the raw receiver', type=int, action="store", required=False, default=1000000)
+    parser.add_argument('--scapy_packets', help='Packets parsed by the Scapy receiver', type=int, action="store", required=False, default=20000)
+    parser.add_argument('--live_packets', help='Packets sent over the veth pair', type=int, action="store", required=False, default=50000)
+    parser.add_argument('--batch', help='Packets per sendmmsg() over the veth pair', type=int, action="store", required=False, default=8)
+    args = parser.parse_args()
+
+    print("Checks")
+    ok = check_metrics()
+
+    scapy_pps, scapy_memory = bench_scapy(args.scapy_packets)
+    raw_pps, raw_memory = bench_raw(args.scapy_packets)
+    raw_many_pps, raw_many_memory = bench_raw(args.packets)
+    print(f"\nparse: scapy {scapy_pps:,.0f} pps, {scapy_memory / 1024:.0f} KiB after {args.scapy_packets} packets")
+    print(f"parse:   raw {raw_pps:,.0f} pps, {raw_memory / 1024:.0f} KiB after {args.scapy_packets} packets, "
+          f"{raw_many_pps:,.0f} pps and {raw_many_memory / 1024:.0f} KiB after {args.packets} packets")
+    print(f"raw {raw_many_pps / scapy_pps:.1f}x the pps of scapy")
+    #the flows keep counters and the window of their sequence numbers
+    ok &= check("raw: memory of the flows the same after more packets", raw_many_memory <= raw_memory + 4096)
+
+    if create_veth():
+        try:
+            ok &= check_live(args.live_packets, args.batch)
+        finally:
+            ip("link", "del", veth)
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
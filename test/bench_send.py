@@ -0,0 +1,140 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'mininet', 'tools'))
+import send
+from raw_send import PacketTemplate, RawSender
+from scapy.all import Ether, IPv6, UDP, TCP
+from checks import check, exit_checks
+
+# Senders of send.py (--engine scapy|raw)
+#   checks: frames of the raw engine byte by byte against the Scapy ones (payload, lengths, checksums), one buffer reused
+#           over sequence numbers of different lengths, and the frames received on the peer of a veth pair with sendmmsg
+#   pps: send.send_packet() without interval over a veth pair, received packets from the counters of the peer
+#
+# usage: sudo python3 bench_send.py --packets 200000 --batch 32        (the veth pair needs root, without it only the checks run)
+
+src_mac, dst_mac = "00:00:00:00:01:01", "00:00:00:00:00:01"
+src_ip, dst_ip = "2001:1:1::1", "2001:1:8::1"
+veth, peer = "vbench0", "vbench1"
+
+def base_packet(l4, flow_label=7, dscp=46):
+    l4_layer = UDP(dport=5000, sport=50000) if l4 == 'udp' else TCP(dport=5000, sport=50000)
+    return Ether(src=src_mac, dst=dst_mac) / IPv6(src=src_ip, dst=dst_ip, fl=flow_label, tc=dscp << 2) / l4_layer
+
+def scapy_frame(Base_pkt, seq, message, payload_space):
+    # Packet of the Scapy loop of send.send_packet()
+    payload = f"{seq}-{message}".encode()
+    payload = payload[:payload_space] + b'\x00' * (payload_space - len(payload))
+    return bytes(Base_pkt / payload)
+
+def template(Base_pkt, l4, message, payload_space):
+    frame = bytes(Base_pkt / (b'\x00' * payload_space))
+    checksum_offset = len(Ether() / IPv6()) + (6 if l4 == 'udp' else 16)
+    return PacketTemplate(frame, len(frame) - payload_space, checksum_offset, message, udp=l4 == 'udp')
+
+def check_frames():
+    seqs = list(range(1, 12)) + [99, 100, 101, 999, 1000, 12345, 9, 1234567, 5]
+    different = 0
+    for l4 in ['udp', 'tcp']:
+        for message, payload_space in [("INTH1", 0), ("INTH1", 3), ("INTH1", 50), ("Video", 1184), ("x" * 300, 100)]:
+            Base_pkt = base_packet(l4)
+            packet_template = template(Base_pkt, l4, message, payload_space)
+            buffer = packet_template.new_buffer()
+            length = 0
+            for seq in seqs:
+                length = packet_template.fill(buffer, seq, length)
+                different += bytes(buffer) != scapy_frame(Base_pkt, seq, message, payload_space)
+    return check("raw frames same as the Scapy ones (UDP/TCP, payload truncated, shorter after longer)", different == 0)
+
+def ip(*command):
+    subprocess.run(["ip"] + list(command), check=True, capture_output=True)
+
+def create_veth():
+    try:
+        ip("link", "add", veth, "type", "veth", "peer", "name", peer)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"Cannot create the veth pair ({e}), only the checks run")
+        return False
+    for iface in [veth, peer]:
+        with open(f"/proc/sys/net/ipv6/conf/{iface}/disable_ipv6", "w") as file:
+            file.write("1")                     #no router solicitations in the counters
+        ip("link", "set", iface, "up")
+    return True
+
+def rx_packets():
+    with open(f"/sys/class/net/{peer}/statistics/rx_packets") as file:
+        return int(file.read())
+
+def check_received(batch):
+    # Frames of sendmmsg() as the peer gets them
+    capture = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x86dd))
+    capture.bind((peer, 0))
+    capture.settimeout(1)
+
+    Base_pkt = base_packet('udp')
+    sender = RawSender(veth, template(Base_pkt, 'udp', "INTH1", 200), batch=batch)
+    seqs = list(range(95, 95 + 2 * batch))
+    sent = sender.send(seqs[:batch]) + sender.send(seqs[batch:])
+    sender.close()
+
+    received = []
+    try:
+        while len(received) < len(seqs):
+            received.append(capture.recv(2048))
+    except socket.timeout:
+        pass
+    capture.close()
+    expected = [scapy_frame(Base_pkt, seq, "INTH1", 200) for seq in seqs]
+    return check(f"{len(seqs)} frames of sendmmsg (batch {batch}) received as sent", sent == len(seqs) and received == expected)
+
+def run_engine(engine, packets, batch, size):
+    args = SimpleNamespace(c=packets, i=0.0, time_out=3600, l4='udp', port=5000, flow_label=7, dscp=46, m="INTH1",
+                           dst_ip=dst_ip, engine=engine, batch=batch,
+                           pacing="constant", spin=200, on_time=1.0, off_time=1.0)
+    payload_space = size - len(Ether() / IPv6() / UDP())
+    before = rx_packets()
+    start = time.perf_counter()
+    results = send.send_packet(args, Ether(src=src_mac, dst=dst_mac), payload_space, veth, dst_ip, src_ip)
+    elapsed = time.perf_counter() - start
+    time.sleep(0.2)
+    received = rx_packets() - before
+    sent = packets - results['failed_packets']
+    print(f"{engine:>5} batch {batch:>3}: {sent} packets in {elapsed:.2f} s, {sent / elapsed:,.0f} pps, {received} received")
+    return sent / elapsed, received >= sent
+
+def main():
+    parser = argparse.ArgumentParser(description='send.py engines benchmark')
+    parser.add_argument('--packets', help='Packets sent by the raw engine', type=int, action="store", required=False, default=200000)
+    parser.add_argument('--scapy_packets', help='Packets sent by the Scapy engine', type=int, action="store", required=False, default=500)
+    parser.add_argument('--batch', help='Packets per sendmmsg()', type=int, action="store", required=False, default=32)
+    parser.add_argument('--s', help='Packet size in bytes (Video)', type=int, action="store", required=False, default=1250)
+    args = parser.parse_args()
+
+    print("Checks")
+    ok = check_frames()
+
+    if create_veth():
+        try:
+            ok &= check_received(args.batch)
+
+            print(f"\n{args.s} bytes packets over {veth}-{peer}")
+            scapy_pps, received = run_engine("scapy", args.scapy_packets, 1, args.s)
+            ok &= check("scapy: all packets received", received)
+            raw_pps, received = run_engine("raw", args.packets, 1, args.s)
+            ok &= check("raw: all packets received", received)
+            batch_pps, received = run_engine("raw", args.packets, args.batch, args.s)
+            ok &= check(f"raw batch {args.batch}: all packets received", received)
+            print(f"raw {raw_pps / scapy_pps:.1f}x the pps of scapy, {batch_pps / scapy_pps:.1f}x with sendmmsg")
+        finally:
+            ip("link", "del", veth)
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
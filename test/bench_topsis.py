@@ -0,0 +1,65 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'analyzer'))
+from mcda_analyzer import MCDAAnalyzer, rank_scores
+
+# TOPSIS of MCDAAnalyzer: dict API (one analyze() per decision) against the array core scoring all of them in one call
+# Each decision is a flow choosing between its candidate paths (alternatives), with the 4 criteria of the analyzer
+#
+# usage: python3 bench_topsis.py --flows 10000 --paths 4
+
+def candidate_paths(num_paths):
+    # (alternatives, criteria) in the order of MCDAAnalyzer.criteria: latency, throughput, packet_loss, recovery_time
+    return np.column_stack((
+        np.random.uniform(1, 50, num_paths),
+        np.random.uniform(1000, 15000, num_paths),
+        np.random.choice([0.0, 0.1, 0.5, np.random.uniform(0, 2)], num_paths),
+        np.random.uniform(1000, 6000, num_paths)
+    ))
+
+def main():
+    parser = argparse.ArgumentParser(description='TOPSIS dict API against the batch array core')
+    parser.add_argument('--flows', help='Number of decisions (flows)', type=int, action="store", required=False, default=10000)
+    parser.add_argument('--paths', help='Maximum number of candidate paths per flow', type=int, action="store", required=False, default=4)
+    args = parser.parse_args()
+
+    random.seed(1)
+    np.random.seed(1)
+    analyzer = MCDAAnalyzer()
+    criteria_names = list(analyzer.criteria)
+    matrices = [candidate_paths(random.randint(1, args.paths)) for _ in range(args.flows)]
+
+    start = time.perf_counter()
+    dict_results = []
+    for matrix in matrices:
+        table = {criterion: {f"path{i}": matrix[i, j] for i in range(len(matrix))} for j, criterion in enumerate(criteria_names)}
+        dict_results.append(analyzer.analyze(table))
+    dict_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = analyzer.score_many(matrices, criteria_names)
+    rankings = [rank_scores(flow_scores) for flow_scores in scores]
+    array_time = time.perf_counter() - start
+
+    same_ranking = 0
+    max_difference = 0.0
+    for result, flow_scores, ranking in zip(dict_results, scores, rankings):
+        same_ranking += [item['alternative'] for item in result['ranking']] == [f"path{i}" for i in ranking]
+        max_difference = max(max_difference, max(abs(result['scores'][f"path{i}"] - score) for i, score in enumerate(flow_scores)))
+
+    print(f"{args.flows} flows, up to {args.paths} paths: dict API {dict_time * 1000:.1f} ms, "
+          f"batch {array_time * 1000:.1f} ms ({dict_time / array_time:.0f}x)")
+    print(f"same ranking: {same_ranking}/{args.flows}, max score difference {max_difference:.2e}")
+
+    ok = same_ranking == args.flows and max_difference < 1e-12
+    print("\nOK" if ok else "\nFAIL")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+tools = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'mininet', 'tools')
+sys.path.append(tools)
+import traffic_engine
+from traffic_engine import TimerWheel, Flow, run
+from pacing import Pacer
+from scapy.all import Ether
+from bench_send import create_veth, rx_packets, ip, src_mac, dst_mac, src_ip, veth
+from checks import check, exit_checks
+
+# Traffic engine of the hosts (traffic_engine.py)
+#   checks: timer wheel order (same slot, later rotations, late deadlines), flows of one engine over a veth pair: packets
+#           sent and received, start times of the flows, pacing of each flow
+#   startup: seconds to start python3 with send.py imported (Scapy), paid once per flow before, once per host with the engine
+#
+# usage: sudo python3 bench_traffic_engine.py --flows 20 --i 0.01 --c 200        (the veth pair needs root)
+
+def check_wheel():
+    ok = True
+    wheel = TimerWheel(1000, slots=8, now_ns=0)
+    for deadline, item in [(5500, "b"), (5100, "a"), (9000, "c"), (13200, "d"), (100000, "e")]:
+        wheel.add(deadline, item)
+    popped = []
+    while wheel.count:
+        tick = wheel.next_tick()
+        popped.append((tick, [item for _, item in wheel.pop(tick)]))
+    ok &= check("deadlines in order, same slot together, later rotations on their tick",
+                popped == [(5, ["a", "b"]), (9, ["c"]), (13, ["d"]), (100, ["e"])])
+
+    wheel.add(50000, "late")
+    ok &= check("late deadline on the current tick", wheel.next_tick() == 100 and wheel.pop(100) == [(50000, "late")])
+    return ok
+
+def run_flows(flows_number, interval, count, tick_us, spin_us):
+    traffic_engine.args = SimpleNamespace(iteration=1, me="bench")
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    sock.bind((veth, 0))
+    pkt = Ether(src=src_mac, dst=dst_mac)
+    flows = []
+    for flow_label in range(1, flows_number + 1):
+        spec = {"dst_ip": f"2001:1:8::{flow_label}", "port": 443, "l4": "udp", "flow_label": flow_label, "m": "INTH1",
+                "dscp": 34, "s": 420, "c": count, "i": interval}
+        flows.append(Flow(spec, pkt, src_ip, veth, sock, Pacer(interval, spin=spin_us / 1000000)))
+
+    before = rx_packets()
+    start = time.perf_counter()
+    run(flows, tick_us * 1000, spin_us * 1000, 3600, time.monotonic_ns())
+    elapsed = time.perf_counter() - start
+    sock.close()
+    time.sleep(0.2)
+    received = rx_packets() - before
+
+    lines = [flow.results_line() for flow in flows]
+    starts = [flow.pacer.first_send_ns for flow in flows]
+    p99 = max(line[16] for line in lines)
+    drift = max(abs(line[17]) for line in lines)
+    print(f"{flows_number} flows of {count} packets every {interval * 1000:g} ms in {elapsed:.2f} s: {received} received, "
+          f"first packets within {(max(starts) - min(starts)) / 1000:.1f} us, max p99 error {p99 / 1000:.1f} us, max drift {drift / 1000:.1f} us")
+
+    ok = check("every flow sent all its packets, all received", all(line[6] == count for line in lines) and received >= flows_number * count)
+    ok &= check("flows started within one interval", max(starts) - min(starts) < interval * 1000000000)
+    ok &= check("drift of each flow under one interval", drift < interval * 1000000000)
+    return ok
+
+def startup_seconds():
+    # python3 with the imports of send.py, once per send.py process
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import sys; sys.path.append({tools!r}); import send"], check=True)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='traffic engine benchmark')
+    parser.add_argument('--flows', help='Flows of the engine', type=int, action="store", required=False, default=20)
+    parser.add_argument('--i', help='Interval between packets of each flow in seconds', type=float, action="store", required=False, default=0.01)
+    parser.add_argument('--c', help='Packets of each flow', type=int, action="store", required=False, default=200)
+    parser.add_argument('--tick_us', help='Microseconds of each slot of the timer wheel', type=int, action="store", required=False, default=1000)
+    parser.add_argument('--spin_us', help='Microseconds busy waiting before each deadline', type=int, action="store", required=False, default=200)
+    args = parser.parse_args()
+
+    print("Checks")
+    ok = check_wheel()
+
+    seconds = startup_seconds()
+    print(f"\nstartup of send.py {seconds:.2f} s: {args.flows} flows {seconds * args.flows:.1f} s with one send.py each, {seconds:.2f} s with the engine")
+
+    if create_veth():
+        try:
+            ok &= run_flows(args.flows, args.i, args.c, args.tick_us, args.spin_us)
+        finally:
+            ip("link", "del", veth)
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
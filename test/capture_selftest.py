@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# Self test of the capture backends without switches: creates a veth pair, sends synthetic INT reports on one end
+# and captures + decodes them on the other end with the selected backend, then compares the counters
+# Needs root (creates the veth pair and opens AF_PACKET sockets)
+#
+# usage: sudo python3 capture_selftest.py --capture ring --n 20000
+
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'receive'))
+from capture import CAPTURE_BACKENDS, create_capture
+from colllector import FlowInfo
+from int_decoder import decode_int_report
+from bench_decoder import build_synthetic_report
+
+VETH_TX = "ctest-tx"
+VETH_RX = "ctest100"                #same name pattern as the collector interfaces
+
+def create_veth():
+    subprocess.run(["ip", "link", "del", VETH_TX], stderr=subprocess.DEVNULL)
+    subprocess.run(["ip", "link", "add", VETH_TX, "type", "veth", "peer", "name", VETH_RX], check=True)
+    for iface in (VETH_TX, VETH_RX):
+        subprocess.run(["sysctl", "-qw", "net.ipv6.conf.%s.disable_ipv6=1" % iface], stderr=subprocess.DEVNULL)
+        subprocess.run(["ip", "link", "set", iface, "up"], check=True)
+
+def delete_veth():
+    subprocess.run(["ip", "link", "del", VETH_TX], stderr=subprocess.DEVNULL)
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture backend self test over a veth pair')
+    parser.add_argument('--capture', help='Capture backend to test',
+                        type=str, action="store", required=False, default="ring", choices=list(CAPTURE_BACKENDS))
+    parser.add_argument('--n', help='Number of INT reports sent',
+                        type=int, action="store", required=False, default=10000)
+    parser.add_argument('--distinct', help='Number of distinct synthetic reports (they are sent in round robin)',
+                        type=int, action="store", required=False, default=200)
+    args = parser.parse_args()
+
+    frames = [build_synthetic_report(random.randint(1, 6), srv6=random.random() < 0.5) for _ in range(args.distinct)]
+
+    decoded = [0]
+    hops = [0]
+    def handler(frame):
+        flow_info = decode_int_report(FlowInfo(), frame, {})
+        if flow_info:
+            decoded[0] += 1
+            hops[0] += flow_info.hop_cnt
+
+    create_veth()
+    stop_event = threading.Event()
+    try:
+        capture = create_capture(args.capture, VETH_RX, handler, stop_event)
+        thread = threading.Thread(target=capture.run, daemon=True)
+        thread.start()
+        time.sleep(2)                   #let the capture start (scapy compiles the BPF filter)
+
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+        sock.bind((VETH_TX, 0))
+        start = time.perf_counter()
+        for i in range(args.n):
+            sock.send(frames[i % len(frames)])
+        send_time = time.perf_counter() - start
+        sock.close()
+
+        time.sleep(2)                   #let the capture drain the ring
+        stop_event.set()
+        thread.join(5)
+        stats = capture.stats()
+    finally:
+        delete_veth()
+
+    print("Capture backend:", args.capture)
+    print("Sent:    %d reports in %.3f s" % (args.n, send_time))
+    print("Decoded: %d reports (%d hops)" % (decoded[0], hops[0]))
+    print("Stats:  ", stats)
+
+    # With the ring the reports not decoded must be in the kernel drop counter
+    lost = args.n - decoded[0]
+    if lost and stats.get('kernel_drops', 0) < lost:
+        print("ERROR: %d reports not decoded (kernel drops: %s)" % (lost, stats.get('kernel_drops')))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import sys
+
+#Checks of the test and benchmark scripts: each one printed as OK/FAIL, the script exits with 1 if any failed
+#
+#usage:
+#   from checks import check, exit_checks
+#   ok = check("same results", results == expected)
+#   ok &= check(...)
+#   exit_checks(ok)
+
+def check(name, condition):
+    print(f"\t{name}: {'OK' if condition else 'FAIL'}")
+    return condition
+
+def exit_checks(ok):
+    print("\nAll checks passed" if ok else "\nSome checks failed")
+    sys.exit(0 if ok else 1)
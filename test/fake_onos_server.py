@@ -0,0 +1,156 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+import paramiko
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'common'))
+from topology import directed_links
+
+#Local stand-in of the ONOS CLI (Karaf shell over SSH) to test the analyzer's ONOS client without ONOS
+#Answers like the srv6_usid app commands: Path-Detour-SRv6 prints "Creating path detour using SRv6 policy" and the
+#result, srv6-insert prints the path installed, srv6-remove prints nothing, links lists the links of the topology
+#(INT/common/topology.py) but the ones in down_links. The input lines are read, echoed and answered one at a time,
+#followed by the (colored) prompt, as the Karaf line reader does with commands typed ahead
+#
+#usage: server = FakeOnosServer(command_delay=0.005).start(); ... OnosCliClient(port=server.port) ...; server.stop()
+
+PROMPT = "\x1b[1monos\x1b[0m@root > "
+BANNER = "Welcome to Open Network Operating System (ONOS)!\r\n\r\n"
+
+HOST_KEY = None
+
+def host_key():
+    global HOST_KEY
+    if HOST_KEY is None:
+        HOST_KEY = paramiko.RSAKey.generate(2048)
+    return HOST_KEY
+
+
+class FakeOnosInterface(paramiko.ServerInterface):
+    def __init__(self, username, password) -> None:
+        self.username = username
+        self.password = password
+        self.shell_event = threading.Event()
+
+    def check_auth_password(self, username, password):
+        if username == self.username and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell_event.set()
+        return True
+
+
+class FakeOnosServer():
+    """
+    :param command_delay: Seconds each command takes.
+    :param detour_result: Last line printed by Path-Detour-SRv6.
+    :param drop_after: Close the channel after this number of commands (per connection), None never.
+    :param slow_commands: Commands starting with this prefix take slow_delay seconds.
+    :param down_links: Links (switch, switch) not listed by links.
+    """
+    def __init__(self, host='127.0.0.1', port=0, username='onos', password='rocks', command_delay=0.0, detour_result="Success",
+                 drop_after=None, slow_commands=None, slow_delay=0.0, down_links=()) -> None:
+        self.username = username
+        self.password = password
+        self.command_delay = command_delay
+        self.detour_result = detour_result
+        self.drop_after = drop_after
+        self.slow_commands = slow_commands
+        self.slow_delay = slow_delay
+        self.down_links = {frozenset(link) for link in down_links}
+
+        self.commands = []              #every command received
+        self.connections = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+        self.stop_event = threading.Event()
+
+    def start(self):
+        self.sock.listen(16)
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.sock.close()
+
+    def accept_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections += 1
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(host_key())
+        interface = FakeOnosInterface(self.username, self.password)
+        try:
+            transport.start_server(server=interface)
+            channel = transport.accept(10)
+            if channel is None or not interface.shell_event.wait(10):
+                return
+            self.shell(channel)
+        except (paramiko.SSHException, OSError, EOFError):
+            pass
+        finally:
+            transport.close()
+
+    def answer(self, command):
+        if command.startswith("Path-Detour-SRv6"):
+            return "Creating path detour using SRv6 policy\r\n" + self.detour_result + "\r\n"
+        if command.startswith("srv6-insert"):
+            fields = command.split()
+            return "Installing path on device %s: %s\r\n" % (fields[1], ", ".join(fields[8:]))
+        if command == "links":
+            return "".join("src=device:r%s/1, dst=device:r%s/1, type=DIRECT, state=ACTIVE, expected=false\r\n" % link
+                           for link in directed_links() if frozenset(link) not in self.down_links)
+        if command.startswith("srv6-remove") or command == "":
+            return ""
+        return "Command not found: %s\r\n" % command.split()[0]
+
+    def shell(self, channel):
+        channel.sendall(BANNER + PROMPT)
+        pending = ""
+        answered = 0
+        while True:
+            data = channel.recv(65536)
+            if not data:
+                return
+            pending += data.decode()
+            while "\n" in pending or "\r" in pending:
+                line, pending = pending.replace("\r\n", "\n").replace("\r", "\n").split("\n", 1)
+                command = line.strip()
+                if command in ("logout", "exit"):
+                    channel.close()
+                    return
+                self.commands.append(command)
+                channel.sendall(line + "\r\n")           #echo
+                delay = self.slow_delay if self.slow_commands and command.startswith(self.slow_commands) else self.command_delay
+                if delay:
+                    time.sleep(delay)
+                channel.sendall(self.answer(command) + PROMPT)
+
+                answered += 1
+                if self.drop_after is not None and answered >= self.drop_after:
+                    channel.close()
+                    return
@@ -0,0 +1,138 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'process_results'))
+from results_frame import read_csv_rows, aggregate_flows, dscp_statistics, AVERAGED_COLUMNS
+from checks import check, exit_checks
+
+# Results frames of process_results (results_frame.py) against the cell by cell calculations they replace
+#   aggregate: receivers averaged with a running mean, loss, loss % and 1º packet delay of each (sender, receiver) pair
+#   statistics: np.percentile + mean of each column per DSCP, STD of the jitter (values below the percentile only if more than 2)
+#
+# usage: python3 test_results_frame.py --flows 2000
+
+percentile = 95
+scenario_DSCPs = [0, 34, 46]
+header = "Iteration,Host,Flow src,Flow dst,Flow Label,Is,Nº of packets,1º Packet Timestamp(seconds),Nº of out of order packets,Out of order packets,DSCP,AVG Flow Jitter (nanoseconds)"
+
+def synthetic_csv(path, n):
+    # n flows over 2 iterations, 1 sender and 0 to 3 receivers each, some without sender
+    rows = []
+    for iteration in [1, 2]:
+        for i in range(n):
+            src_ip, dst_ip, flow_label = f"2001:1:{i % 8 + 1}::1", f"2001:1:{(i + 3) % 8 + 1}::{i // 8:x}", i % 500
+            dscp = random.choice([0, 34, 35, 46])
+            num_pkt = random.randint(100, 1000)
+            sent = 1700000000 + iteration * 100 + random.random()
+            if random.random() > 0.05:
+                rows.append(f"{iteration},h{i % 8 + 1},{src_ip},{dst_ip},{flow_label},sender,{num_pkt},{sent!r},,,{dscp},")
+            for host in range(random.choice([0, 1, 1, 1, 2, 3])):
+                received = num_pkt - random.randint(0, 20)
+                out_of_order = random.randint(0, 3)
+                rows.append(f"{iteration},h{host + 10},{src_ip},{dst_ip},{flow_label},receiver,{received},{sent + random.random() / 100!r},"
+                            f"{out_of_order},{'-'.join(str(random.randint(1, num_pkt)) for _ in range(out_of_order))},{dscp},"
+                            f"{random.uniform(1000, 90000)!r}")
+    with open(path, "w") as file:
+        file.write(header + "\n" + "\n".join(rows) + "\n")
+
+def cell_flows(path):
+    # What process_results computed: {flow: [dscp, sender, receiver]}, the receivers with a running mean
+    flows = {}
+    with open(path) as file:
+        next(file)
+        for line in file:
+            iteration, _, src_ip, dst_ip, flow_label, is_, num_pkt, timestamp, num_out, _, dscp, jitter = line.rstrip("\n").split(",")
+            flow = flows.setdefault((iteration, src_ip, dst_ip, int(flow_label)), [int(dscp), None, None])
+            if is_ == "sender":
+                flow[1] = (float(num_pkt), float(timestamp))
+                continue
+            values = [float(num_pkt), float(timestamp), float(num_out), float(jitter), 1]
+            if flow[2] is None:
+                flow[2] = values
+            else:
+                count = flow[2][4]
+                flow[2] = [(old * count + new) / (count + 1) for old, new in zip(flow[2][:4], values[:4])] + [count + 1]
+    return flows
+
+def cell_values(flows):
+    # {flow: {column: value}} of the loss/delay cells and the receiver columns
+    values = {}
+    for flow, (dscp, sender, receiver) in flows.items():
+        flow_values = values[flow] = {"dscp": dscp}
+        if receiver is None:
+            continue
+        flow_values.update(num_out_of_order_pkt=receiver[2], avg_jitter=receiver[3])
+        if sender is not None:
+            loss = sender[0] - receiver[0]
+            flow_values.update(packet_loss=loss, packet_loss_pct=round(loss / receiver[0] * 100, 2),
+                               first_pkt_delay=round((receiver[1] - sender[1]) * 1000000000, 2))
+    return values
+
+def cell_statistics(values):
+    # {(column, dscp): value} of the calculations area
+    statistics = {}
+    for dscp in [-1] + scenario_DSCPs:
+        for column in AVERAGED_COLUMNS:
+            column_values = [flow[column] for flow in values.values()
+                             if column in flow and flow["dscp"] in scenario_DSCPs and (dscp == -1 or flow["dscp"] == dscp)]
+            if column_values:
+                limit = np.percentile(column_values, percentile)
+                statistics[(column, dscp)] = round(np.mean([value for value in column_values if value <= limit]), 2)
+        jitters = [flow["avg_jitter"] for flow in values.values() if "avg_jitter" in flow and (dscp == -1 or flow["dscp"] == dscp)]
+        if jitters:
+            limit = np.percentile(jitters, percentile)
+            kept = [value for value in jitters if value <= limit]
+            statistics[("std_jitter", dscp)] = round(np.std(kept if len(kept) > 2 else jitters), 2)
+    return statistics
+
+def close(a, b, tolerance=1e-6):
+    return abs(a - b) <= tolerance * max(1, abs(a), abs(b))
+
+def main():
+    parser = argparse.ArgumentParser(description='Results frames against the cell by cell calculations')
+    parser.add_argument('--flows', help='Number of flows per iteration', type=int, action="store", required=False, default=2000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    path = os.path.join(tempfile.mkdtemp(), "HIGH-ECMP_results.csv")
+    synthetic_csv(path, args.flows)
+
+    start = time.perf_counter()
+    rows = read_csv_rows(path)
+    flows_info = {flow: (dscp, 512) for flow, dscp in rows.groupby(["src_ip", "dst_ip", "flow_label"])["dscp"].first().items()}
+    flows = aggregate_flows(rows, flows_info)
+    statistics = dscp_statistics(flows, scenario_DSCPs, percentile)
+    frame_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected_values = cell_values(cell_flows(path))
+    expected_statistics = cell_statistics(expected_values)
+    cell_time = time.perf_counter() - start
+    print(f"{len(rows)} rows, {len(flows)} flows: frames {frame_time * 1000:.1f} ms, cell by cell {cell_time * 1000:.1f} ms")
+
+    print("\nChecks")
+    ok = check("one line per flow and iteration, in order", list(map(tuple, flows[["iteration", "src_ip", "dst_ip", "flow_label"]].values)) == list(expected_values))
+    different = 0
+    for flow, line in zip(expected_values.values(), flows.to_dict("records")):
+        for column in ["dscp", "num_out_of_order_pkt", "avg_jitter", "packet_loss", "packet_loss_pct", "first_pkt_delay"]:
+            if column in flow:
+                #the mean of the timestamps (~1.7e9 s) may differ in the last bit from the running mean, up to ~240 ns of delay
+                different += not close(line[column], flow[column], 1e-3 if column == "first_pkt_delay" else 1e-6)
+            else:
+                different += not np.isnan(line[column])
+    ok &= check("receivers averaged, loss and 1º packet delay only with sender and receiver", different == 0)
+
+    different = [key for key, value in expected_statistics.items() if not close(statistics.loc[key[1], key[0]], value)]
+    computed = statistics.loc[[-1] + scenario_DSCPs].notna().sum().sum()
+    ok &= check("averages and STD of the jitter per DSCP", len(different) == 0 and computed == len(expected_statistics))
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'mininet', 'tools'))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'process_results'))
+from sequence_tracker import SequenceTracker, HISTOGRAM_BINS, histogram_bin
+import results_csv
+from results_frame import read_csv_rows, aggregate_flows
+from checks import check, exit_checks
+
+# Sequence numbers of the receivers (sequence_tracker.py) against the definitions computed over the whole stream
+#   counters: duplicated (already received), reordered (below the next expected, RFC 4737), late (below the window), lost
+#   histograms: RFC 4737 reordering extent (arrivals since the earliest higher sequence number) and distance (below the next expected)
+#   size: results CSV cells of the list of out of order packets of terminate() before against the counters and histograms
+#   process_results: the new columns read and aggregated per flow, the old files (list in the 10º column) still read
+#
+# usage: python3 test_sequence_tracker.py --packets 1000000
+
+def stream(packets, rng, reorder=0.02, duplicate=0.005, loss=0.01, max_displacement=40):
+    # Sequence numbers 1..packets, some lost, some duplicated, some delayed up to max_displacement positions
+    seqs = [seq for seq in range(1, packets + 1) if rng.random() >= loss]
+    seqs += [seq for seq in seqs if rng.random() < duplicate]
+    keys = [index + (rng.randint(1, max_displacement) if rng.random() < reorder else 0) for index in range(len(seqs))]
+    return [seq for _, seq in sorted(zip(keys, seqs))]
+
+def reference(seqs, window):
+    # Counters and histograms over the whole stream
+    received, first_arrival = set(), {}
+    duplicated = late = reordered = 0
+    extents, distances = [0] * len(HISTOGRAM_BINS), [0] * len(HISTOGRAM_BINS)
+    max_seq, max_extent = 0, 0
+    for arrival, seq in enumerate(seqs, 1):
+        if seq > max_seq:
+            max_seq = seq
+            received.add(seq)
+            first_arrival[seq] = arrival
+        elif seq <= max_seq - window:
+            late += 1
+        elif seq in received:
+            duplicated += 1
+        else:
+            received.add(seq)
+            first_arrival[seq] = arrival
+            reordered += 1
+            extent = arrival - min(a for s, a in first_arrival.items() if s > seq)
+            max_extent = max(max_extent, extent)
+            extents[histogram_bin(extent)] += 1
+            distances[histogram_bin(max_seq + 1 - seq)] += 1
+    lost = max(max_seq - len(received) - late, 0)
+    return [duplicated, late, lost] + extents + distances, reordered, max_extent
+
+def tracked(seqs, window):
+    sequences = SequenceTracker(window)
+    for seq in seqs:
+        sequences.add(seq)
+    return sequences
+
+def check_definitions():
+    ok = True
+    sequences = tracked([1, 2, 3, 5, 4, 6, 9, 7, 8, 10, 2, 12], 4096)
+    #4: extent 1 (after 5), distance 2 | 7: extent 1 (after 9), distance 3 | 8: extent 2 (after 9, 7), distance 2 | 2 duplicated | 11 lost
+    ok &= check("RFC 4737 example: reordered, extents, distances, duplicated, lost",
+                (sequences.reordered, sequences.duplicated, sequences.lost(), sequences.max_extent) == (3, 1, 1, 2)
+                and list(sequences.extent_histogram[:2]) == [2, 1] and list(sequences.distance_histogram[:3]) == [0, 2, 1])
+
+    sequences = tracked([1, 100, 2, 50, 100], 64)
+    ok &= check("below the window late, in the window reordered, repeated duplicated",
+                (sequences.late, sequences.reordered, sequences.duplicated, sequences.lost()) == (1, 1, 1, 96))
+
+    sequences = tracked([10, 10000, 9980, 20000, 10000, 19999], 16)
+    ok &= check("window slid over more than its size", (sequences.late, sequences.reordered, sequences.duplicated) == (2, 1, 0))
+
+    rng = random.Random(1)
+    for window, packets in [(4096, 20000), (32, 20000), (8, 5000)]:
+        seqs = stream(packets, rng)
+        expected, reordered, max_extent = reference(seqs, window)
+        sequences = tracked(seqs, window)
+        ok &= check(f"{len(seqs)} packets, window {window}: counters and histograms of the whole stream",
+                    sequences.columns() == expected and sequences.reordered == reordered and sequences.max_extent == max_extent)
+    return ok
+
+def previous_out_of_order(seqs):
+    # terminate() before: every sequence number below the highest one, kept as a list
+    out_of_order, expected_seq = [], 0
+    for seq in seqs:
+        if seq < expected_seq:
+            out_of_order.append(seq)
+        else:
+            expected_seq = seq
+    return out_of_order
+
+def measured(function, *args):
+    # Seconds of function() and its peak of memory, measured in two runs (tracemalloc slows it down)
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    result = function(*args)
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, memory, result
+
+def check_size(packets):
+    rng = random.Random(2)
+    seqs = stream(packets, rng, duplicate=0)
+
+    def previous():
+        sequence_numbers = list(seqs)               #the list of sequence numbers of process_packet()
+        return previous_out_of_order(sequence_numbers)
+
+    previous_seconds, previous_memory, out_of_order = measured(previous)
+    seconds, memory, sequences = measured(tracked, seqs, 4096)
+
+    previous_cell = len(str(out_of_order))
+    cells = len(",".join(str(value) for value in [sequences.out_of_order(), sequences.max_extent] + sequences.columns()))
+    print(f"\n{len(seqs)} packets: before {len(out_of_order)} out of order packets in a {previous_cell / 1024:.0f} KiB cell, "
+          f"{previous_memory / 1024 / 1024:.1f} MiB, {previous_seconds:.2f} s")
+    print(f"{' ' * len(str(len(seqs)))}          now {sequences.out_of_order()} out of order packets, counters and histograms in {cells} bytes, "
+          f"{memory / 1024:.0f} KiB, {seconds:.2f} s")
+    ok = check("same out of order packets without duplicates", sequences.out_of_order() == len(out_of_order))
+    ok &= check("constant memory and a line of less than 200 bytes", memory < 64 * 1024 and cells < 200)
+    return ok
+
+def check_process_results():
+    directory = tempfile.mkdtemp()
+    results_csv.result_directory = directory
+    flow = ["2001:1:1::1", "2001:1:8::1", 7]
+    sequences = tracked([1, 3, 2, 5, 6, 6], 4096)
+    results_csv.append_lines("new.csv", [
+        [1, "h1", *flow, "sender", 6, 1700000000.0, None, None, 34, None, "constant", 0.01, 0.01, 10.0, 20, 5],
+        [1, "h2", *flow, "receiver", 6, 1700000000.1, sequences.out_of_order(), sequences.max_extent, 34, 1000.0]
+        + [None] * len(results_csv.PACING_COLUMNS) + sequences.columns()])
+    with open(os.path.join(directory, "old.csv"), "w") as file:
+        file.write(",".join(results_csv.HEADER[:12]) + "\n")
+        file.write("1,h2,2001:1:1::1,2001:1:8::1,7,receiver,6,1700000000.1,2,\"[3, 2]\",34,1000.0\n")
+
+    flows = aggregate_flows(read_csv_rows(os.path.join(directory, "new.csv")), {tuple(flow): (34, 420)})
+    line = flows.iloc[0]
+    ok = check("new columns read and aggregated", (line["num_out_of_order_pkt"], line["max_reorder_extent"], line["num_duplicated_pkt"],
+                                                   line["num_lost_pkt"], line["reorder_extent_1"], line["reorder_distance_2"]) == (1, 1, 1, 1, 1, 1))
+    old = read_csv_rows(os.path.join(directory, "old.csv"))
+    ok &= check("old files read, list of out of order packets as NaN",
+                old["max_reorder_extent"].isna().all() and old["num_lost_pkt"].isna().all() and old["num_out_of_order_pkt"][0] == 2)
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Sequence tracker test')
+    parser.add_argument('--packets', help='Packets of the size comparison', type=int, action="store", required=False, default=1000000)
+    args = parser.parse_args()
+
+    print("Checks")
+    ok = check_definitions()
+    ok &= check_process_results()
+    ok &= check_size(args.packets)
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'common'))
+from quantile_sketch import QuantileSketch, merge_sketches, DEFAULT_RELATIVE_ACCURACY
+from sketch_queries import get_latency_sketch, get_latency_sketches_by_switch
+
+# Accuracy of the latency sketches against the exact values
+#   synthetic: several latency distributions split in windows (as the collector writes them), serialized, merged back
+#              and compared against the exact nearest rank percentiles (same definition as InfluxDB PERCENTILE())
+#   --start/--end: compares the sketches stored in InfluxDB against the PERCENTILE()/COUNT() queries they replace
+#
+# usage: python3 test_sketch_accuracy.py
+#        python3 test_sketch_accuracy.py --start 2024-05-01T10:00:00Z --end 2024-05-01T10:05:00Z
+
+percentiles = [50, 85, 95, 99]
+num_windows = 60
+
+def exact_percentile(sorted_values, p):
+    # InfluxDB PERCENTILE(): value at position int(count*p/100 + 0.5) of the sorted values
+    index = int(len(sorted_values) * p / 100 + 0.5) - 1
+    index = min(max(index, 0), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def synthetic_distributions(n):
+    return {
+        "lognormal hop latency": [int(random.lognormvariate(9, 0.8)) for _ in range(n)],
+        "uniform": [random.randint(1000, 100000) for _ in range(n)],
+        "bimodal (congested queue)": [int(random.gauss(5000, 500)) if random.random() < 0.8 else int(random.gauss(400000, 50000)) for _ in range(n)],
+        "constant": [12345] * n,
+        "with zeros": [0] * (n // 10) + [int(random.expovariate(1 / 20000)) for _ in range(n - n // 10)],
+    }
+
+def check_synthetic(n):
+    ok = True
+    for name, values in synthetic_distributions(n).items():
+        # one sketch per window, serialized and merged back as the analyzer does
+        windows = np.array_split(np.array(values), num_windows)
+        serialized = []
+        for window in windows:
+            sketch = QuantileSketch()
+            for value in window:
+                sketch.add(int(value))
+            serialized.append(sketch.to_string())
+        merged = merge_sketches(serialized)
+
+        sorted_values = sorted(values)
+        print(f"{name}: {len(values)} values, {num_windows} windows")
+        for p in percentiles:
+            exact = exact_percentile(sorted_values, p)
+            numpy_value = np.percentile(values, p, method="inverted_cdf")
+            estimated = merged.percentile(p)
+            error = abs(estimated - exact) / exact if exact else abs(estimated)
+
+            exact_rank = sum(1 for value in values if value <= exact)
+            rank = merged.rank(estimated)
+
+            status = "OK" if error <= DEFAULT_RELATIVE_ACCURACY + 1e-9 else "FAIL"
+            ok = ok and status == "OK"
+            print(f"\tp{p}: exact {exact}\tnumpy {numpy_value}\tsketch {estimated:.1f}\trelative error {error:.4%}\t"
+                  f"COUNT(<= p) exact {exact_rank} sketch {rank}\t{status}")
+
+        if merged.count != len(values) or merged.min != min(values) or merged.max != max(values):
+            print("\tFAIL: count/min/max do not match")
+            ok = False
+    return ok
+
+def check_db(start, end):
+    from influx_query import get_influx_query
+    apply_query = get_influx_query(host='localhost', database='int').query
+
+    def db_percentile(table, p, condition=""):
+        result = apply_query(f"""
+            SELECT PERCENTILE("latency", {p}) AS p_latency FROM {table}
+            WHERE time >= $start AND time <= $end {condition}
+        """, {'start': start, 'end': end})
+        points = list(result.get_points())
+        return points[0]['p_latency'] if points else None
+
+    ok = True
+    dscps = [None] + sorted({point['value'] for point in apply_query('SHOW TAG VALUES FROM flow_stats WITH KEY = "dscp"').get_points()})
+    for table in ["flow_stats", "switch_stats"]:
+        for dscp in dscps:
+            condition = f"AND dscp = '{dscp}'" if dscp is not None else ""
+            sketch = get_latency_sketch(apply_query, table, start, end, condition)
+            for p in percentiles:
+                exact = db_percentile(table, p, condition)
+                if exact is None or sketch.count == 0:
+                    print(f"{table} dscp {dscp}: no data (exact {exact}, sketch count {sketch.count})")
+                    break
+                estimated = sketch.percentile(p)
+                error = abs(estimated - exact) / exact if exact else abs(estimated)
+                status = "OK" if error <= DEFAULT_RELATIVE_ACCURACY + 1e-9 else "CHECK"
+                ok = ok and status == "OK"
+                print(f"{table} dscp {dscp} p{p}: PERCENTILE() {exact}\tsketch {estimated:.1f}\trelative error {error:.4%}\t{status}")
+
+    # per switch counts below the 95th percentile (configure.calculate_percentages)
+    p_switch = db_percentile("switch_stats", 95)
+    result = apply_query("""
+        SELECT COUNT("latency") FROM switch_stats
+        WHERE time >= $start AND time <= $end AND "latency" <= $p_latency GROUP BY switch_id
+    """, {'start': start, 'end': end, 'p_latency': p_switch})
+    sketches = get_latency_sketches_by_switch(apply_query, start, end)
+    for series in result.raw.get('series', []):
+        switch_id = int(series['tags']['switch_id'])
+        exact = series['values'][0][1]
+        estimated = sketches[switch_id].rank(p_switch) if switch_id in sketches else 0
+        print(f"switch {switch_id}: COUNT(latency <= p95) {exact}\tsketch {estimated}\tdifference {estimated - exact}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency sketches accuracy')
+    parser.add_argument('--n', help='Number of synthetic values per distribution', type=int, default=50000)
+    parser.add_argument('--start', help='Start (RFC3339) of the time range to compare against InfluxDB', type=str, default=None)
+    parser.add_argument('--end', help='End (RFC3339) of the time range to compare against InfluxDB', type=str, default=None)
+    args = parser.parse_args()
+
+    random.seed(1)
+    ok = check_synthetic(args.n)
+    if args.start and args.end:
+        ok = check_db(args.start, args.end) and ok
+
+    print("\nAll percentiles within the relative accuracy" if ok else "\nSome percentiles are outside the relative accuracy")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'common'))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'process_results'))
+from srv6_registry import SRv6Registry, SRv6Journal, replay_journal, flow_key, OPERATION_CREATED, OPERATION_REMOVED, OPERATION_DETOUR_LATENCY
+import constants
+import process_results
+from checks import check, exit_checks
+
+# SRv6 rules registry of the analyzer (srv6_registry.py) and its journal
+#   replay: the rules left active by a run that did not stop cleanly, rebuilt from the journal (create, replace, remove)
+#   crash:  a last line cut while it was written is skipped
+#   process_results: the removals of the cleanup at the end of a test are replayed but are not SRv6 operations
+#   indexes: by_switch and detour_counts after a rule of a flow is replaced by one of another switch
+#
+# usage: python3 test_srv6_registry.py
+
+def rule(flow_label, device_id=1, src="2001:1:1::1", dst="2001:1:8::1"):
+    return {"deviceID": str(device_id), "srcIP": src, "dstIP": dst, "flow_label": flow_label,
+            "src_mask": 128, "dst_mask": 128, "flow_label_mask": 255, "segments": "fcbb:bb00:2::"}
+
+def journaled_registry(directory, name):
+    path = os.path.join(directory, name)
+    return SRv6Registry(SRv6Journal(path)), path
+
+def check_replay(directory):
+    registry, path = journaled_registry(directory, "replay.jsonl")
+    registry.add(5, rule(1), iteration=1)
+    registry.add(5, rule(2), iteration=1)
+    registry.add(7, rule(3), iteration=1)
+    registry.add(7, rule(1), iteration=1)                   #replaces the rule of flow 1 of switch 5
+    registry.journal.record(OPERATION_DETOUR_LATENCY, 7, 1, latency=0.01)
+    registry.remove_rule(rule(2), iteration=1)
+    registry.remove_switch(9, iteration=1)                  #no rules, nothing journaled
+    registry.journal.close()
+
+    replayed = replay_journal(path)
+    ok = check("create, replace and remove replayed as the registry ended",
+               replayed.to_dict() == registry.to_dict() == {7: [rule(3), rule(1)]})
+    ok &= check("detours of each flow replayed", {key: replayed.detour_count(key) for key in replayed.detour_counts}
+                == {flow_key(rule(1)): 2, flow_key(rule(2)): 1, flow_key(rule(3)): 1})
+
+    registry.journal = SRv6Journal(path)
+    registry.clear(iteration=1)
+    registry.journal.close()
+    ok &= check("no rules left after a clear", len(replay_journal(path)) == 0)
+    ok &= check("no journal, no rules", len(replay_journal(os.path.join(directory, "missing.jsonl"))) == 0)
+    return ok
+
+def check_crash(directory):
+    registry, path = journaled_registry(directory, "crash.jsonl")
+    registry.add(5, rule(1), iteration=1)
+    registry.add(5, rule(2), iteration=1)
+    registry.journal.close()
+    with open(path) as file:
+        complete = file.read()
+
+    # the removal of flow 2 cut while it was written: flow 2 still active in ONOS as far as the journal knows
+    registry.journal = SRv6Journal(path)
+    registry.remove_rule(rule(2), iteration=1)
+    registry.journal.close()
+    with open(path) as file:
+        removal = file.read()[len(complete):]
+    with open(path, "w") as file:
+        file.write(complete + removal[:len(removal) // 2])
+
+    leaked = replay_journal(path)
+    ok = check("truncated last line skipped, its rule still removed on restart", leaked.to_dict() == {5: [rule(1), rule(2)]})
+
+    # the analyzer starts again: the leaked rules are removed from ONOS and the journal starts empty
+    journal = SRv6Journal(path)
+    journal.truncate()
+    SRv6Registry(journal).add(7, rule(3), iteration=1)
+    journal.close()
+    ok &= check("journal of the new run only has its own rules", replay_journal(path).to_dict() == {7: [rule(3)]})
+    return ok
+
+def check_cleanup(directory):
+    registry, path = journaled_registry(directory, "cleanup.jsonl")
+    registry.add(5, rule(1), iteration=1)
+    registry.add(5, rule(2), iteration=1)
+    registry.remove_rule(rule(1), iteration=1)              #the load of switch 5 went down
+    registry.add(7, rule(3), iteration=2)
+    registry.journal.record(OPERATION_DETOUR_LATENCY, 7, 2, latency=0.01)
+    registry.clear(iteration=2)                             #end of the test
+    registry.journal.close()
+
+    ok = check("cleanup removals applied by the replay", len(replay_journal(path)) == 0)
+
+    constants.SRv6_operations = []
+    process_results.read_SRv6_journal(path)
+    operations = [(iteration, operation, switch, flow_label) for iteration, _, operation, switch, _, _, flow_label in constants.SRv6_operations]
+    ok &= check("cleanup removals and detour latencies are not SRv6 operations of process_results", operations == [
+        ("1", OPERATION_CREATED, 5, 1), ("1", OPERATION_CREATED, 5, 2), ("1", OPERATION_REMOVED, 5, 1), ("2", OPERATION_CREATED, 7, 3)])
+    return ok
+
+def check_indexes():
+    registry = SRv6Registry()
+    registry.add(5, rule(1))
+    registry.add(5, rule(2))
+    detours = registry.add(7, rule(1))                      #the detour of flow 1 moves to switch 7
+
+    ok = check("replaced rule moved to the new switch", registry.by_switch == {5: {flow_key(rule(2)): None}, 7: {flow_key(rule(1)): None}}
+               and registry.get(flow_key(rule(1))).switch_id == 7 and len(registry) == 2)
+    ok &= check("detour count of the replaced flow incremented", detours == 2 and registry.detour_count(flow_key(rule(1))) == 2
+                and registry.detour_count(flow_key(rule(2))) == 1)
+
+    registry.remove_switch(5)
+    ok &= check("empty switch left out of by_switch", registry.switches() == [7] and not registry.has_switch(5) and registry.count(7) == 1)
+    registry.remove_rule(rule(1))
+    registry.add(5, rule(1))
+    ok &= check("detour counts kept after the rules are removed", registry.by_switch == {5: {flow_key(rule(1)): None}}
+                and registry.detour_count(flow_key(rule(1))) == 3)
+    return ok
+
+def main():
+    directory = tempfile.mkdtemp()
+
+    print("Checks")
+    ok = check_replay(directory)
+    ok &= check_crash(directory)
+    ok &= check_cleanup(directory)
+    ok &= check_indexes()
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
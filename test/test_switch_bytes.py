@@ -0,0 +1,158 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+from influxdb.resultset import ResultSet
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'common'))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'receive'))
+from byte_queries import ScenarioSwitchData, get_scenario_switch_data
+from rollup import RollupAggregator
+from backfill_switch_bytes import window_byte_lines, rfc3339_ns
+from checks import check, exit_checks
+
+# Per switch byte sums of the switch_bytes/flow_bytes rollups against the regex on the path of flow_stats they replace
+#   synthetic: flow reports through the collector rollups (rollup.py) and through the backfill (backfill_switch_bytes.py),
+#              grouped as SUM() ... GROUP BY does, against SUM("size") WHERE path =~ switch AND size <= PERCENTILE("size", 95)
+#   --start/--end: compares the rollups stored in InfluxDB against the queries of configure.get_byte_sums_from_db()
+#
+# usage: python3 test_switch_bytes.py
+#        python3 test_switch_bytes.py --start 2024-05-01T10:00:00Z --end 2024-05-01T10:05:00Z
+
+percentile = 95
+num_switches = 14
+dscps = [0, 34, 35, 46]
+paths = ["1-4-5-8", "1-9-10-5-8", "2-3-6-7", "2-14-13-12-7", "3-2-1", "10-11", "12-11-10"]
+
+class FakeWriter():
+    def __init__(self) -> None:
+        self.lines = []
+
+    def put(self, lines):
+        self.lines += lines
+
+def exact_percentile(sorted_values, p):
+    # InfluxDB PERCENTILE(): value at position int(count*p/100 + 0.5) of the sorted values
+    index = int(len(sorted_values) * p / 100 + 0.5) - 1
+    return sorted_values[min(max(index, 0), len(sorted_values) - 1)]
+
+def regex_byte_sums(rows, dscp):
+    # What the flow_stats queries return: sizes below the percentile of all DSCPs, per switch (path =~ /(^|-)(id)(-|$|\b)/)
+    p_size = exact_percentile(sorted(size for _, _, _, size in rows), percentile)
+    sums = {}
+    for switch_id in range(1, num_switches + 1):
+        regex = re.compile(rf"(^|-)({switch_id})(-|$|\b)")
+        total = sum(size for _, path, row_dscp, size in rows if regex.search(path) and (dscp == -1 or row_dscp == dscp) and size <= p_size)
+        if total:
+            sums[switch_id] = total
+    return sums
+
+def grouped_result(lines, measurement, group_by, fields):
+    # SELECT SUM(field) ... GROUP BY group_by of line protocol points, as InfluxDB answers it
+    groups = {}
+    for line in lines:
+        head, values, _ = line.split(" ")
+        name, *tags = head.split(",")
+        if name != measurement:
+            continue
+        tags = dict(tag.split("=") for tag in tags)
+        values = dict(value.split("=") for value in values.split(","))
+        key = tuple(tags[tag] for tag in group_by)
+        totals = groups.setdefault(key, [0] * len(fields))
+        for i, field in enumerate(fields):
+            totals[i] += int(values[field].rstrip("i"))
+    return ResultSet({'series': [{'name': measurement, 'tags': dict(zip(group_by, key)), 'columns': ['time'] + fields, 'values': [[0] + totals]}
+                                 for key, totals in groups.items()]})
+
+def scenario_data(lines):
+    return ScenarioSwitchData(grouped_result(lines, "switch_bytes", ["switch_id", "dscp", "size"], ["packets", "bytes"]),
+                              grouped_result(lines, "flow_bytes", ["dscp", "size"], ["packets"]),
+                              ResultSet({}), ResultSet({}))
+
+def check_synthetic(n):
+    # flow_stats rows (time, path, dscp, size), over 10 windows of 1 s
+    start = 1714557600 * 1000000000
+    sizes = {0: [64, 128], 34: [256, 512], 35: [512], 46: [1024, 1400]}
+    rows = []
+    for i in range(n):
+        dscp = random.choice(dscps)
+        rows.append((start + i * 10000000000 // n, random.choice(paths), dscp, random.choice(sizes[dscp])))
+
+    writer = FakeWriter()
+    rollup = RollupAggregator(writer, window=1.0, collector_id=0)
+    for timestamp, path, dscp, size in rows:
+        switch_ids = [int(switch_id) for switch_id in path.split("-")][::-1]        #reports have the last hop first
+        rollup.add(SimpleNamespace(src_ip="2001:1:1::1", dst_ip="2001:1:8::1", flow_label=1, flow_latency=1000, dscp=dscp, size=size,
+                                   switch_ids=switch_ids, egress_tstamps=[], hop_latencies=[], hop_cnt=len(switch_ids), queue_ids=[]),
+                   timestamp)
+    rollup.flush(all_windows=True)
+    backfill_lines, count = window_byte_lines(((timestamp, path, str(dscp), size) for timestamp, path, dscp, size in rows), 1.0, collector=0)
+
+    collector_lines = [line for line in writer.lines if line.startswith(("switch_bytes", "flow_bytes"))]
+    print(f"{n} flow reports: {len(collector_lines)} switch_bytes/flow_bytes points from the collector, {len(backfill_lines)} from the backfill")
+    ok = check("backfill writes the same points as the collector", count == n and sorted(backfill_lines) == sorted(collector_lines))
+
+    data = scenario_data(collector_lines)
+    for dscp in [-1] + dscps:
+        ok &= check(f"dscp {dscp}: same byte sums as the regex on the path", data.byte_sums(percentile, dscp) == regex_byte_sums(rows, dscp))
+
+    # the percentile of the sizes must fall on a size with the packets of the sums cut at it
+    big = [row for row in rows if row[3] == 1400][:50]
+    small = [row for row in rows if row[3] == 64]
+    data = scenario_data(window_byte_lines(small + big, 1.0)[0])
+    ok &= check("sizes above the 95th percentile left out", data.byte_sums(percentile) == regex_byte_sums(small + big, -1))
+    return ok
+
+def check_db(start, end):
+    from influx_query import get_influx_query
+    influx = get_influx_query(host='localhost', database='int')
+
+    started = time.perf_counter()
+    data = get_scenario_switch_data(influx.query_batch, start, end)
+    rollup_time = time.perf_counter() - started
+    if not data.has_bytes():
+        print("No switch_bytes/flow_bytes in the time range (backfill them with INT/receive/backfill_switch_bytes.py)")
+        return False
+
+    ok = True
+    db_dscps = [-1] + sorted(int(point['value']) for point in influx.query('SHOW TAG VALUES FROM flow_stats WITH KEY = "dscp"').get_points())
+    started = time.perf_counter()
+    p_size = list(influx.query(f'SELECT PERCENTILE("size", {percentile}) AS p_size FROM flow_stats WHERE time >= $start AND time <= $end',
+                               {'start': start, 'end': end}).get_points())[0]['p_size']
+    for dscp in db_dscps:
+        condition = f"AND dscp = '{dscp}'" if dscp != -1 else ""
+        sums = {}
+        for switch_id in range(1, num_switches + 1):
+            result = influx.query(f"""
+                SELECT SUM("size") FROM flow_stats
+                WHERE time >= $start AND time <= $end AND path =~ /(^|-)({switch_id})(-|$|\\b)/ {condition} AND "size" <= $p_size
+            """, {'start': start, 'end': end, 'p_size': p_size})
+            for point in result.get_points():
+                sums[switch_id] = point['sum']
+        ok &= check(f"dscp {dscp}: switch_bytes same as the regex on the path", data.byte_sums(percentile, dscp) == sums)
+    regex_time = time.perf_counter() - started
+    print(f"{len(db_dscps)} DSCPs: regex on flow_stats.path {regex_time * 1000:.1f} ms, rollups (1 request, sketches included) {rollup_time * 1000:.1f} ms")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='switch_bytes/flow_bytes rollups against the regex on flow_stats.path')
+    parser.add_argument('--n', help='Number of synthetic flow reports', type=int, default=50000)
+    parser.add_argument('--start', help='Start (RFC3339) of the time range to compare against InfluxDB', type=str, default=None)
+    parser.add_argument('--end', help='End (RFC3339) of the time range to compare against InfluxDB', type=str, default=None)
+    args = parser.parse_args()
+
+    random.seed(1)
+    ok = check_synthetic(args.n)
+    ok &= check("RFC3339 to nanoseconds", rfc3339_ns("2024-05-01T10:00:00.123456789Z") == 1714557600123456789
+                and rfc3339_ns("2024-05-01T12:00:00+02:00") == 1714557600000000000)
+    if args.start and args.end:
+        ok = check_db(args.start, args.end) and ok
+
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'INT', 'analyzer'))
+import analyzer
+from analyzer import update_switch_states, thresholds_overloaded, thresholds_no_overloaded
+from checks import check, exit_checks
+
+# Hysteresis and dwell of the event mode of the analyzer (update_switch_states): the loads of the switches are fed one
+# per second, the switches returned to detour/revert are collected by time
+#   flapping: loads around the thresholds never detour nor revert, between both thresholds nothing changes
+#   dwell:    a switch is detoured (reverted) only after min_dwell seconds above (below) the threshold
+#   backoff:  nothing is returned for a switch before its next_attempt
+#
+# usage: python3 test_switch_states.py
+
+MIN_DWELL = 3
+SWITCH = 5
+
+ABOVE = thresholds_overloaded + 0.05
+BELOW = thresholds_no_overloaded - 0.05
+BETWEEN = (thresholds_overloaded + thresholds_no_overloaded) / 2
+
+def rule(flow_label):
+    return {"deviceID": "1", "srcIP": "2001:1:1::1", "dstIP": "2001:1:8::1", "flow_label": flow_label,
+            "src_mask": 128, "dst_mask": 128, "flow_label_mask": 255}
+
+def run(loads, detoured=False, switch_states=None, start=0):
+    """
+    Feeds the loads of SWITCH, one per second.
+
+    :param loads: Load of each second, None if the switch is not in the loads.
+    :param detoured: SWITCH has a SRv6 rule (it can be reverted).
+    :return: (seconds the switch was returned to detour, seconds it was returned to revert, switch_states)
+    """
+    analyzer.active_SRv6_rules.clear()
+    if detoured:
+        analyzer.active_SRv6_rules.add(SWITCH, rule(1))
+    switch_states = {} if switch_states is None else switch_states
+    detours, reverts = [], []
+    for second, load in enumerate(loads, start):
+        to_detour, to_revert = update_switch_states(switch_states, [] if load is None else [(SWITCH, load)], second)
+        if SWITCH in to_detour:
+            detours.append(second)
+        if SWITCH in to_revert:
+            reverts.append(second)
+    return detours, reverts, switch_states
+
+def check_flapping():
+    ok = check("load flapping around the overloaded threshold never detoured",
+               run([ABOVE, BETWEEN] * 10)[0] == [] and run(([ABOVE] * (MIN_DWELL - 1) + [BETWEEN]) * 5)[0] == [])
+    ok &= check("load flapping around the no longer overloaded threshold never reverted",
+                run([BELOW, BETWEEN] * 10, detoured=True)[1] == [] and run(([BELOW] * (MIN_DWELL - 1) + [BETWEEN]) * 5, detoured=True)[1] == [])
+    detours, reverts, switch_states = run([BETWEEN] * 20, detoured=True)
+    ok &= check("between both thresholds nothing changes", (detours, reverts) == ([], []) and run([BETWEEN] * 20)[:2] == ([], [])
+                and switch_states[SWITCH].above_since is None and switch_states[SWITCH].below_since is None)
+    ok &= check("load jumping from one threshold to the other restarts the dwell",
+                run([ABOVE, ABOVE, BELOW, ABOVE, ABOVE, BELOW] * 5, detoured=True)[:2] == ([], []))
+    return ok
+
+def check_dwell():
+    detours, _, switch_states = run([ABOVE] * (MIN_DWELL + 1))
+    ok = check("detoured only after min_dwell above the threshold", detours == [MIN_DWELL] and switch_states[SWITCH].above_since == 0)
+    ok &= check("dwell counted from the last crossing", run([ABOVE, ABOVE, BETWEEN] + [ABOVE] * (MIN_DWELL + 1))[0] == [3 + MIN_DWELL])
+    ok &= check("reverted only after min_dwell below the threshold", run([BELOW] * (MIN_DWELL + 1), detoured=True)[1] == [MIN_DWELL])
+    ok &= check("switch without SRv6 rules never reverted", run([BELOW] * (MIN_DWELL + 5))[1] == [])
+    ok &= check("detoured switch without traffic (load 0) reverted after min_dwell", run([None] * (MIN_DWELL + 1), detoured=True)[1] == [MIN_DWELL])
+    return ok
+
+def check_backoff():
+    # apply_event_decisions(): next_attempt after a detour (the analysis window) or a failed one (min_dwell)
+    detours, _, switch_states = run([ABOVE] * (MIN_DWELL + 1))
+    switch_states[SWITCH].next_attempt = MIN_DWELL + 10
+    detours, _, _ = run([ABOVE] * 15, switch_states=switch_states, start=MIN_DWELL + 1)
+    ok = check("still overloaded: detoured again only at next_attempt", detours == list(range(MIN_DWELL + 10, MIN_DWELL + 16)))
+
+    _, reverts, switch_states = run([BELOW] * (MIN_DWELL + 1), detoured=True)
+    switch_states[SWITCH].next_attempt = 20
+    _, reverts, _ = run([BELOW] * 20, detoured=True, switch_states=switch_states, start=MIN_DWELL + 1)
+    ok &= check("revert waits for next_attempt", reverts[:1] == [20])
+
+    switch_states = run([ABOVE] * (MIN_DWELL + 1))[2]
+    switch_states[SWITCH].next_attempt = 100
+    detours, _, _ = run([BETWEEN] + [ABOVE] * 10, switch_states=switch_states, start=MIN_DWELL + 1)
+    ok &= check("next_attempt kept while the dwell restarts", detours == [])
+    return ok
+
+def main():
+    analyzer.args = SimpleNamespace(min_dwell=MIN_DWELL)
+
+    print("Checks")
+    ok = check_flapping()
+    ok &= check_dwell()
+    ok &= check_backoff()
+    exit_checks(ok)
+
+if __name__ == "__main__":
+    main()